@@ -61,6 +61,7 @@ def create_app(config_name=None):
     from app.routes.faturamento import faturamento_bp
     from app.routes.api import api_bp
     from app.routes.api_docs import api_docs_bp
+    from app.routes.jobs import jobs_bp
     
     app.register_blueprint(auth_bp)
     app.register_blueprint(main_bp)
@@ -70,5 +71,28 @@ def create_app(config_name=None):
     app.register_blueprint(faturamento_bp)
     app.register_blueprint(api_bp)
     app.register_blueprint(api_docs_bp)
+    app.register_blueprint(jobs_bp)
+    
+    # Fila de tarefas em segundo plano (os handlers são registrados na
+    # importação dos blueprints acima; execução em scripts/job_worker.py)
+    from app.services.jobs import job_queue
+    job_queue.init_app(app)
+    
+    # Contadores de estatísticas mantidos pelos eventos do SQLAlchemy
+    from app.utils.stats_counters import init_stats_counters
+    init_stats_counters(app)
+    
+    # Índice de busca dos cadastros (FTS5 no SQLite, trigramas nos demais)
+    from app.utils.search_index import init_search_index
+    init_search_index(app)
+    
+    # Índice de identidade por CPF/CNPJ (/api/lookup) e o LRU das consultas
+    from app.utils.identity_index import init_identity_index
+    init_identity_index(app)
+    
+    # Aquecer o cache com as agregações mais acessadas (as funções
+    # aquecíveis são registradas na importação dos blueprints acima)
+    from app.utils.cache_warmer import cache_warmer
+    cache_warmer.init_app(app)
     
     return app
@@ -1,11 +1,14 @@
 """
 Namespace de entidades da API
 """
-from flask_restx import Namespace, Resource, fields, reqparse
+from flask_restx import Namespace, Resource, fields, inputs, reqparse
 from flask import request, jsonify
 from flask_login import current_user, login_required
 from app.models.entidade import Entidade
 from app import db
+from app.utils.pagination import InvalidCursor, InvalidSort, paginate
+from app.utils.documents import find_by_document
+from app.utils.search_index import apply_search
 from app.api.models import (
     entity_model, entity_create_model, entity_update_model,
     success_response, error_response, paginated_response
@@ -13,14 +16,19 @@ from app.api.models import (
 
 entities_ns = Namespace('entities', description='Operações de entidades')
 
+# Campos aceitos em `sort` (o valor da coluna vai no cursor de paginação)
+SORT_FIELDS = ('id', 'razao_social', 'nome_fantasia', 'tipo_cliente', 'status', 'created_at')
+
 # Parser para parâmetros de query
 parser = reqparse.RequestParser()
 parser.add_argument('page', type=int, default=1, help='Número da página')
 parser.add_argument('per_page', type=int, default=10, help='Itens por página')
 parser.add_argument('search', type=str, help='Termo de busca (nome ou CNPJ)')
 parser.add_argument('status', type=str, help='Filtrar por status (ativo, inativo)')
-parser.add_argument('sort', type=str, default='id', help='Campo para ordenação')
+parser.add_argument('sort', type=str, default='id', help=f"Campo para ordenação: {', '.join(SORT_FIELDS)}")
 parser.add_argument('order', type=str, default='asc', help='Ordem da classificação')
+parser.add_argument('cursor', type=str, help='Cursor da próxima página (paginação por keyset)')
+parser.add_argument('include_total', type=inputs.boolean, default=True, help='Calcular o total de itens')
 
 @entities_ns.route('/')
 class EntityList(Resource):
@@ -30,6 +38,7 @@ class EntityList(Resource):
                      description='Listar entidades com paginação e filtros',
                      responses={
                          200: 'Lista de entidades obtida com sucesso',
+                         400: 'Cursor inválido',
                          401: 'Usuário não autenticado',
                          500: 'Erro interno do servidor'
                      })
@@ -47,6 +56,8 @@ class EntityList(Resource):
         - `status` (string): Filtrar por status (ativo, inativo)
         - `sort` (string): Campo para ordenação (padrão: id)
         - `order` (string): Ordem da classificação (asc, desc)
+        - `cursor` (string): Cursor `next_cursor` da resposta anterior; ignora `page`
+        - `include_total` (bool): `false` dispensa o COUNT(*) (total e pages nulos)
         
         **Exemplo de uso:**
         ```bash
@@ -75,7 +86,8 @@ class EntityList(Resource):
             "total": 1,
             "pages": 1,
             "has_prev": false,
-            "has_next": false
+            "has_next": false,
+            "next_cursor": null
           }
         }
         ```
@@ -95,32 +107,22 @@ class EntityList(Resource):
             query = Entidade.query
             
             # Aplicar filtros
-            if args['search']:
-                search_term = f"%{args['search']}%"
-                query = query.filter(
-                    (Entidade.nome.ilike(search_term)) | 
-                    (Entidade.cnpj.ilike(search_term))
-                )
+            query = apply_search(query, Entidade, args['search'])
             
             if args['status']:
                 query = query.filter(Entidade.status == args['status'])
             
-            # Aplicar ordenação
-            sort_field = getattr(Entidade, args['sort'], Entidade.id)
-            if args['order'] == 'desc':
-                query = query.order_by(sort_field.desc())
-            else:
-                query = query.order_by(sort_field.asc())
-            
-            # Paginação
-            pagination = query.paginate(
-                page=page,
-                per_page=per_page,
-                error_out=False
+            # Ordenação e paginação (por cursor quando informado)
+            items, pagination = paginate(
+                query, Entidade,
+                sort=args['sort'], order=args['order'],
+                page=page, per_page=per_page,
+                cursor=args['cursor'], include_total=args['include_total'],
+                sortable=SORT_FIELDS
             )
             
             entities = []
-            for entity in pagination.items:
+            for entity in items:
                 entities.append({
                     'id': entity.id,
                     'nome': entity.nome,
@@ -135,16 +137,14 @@ class EntityList(Resource):
             return {
                 'success': True,
                 'data': entities,
-                'pagination': {
-                    'page': pagination.page,
-                    'per_page': pagination.per_page,
-                    'total': pagination.total,
-                    'pages': pagination.pages,
-                    'has_prev': pagination.has_prev,
-                    'has_next': pagination.has_next
-                }
+                'pagination': pagination
             }, 200
             
+        except (InvalidCursor, InvalidSort) as e:
+            return {
+                'success': False,
+                'message': str(e)
+            }, 400
         except Exception as e:
             return {
                 'success': False,
@@ -206,7 +206,7 @@ class EntityList(Resource):
             data = request.get_json()
             
             # Verificar se CNPJ já existe
-            existing_entity = Entidade.query.filter_by(cnpj=data['cnpj']).first()
+            existing_entity = find_by_document(Entidade, 'cpf_cnpj', data['cnpj'])
             if existing_entity:
                 return {
                     'success': False,
@@ -351,7 +351,7 @@ class EntityDetail(Resource):
                 entity.nome = data['nome']
             if 'cnpj' in data:
                 # Verificar se CNPJ já existe
-                existing_entity = Entidade.query.filter_by(cnpj=data['cnpj']).first()
+                existing_entity = find_by_document(Entidade, 'cpf_cnpj', data['cnpj'])
                 if existing_entity and existing_entity.id != entity_id:
                     return {
                         'success': False,
@@ -156,12 +156,14 @@ linkedin_company_model = Model('LinkedInCompany', {
 
 # Modelos de paginação
 pagination_model = Model('Pagination', {
-    'page': fields.Integer(required=True, description='Página atual'),
+    'page': fields.Integer(description='Página atual (nula no modo cursor)'),
     'per_page': fields.Integer(required=True, description='Itens por página'),
-    'total': fields.Integer(required=True, description='Total de itens'),
-    'pages': fields.Integer(required=True, description='Total de páginas'),
+    'total': fields.Integer(description='Total de itens (nulo com include_total=false)'),
+    'pages': fields.Integer(description='Total de páginas (nulo com include_total=false)'),
     'has_prev': fields.Boolean(required=True, description='Tem página anterior'),
-    'has_next': fields.Boolean(required=True, description='Tem próxima página')
+    'has_next': fields.Boolean(required=True, description='Tem próxima página'),
+    'mode': fields.String(description='Modo de paginação', enum=['page', 'cursor']),
+    'next_cursor': fields.String(description='Cursor opaco da próxima página')
 })
 
 paginated_response = Model('PaginatedResponse', {
@@ -6,6 +6,9 @@ from flask import request, jsonify
 from app.models.user import User
 from app.models.veiculo import Veiculo
 from app.models.entidade import Entidade
+from app.utils.response_cache import cache_response
+from app.utils.stats_engine import table_stats
+from app.utils.stats_counters import counter_stats, counter_totals
 # from app.api.models import (
 #     stats_model, detailed_stats_model, success_response, error_response
 # )
@@ -21,6 +24,8 @@ class Statistics(Resource):
                       200: 'Estatísticas obtidas com sucesso',
                       500: 'Erro interno do servidor'
                   })
+    @cache_response(timeout=60, key_prefix="api_stats", vary=["Accept-Encoding"],
+                    tags=["model:User", "model:Veiculo", "model:Entidade"])
     def get(self):
         """
         Obter estatísticas básicas do sistema
@@ -45,20 +50,18 @@ class Statistics(Resource):
         
         **Notas:**
         - Este endpoint é público e não requer autenticação
-        - Os dados são atualizados em tempo real
+        - Resposta em cache por até 1 minuto (ETag; If-None-Match retorna 304)
         - O campo 'processes' sempre retorna 0 (não implementado)
         """
         try:
-            # Contar registros
-            users_count = User.query.count()
-            vehicles_count = Veiculo.query.count()
-            entities_count = Entidade.query.count()
+            # Totais pré-calculados (stats_counters), sem COUNT(*) nas tabelas
+            totals = counter_totals(User, Veiculo, Entidade)
             processes_count = 0  # Não implementado ainda
             
             return {
-                'users': users_count,
-                'vehicles': vehicles_count,
-                'entities': entities_count,
+                'users': totals[User.__tablename__],
+                'vehicles': totals[Veiculo.__tablename__],
+                'entities': totals[Entidade.__tablename__],
                 'processes': processes_count
             }, 200
             
@@ -79,6 +82,8 @@ class DetailedStatistics(Resource):
                       401: 'Usuário não autenticado',
                       500: 'Erro interno do servidor'
                   })
+    @cache_response(timeout=300, key_prefix="api_stats",
+                    tags=["model:User", "model:Veiculo", "model:Entidade"])
     def get(self):
         """
         Obter estatísticas detalhadas do sistema
@@ -121,7 +126,7 @@ class DetailedStatistics(Resource):
         
         **Notas:**
         - Este endpoint requer autenticação
-        - Os dados são atualizados em tempo real
+        - Resposta em cache por até 5 minutos por grupo de usuário (ETag; If-None-Match retorna 304)
         - Inclui breakdowns detalhados por categoria
         """
         try:
@@ -133,45 +138,27 @@ class DetailedStatistics(Resource):
                     'message': 'Usuário não autenticado'
                 }, 401
             
-            # Estatísticas de usuários
-            users_total = User.query.count()
-            users_active = User.query.filter_by(status='active').count()
-            users_blocked = User.query.filter_by(status='blocked').count()
-            
-            # Usuários por grupo
-            from app import db
-            users_by_group = db.session.query(
-                User.group,
-                db.func.count(User.id)
-            ).group_by(User.group).all()
-            
+            # Contagens pré-calculadas (stats_counters)
+            users = counter_stats(User, statuses=('active', 'blocked'), dimension='group')
             users_stats = {
-                'total': users_total,
-                'active': users_active,
-                'blocked': users_blocked,
-                'by_group': [{'group': group, 'count': count} for group, count in users_by_group]
+                'total': users['total'],
+                'active': users['by_status']['active'],
+                'blocked': users['by_status']['blocked'],
+                'by_group': [{'group': group, 'count': count} for group, count in users['by_group']]
             }
             
-            # Estatísticas de veículos
-            vehicles_total = Veiculo.query.count()
-            vehicles_active = Veiculo.query.filter_by(status='ativo').count()
-            vehicles_inactive = Veiculo.query.filter_by(status='inativo').count()
-            
+            vehicles = counter_stats(Veiculo, statuses=('ativo', 'inativo'))
             vehicles_stats = {
-                'total': vehicles_total,
-                'active': vehicles_active,
-                'inactive': vehicles_inactive
+                'total': vehicles['total'],
+                'active': vehicles['by_status']['ativo'],
+                'inactive': vehicles['by_status']['inativo']
             }
             
-            # Estatísticas de entidades
-            entities_total = Entidade.query.count()
-            entities_active = Entidade.query.filter_by(status='ativo').count()
-            entities_inactive = Entidade.query.filter_by(status='inativo').count()
-            
+            entities = counter_stats(Entidade, statuses=('ativo', 'inativo'))
             entities_stats = {
-                'total': entities_total,
-                'active': entities_active,
-                'inactive': entities_inactive
+                'total': entities['total'],
+                'active': entities['by_status']['ativo'],
+                'inactive': entities['by_status']['inativo']
             }
             
             return {
@@ -197,6 +184,8 @@ class UserStatistics(Resource):
                       200: 'Estatísticas de usuários obtidas com sucesso',
                       500: 'Erro interno do servidor'
                   })
+    @cache_response(timeout=300, key_prefix="api_stats", vary=["Accept-Encoding"],
+                    tags=["model:User"])
     def get(self):
         """
         Obter estatísticas específicas de usuários
@@ -226,39 +215,36 @@ class UserStatistics(Resource):
           }
         }
         ```
+        
+        **Notas:**
+        - Todas as contagens vêm de uma única consulta (agregação condicional)
+        - 'recent_logins' é null enquanto o modelo não registrar o último login
         """
         try:
-            from app import db
             from datetime import datetime, timedelta
             
-            # Estatísticas básicas
-            total = User.query.count()
-            active = User.query.filter_by(status='active').count()
-            blocked = User.query.filter_by(status='blocked').count()
-            
-            # Usuários por grupo
-            by_group = db.session.query(
-                User.group,
-                db.func.count(User.id)
-            ).group_by(User.group).all()
-            
             # Usuários novos este mês
             this_month = datetime.now().replace(day=1)
-            new_this_month = User.query.filter(User.created_at >= this_month).count()
+            conditions = {'new_this_month': User.created_at >= this_month}
             
-            # Logins recentes (últimos 7 dias)
-            week_ago = datetime.now() - timedelta(days=7)
-            recent_logins = User.query.filter(User.last_login >= week_ago).count()
+            # Logins recentes (últimos 7 dias), se o modelo registrar o último login
+            if hasattr(User, 'last_login'):
+                week_ago = datetime.now() - timedelta(days=7)
+                conditions['recent_logins'] = User.last_login >= week_ago
+            
+            # Total, status, grupos e condições em uma única consulta
+            stats = table_stats(User, statuses=('active', 'blocked'), group_by=User.group,
+                                conditions=conditions)
             
             return {
                 'success': True,
                 'data': {
-                    'total': total,
-                    'active': active,
-                    'blocked': blocked,
-                    'by_group': [{'group': group, 'count': count} for group, count in by_group],
-                    'recent_logins': recent_logins,
-                    'new_this_month': new_this_month
+                    'total': stats['total'],
+                    'active': stats['by_status']['active'],
+                    'blocked': stats['by_status']['blocked'],
+                    'by_group': [{'group': group, 'count': count} for group, count in stats['by_group']],
+                    'recent_logins': stats['conditions'].get('recent_logins'),
+                    'new_this_month': stats['conditions']['new_this_month']
                 }
             }, 200
             
@@ -278,6 +264,8 @@ class VehicleStatistics(Resource):
                       200: 'Estatísticas de veículos obtidas com sucesso',
                       500: 'Erro interno do servidor'
                   })
+    @cache_response(timeout=300, key_prefix="api_stats", vary=["Accept-Encoding"],
+                    tags=["model:Veiculo"])
     def get(self):
         """
         Obter estatísticas específicas de veículos
@@ -316,10 +304,11 @@ class VehicleStatistics(Resource):
         try:
             from app import db
             
-            # Estatísticas básicas
-            total = Veiculo.query.count()
-            active = Veiculo.query.filter_by(status='ativo').count()
-            inactive = Veiculo.query.filter_by(status='inativo').count()
+            # Estatísticas básicas (pré-calculadas)
+            basic = counter_stats(Veiculo, statuses=('ativo', 'inativo'))
+            total = basic['total']
+            active = basic['by_status']['ativo']
+            inactive = basic['by_status']['inativo']
             
             # Veículos por ano
             by_year = db.session.query(
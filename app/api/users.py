@@ -1,12 +1,14 @@
 """
 Namespace de usuários da API
 """
-from flask_restx import Namespace, Resource, fields, reqparse
+from flask_restx import Namespace, Resource, fields, inputs, reqparse
 from flask import request, jsonify
 from flask_login import current_user, login_required
 from werkzeug.security import generate_password_hash
 from app.models.user import User
 from app import db
+from app.utils.pagination import InvalidCursor, InvalidSort, paginate
+from app.utils.search_index import apply_search
 from app.api.models import (
     user_model, user_create_model, user_update_model, 
     success_response, error_response, paginated_response
@@ -14,6 +16,9 @@ from app.api.models import (
 
 users_ns = Namespace('users', description='Operações de usuários')
 
+# Campos aceitos em `sort` (o valor da coluna vai no cursor de paginação)
+SORT_FIELDS = ('id', 'name', 'lastname', 'email', 'group', 'status', 'created_at')
+
 # Parser para parâmetros de query
 parser = reqparse.RequestParser()
 parser.add_argument('page', type=int, default=1, help='Número da página')
@@ -21,8 +26,10 @@ parser.add_argument('per_page', type=int, default=10, help='Itens por página')
 parser.add_argument('search', type=str, help='Termo de busca')
 parser.add_argument('group', type=str, help='Filtrar por grupo')
 parser.add_argument('status', type=str, help='Filtrar por status')
-parser.add_argument('sort', type=str, default='id', help='Campo para ordenação')
+parser.add_argument('sort', type=str, default='id', help=f"Campo para ordenação: {', '.join(SORT_FIELDS)}")
 parser.add_argument('order', type=str, default='asc', help='Ordem da classificação')
+parser.add_argument('cursor', type=str, help='Cursor da próxima página (paginação por keyset)')
+parser.add_argument('include_total', type=inputs.boolean, default=True, help='Calcular o total de itens')
 
 @users_ns.route('/')
 class UserList(Resource):
@@ -32,6 +39,7 @@ class UserList(Resource):
                   description='Listar usuários com paginação e filtros',
                   responses={
                       200: 'Lista de usuários obtida com sucesso',
+                      400: 'Cursor inválido',
                       401: 'Usuário não autenticado',
                       500: 'Erro interno do servidor'
                   })
@@ -50,6 +58,8 @@ class UserList(Resource):
         - `status` (string): Filtrar por status (active, blocked)
         - `sort` (string): Campo para ordenação (padrão: id)
         - `order` (string): Ordem da classificação (asc, desc)
+        - `cursor` (string): Cursor `next_cursor` da resposta anterior; ignora `page`
+        - `include_total` (bool): `false` dispensa o COUNT(*) (total e pages nulos)
         
         **Exemplo de uso:**
         ```bash
@@ -75,7 +85,8 @@ class UserList(Resource):
             "total": 1,
             "pages": 1,
             "has_prev": false,
-            "has_next": false
+            "has_next": false,
+            "next_cursor": null
           }
         }
         ```
@@ -95,12 +106,7 @@ class UserList(Resource):
             query = User.query
             
             # Aplicar filtros
-            if args['search']:
-                search_term = f"%{args['search']}%"
-                query = query.filter(
-                    (User.name.ilike(search_term)) | 
-                    (User.email.ilike(search_term))
-                )
+            query = apply_search(query, User, args['search'])
             
             if args['group']:
                 query = query.filter(User.group == args['group'])
@@ -108,22 +114,17 @@ class UserList(Resource):
             if args['status']:
                 query = query.filter(User.status == args['status'])
             
-            # Aplicar ordenação
-            sort_field = getattr(User, args['sort'], User.id)
-            if args['order'] == 'desc':
-                query = query.order_by(sort_field.desc())
-            else:
-                query = query.order_by(sort_field.asc())
-            
-            # Paginação
-            pagination = query.paginate(
-                page=page,
-                per_page=per_page,
-                error_out=False
+            # Ordenação e paginação (por cursor quando informado)
+            items, pagination = paginate(
+                query, User,
+                sort=args['sort'], order=args['order'],
+                page=page, per_page=per_page,
+                cursor=args['cursor'], include_total=args['include_total'],
+                sortable=SORT_FIELDS
             )
             
             users = []
-            for user in pagination.items:
+            for user in items:
                 users.append({
                     'id': user.id,
                     'name': user.name,
@@ -137,16 +138,14 @@ class UserList(Resource):
             return {
                 'success': True,
                 'data': users,
-                'pagination': {
-                    'page': pagination.page,
-                    'per_page': pagination.per_page,
-                    'total': pagination.total,
-                    'pages': pagination.pages,
-                    'has_prev': pagination.has_prev,
-                    'has_next': pagination.has_next
-                }
+                'pagination': pagination
             }, 200
             
+        except (InvalidCursor, InvalidSort) as e:
+            return {
+                'success': False,
+                'message': str(e)
+            }, 400
         except Exception as e:
             return {
                 'success': False,
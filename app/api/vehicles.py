@@ -1,11 +1,14 @@
 """
 Namespace de veículos da API
 """
-from flask_restx import Namespace, Resource, fields, reqparse
+from flask_restx import Namespace, Resource, fields, inputs, reqparse
 from flask import request, jsonify
 from flask_login import current_user, login_required
 from app.models.veiculo import Veiculo
 from app import db
+from app.utils.pagination import InvalidCursor, InvalidSort, paginate
+from app.utils.documents import find_by_document
+from app.utils.search_index import apply_search
 from app.api.models import (
     vehicle_model, vehicle_create_model, vehicle_update_model,
     success_response, error_response, paginated_response
@@ -13,6 +16,9 @@ from app.api.models import (
 
 vehicles_ns = Namespace('vehicles', description='Operações de veículos')
 
+# Campos aceitos em `sort` (o valor da coluna vai no cursor de paginação)
+SORT_FIELDS = ('id', 'placa', 'motorista_responsavel', 'tipo', 'estado', 'status', 'created_at')
+
 # Parser para parâmetros de query
 parser = reqparse.RequestParser()
 parser.add_argument('page', type=int, default=1, help='Número da página')
@@ -21,8 +27,10 @@ parser.add_argument('search', type=str, help='Termo de busca (placa ou modelo)')
 parser.add_argument('status', type=str, help='Filtrar por status (ativo, inativo)')
 parser.add_argument('year', type=int, help='Filtrar por ano')
 parser.add_argument('color', type=str, help='Filtrar por cor')
-parser.add_argument('sort', type=str, default='id', help='Campo para ordenação')
+parser.add_argument('sort', type=str, default='id', help=f"Campo para ordenação: {', '.join(SORT_FIELDS)}")
 parser.add_argument('order', type=str, default='asc', help='Ordem da classificação')
+parser.add_argument('cursor', type=str, help='Cursor da próxima página (paginação por keyset)')
+parser.add_argument('include_total', type=inputs.boolean, default=True, help='Calcular o total de itens')
 
 @vehicles_ns.route('/')
 class VehicleList(Resource):
@@ -32,6 +40,7 @@ class VehicleList(Resource):
                      description='Listar veículos com paginação e filtros',
                      responses={
                          200: 'Lista de veículos obtida com sucesso',
+                         400: 'Cursor inválido',
                          401: 'Usuário não autenticado',
                          500: 'Erro interno do servidor'
                      })
@@ -51,6 +60,8 @@ class VehicleList(Resource):
         - `color` (string): Filtrar por cor
         - `sort` (string): Campo para ordenação (padrão: id)
         - `order` (string): Ordem da classificação (asc, desc)
+        - `cursor` (string): Cursor `next_cursor` da resposta anterior; ignora `page`
+        - `include_total` (bool): `false` dispensa o COUNT(*) (total e pages nulos)
         
         **Exemplo de uso:**
         ```bash
@@ -78,7 +89,8 @@ class VehicleList(Resource):
             "total": 1,
             "pages": 1,
             "has_prev": false,
-            "has_next": false
+            "has_next": false,
+            "next_cursor": null
           }
         }
         ```
@@ -98,12 +110,7 @@ class VehicleList(Resource):
             query = Veiculo.query
             
             # Aplicar filtros
-            if args['search']:
-                search_term = f"%{args['search']}%"
-                query = query.filter(
-                    (Veiculo.placa.ilike(search_term)) | 
-                    (Veiculo.modelo.ilike(search_term))
-                )
+            query = apply_search(query, Veiculo, args['search'])
             
             if args['status']:
                 query = query.filter(Veiculo.status == args['status'])
@@ -114,22 +121,17 @@ class VehicleList(Resource):
             if args['color']:
                 query = query.filter(Veiculo.cor.ilike(f"%{args['color']}%"))
             
-            # Aplicar ordenação
-            sort_field = getattr(Veiculo, args['sort'], Veiculo.id)
-            if args['order'] == 'desc':
-                query = query.order_by(sort_field.desc())
-            else:
-                query = query.order_by(sort_field.asc())
-            
-            # Paginação
-            pagination = query.paginate(
-                page=page,
-                per_page=per_page,
-                error_out=False
+            # Ordenação e paginação (por cursor quando informado)
+            items, pagination = paginate(
+                query, Veiculo,
+                sort=args['sort'], order=args['order'],
+                page=page, per_page=per_page,
+                cursor=args['cursor'], include_total=args['include_total'],
+                sortable=SORT_FIELDS
             )
             
             vehicles = []
-            for vehicle in pagination.items:
+            for vehicle in items:
                 vehicles.append({
                     'id': vehicle.id,
                     'placa': vehicle.placa,
@@ -143,16 +145,14 @@ class VehicleList(Resource):
             return {
                 'success': True,
                 'data': vehicles,
-                'pagination': {
-                    'page': pagination.page,
-                    'per_page': pagination.per_page,
-                    'total': pagination.total,
-                    'pages': pagination.pages,
-                    'has_prev': pagination.has_prev,
-                    'has_next': pagination.has_next
-                }
+                'pagination': pagination
             }, 200
             
+        except (InvalidCursor, InvalidSort) as e:
+            return {
+                'success': False,
+                'message': str(e)
+            }, 400
         except Exception as e:
             return {
                 'success': False,
@@ -212,7 +212,7 @@ class VehicleList(Resource):
             data = request.get_json()
             
             # Verificar se placa já existe
-            existing_vehicle = Veiculo.query.filter_by(placa=data['placa']).first()
+            existing_vehicle = find_by_document(Veiculo, 'placa', data['placa'])
             if existing_vehicle:
                 return {
                     'success': False,
@@ -351,7 +351,7 @@ class VehicleDetail(Resource):
             # Atualizar campos fornecidos
             if 'placa' in data:
                 # Verificar se placa já existe
-                existing_vehicle = Veiculo.query.filter_by(placa=data['placa']).first()
+                existing_vehicle = find_by_document(Veiculo, 'placa', data['placa'])
                 if existing_vehicle and existing_vehicle.id != vehicle_id:
                     return {
                         'success': False,
@@ -5,5 +5,10 @@ Modelos do banco de dados
 from .user import User
 from .veiculo import Veiculo
 from .entidade import Entidade
+from .stats_counter import StatsCounter
+from .monthly_rollup import MonthlyRollup
+from .search_trigram import SearchTrigram
+from .document_identity import DocumentIdentity
 
-__all__ = ['User', 'Veiculo', 'Entidade']
+__all__ = ['User', 'Veiculo', 'Entidade', 'StatsCounter', 'MonthlyRollup', 'SearchTrigram',
+           'DocumentIdentity']
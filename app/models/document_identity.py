@@ -0,0 +1,25 @@
+"""
+Modelo do índice de identidade por documento
+"""
+
+from app import db
+
+class DocumentIdentity(db.Model):
+    """Cadastros de cada CPF/CNPJ normalizado (usuário, veículos e entidade)
+
+    Mantido pelos eventos de app/utils/identity_index.py; a chave primária
+    começa pelo documento, então a consulta de um CPF/CNPJ é uma busca no
+    índice, e (entidade, registro) localiza as linhas de um cadastro alterado.
+    """
+    __tablename__ = 'document_identities'
+    
+    document = db.Column(db.String(14), primary_key=True)   # Só dígitos (CPF ou CNPJ)
+    entity = db.Column(db.String(50), primary_key=True)     # Nome da tabela (users, veiculos, entidades)
+    record_id = db.Column(db.Integer, primary_key=True)
+    
+    __table_args__ = (
+        db.Index('ix_document_identities_record', 'entity', 'record_id'),
+    )
+
+    def __repr__(self):
+        return f'<DocumentIdentity {self.document} {self.entity}#{self.record_id}>'
@@ -3,7 +3,9 @@ Modelo de Entidade
 """
 
 from datetime import datetime
+from sqlalchemy.orm import validates
 from app import db
+from app.utils.documents import CPF_CNPJ, document_column, sync_document
 
 class Entidade(db.Model):
     """Modelo de entidade do sistema"""
@@ -12,6 +14,7 @@ class Entidade(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     razao_social = db.Column(db.String(200), nullable=False)
     cpf_cnpj = db.Column(db.String(18), unique=True, nullable=False)
+    cpf_cnpj_norm = document_column('cpf_cnpj', CPF_CNPJ, 14, unique=True)  # Só dígitos
     nome_fantasia = db.Column(db.String(200), nullable=False)
     inscricao_estadual = db.Column(db.String(20))
     tipo_cliente = db.Column(db.String(20), nullable=False)  # Pessoa Fisica, Juridica, Estrangeira
@@ -34,6 +37,11 @@ class Entidade(db.Model):
     status = db.Column(db.String(20), default='active')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    @validates('cpf_cnpj')
+    def _sync_document(self, key, value):
+        """Mantém a coluna normalizada junto com o CPF/CNPJ"""
+        return sync_document(self, key, value)
+
     def to_dict(self):
         """Converte a entidade para dicionário"""
         return {
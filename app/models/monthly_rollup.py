@@ -0,0 +1,22 @@
+"""
+Modelo de agregados mensais
+"""
+
+from datetime import datetime
+from app import db
+
+class MonthlyRollup(db.Model):
+    """Registros criados por mês de cada tabela (séries dos gráficos mensais)
+
+    Mantido pelos mesmos eventos de stats_counters (app/utils/stats_counters.py);
+    o gráfico de 12 meses lê cerca de 12 linhas por tabela.
+    """
+    __tablename__ = 'monthly_rollups'
+    
+    entity = db.Column(db.String(50), primary_key=True)   # Nome da tabela (users, veiculos, entidades)
+    month = db.Column(db.String(7), primary_key=True)     # AAAA-MM
+    count = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<MonthlyRollup {self.entity} {self.month}: {self.count}>'
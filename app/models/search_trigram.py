@@ -0,0 +1,25 @@
+"""
+Modelo do índice de busca por trigramas
+"""
+
+from app import db
+
+class SearchTrigram(db.Model):
+    """Trigramas das palavras de cada registro pesquisável (índice de busca portátil)
+
+    Usado nos bancos sem FTS5 e mantido pelos eventos de
+    app/utils/search_index.py; a chave primária (entidade, trigrama,
+    registro) atende a busca por trigrama sem varrer a tabela.
+    """
+    __tablename__ = 'search_trigrams'
+    
+    entity = db.Column(db.String(50), primary_key=True)      # Nome da tabela (users, veiculos, entidades)
+    trigram = db.Column(db.String(3), primary_key=True)
+    record_id = db.Column(db.Integer, primary_key=True)
+    
+    __table_args__ = (
+        db.Index('ix_search_trigrams_record', 'entity', 'record_id'),
+    )
+
+    def __repr__(self):
+        return f'<SearchTrigram {self.entity}#{self.record_id} {self.trigram!r}>'
@@ -0,0 +1,24 @@
+"""
+Modelo de contadores de estatísticas
+"""
+
+from datetime import datetime
+from app import db
+
+class StatsCounter(db.Model):
+    """Contagem pré-calculada de registros por (tabela, dimensão, valor)
+
+    Mantida pelos eventos do SQLAlchemy em app/utils/stats_counters.py e
+    corrigida periodicamente pela reconciliação. A dimensão "_total" (valor
+    vazio) guarda o total da tabela; valores nulos são gravados como "".
+    """
+    __tablename__ = 'stats_counters'
+    
+    table_name = db.Column(db.String(50), primary_key=True)
+    dimension = db.Column(db.String(30), primary_key=True)   # status, group, tipo, tipo_cliente
+    value = db.Column(db.String(100), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<StatsCounter {self.table_name}.{self.dimension}={self.value}: {self.count}>'
@@ -6,7 +6,9 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
+from sqlalchemy.orm import validates
 from app import db
+from app.utils.documents import CPF, document_column, sync_document
 
 class User(UserMixin, db.Model):
     """Modelo de usuário do sistema"""
@@ -16,6 +18,7 @@ class User(UserMixin, db.Model):
     name = db.Column(db.String(100), nullable=False)
     lastname = db.Column(db.String(100), nullable=False)
     cpf = db.Column(db.String(14), unique=True, nullable=False)
+    cpf_norm = document_column('cpf', CPF, 11, unique=True)  # CPF só com dígitos
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(128))
     status = db.Column(db.String(20), default='active')
@@ -24,12 +27,19 @@ class User(UserMixin, db.Model):
     permissions = db.Column(db.Text)  # JSON string das permissões
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    @validates('cpf')
+    def _sync_document(self, key, value):
+        """Mantém a coluna normalizada junto com o CPF"""
+        return sync_document(self, key, value)
+
     def set_password(self, password):
         """Define a senha do usuário"""
         self.password_hash = generate_password_hash(password)
 
     def check_password(self, password):
-        """Verifica se a senha está correta"""
+        """Verifica se a senha está correta (False para contas sem senha definida)"""
+        if not self.password_hash or not password:
+            return False
         return check_password_hash(self.password_hash, password)
 
     def to_dict(self):
@@ -3,7 +3,9 @@ Modelo de Veículo
 """
 
 from datetime import datetime
+from sqlalchemy.orm import validates
 from app import db
+from app.utils.documents import CPF, PLACA, RENAVAM, document_column, sync_document
 
 class Veiculo(db.Model):
     """Modelo de veículo do sistema"""
@@ -14,6 +16,10 @@ class Veiculo(db.Model):
     cpf_motorista = db.Column(db.String(14), nullable=False)
     placa = db.Column(db.String(8), unique=True, nullable=False)
     renavam = db.Column(db.String(11))
+    # Documentos normalizados (um motorista pode ter vários veículos; RENAVAM pode faltar)
+    cpf_motorista_norm = document_column('cpf_motorista', CPF, 11)
+    placa_norm = document_column('placa', PLACA, 8, unique=True)
+    renavam_norm = document_column('renavam', RENAVAM, 11)
     tipo = db.Column(db.String(50), nullable=False)  # Reboque, Carreta, Cavalo, Truck, Outros
     tipo_outros = db.Column(db.String(100))  # Campo para "Outros"
     estado = db.Column(db.String(2))
@@ -22,6 +28,11 @@ class Veiculo(db.Model):
     status = db.Column(db.String(20), default='active')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    @validates('cpf_motorista', 'placa', 'renavam')
+    def _sync_document(self, key, value):
+        """Mantém as colunas normalizadas junto com os documentos"""
+        return sync_document(self, key, value)
+
     def to_dict(self):
         """Converte o veículo para dicionário"""
         return {
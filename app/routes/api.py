@@ -3,10 +3,17 @@
 Rotas da API para dados externos
 """
 
-from flask import Blueprint, jsonify, request
-from flask_login import login_required
-from app.services.linkedin_service import LinkedInService
-from app.utils.cache import cached, cache_invalidate, cache_manager
+from flask import Blueprint, current_app, jsonify, request
+from flask_login import current_user, login_required
+from app.models.user import User
+from app.models.veiculo import Veiculo
+from app.models.entidade import Entidade
+from app.routes.jobs import job_response
+from app.services.jobs import job_queue
+from app.services.linkedin_service import LinkedInService, get_linkedin_feed
+from app.utils.cache import cache_invalidate, cache_manager, cache_prefetch
+from app.utils.response_cache import cache_response
+from app.utils.documents import only_digits
 from app.utils.database_optimization import (
     get_user_stats, get_vehicle_stats, get_entity_stats, 
     get_monthly_stats, invalidate_related_cache
@@ -17,6 +24,8 @@ import json
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
+CACHE_REBUILD_BUDGET = 600  # Segundos para o aquecimento na fila de tarefas
+
 @api_bp.route('/linkedin/posts')
 @limiter.limit("5 per minute")
 def get_linkedin_posts():
@@ -84,7 +93,7 @@ def force_refresh_linkedin():
         cache_invalidate("linkedin_posts")
         cache_invalidate("linkedin_company")
         
-        posts = linkedin_service.get_linkedin_posts(limit=5)
+        posts = get_linkedin_feed(limit=5)
         
         return jsonify({
             'success': True,
@@ -102,6 +111,8 @@ def force_refresh_linkedin():
 
 @api_bp.route('/stats')
 @limiter.limit("10 per minute")
+@cache_response(timeout=60, key_prefix="system_stats", vary=["Accept-Encoding"],
+                tags=["model:User", "model:Veiculo", "model:Entidade"])
 def get_system_stats():
     """
     Endpoint para buscar estatísticas do sistema (público)
@@ -110,12 +121,14 @@ def get_system_stats():
         from app.models.user import User
         from app.models.veiculo import Veiculo
         from app.models.entidade import Entidade
+        from app.utils.stats_counters import counter_totals
         
-        # Buscar estatísticas diretamente do banco
+        # Totais pré-calculados (stats_counters), sem COUNT(*) nas tabelas
+        totals = counter_totals(User, Veiculo, Entidade)
         stats = {
-            'users': User.query.count(),
-            'vehicles': Veiculo.query.count(),
-            'entities': Entidade.query.count(),
+            'users': totals[User.__tablename__],
+            'vehicles': totals[Veiculo.__tablename__],
+            'entities': totals[Entidade.__tablename__],
             'processes': 0  # Placeholder para processos futuros
         }
         
@@ -138,13 +151,15 @@ def get_system_stats():
 
 @api_bp.route('/stats/detailed')
 @login_required
-@cached(timeout=300, key_prefix="system_stats_detailed")  # Cache por 5 minutos
+@cache_response(timeout=300, key_prefix="system_stats_detailed",  # Cache por 5 minutos
+                tags=["model:User", "model:Veiculo", "model:Entidade"])
 def get_detailed_system_stats():
     """
     Endpoint para buscar estatísticas detalhadas do sistema (requer login)
     """
     try:
-        # Usar funções otimizadas com cache
+        # Usar funções otimizadas com cache (uma única ida ao Redis)
+        cache_prefetch(get_user_stats, get_vehicle_stats, get_entity_stats)
         user_stats = get_user_stats()
         vehicle_stats = get_vehicle_stats()
         entity_stats = get_entity_stats()
@@ -178,6 +193,42 @@ def get_detailed_system_stats():
             }
         }), 500
 
+@api_bp.route('/health')
+@limiter.exempt
+def health_check():
+    """
+    Verificação de vida (liveness): o processo está respondendo
+    """
+    return jsonify({'status': 'healthy'})
+
+@api_bp.route('/health/ready')
+@limiter.exempt
+def readiness_check():
+    """
+    Verificação de prontidão: responde 503 até o fim do aquecimento do cache
+    
+    O parâmetro `wait` (segundos, limitado ao orçamento do aquecimento)
+    faz a verificação aguardar o aquecimento em vez de responder na hora.
+    """
+    from app.utils.cache_warmer import cache_warmer
+    
+    cache_warmer.ensure_started()
+    wait = min(request.args.get('wait', 0, type=float), cache_warmer.budget)
+    ready = cache_warmer.wait(wait) if wait > 0 else cache_warmer.is_ready()
+    
+    warmup = cache_warmer.status()
+    # Endpoint público: apenas estado e tempos (mensagens de erro ficam
+    # em /api/cache/stats, que exige login)
+    warmup['results'] = {
+        name: {'status': result['status'], 'seconds': result['seconds']}
+        for name, result in warmup['results'].items()
+    }
+    
+    return jsonify({
+        'status': 'ready' if ready else 'warming',
+        'warmup': warmup
+    }), 200 if ready else 503
+
 @api_bp.route('/cache/stats')
 @login_required
 def get_cache_stats():
@@ -201,6 +252,28 @@ def get_cache_stats():
             'data': {}
         }), 500
 
+@api_bp.route('/cache/stats/reset', methods=['POST'])
+@login_required
+def reset_cache_stats():
+    """
+    Endpoint para zerar as métricas do cache
+    """
+    try:
+        from app.utils.cache import reset_cache_metrics
+        
+        reset_cache_metrics()
+        
+        return jsonify({
+            'success': True,
+            'message': 'Métricas do cache zeradas com sucesso'
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @api_bp.route('/cache/clear', methods=['POST'])
 @login_required
 def clear_all_cache():
@@ -221,6 +294,23 @@ def clear_all_cache():
             'error': str(e)
         }), 500
 
+@job_queue.handler('cache_rebuild')
+def rebuild_cache(context):
+    """Limpa o cache e recalcula as funções aquecíveis na fila de tarefas"""
+    from app.utils.cache_warmer import cache_warmer
+    
+    cache_manager.clear()
+    results = cache_warmer.run(current_app._get_current_object(), budget=CACHE_REBUILD_BUDGET)
+    return {name: {'status': r['status'], 'seconds': r['seconds']} for name, r in results.items()}
+
+@api_bp.route('/cache/rebuild', methods=['POST'])
+@login_required
+def rebuild_all_cache():
+    """
+    Endpoint para reconstruir o cache em segundo plano (resposta 202)
+    """
+    return job_response(job_queue.submit('cache_rebuild', user_id=current_user.id))
+
 @api_bp.route('/performance/database')
 @login_required
 def get_database_performance():
@@ -271,3 +361,96 @@ def optimize_database():
             'success': False,
             'error': str(e)
         }), 500
+
+@api_bp.route('/performance/stats-counters/reconcile', methods=['POST'])
+@login_required
+def reconcile_stats_counters():
+    """
+    Endpoint para recalcular os contadores de estatísticas (stats_counters)
+    """
+    try:
+        from app.utils.stats_counters import reconcile_counters
+        
+        fixed = reconcile_counters()
+        
+        return jsonify({
+            'success': True,
+            'data': {'fixed': fixed},
+            'message': 'Contadores de estatísticas reconciliados com sucesso'
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@job_queue.handler('search_index_rebuild')
+def rebuild_search(context):
+    """Recria o índice de busca dos cadastros na fila de tarefas"""
+    from app.utils.search_index import rebuild_search_index
+    
+    return {'indexed': rebuild_search_index()}
+
+@api_bp.route('/performance/search-index/rebuild', methods=['POST'])
+@login_required
+def rebuild_search_index_job():
+    """
+    Endpoint para recriar o índice de busca em segundo plano (resposta 202)
+    """
+    return job_response(job_queue.submit('search_index_rebuild', user_id=current_user.id))
+
+# Resultados da busca rápida: modelo, título e subtítulo de cada registro
+SEARCH_RESULTS = {
+    'users': (User, lambda user: f'{user.name} {user.lastname}', lambda user: user.email),
+    'vehicles': (Veiculo, lambda veiculo: veiculo.placa, lambda veiculo: veiculo.motorista_responsavel),
+    'entities': (Entidade, lambda entidade: entidade.razao_social, lambda entidade: entidade.cpf_cnpj)
+}
+
+@api_bp.route('/search')
+@login_required
+def search_cadastros():
+    """
+    Busca rápida nos cadastros pelo índice de busca, em ordem de relevância
+    
+    Parâmetros: q (prefixos das palavras, sem diferenciar acentos),
+    type (users, vehicles e/ou entities, separados por vírgula) e limit.
+    """
+    from app.utils.search_index import search_ids
+    
+    term = request.args.get('q', '', type=str).strip()
+    types = [name for name in request.args.get('type', ','.join(SEARCH_RESULTS)).split(',')
+             if name in SEARCH_RESULTS]
+    limit = max(1, min(request.args.get('limit', 10, type=int), 50))
+    
+    data = {}
+    for name in types:
+        model, title, subtitle = SEARCH_RESULTS[name]
+        ids = search_ids(model, term, limit)
+        records = {record.id: record for record in model.query.filter(model.id.in_(ids))} if ids else {}
+        data[name] = [
+            {'id': record_id, 'title': title(records[record_id]), 'subtitle': subtitle(records[record_id])}
+            for record_id in ids if record_id in records
+        ]
+    
+    return jsonify({'success': True, 'query': term, 'data': data})
+
+@api_bp.route('/lookup/<path:documento>')
+@login_required
+def lookup_documento(documento):
+    """
+    Cadastros de um CPF/CNPJ, com ou sem pontuação: o usuário, os veículos
+    do motorista e a entidade, em uma consulta ao índice de identidade
+    """
+    from app.utils.identity_index import lookup_document
+    
+    records = lookup_document(documento)
+    if records is None:
+        return jsonify({'success': False, 'error': 'Informe um CPF (11 dígitos) ou CNPJ (14 dígitos)'}), 400
+    
+    return jsonify({
+        'success': True,
+        'documento': only_digits(documento),
+        'data': records,
+        'total': sum(len(group) for group in records.values())
+    })
@@ -2,17 +2,166 @@
 Rotas de cadastros
 """
 
-from flask import Blueprint, render_template, request
+import os
+from datetime import datetime
+from flask import Blueprint, render_template, request, jsonify
 from flask_login import login_required, current_user
 from app import db
 from app.models.user import User
 from app.models.veiculo import Veiculo
 from app.models.entidade import Entidade
+from app.routes.jobs import job_response
+from app.services.bulk_import import IMPORT_SPECS, BulkImporter, ImportFormatError
+from app.services.jobs import JobError, job_queue
+from app.utils.database_optimization import invalidate_related_cache
+from app.utils.search_index import apply_search
+from app.utils.pagination import (
+    DEFAULT_PAGE_SIZE, PAGE_SIZES, page_size, paginate_page, sort_column
+)
+from app.utils.streaming import (
+    FORMAT_CSV, FORMAT_XLSX, csv_chunks, iter_records, stream_response, xlsx_chunks
+)
 
 cadastros_bp = Blueprint('cadastros', __name__)
 
+# Colunas exibidas nas listagens (load_only) e opções de ordenação
+USER_COLUMNS = ('id', 'name', 'lastname', 'cpf', 'email', 'group', 'status')
+USER_SORTS = [('id', 'Cadastro'), ('name', 'Nome'), ('email', 'E-mail'),
+              ('group', 'Grupo'), ('status', 'Status')]
+
+VEICULO_COLUMNS = ('id', 'motorista_responsavel', 'cpf_motorista', 'placa', 'renavam',
+                   'tipo', 'tipo_outros', 'estado', 'municipio', 'status')
+VEICULO_SORTS = [('id', 'Cadastro'), ('placa', 'Placa'), ('motorista_responsavel', 'Motorista'),
+                 ('tipo', 'Tipo'), ('estado', 'Estado'), ('status', 'Status')]
+
+ENTIDADE_COLUMNS = ('id', 'razao_social', 'nome_fantasia', 'cpf_cnpj', 'tipo_cliente',
+                    'pagamento', 'status')
+ENTIDADE_SORTS = [('id', 'Cadastro'), ('razao_social', 'Razão Social'),
+                  ('nome_fantasia', 'Nome Fantasia'), ('tipo_cliente', 'Tipo de Cliente'),
+                  ('status', 'Status')]
+
+# Exportação: (campo, rótulo) na ordem das colunas do arquivo
+USER_EXPORT = [('id', 'ID'), ('name', 'Nome'), ('lastname', 'Sobrenome'), ('cpf', 'CPF'),
+               ('email', 'E-mail'), ('group', 'Grupo'), ('job_title', 'Cargo'),
+               ('status', 'Status'), ('created_at', 'Criado em')]
+VEICULO_EXPORT = [('id', 'ID'), ('motorista_responsavel', 'Motorista'),
+                  ('cpf_motorista', 'CPF do Motorista'), ('placa', 'Placa'),
+                  ('renavam', 'RENAVAM'), ('tipo', 'Tipo'), ('tipo_outros', 'Tipo (Outros)'),
+                  ('estado', 'Estado'), ('municipio', 'Município'), ('observacoes', 'Observações'),
+                  ('status', 'Status'), ('created_at', 'Criado em')]
+ENTIDADE_EXPORT = [('id', 'ID'), ('razao_social', 'Razão Social'),
+                   ('nome_fantasia', 'Nome Fantasia'), ('cpf_cnpj', 'CPF/CNPJ'),
+                   ('inscricao_estadual', 'Inscrição Estadual'), ('tipo_cliente', 'Tipo de Cliente'),
+                   ('pagamento', 'Pagamento'), ('retencao', 'Retenção'),
+                   ('valor_retencao', 'Valor da Retenção'), ('prazo_retencao', 'Prazo da Retenção'),
+                   ('telefone', 'Telefone'), ('email_faturamento', 'E-mail Faturamento'),
+                   ('email_operacional', 'E-mail Operacional'),
+                   ('email_despachante', 'E-mail Despachante'), ('status', 'Status'),
+                   ('created_at', 'Criado em')]
+
+# Importação: os rótulos da exportação também são aceitos como cabeçalho
+IMPORT_ALIASES = {'users': USER_EXPORT, 'veiculos': VEICULO_EXPORT, 'entidades': ENTIDADE_EXPORT}
+
+EXPORT_BATCH_SIZE = 1000  # Linhas por lote (yield_per) nas exportações
+
+def listing_args(sort_options):
+    """Página, tamanho, ordenação e sentido da listagem (validados)"""
+    sort = request.args.get('sort', 'id', type=str)
+    order = request.args.get('order', 'asc', type=str)
+    return {
+        'page': max(request.args.get('page', 1, type=int) or 1, 1),
+        'per_page': page_size(request.args.get('per_page', DEFAULT_PAGE_SIZE, type=int)),
+        'sort': sort if sort in dict(sort_options) else 'id',
+        'order': 'desc' if order == 'desc' else 'asc'
+    }
+
+def listing_context(sort_options, args=None):
+    """Variáveis dos controles de paginação e ordenação dos templates"""
+    args = args or {'per_page': DEFAULT_PAGE_SIZE, 'sort': 'id', 'order': 'asc'}
+    return {
+        'sort': args['sort'],
+        'order': args['order'],
+        'per_page': args['per_page'],
+        'sort_options': sort_options,
+        'page_sizes': PAGE_SIZES
+    }
+
+def filtered_users_query():
+    """Usuários com os filtros da listagem (search, grupo, status)"""
+    search = request.args.get('search', '', type=str)
+    grupo_filter = request.args.get('grupo', '', type=str)
+    status_filter = request.args.get('status', '', type=str)
+    
+    # Construir query base
+    query = User.query
+    
+    # Aplicar filtro de busca (índice de busca: nome, sobrenome, e-mail, CPF)
+    query = apply_search(query, User, search)
+    
+    # Aplicar filtro de grupo
+    if grupo_filter:
+        query = query.filter(User.group == grupo_filter)
+    
+    # Aplicar filtro de status
+    if status_filter:
+        query = query.filter(User.status == status_filter)
+    
+    return query
+
+def filtered_veiculos_query():
+    """Veículos com os filtros da listagem (search, tipo, estado, status)"""
+    search = request.args.get('search', '', type=str)
+    tipo_filter = request.args.get('tipo', '', type=str)
+    estado_filter = request.args.get('estado', '', type=str)
+    status_filter = request.args.get('status', '', type=str)
+    
+    # Construir query base
+    query = Veiculo.query
+    
+    # Aplicar filtro de busca (índice de busca: motorista, CPF, placa, RENAVAM)
+    query = apply_search(query, Veiculo, search)
+    
+    # Aplicar filtro de tipo
+    if tipo_filter:
+        query = query.filter(Veiculo.tipo == tipo_filter)
+    
+    # Aplicar filtro de estado
+    if estado_filter:
+        query = query.filter(Veiculo.estado == estado_filter)
+    
+    # Aplicar filtro de status
+    if status_filter:
+        query = query.filter(Veiculo.status == status_filter)
+    
+    return query
+
+def filtered_entidades_query():
+    """Entidades com os filtros da listagem (search, tipo de cliente, pagamento, status)"""
+    search = request.args.get('search', '', type=str)
+    tipo_cliente_filter = request.args.get('tipo_cliente_filter', '', type=str)
+    pagamento_filter = request.args.get('pagamento_filter', '', type=str)
+    status_filter = request.args.get('status_filter', '', type=str)
+    
+    # Construir query base
+    query = Entidade.query
+    
+    # Aplicar filtro de busca (índice de busca: razão social, nome fantasia, CPF/CNPJ, e-mail)
+    query = apply_search(query, Entidade, search)
+    
+    # Aplicar filtros específicos
+    if tipo_cliente_filter:
+        query = query.filter(Entidade.tipo_cliente == tipo_cliente_filter)
+    
+    if pagamento_filter:
+        query = query.filter(Entidade.pagamento == pagamento_filter)
+    
+    if status_filter:
+        query = query.filter(Entidade.status == status_filter)
+    
+    return query
+
 def create_mock_paginate(items):
-    """Cria objeto mock para paginação"""
+    """Cria objeto mock para paginação (listagem vazia em caso de erro)"""
     class MockPaginate:
         def __init__(self, items):
             # Garantir que items seja sempre uma lista
@@ -44,42 +193,20 @@ def cadastros_usuarios():
         search = request.args.get('search', '', type=str)
         grupo_filter = request.args.get('grupo', '', type=str)
         status_filter = request.args.get('status', '', type=str)
+        args = listing_args(USER_SORTS)
         
-        # Construir query base
-        query = User.query
-        
-        # Aplicar filtro de busca
-        if search:
-            search_term = f"%{search.lower()}%"
-            query = query.filter(
-                db.or_(
-                    User.name.ilike(search_term),
-                    User.lastname.ilike(search_term),
-                    User.email.ilike(search_term),
-                    User.cpf.ilike(search_term)
-                )
-            )
-        
-        # Aplicar filtro de grupo
-        if grupo_filter:
-            query = query.filter(User.group == grupo_filter)
-        
-        # Aplicar filtro de status
-        if status_filter:
-            query = query.filter(User.status == status_filter)
-        
-        # Executar query
-        users = query.all()
+        query = filtered_users_query()
         
-        # Criar paginação
-        paginated_users = create_mock_paginate(users)
+        # Paginação no banco
+        paginated_users = paginate_page(query, User, columns=USER_COLUMNS, **args)
         
         return render_template('cadastros/cadastros_usuarios.html', 
                              users=paginated_users, 
                              search=search,
                              grupo_filter=grupo_filter,
                              status_filter=status_filter,
-                             user=current_user)
+                             user=current_user,
+                             **listing_context(USER_SORTS, args))
     except Exception as e:
         print(f"Erro na rota cadastros usuarios: {e}")
         # Criar objeto de paginação vazio em caso de erro
@@ -89,7 +216,8 @@ def cadastros_usuarios():
                              search='',
                              grupo_filter='',
                              status_filter='',
-                             user=current_user)
+                             user=current_user,
+                             **listing_context(USER_SORTS))
 
 @cadastros_bp.route('/cadastros/veiculos')
 @login_required
@@ -101,42 +229,12 @@ def cadastros_veiculos():
         tipo_filter = request.args.get('tipo', '', type=str)
         estado_filter = request.args.get('estado', '', type=str)
         status_filter = request.args.get('status', '', type=str)
+        args = listing_args(VEICULO_SORTS)
         
-        # Construir query base
-        query = Veiculo.query
-        
-        # Aplicar filtro de busca
-        if search:
-            search_term = f"%{search.lower()}%"
-            query = query.filter(
-                db.or_(
-                    Veiculo.motorista_responsavel.ilike(search_term),
-                    Veiculo.cpf_motorista.ilike(search_term),
-                    Veiculo.placa.ilike(search_term),
-                    Veiculo.renavam.ilike(search_term)
-                )
-            )
-        
-        # Aplicar filtro de tipo
-        if tipo_filter:
-            if tipo_filter == 'Outros':
-                query = query.filter(Veiculo.tipo == 'Outros')
-            else:
-                query = query.filter(Veiculo.tipo == tipo_filter)
-        
-        # Aplicar filtro de estado
-        if estado_filter:
-            query = query.filter(Veiculo.estado == estado_filter)
-        
-        # Aplicar filtro de status
-        if status_filter:
-            query = query.filter(Veiculo.status == status_filter)
+        query = filtered_veiculos_query()
         
-        # Executar query
-        veiculos = query.all()
-        
-        # Criar paginação
-        paginated_veiculos = create_mock_paginate(veiculos)
+        # Paginação no banco
+        paginated_veiculos = paginate_page(query, Veiculo, columns=VEICULO_COLUMNS, **args)
         
         return render_template('cadastros/cadastros_veiculos.html', 
                              veiculos=paginated_veiculos, 
@@ -144,7 +242,8 @@ def cadastros_veiculos():
                              tipo_filter=tipo_filter,
                              estado_filter=estado_filter,
                              status_filter=status_filter,
-                             user=current_user)
+                             user=current_user,
+                             **listing_context(VEICULO_SORTS, args))
     except Exception as e:
         print(f"Erro na rota cadastros veiculos: {e}")
         # Criar objeto de paginação vazio em caso de erro
@@ -155,7 +254,8 @@ def cadastros_veiculos():
                              tipo_filter='',
                              estado_filter='',
                              status_filter='',
-                             user=current_user)
+                             user=current_user,
+                             **listing_context(VEICULO_SORTS))
 
 @cadastros_bp.route('/cadastros/entidades')
 @login_required
@@ -167,43 +267,20 @@ def cadastros_entidades():
         tipo_cliente_filter = request.args.get('tipo_cliente_filter', '', type=str)
         pagamento_filter = request.args.get('pagamento_filter', '', type=str)
         status_filter = request.args.get('status_filter', '', type=str)
+        args = listing_args(ENTIDADE_SORTS)
         
-        # Construir query base
-        query = Entidade.query
-        
-        # Aplicar filtro de busca
-        if search:
-            search_term = f"%{search.lower()}%"
-            query = query.filter(
-                db.or_(
-                    Entidade.razao_social.ilike(search_term),
-                    Entidade.nome_fantasia.ilike(search_term),
-                    Entidade.cpf_cnpj.ilike(search_term),
-                    Entidade.email_faturamento.ilike(search_term)
-                )
-            )
-        
-        # Aplicar filtros específicos
-        if tipo_cliente_filter:
-            query = query.filter(Entidade.tipo_cliente == tipo_cliente_filter)
-        
-        if pagamento_filter:
-            query = query.filter(Entidade.pagamento == pagamento_filter)
-        
-        if status_filter:
-            query = query.filter(Entidade.status == status_filter)
+        query = filtered_entidades_query()
         
-        # Executar query
-        entidades = query.all()
-        
-        paginated_entidades = create_mock_paginate(entidades)
+        # Paginação no banco
+        paginated_entidades = paginate_page(query, Entidade, columns=ENTIDADE_COLUMNS, **args)
         return render_template('cadastros/cadastros_entidades.html', 
                              entidades=paginated_entidades, 
                              search=search,
                              tipo_cliente_filter=tipo_cliente_filter,
                              pagamento_filter=pagamento_filter,
                              status_filter=status_filter,
-                             user=current_user)
+                             user=current_user,
+                             **listing_context(ENTIDADE_SORTS, args))
     except Exception as e:
         print(f"Erro na rota cadastros entidades: {e}")
         return render_template('cadastros/cadastros_entidades.html', 
@@ -212,4 +289,152 @@ def cadastros_entidades():
                              tipo_cliente_filter='',
                              pagamento_filter='',
                              status_filter='',
-                             user=current_user)
+                             user=current_user,
+                             **listing_context(ENTIDADE_SORTS))
+
+def _export_value(value):
+    return value.strftime('%d/%m/%Y %H:%M') if isinstance(value, datetime) else value
+
+def export_listing(query, model, fields, sort_options, name):
+    """Exporta a listagem filtrada em CSV ou XLSX (?format=csv|xlsx), em streaming
+    
+    Lê só as colunas exportadas, em lotes (yield_per), na mesma ordenação
+    da listagem; nenhum momento mantém o conjunto inteiro em memória.
+    """
+    format_type = request.args.get('format', FORMAT_XLSX)
+    if format_type not in (FORMAT_CSV, FORMAT_XLSX):
+        return jsonify({'success': False, 'message': 'Formato inválido (use csv ou xlsx)'}), 400
+    
+    args = listing_args(sort_options)
+    _, column = sort_column(model, args['sort'])
+    ordering = [column.desc() if args['order'] == 'desc' else column.asc()]
+    if column is not model.id:
+        ordering.append(model.id.desc() if args['order'] == 'desc' else model.id.asc())
+    
+    keys = [key for key, _ in fields]
+    statement = query.with_entities(*(getattr(model, key) for key in keys)) \
+                     .order_by(None).order_by(*ordering).statement
+    batches = iter_records(statement, lambda row: dict(zip(keys, map(_export_value, row))),
+                           EXPORT_BATCH_SIZE)
+    
+    labels = [label for _, label in fields]
+    if format_type == FORMAT_CSV:
+        chunks = csv_chunks(batches, keys, labels)
+    else:
+        chunks = xlsx_chunks(batches, keys, labels, sheet_name=name.capitalize())
+    filename = f"{name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{format_type}"
+    return stream_response(chunks, format_type, filename)
+
+def admin_only(action):
+    """Resposta 403 se o usuário não é administrador (mesma regra da API de usuários)"""
+    if current_user.group != 'admin':
+        return jsonify({
+            'success': False,
+            'error': f'Acesso negado. Apenas administradores podem {action}.'
+        }), 403
+    return None
+
+@cadastros_bp.route('/api/users/export')
+@login_required
+def export_usuarios():
+    """Exporta usuários com os filtros da listagem (apenas administradores)"""
+    denied = admin_only('exportar usuários')
+    if denied:
+        return denied
+    return export_listing(filtered_users_query(), User, USER_EXPORT, USER_SORTS, 'usuarios')
+
+@cadastros_bp.route('/api/veiculos/export')
+@login_required
+def export_veiculos():
+    """Exporta veículos com os filtros da listagem"""
+    return export_listing(filtered_veiculos_query(), Veiculo, VEICULO_EXPORT, VEICULO_SORTS, 'veiculos')
+
+@cadastros_bp.route('/api/entidades/export')
+@login_required
+def export_entidades():
+    """Exporta entidades com os filtros da listagem"""
+    return export_listing(filtered_entidades_query(), Entidade, ENTIDADE_EXPORT, ENTIDADE_SORTS,
+                          'entidades')
+
+def import_message(result):
+    message = f"{result['imported']} registro(s) importado(s)"
+    if result['failed']:
+        message += f", {result['failed']} com erro"
+    if result['rows_per_second']:
+        message += f" ({result['rows_per_second']:.0f} linhas/s)"
+    return message
+
+def import_listing(kind):
+    """Importa um CSV enviado no campo `file` com o BulkImporter
+    
+    Aceita os nomes das colunas ou os rótulos da exportação como cabeçalho
+    e responde com o resumo, os erros por linha e as linhas por segundo.
+    Com async=1 o arquivo vai para a fila de tarefas (resposta 202).
+    """
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        return jsonify({'success': False, 'error': 'Nenhum arquivo enviado'}), 400
+    if not upload.filename.lower().endswith('.csv'):
+        return jsonify({'success': False, 'error': 'Envie um arquivo CSV'}), 400
+    
+    if request.args.get('async') in ('1', 'true'):
+        job = job_queue.submit('bulk_import', {'kind': kind, 'filename': upload.filename},
+                               user_id=current_user.id, upload=upload.stream)
+        return job_response(job)
+    
+    spec = IMPORT_SPECS[kind]
+    try:
+        result = BulkImporter(spec, aliases=IMPORT_ALIASES[kind]).run(upload.stream)
+    except ImportFormatError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    if result['imported']:
+        invalidate_related_cache(spec.model.__name__)
+    return jsonify({'success': True, 'message': import_message(result), **result})
+
+@job_queue.handler('bulk_import', max_attempts=1)
+def run_bulk_import(context):
+    """Importação de CSV na fila de tarefas (params: kind; arquivo enviado na criação)
+    
+    Uma tentativa só: os lotes já gravados ficam no banco e uma repetição
+    os rejeitaria como duplicados. O progresso é a posição no arquivo.
+    """
+    kind = context.params.get('kind')
+    if kind not in IMPORT_SPECS or context.input_path is None:
+        raise JobError('Importação inválida ou arquivo ausente')
+    spec = IMPORT_SPECS[kind]
+    size = os.path.getsize(context.input_path) or 1
+    
+    with open(context.input_path, 'rb') as stream:
+        def on_chunk(rows):
+            context.progress(stream.tell() * 100 / size, f'{rows} linha(s) processada(s)')
+        try:
+            result = BulkImporter(spec, aliases=IMPORT_ALIASES[kind]).run(stream, on_chunk=on_chunk)
+        except ImportFormatError as e:
+            raise JobError(str(e))
+        finally:
+            # Também no cancelamento: os lotes anteriores já foram gravados
+            invalidate_related_cache(spec.model.__name__)
+    
+    return dict(result, message=import_message(result))
+
+@cadastros_bp.route('/api/users/import', methods=['POST'])
+@login_required
+def import_usuarios():
+    """Importa usuários de um CSV (apenas administradores: o arquivo define o grupo)"""
+    denied = admin_only('importar usuários')
+    if denied:
+        return denied
+    return import_listing('users')
+
+@cadastros_bp.route('/api/veiculos/import', methods=['POST'])
+@login_required
+def import_veiculos():
+    """Importa veículos de um CSV"""
+    return import_listing('veiculos')
+
+@cadastros_bp.route('/api/entidades/import', methods=['POST'])
+@login_required
+def import_entidades():
+    """Importa entidades de um CSV"""
+    return import_listing('entidades')
@@ -0,0 +1,95 @@
+"""
+Rotas da fila de tarefas em segundo plano (enfileirar, estado, resultado e cancelamento)
+"""
+
+import os
+from flask import Blueprint, jsonify, request, send_file, url_for
+from flask_login import login_required, current_user
+from app.services.jobs import FINISHED, SUCCEEDED, UnknownJobType, job_queue, serialize_job
+
+jobs_bp = Blueprint('jobs', __name__, url_prefix='/api/jobs')
+
+def job_response(job):
+    """Resposta 202 de uma tarefa enfileirada, com as URLs de acompanhamento"""
+    status_url = url_for('jobs.job_status', job_id=job['id'])
+    return jsonify({
+        'success': True,
+        'message': 'Tarefa enfileirada',
+        'job': serialize_job(job),
+        'status_url': status_url,
+        'result_url': url_for('jobs.job_result', job_id=job['id'])
+    }), 202, {'Location': status_url}
+
+def _own_job(job_id):
+    """Tarefa do usuário atual (as de outros usuários não são expostas)"""
+    job = job_queue.get(job_id)
+    if job is None or job['user_id'] != current_user.id:
+        return None
+    return job
+
+def _not_found():
+    return jsonify({'success': False, 'error': 'Tarefa não encontrada'}), 404
+
+@jobs_bp.route('')
+@login_required
+def list_jobs():
+    """Tarefas recentes do usuário"""
+    limit = min(request.args.get('limit', 50, type=int), 200)
+    return jsonify({
+        'success': True,
+        'data': [serialize_job(job) for job in job_queue.recent(current_user.id, limit)],
+        'types': job_queue.types
+    })
+
+@jobs_bp.route('', methods=['POST'])
+@login_required
+def submit_job():
+    """Enfileira uma tarefa: {"type": "...", "params": {...}}"""
+    data = request.get_json(silent=True) or {}
+    params = data.get('params') or {}
+    if not isinstance(params, dict):
+        return jsonify({'success': False, 'error': 'params deve ser um objeto'}), 400
+    try:
+        job = job_queue.submit(data.get('type'), params, user_id=current_user.id)
+    except UnknownJobType as e:
+        return jsonify({'success': False, 'error': str(e), 'types': job_queue.types}), 400
+    return job_response(job)
+
+@jobs_bp.route('/<job_id>')
+@login_required
+def job_status(job_id):
+    """Estado e progresso da tarefa"""
+    job = _own_job(job_id)
+    if job is None:
+        return _not_found()
+    return jsonify({'success': True, 'job': serialize_job(job)})
+
+@jobs_bp.route('/<job_id>/result')
+@login_required
+def job_result(job_id):
+    """Arquivo gerado pela tarefa ou, se não houver, o resultado em JSON"""
+    job = _own_job(job_id)
+    if job is None:
+        return _not_found()
+    if job['status'] != SUCCEEDED:
+        return jsonify({
+            'success': False,
+            'error': 'Tarefa ainda não concluída' if job['status'] not in FINISHED else 'Tarefa não concluída com sucesso',
+            'job': serialize_job(job)
+        }), 409
+    if job['result_file']:
+        if not os.path.exists(job['result_file']):
+            return jsonify({'success': False, 'error': 'Resultado expirado'}), 410
+        return send_file(job['result_file'], as_attachment=True, download_name=job['result_name'])
+    return jsonify({'success': True, 'data': job['result']})
+
+@jobs_bp.route('/<job_id>/cancel', methods=['POST'])
+@login_required
+def cancel_job(job_id):
+    """Cancela a tarefa (na fila: imediatamente; em execução: no próximo progresso)"""
+    job = _own_job(job_id)
+    if job is None:
+        return _not_found()
+    if job['status'] in FINISHED:
+        return jsonify({'success': False, 'error': 'Tarefa já finalizada', 'job': serialize_job(job)}), 409
+    return jsonify({'success': True, 'job': serialize_job(job_queue.cancel(job_id))})
@@ -4,12 +4,23 @@ from app import db
 from app.models.user import User
 from app.models.veiculo import Veiculo
 from app.models.entidade import Entidade
-from sqlalchemy import func, text
+from app.routes.jobs import job_response
+from app.services.jobs import JobError, job_queue
+from app.utils.cache import cached, cache_prefetch
+from app.utils.cache_warmer import warmable
+from app.utils.stats_counters import counter_stats, monthly_series
+from app.utils.streaming import (
+    FORMAT_CSV, FORMAT_NDJSON, FORMAT_XLSX, STREAM_FORMATS, csv_chunks, iter_records,
+    ndjson_chunks, stream_response, xlsx_chunks
+)
+from sqlalchemy import func, select, text
 from datetime import datetime, timedelta
 import json
 
 reports_bp = Blueprint('reports', __name__)
 
+REPORT_BATCH_SIZE = 1000  # Linhas por lote (yield_per) nos relatórios detalhados
+
 @reports_bp.route('/relatorios')
 @login_required
 def relatorios_main():
@@ -75,138 +86,243 @@ def configuracao_submenu(submenu):
                          user=current_user, 
                          submenu_title=submenu_titles[submenu])
 
+def _twelve_months_ago():
+    """Início da janela dos gráficos mensais (últimos 12 meses)"""
+    return datetime.now() - timedelta(days=365)
+
+def _report_section(model, dimension, group_field, label):
+    """Seção do relatório: contagens (stats_counters) e série mensal (monthly_rollups)"""
+    stats = counter_stats(model, statuses=('active', 'blocked'), dimension=dimension)
+    
+    by_month = monthly_series(model, since=_twelve_months_ago())[model.__tablename__]
+    
+    return {
+        'total': stats['total'],
+        'active': stats['by_status']['active'],
+        'blocked': stats['by_status']['blocked'],
+        group_field: [{label: g[0], 'count': g[1]} for g in stats['by_group']],
+        'by_month': [{'month': m[0], 'count': m[1]} for m in by_month]
+    }
+
+@warmable(order=30)
+@cached(timeout=300, key_prefix="reports_stats", tags=["model:User"])
+def _users_report_stats():
+    """Estatísticas de usuários para a página de relatórios"""
+    return _report_section(User, 'group', 'by_group', 'group')
+
+@warmable(order=30)
+@cached(timeout=300, key_prefix="reports_stats", tags=["model:Veiculo"])
+def _vehicles_report_stats():
+    """Estatísticas de veículos para a página de relatórios"""
+    return _report_section(Veiculo, 'tipo', 'by_type', 'type')
+
+@warmable(order=30)
+@cached(timeout=300, key_prefix="reports_stats", tags=["model:Entidade"])
+def _entities_report_stats():
+    """Estatísticas de entidades para a página de relatórios"""
+    return _report_section(Entidade, 'tipo_cliente', 'by_type', 'type')
+
 @reports_bp.route('/api/reports/stats')
 @login_required
 def get_reports_stats():
     """API para obter estatísticas gerais"""
     try:
-        # Estatísticas de usuários
-        total_users = User.query.count()
-        active_users = User.query.filter_by(status='active').count()
-        blocked_users = User.query.filter_by(status='blocked').count()
-        
-        # Estatísticas de veículos
-        total_vehicles = Veiculo.query.count()
-        active_vehicles = Veiculo.query.filter_by(status='active').count()
-        blocked_vehicles = Veiculo.query.filter_by(status='blocked').count()
-        
-        # Estatísticas de entidades
-        total_entities = Entidade.query.count()
-        active_entities = Entidade.query.filter_by(status='active').count()
-        blocked_entities = Entidade.query.filter_by(status='blocked').count()
-        
-        # Usuários por grupo
-        users_by_group = db.session.query(
-            User.group, 
-            func.count(User.id).label('count')
-        ).group_by(User.group).all()
-        
-        # Veículos por tipo
-        vehicles_by_type = db.session.query(
-            Veiculo.tipo, 
-            func.count(Veiculo.id).label('count')
-        ).group_by(Veiculo.tipo).all()
-        
-        # Entidades por tipo
-        entities_by_type = db.session.query(
-            Entidade.tipo, 
-            func.count(Entidade.id).label('count')
-        ).group_by(Entidade.tipo).all()
-        
-        # Cadastros por mês (últimos 12 meses)
-        twelve_months_ago = datetime.now() - timedelta(days=365)
-        
-        users_by_month = db.session.query(
-            func.date_format(User.created_at, '%Y-%m').label('month'),
-            func.count(User.id).label('count')
-        ).filter(User.created_at >= twelve_months_ago).group_by('month').all()
-        
-        vehicles_by_month = db.session.query(
-            func.date_format(Veiculo.created_at, '%Y-%m').label('month'),
-            func.count(Veiculo.id).label('count')
-        ).filter(Veiculo.created_at >= twelve_months_ago).group_by('month').all()
-        
-        entities_by_month = db.session.query(
-            func.date_format(Entidade.created_at, '%Y-%m').label('month'),
-            func.count(Entidade.id).label('count')
-        ).filter(Entidade.created_at >= twelve_months_ago).group_by('month').all()
+        # Buscar as três seções do cache com uma única ida ao Redis
+        cache_prefetch(_users_report_stats, _vehicles_report_stats, _entities_report_stats)
         
         return jsonify({
             'success': True,
             'data': {
-                'users': {
-                    'total': total_users,
-                    'active': active_users,
-                    'blocked': blocked_users,
-                    'by_group': [{'group': g[0], 'count': g[1]} for g in users_by_group],
-                    'by_month': [{'month': m[0], 'count': m[1]} for m in users_by_month]
-                },
-                'vehicles': {
-                    'total': total_vehicles,
-                    'active': active_vehicles,
-                    'blocked': blocked_vehicles,
-                    'by_type': [{'type': t[0], 'count': t[1]} for t in vehicles_by_type],
-                    'by_month': [{'month': m[0], 'count': m[1]} for m in vehicles_by_month]
-                },
-                'entities': {
-                    'total': total_entities,
-                    'active': active_entities,
-                    'blocked': blocked_entities,
-                    'by_type': [{'type': t[0], 'count': t[1]} for t in entities_by_type],
-                    'by_month': [{'month': m[0], 'count': m[1]} for m in entities_by_month]
-                }
+                'users': _users_report_stats(),
+                'vehicles': _vehicles_report_stats(),
+                'entities': _entities_report_stats()
             }
         })
     except Exception as e:
         current_app.logger.error(f"Erro ao obter estatísticas: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def _format_datetime(value):
+    return value.strftime('%d/%m/%Y %H:%M') if value else None
+
+# Relatórios detalhados: colunas (chave, coluna, formatação), rótulos do CSV
+# e filtro de tipo de cada um. As chaves são as usadas pela tela de relatórios
+REPORTS = {
+    'users': {
+        'model': User,
+        'type_arg': 'group',
+        'type_column': User.group,
+        'columns': [
+            ('id', User.id, None),
+            ('name', User.name, None),
+            ('email', User.email, None),
+            ('group', User.group, None),
+            ('job_title', User.job_title, None),
+            ('status', User.status, None),
+            ('created_at', User.created_at, _format_datetime),
+            ('last_login', getattr(User, 'last_login', None),
+             lambda value: _format_datetime(value) or 'Nunca')
+        ],
+        'labels': ['ID', 'Nome', 'Email', 'Grupo', 'Cargo', 'Status', 'Criado em', 'Último Login']
+    },
+    'vehicles': {
+        'model': Veiculo,
+        'type_arg': 'tipo',
+        'type_column': Veiculo.tipo,
+        'columns': [
+            ('id', Veiculo.id, None),
+            ('motorista', Veiculo.motorista_responsavel, None),
+            ('cpf', Veiculo.cpf_motorista, None),
+            ('placa', Veiculo.placa, None),
+            ('renavam', Veiculo.renavam, None),
+            ('tipo', Veiculo.tipo, None),
+            ('status', Veiculo.status, None),
+            ('created_at', Veiculo.created_at, _format_datetime)
+        ],
+        'labels': ['ID', 'Motorista', 'CPF', 'Placa', 'RENAVAM', 'Tipo', 'Status', 'Criado em']
+    },
+    'entities': {
+        'model': Entidade,
+        'type_arg': 'tipo',
+        'type_column': Entidade.tipo_cliente,
+        'columns': [
+            ('id', Entidade.id, None),
+            ('nome', Entidade.razao_social, None),
+            ('cnpj', Entidade.cpf_cnpj, None),
+            ('tipo', Entidade.tipo_cliente, None),
+            ('status', Entidade.status, None),
+            ('created_at', Entidade.created_at, _format_datetime)
+        ],
+        'labels': ['ID', 'Nome', 'CNPJ', 'Tipo', 'Status', 'Criado em']
+    }
+}
+
+def _report_filters(spec):
+    """Filtros do relatório presentes na requisição"""
+    names = ('start_date', 'end_date', spec['type_arg'], 'status')
+    return {name: request.args[name] for name in names if request.args.get(name)}
+
+def _report_statement(spec, filters=None):
+    """SELECT só das colunas do relatório, com os filtros (padrão: os da requisição)"""
+    filters = _report_filters(spec) if filters is None else filters
+    model = spec['model']
+    columns = [column for _, column, _ in spec['columns'] if column is not None]
+    statement = select(*columns)
+    
+    start_date = filters.get('start_date')
+    end_date = filters.get('end_date')
+    report_type = filters.get(spec['type_arg'])
+    status = filters.get('status')
+    
+    if start_date:
+        statement = statement.where(model.created_at >= datetime.strptime(start_date, '%Y-%m-%d'))
+    if end_date:
+        statement = statement.where(model.created_at <= datetime.strptime(end_date, '%Y-%m-%d'))
+    if report_type:
+        statement = statement.where(spec['type_column'] == report_type)
+    if status:
+        statement = statement.where(model.status == status)
+    
+    # Ordenar por data de criação (id desempata)
+    return statement.order_by(model.created_at.desc(), model.id.desc())
+
+def _report_serializer(spec):
+    """Converte uma linha do SELECT no dicionário do relatório"""
+    fields = []
+    index = 0
+    for key, column, formatter in spec['columns']:
+        fields.append((key, index if column is not None else None, formatter))
+        if column is not None:
+            index += 1
+    
+    def serialize(row):
+        record = {}
+        for key, position, formatter in fields:
+            value = row[position] if position is not None else None
+            record[key] = formatter(value) if formatter else value
+        return record
+    return serialize
+
+def _report_records(report_type):
+    """Lotes de registros do relatório (yield_per)"""
+    spec = REPORTS[report_type]
+    return iter_records(_report_statement(spec), _report_serializer(spec), REPORT_BATCH_SIZE)
+
+def _report_json(report_type):
+    data = [record for records in _report_records(report_type) for record in records]
+    return {'success': True, 'data': data, 'total': len(data)}
+
+def _report_chunks(spec, format_type, batches):
+    keys = [key for key, _, _ in spec['columns']]
+    if format_type == FORMAT_CSV:
+        return csv_chunks(batches, keys, spec['labels'])
+    if format_type == FORMAT_XLSX:
+        return xlsx_chunks(batches, keys, spec['labels'], sheet_name='Relatório')
+    return ndjson_chunks(batches)
+
+def _report_filename(report_type, format_type):
+    return f"relatorio_{report_type}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{format_type}"
+
+def _report_stream(report_type, format_type, attachment=False):
+    """Relatório em NDJSON, CSV ou XLSX, escrito lote a lote"""
+    spec = REPORTS[report_type]
+    # Validar filtros antes de enviar o status 200
+    statement = _report_statement(spec)
+    batches = iter_records(statement, _report_serializer(spec), REPORT_BATCH_SIZE)
+    
+    filename = _report_filename(report_type, format_type) if attachment else None
+    return stream_response(_report_chunks(spec, format_type, batches), format_type, filename)
+
+@job_queue.handler('report_export')
+def build_report_export(context):
+    """Gera o arquivo do relatório na fila de tarefas
+    
+    params: report_type, format (csv, xlsx ou ndjson) e filters (os mesmos
+    argumentos da exportação); o progresso é contado por lote.
+    """
+    report_type = context.params.get('report_type')
+    format_type = context.params.get('format', FORMAT_CSV)
+    if report_type not in REPORTS or format_type not in STREAM_FORMATS:
+        raise JobError('Tipo de relatório ou formato inválido')
+    spec = REPORTS[report_type]
+    try:
+        statement = _report_statement(spec, context.params.get('filters') or {})
+    except ValueError as e:
+        raise JobError(f'Filtro inválido: {e}')
+    
+    total = db.session.execute(
+        select(func.count()).select_from(statement.order_by(None).subquery())
+    ).scalar()
+    written = 0
+    failures = []
+    
+    def batches():
+        nonlocal written
+        try:
+            for records in iter_records(statement, _report_serializer(spec), REPORT_BATCH_SIZE):
+                yield records
+                written += len(records)
+                context.progress(written * 100 / total if total else 100,
+                                 f'{written} de {total} registros')
+        except Exception as e:
+            # Os geradores de formato registram o erro e encerram o arquivo:
+            # a falha precisa chegar à fila para uma nova tentativa
+            failures.append(e)
+            raise
+    
+    with open(context.result_path(_report_filename(report_type, format_type)), 'wb') as target:
+        for chunk in _report_chunks(spec, format_type, batches()):
+            target.write(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+    if failures:
+        raise failures[0]
+    return {'report_type': report_type, 'format': format_type, 'rows': written}
+
 @reports_bp.route('/api/reports/users')
 @login_required
 def get_users_report():
     """API para relatório detalhado de usuários"""
     try:
-        # Parâmetros de filtro
-        start_date = request.args.get('start_date')
-        end_date = request.args.get('end_date')
-        group = request.args.get('group')
-        status = request.args.get('status')
-        
-        # Query base
-        query = User.query
-        
-        # Aplicar filtros
-        if start_date:
-            query = query.filter(User.created_at >= datetime.strptime(start_date, '%Y-%m-%d'))
-        if end_date:
-            query = query.filter(User.created_at <= datetime.strptime(end_date, '%Y-%m-%d'))
-        if group:
-            query = query.filter(User.group == group)
-        if status:
-            query = query.filter(User.status == status)
-        
-        # Ordenar por data de criação
-        users = query.order_by(User.created_at.desc()).all()
-        
-        # Converter para dicionário
-        users_data = []
-        for user in users:
-            users_data.append({
-                'id': user.id,
-                'name': user.name,
-                'email': user.email,
-                'group': user.group,
-                'job_title': user.job_title,
-                'status': user.status,
-                'created_at': user.created_at.strftime('%d/%m/%Y %H:%M'),
-                'last_login': user.last_login.strftime('%d/%m/%Y %H:%M') if user.last_login else 'Nunca'
-            })
-        
-        return jsonify({
-            'success': True,
-            'data': users_data,
-            'total': len(users_data)
-        })
+        return jsonify(_report_json('users'))
     except Exception as e:
         current_app.logger.error(f"Erro ao obter relatório de usuários: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -216,47 +332,7 @@ def get_users_report():
 def get_vehicles_report():
     """API para relatório detalhado de veículos"""
     try:
-        # Parâmetros de filtro
-        start_date = request.args.get('start_date')
-        end_date = request.args.get('end_date')
-        tipo = request.args.get('tipo')
-        status = request.args.get('status')
-        
-        # Query base
-        query = Veiculo.query
-        
-        # Aplicar filtros
-        if start_date:
-            query = query.filter(Veiculo.created_at >= datetime.strptime(start_date, '%Y-%m-%d'))
-        if end_date:
-            query = query.filter(Veiculo.created_at <= datetime.strptime(end_date, '%Y-%m-%d'))
-        if tipo:
-            query = query.filter(Veiculo.tipo == tipo)
-        if status:
-            query = query.filter(Veiculo.status == status)
-        
-        # Ordenar por data de criação
-        vehicles = query.order_by(Veiculo.created_at.desc()).all()
-        
-        # Converter para dicionário
-        vehicles_data = []
-        for vehicle in vehicles:
-            vehicles_data.append({
-                'id': vehicle.id,
-                'motorista': vehicle.motorista,
-                'cpf': vehicle.cpf,
-                'placa': vehicle.placa,
-                'renavam': vehicle.renavam,
-                'tipo': vehicle.tipo,
-                'status': vehicle.status,
-                'created_at': vehicle.created_at.strftime('%d/%m/%Y %H:%M')
-            })
-        
-        return jsonify({
-            'success': True,
-            'data': vehicles_data,
-            'total': len(vehicles_data)
-        })
+        return jsonify(_report_json('vehicles'))
     except Exception as e:
         current_app.logger.error(f"Erro ao obter relatório de veículos: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -266,72 +342,64 @@ def get_vehicles_report():
 def get_entities_report():
     """API para relatório detalhado de entidades"""
     try:
-        # Parâmetros de filtro
-        start_date = request.args.get('start_date')
-        end_date = request.args.get('end_date')
-        tipo = request.args.get('tipo')
-        status = request.args.get('status')
-        
-        # Query base
-        query = Entidade.query
-        
-        # Aplicar filtros
-        if start_date:
-            query = query.filter(Entidade.created_at >= datetime.strptime(start_date, '%Y-%m-%d'))
-        if end_date:
-            query = query.filter(Entidade.created_at <= datetime.strptime(end_date, '%Y-%m-%d'))
-        if tipo:
-            query = query.filter(Entidade.tipo == tipo)
-        if status:
-            query = query.filter(Entidade.status == status)
-        
-        # Ordenar por data de criação
-        entities = query.order_by(Entidade.created_at.desc()).all()
-        
-        # Converter para dicionário
-        entities_data = []
-        for entity in entities:
-            entities_data.append({
-                'id': entity.id,
-                'nome': entity.nome,
-                'cnpj': entity.cnpj,
-                'tipo': entity.tipo,
-                'status': entity.status,
-                'created_at': entity.created_at.strftime('%d/%m/%Y %H:%M')
-            })
-        
-        return jsonify({
-            'success': True,
-            'data': entities_data,
-            'total': len(entities_data)
-        })
+        return jsonify(_report_json('entities'))
     except Exception as e:
         current_app.logger.error(f"Erro ao obter relatório de entidades: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@reports_bp.route('/api/reports/<report_type>/stream')
+@login_required
+def stream_report(report_type):
+    """API para relatório detalhado em streaming (?format=ndjson|csv|xlsx)
+    
+    Aceita os mesmos filtros dos relatórios em JSON; a memória não cresce
+    com o número de linhas.
+    """
+    format_type = request.args.get('format', FORMAT_NDJSON)
+    if report_type not in REPORTS:
+        return jsonify({'success': False, 'error': 'Tipo de relatório inválido'}), 400
+    if format_type not in STREAM_FORMATS:
+        return jsonify({'success': False, 'error': 'Formato inválido (use ndjson, csv ou xlsx)'}), 400
+    try:
+        return _report_stream(report_type, format_type)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
 @reports_bp.route('/api/reports/export/<report_type>')
 @login_required
 def export_report(report_type):
-    """API para exportar relatórios em diferentes formatos"""
+    """API para exportar relatórios em diferentes formatos
+    
+    CSV (padrão), XLSX e NDJSON são enviados como arquivo em streaming;
+    com async=1 o arquivo é gerado na fila de tarefas (resposta 202 com a
+    URL de acompanhamento). Outros formatos (ex.: pdf) retornam 400.
+    """
     try:
-        format_type = request.args.get('format', 'pdf')
+        format_type = request.args.get('format', FORMAT_CSV)
         
-        if report_type == 'users':
-            data = get_users_report().get_json()
-        elif report_type == 'vehicles':
-            data = get_vehicles_report().get_json()
-        elif report_type == 'entities':
-            data = get_entities_report().get_json()
-        else:
+        if report_type not in REPORTS:
             return jsonify({'success': False, 'error': 'Tipo de relatório inválido'}), 400
+        if format_type not in STREAM_FORMATS:
+            return jsonify({
+                'success': False,
+                'error': f'Formato {format_type} não suportado (use csv, xlsx ou ndjson)'
+            }), 400
         
-        # Por enquanto, retornar JSON
-        # TODO: Implementar geração de PDF/Excel
-        return jsonify({
-            'success': True,
-            'message': f'Relatório {report_type} exportado com sucesso',
-            'data': data
-        })
+        if request.args.get('async') in ('1', 'true'):
+            spec = REPORTS[report_type]
+            filters = _report_filters(spec)
+            try:
+                _report_statement(spec, filters)
+            except ValueError as e:
+                return jsonify({'success': False, 'error': f'Filtro inválido: {e}'}), 400
+            job = job_queue.submit('report_export', {
+                'report_type': report_type, 'format': format_type, 'filters': filters
+            }, user_id=current_user.id)
+            return job_response(job)
+        
+        return _report_stream(report_type, format_type, attachment=True)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': f'Filtro inválido: {e}'}), 400
     except Exception as e:
         current_app.logger.error(f"Erro ao exportar relatório: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -207,6 +207,27 @@ def validate_cnpj(cnpj: str) -> bool:
     
     return cnpj[12] == str(digit1) and cnpj[13] == str(digit2)
 
+def validate_cpf(cpf: str) -> bool:
+    """Valida formato de CPF"""
+    # Remove caracteres não numéricos
+    cpf = re.sub(r'[^0-9]', '', cpf)
+    
+    if len(cpf) != 11:
+        return False
+    
+    # Verifica se todos os dígitos são iguais
+    if cpf == cpf[0] * 11:
+        return False
+    
+    # Validação do algoritmo do CPF
+    def calculate_digit(cpf_digits):
+        weight = len(cpf_digits) + 1
+        sum_result = sum(int(digit) * (weight - index) for index, digit in enumerate(cpf_digits))
+        remainder = sum_result % 11
+        return 0 if remainder < 2 else 11 - remainder
+    
+    return cpf[9] == str(calculate_digit(cpf[:9])) and cpf[10] == str(calculate_digit(cpf[:10]))
+
 def validate_placa(placa: str) -> bool:
     """Valida formato de placa de veículo"""
     # Remove espaços e converte para maiúsculo
@@ -3,6 +3,7 @@ Sistema de logging de segurança
 """
 import logging
 import json
+import os
 from datetime import datetime
 from flask import request, current_app
 from functools import wraps
@@ -11,7 +12,8 @@ from functools import wraps
 security_logger = logging.getLogger('security')
 security_logger.setLevel(logging.INFO)
 
-# Handler para arquivo de log
+# Handler para arquivo de log (a pasta não é versionada)
+os.makedirs('logs', exist_ok=True)
 file_handler = logging.FileHandler('logs/security.log')
 file_handler.setLevel(logging.INFO)
 
@@ -0,0 +1,383 @@
+"""
+Importação em massa de cadastros (CSV) do Projeto Aduaneiro
+Lê o arquivo em streaming, valida em lotes, verifica duplicidade com uma
+consulta por lote e coluna única e insere cada lote com executemany em
+uma transação própria, devolvendo os erros por linha e a vazão
+"""
+
+import codecs
+import csv
+import itertools
+import re
+import time
+import unicodedata
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from flask import current_app
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from werkzeug.security import generate_password_hash
+from app import db
+from app.models.user import User
+from app.models.veiculo import Veiculo
+from app.models.entidade import Entidade
+from app.security.input_validation import validate_cnpj, validate_cpf, validate_email, validate_placa
+from app.utils.documents import document_columns
+from app.utils.identity_index import identity_bulk_insert
+from app.utils.search_index import index_bulk_insert
+from app.utils.stats_counters import count_bulk_insert
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 500
+DEFAULT_MAX_ERRORS = 1000
+MIN_PASSWORD_LENGTH = 6
+
+Row = Tuple[int, Dict[str, Any]]  # (linha do arquivo, valores)
+
+
+class ImportFormatError(ValueError):
+    """Arquivo ilegível ou sem as colunas obrigatórias"""
+
+
+def normalize_header(name: str) -> str:
+    """Cabeçalho sem acentos, minúsculo e com '_' ("E-mail" -> "e_mail")"""
+    name = unicodedata.normalize('NFKD', name or '')
+    name = ''.join(char for char in name if not unicodedata.combining(char))
+    return re.sub(r'[^a-z0-9]+', '_', name.lower()).strip('_')
+
+
+# Conversores de campo: recebem o texto (já sem espaços) e retornam o
+# valor da coluna ou lançam ValueError com a mensagem do erro
+
+def _boolean(value: str) -> bool:
+    normalized = normalize_header(value)
+    if normalized in ('1', 'true', 'sim', 's', 'yes', 'y', 'x'):
+        return True
+    if normalized in ('0', 'false', 'nao', 'n', 'no', ''):
+        return False
+    raise ValueError('valor deve ser Sim ou Não')
+
+
+def _decimal(value: str) -> float:
+    try:
+        return float(value.replace('.', '').replace(',', '.') if ',' in value else value)
+    except ValueError:
+        raise ValueError('número inválido')
+
+
+def _integer(value: str) -> int:
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError('número inteiro inválido')
+
+
+def _status(value: str) -> str:
+    status = {'ativo': 'active', 'bloqueado': 'blocked'}.get(normalize_header(value), value.lower())
+    if status not in ('active', 'blocked'):
+        raise ValueError('status deve ser active ou blocked')
+    return status
+
+
+def _email(value: str) -> str:
+    if not validate_email(value):
+        raise ValueError('e-mail inválido')
+    return value.lower()
+
+
+def _cpf(value: str) -> str:
+    if not validate_cpf(value):
+        raise ValueError('CPF inválido')
+    return value
+
+
+def _password(value: str) -> str:
+    if len(value) < MIN_PASSWORD_LENGTH:
+        raise ValueError(f'mínimo de {MIN_PASSWORD_LENGTH} caracteres')
+    return generate_password_hash(value)
+
+
+def _placa(value: str) -> str:
+    placa = re.sub(r'[\s-]', '', value).upper()
+    if not validate_placa(placa):
+        raise ValueError('placa inválida')
+    return placa
+
+
+def _check_cpf_cnpj(values: Dict[str, Any]) -> Optional[str]:
+    """CPF para pessoa física, CNPJ para jurídica; estrangeiras não são validadas"""
+    tipo = normalize_header(values.get('tipo_cliente', ''))
+    document = values.get('cpf_cnpj', '')
+    if tipo.startswith('pessoa_fisica') and not validate_cpf(document):
+        return 'cpf_cnpj: CPF inválido'
+    if tipo.startswith('juridica') and not validate_cnpj(document):
+        return 'cpf_cnpj: CNPJ inválido'
+    return None
+
+
+class ImportSpec:
+    """Colunas, validação e chaves únicas de um cadastro importável
+
+    `fields` mapeia cada coluna aceita para um conversor (None: texto);
+    o tamanho máximo dos textos vem da própria coluna do modelo. `columns`
+    indica a coluna do modelo dos campos gravados com outro nome (ex.:
+    password -> password_hash, validado só pelo conversor). `unique`
+    são as colunas verificadas contra o banco e contra o próprio arquivo;
+    documentos são comparados pela coluna normalizada ("529.982.247-25"
+    e "52998224725" são o mesmo CPF).
+    """
+
+    def __init__(self, model, fields: Dict[str, Optional[Callable[[str], Any]]],
+                 required: Sequence[str], unique: Sequence[str],
+                 defaults: Optional[Dict[str, Any]] = None,
+                 check: Optional[Callable[[Dict[str, Any]], Optional[str]]] = None,
+                 columns: Optional[Dict[str, str]] = None):
+        self.model = model
+        self.fields = fields
+        self.columns = columns or {}
+        self.required = tuple(required)
+        self.unique = tuple(unique)
+        self.defaults = defaults or {}
+        self.check = check
+        self.lengths = {
+            name: None if name in self.columns else getattr(model.__table__.columns[name].type, 'length', None)
+            for name in fields
+        }
+        shadows = {
+            source: (getattr(model, name), kind.normalize)
+            for name, (source, kind) in document_columns(model).items()
+        }
+        self.keys = {name: shadows.get(name, (getattr(model, name), None)) for name in self.unique}
+
+    def key(self, name: str, values: Dict[str, Any]) -> Any:
+        """Valor comparado na verificação de duplicidade da coluna única `name`"""
+        normalize = self.keys[name][1]
+        return normalize(values[name]) if normalize else values[name]
+
+
+IMPORT_SPECS = {
+    'users': ImportSpec(
+        User,
+        # Sem a coluna password a conta fica sem senha (password_hash nulo):
+        # o login é recusado até um administrador definir a senha
+        fields={'name': None, 'lastname': None, 'cpf': _cpf, 'email': _email, 'group': None,
+                'job_title': None, 'status': _status, 'password': _password},
+        required=('name', 'lastname', 'cpf', 'email', 'group'),
+        unique=('cpf', 'email'),
+        defaults={'status': 'active'},
+        columns={'password': 'password_hash'}
+    ),
+    'veiculos': ImportSpec(
+        Veiculo,
+        fields={'motorista_responsavel': None, 'cpf_motorista': _cpf, 'placa': _placa,
+                'renavam': None, 'tipo': None, 'tipo_outros': None, 'estado': None,
+                'municipio': None, 'observacoes': None, 'status': _status},
+        required=('motorista_responsavel', 'cpf_motorista', 'placa', 'tipo'),
+        unique=('placa',),
+        defaults={'status': 'active'}
+    ),
+    'entidades': ImportSpec(
+        Entidade,
+        fields={'razao_social': None, 'cpf_cnpj': None, 'nome_fantasia': None,
+                'inscricao_estadual': None, 'tipo_cliente': None, 'pagamento': None,
+                'retencao': _boolean, 'valor_retencao': _decimal, 'prazo_retencao': _integer,
+                'relatorio_nd': _boolean, 'email_faturamento': _email,
+                'email_operacional': _email, 'email_despachante': _email,
+                'telefone': None, 'status': _status},
+        required=('razao_social', 'cpf_cnpj', 'nome_fantasia', 'tipo_cliente', 'pagamento',
+                  'email_faturamento', 'email_operacional', 'email_despachante'),
+        unique=('cpf_cnpj',),
+        defaults={'status': 'active', 'retencao': False, 'relatorio_nd': False},
+        check=_check_cpf_cnpj
+    )
+}
+
+
+def _decoded_lines(stream) -> Iterator[str]:
+    """Linhas do arquivo em texto: UTF-8 (com ou sem BOM) ou, se não for, Windows-1252"""
+    encoding = 'utf-8-sig'
+    if hasattr(stream, 'seek'):
+        sample = stream.read(64 * 1024)
+        stream.seek(0)
+        try:
+            sample.decode('utf-8')
+        except UnicodeDecodeError as e:
+            # Amostra cortada no meio de um caractere não indica outra codificação
+            if e.start < len(sample) - 3:
+                encoding = 'cp1252'
+    try:
+        yield from codecs.iterdecode(stream, encoding)
+    except UnicodeDecodeError:
+        raise ImportFormatError('Codificação do arquivo não suportada (use UTF-8)')
+
+
+class BulkImporter:
+    """Importa um CSV para o modelo de `spec`, em lotes de `chunk_size` linhas"""
+
+    def __init__(self, spec: ImportSpec, aliases: Iterable[Tuple[str, str]] = (),
+                 chunk_size: Optional[int] = None, max_errors: Optional[int] = None):
+        self.spec = spec
+        self.chunk_size = chunk_size or current_app.config.get('IMPORT_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+        self.max_errors = max_errors or current_app.config.get('IMPORT_MAX_ERRORS', DEFAULT_MAX_ERRORS)
+
+        # Cabeçalhos aceitos: o nome da coluna e os rótulos (ex.: os da exportação)
+        self.headers = {normalize_header(name): name for name in spec.fields}
+        for name, label in aliases:
+            if name in spec.fields:
+                self.headers.setdefault(normalize_header(label), name)
+
+        self.errors: List[Dict[str, Any]] = []
+        self.failed = 0
+        self.imported = 0
+        self.seen: Dict[str, Dict[Any, int]] = {name: {} for name in spec.unique}
+
+    def _rows(self, stream) -> Iterator[Row]:
+        lines = _decoded_lines(stream)
+        first = next(lines, None)
+        if first is None:
+            raise ImportFormatError('Arquivo vazio')
+        delimiter = ';' if first.count(';') > first.count(',') else ','
+        reader = csv.reader(itertools.chain([first], lines), delimiter=delimiter)
+
+        header = next(reader)
+        columns = [self.headers.get(normalize_header(name)) for name in header]
+        missing = [name for name in self.spec.required if name not in columns]
+        if missing:
+            raise ImportFormatError(f"Colunas obrigatórias ausentes: {', '.join(missing)}")
+
+        for values in reader:
+            if not any(value.strip() for value in values):
+                continue
+            yield reader.line_num, {
+                column: value.strip() for column, value in zip(columns, values) if column
+            }
+
+    def _validate(self, raw: Dict[str, str]) -> Tuple[Dict[str, Any], List[str]]:
+        values: Dict[str, Any] = dict(self.spec.defaults)
+        errors = []
+        for name, convert in self.spec.fields.items():
+            text = raw.get(name, '')
+            if not text:
+                if name in self.spec.required:
+                    errors.append(f'{name}: campo obrigatório')
+                continue
+            length = self.spec.lengths[name]
+            if length and len(text) > length:
+                errors.append(f'{name}: máximo de {length} caracteres')
+                continue
+            try:
+                values[self.spec.columns.get(name, name)] = convert(text) if convert else text
+            except ValueError as e:
+                errors.append(f'{name}: {e}')
+        if not errors and self.spec.check:
+            message = self.spec.check(values)
+            if message:
+                errors.append(message)
+        return values, errors
+
+    def _reject(self, line: int, errors: List[str]) -> None:
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'line': line, 'errors': errors})
+
+    def _existing(self, rows: List[Row]) -> Dict[str, set]:
+        """Valores das colunas únicas do lote já cadastrados (uma consulta por coluna)"""
+        existing = {}
+        for name in self.spec.unique:
+            column = self.spec.keys[name][0]
+            values = {self.spec.key(name, values) for _, values in rows}
+            existing[name] = set(db.session.execute(
+                select(column).where(column.in_(values))
+            ).scalars()) if values else set()
+        return existing
+
+    def _process_chunk(self, chunk: List[Row]) -> None:
+        valid: List[Row] = []
+        for line, raw in chunk:
+            values, errors = self._validate(raw)
+            if errors:
+                self._reject(line, errors)
+            else:
+                valid.append((line, values))
+
+        existing = self._existing(valid)
+        accepted: List[Row] = []
+        for line, values in valid:
+            errors = []
+            keys = {name: self.spec.key(name, values) for name in self.spec.unique}
+            for name, key in keys.items():
+                if key in existing[name]:
+                    errors.append(f'{name}: já cadastrado')
+                elif key in self.seen[name]:
+                    errors.append(f'{name}: repetido no arquivo (linha {self.seen[name][key]})')
+            if errors:
+                self._reject(line, errors)
+                continue
+            for name, key in keys.items():
+                self.seen[name][key] = line
+            accepted.append((line, values))
+
+        if accepted:
+            self._insert(accepted)
+
+    def _insert(self, rows: List[Row]) -> None:
+        """Insere o lote em uma transação (executemany) e atualiza os contadores"""
+        now = datetime.utcnow()
+        mappings = [dict(values, created_at=now) for _, values in rows]
+        try:
+            db.session.execute(insert(self.spec.model), mappings)
+            count_bulk_insert(db.session.connection(), self.spec.model, mappings)
+            index_bulk_insert(db.session.connection(), self.spec.model, mappings, self.spec.unique[0])
+            identity_bulk_insert(db.session.connection(), self.spec.model, mappings, self.spec.unique[0])
+            db.session.commit()
+            self.imported += len(rows)
+        except IntegrityError:
+            # Escrita concorrente criou um dos registros: refazer linha a linha
+            db.session.rollback()
+            for (line, _), mapping in zip(rows, mappings):
+                try:
+                    with db.session.begin_nested():
+                        db.session.execute(insert(self.spec.model), [mapping])
+                        count_bulk_insert(db.session.connection(), self.spec.model, [mapping])
+                        index_bulk_insert(db.session.connection(), self.spec.model, [mapping],
+                                          self.spec.unique[0])
+                        identity_bulk_insert(db.session.connection(), self.spec.model, [mapping],
+                                             self.spec.unique[0])
+                    self.imported += 1
+                except IntegrityError:
+                    self._reject(line, ['registro duplicado'])
+            db.session.commit()
+
+    def run(self, stream, on_chunk: Optional[Callable[[int], None]] = None) -> Dict[str, Any]:
+        """Importa o arquivo e retorna o resumo com os erros por linha
+
+        `on_chunk` recebe o total de linhas processadas após cada lote
+        (progresso na fila de tarefas).
+        """
+        start = time.perf_counter()
+        rows = self._rows(stream)
+        while True:
+            chunk = list(itertools.islice(rows, self.chunk_size))
+            if not chunk:
+                break
+            self._process_chunk(chunk)
+            if on_chunk:
+                on_chunk(self.imported + self.failed)
+
+        seconds = time.perf_counter() - start
+        total = self.imported + self.failed
+        logger.info(
+            f"Importação de {self.spec.model.__tablename__}: {self.imported} inseridos, "
+            f"{self.failed} rejeitados em {seconds:.2f}s"
+        )
+        return {
+            'total': total,
+            'imported': self.imported,
+            'failed': self.failed,
+            'errors': sorted(self.errors, key=lambda error: error['line']),
+            'errors_truncated': self.failed > len(self.errors),
+            'seconds': round(seconds, 3),
+            'rows_per_second': round(total / seconds, 1) if seconds else None
+        }
@@ -0,0 +1,531 @@
+"""
+Fila local de tarefas em segundo plano do Projeto Aduaneiro
+Exportações, importações e reconstrução do cache saem da requisição (timeout
+de 30s do Gunicorn) para uma tabela jobs em um arquivo SQLite local (WAL),
+executada por um pool de processos (scripts/job_worker.py) com progresso,
+cancelamento, novas tentativas e retenção dos arquivos de resultado, sem
+broker externo
+"""
+
+import json
+import multiprocessing
+import os
+import shutil
+import signal
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from werkzeug.utils import secure_filename
+from app import db
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Estados da tarefa
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+INPUT_FILE = 'input'          # Arquivo enviado na criação (ex.: CSV da importação)
+PROGRESS_INTERVAL = 1.0       # Segundos entre gravações de progresso
+MAINTENANCE_INTERVAL = 60.0   # Segundos entre recuperação de órfãs e limpeza
+
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        type TEXT NOT NULL,
+        status TEXT NOT NULL,
+        params TEXT NOT NULL DEFAULT '{}',
+        progress REAL NOT NULL DEFAULT 0,
+        message TEXT,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        max_attempts INTEGER NOT NULL,
+        run_after REAL NOT NULL,
+        cancel_requested INTEGER NOT NULL DEFAULT 0,
+        worker TEXT,
+        heartbeat_at REAL,
+        result TEXT,
+        result_file TEXT,
+        result_name TEXT,
+        error TEXT,
+        user_id INTEGER,
+        created_at REAL NOT NULL,
+        started_at REAL,
+        finished_at REAL
+    )
+    """,
+    'CREATE INDEX IF NOT EXISTS ix_jobs_queue ON jobs (status, run_after)',
+    'CREATE INDEX IF NOT EXISTS ix_jobs_user ON jobs (user_id, created_at)',
+)
+
+
+class JobError(Exception):
+    """Falha definitiva: a tarefa termina sem novas tentativas"""
+
+
+class JobCancelled(BaseException):
+    """Cancelamento pedido durante a execução
+
+    Deriva de BaseException para atravessar os `except Exception` dos
+    geradores de streaming (csv_chunks, xlsx_chunks) que o handler percorre.
+    """
+
+
+class UnknownJobType(ValueError):
+    """Tipo de tarefa sem handler registrado"""
+
+
+class JobContext:
+    """Recebido pelo handler: parâmetros, progresso, cancelamento e arquivos"""
+
+    def __init__(self, queue: 'JobQueue', job: Dict[str, Any]):
+        self.queue = queue
+        self.job_id = job['id']
+        self.params = job['params']
+        self.attempt = job['attempts']
+        self.result_file: Optional[str] = None
+        self.result_name: Optional[str] = None
+        self._last_progress = 0.0
+
+        input_path = os.path.join(queue.job_dir(self.job_id), INPUT_FILE)
+        self.input_path = input_path if os.path.exists(input_path) else None
+
+    def progress(self, percent: float, message: Optional[str] = None, force: bool = False) -> None:
+        """Registra o progresso (0-100), no máximo uma vez por segundo
+
+        Lança JobCancelled se o cancelamento foi pedido.
+        """
+        now = time.monotonic()
+        if not force and now - self._last_progress < PROGRESS_INTERVAL:
+            return
+        self._last_progress = now
+        if self.queue._report_progress(self.job_id, percent, message):
+            raise JobCancelled()
+
+    def result_path(self, filename: str) -> str:
+        """Caminho para gravar o arquivo de resultado (baixado em /api/jobs/<id>/result)"""
+        directory = self.queue.job_dir(self.job_id)
+        os.makedirs(directory, exist_ok=True)
+        self.result_file = os.path.join(directory, secure_filename(filename) or 'resultado')
+        self.result_name = filename
+        return self.result_file
+
+
+class JobQueue:
+    """Registro de handlers e operações da fila (enfileirar, reservar, executar)
+
+    A reserva usa BEGIN IMMEDIATE, que serializa os workers de todos os
+    processos; a tarefa em execução renova `heartbeat_at` e volta para a
+    fila se o worker morrer e o heartbeat passar de JOBS_LEASE_TIMEOUT.
+    """
+
+    def __init__(self):
+        self._handlers: Dict[str, Dict[str, Any]] = {}
+        self._local = threading.local()
+        self._last_maintenance = 0.0
+
+        self.app = None
+        self.path: Optional[str] = None
+        self.result_dir: Optional[str] = None
+        self.workers = 2
+        self.poll_interval = 1.0
+        self.max_attempts = 3
+        self.retry_backoff = 30.0
+        self.lease_timeout = 120.0
+        self.retention = 86400
+
+    def handler(self, name: str, max_attempts: Optional[int] = None):
+        """Decorator que registra a função executada para o tipo `name`"""
+        def decorator(func: Callable[[JobContext], Any]) -> Callable[[JobContext], Any]:
+            self._handlers[name] = {'func': func, 'max_attempts': max_attempts}
+            return func
+        return decorator
+
+    @property
+    def types(self) -> List[str]:
+        return sorted(self._handlers)
+
+    def init_app(self, app) -> None:
+        self.app = app
+        self.path = app.config.get('JOBS_DATABASE') or os.path.join(app.instance_path, 'jobs.sqlite3')
+        self.result_dir = app.config.get('JOBS_RESULT_DIR') or os.path.join(app.instance_path, 'jobs')
+        self.workers = int(app.config.get('JOBS_WORKERS', 2))
+        self.poll_interval = float(app.config.get('JOBS_POLL_INTERVAL', 1))
+        self.max_attempts = int(app.config.get('JOBS_MAX_ATTEMPTS', 3))
+        self.retry_backoff = float(app.config.get('JOBS_RETRY_BACKOFF', 30))
+        self.lease_timeout = float(app.config.get('JOBS_LEASE_TIMEOUT', 120))
+        self.retention = int(app.config.get('JOBS_RESULT_RETENTION', 86400))
+        app.extensions['job_queue'] = self
+
+    def job_dir(self, job_id: str) -> str:
+        return os.path.join(self.result_dir, job_id)
+
+    # Armazenamento
+
+    def _connection(self) -> sqlite3.Connection:
+        """Conexão SQLite da thread atual (uma por processo: não cruza o fork)"""
+        local = self._local
+        if getattr(local, 'connection', None) is None or local.pid != os.getpid() or local.path != self.path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.row_factory = sqlite3.Row
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            for statement in _SCHEMA:
+                connection.execute(statement)
+            local.connection, local.pid, local.path = connection, os.getpid(), self.path
+        return local.connection
+
+    @contextmanager
+    def _transaction(self, immediate: bool = False) -> Iterator[sqlite3.Connection]:
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE' if immediate else 'BEGIN')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        job['params'] = json.loads(job['params'] or '{}')
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        job['cancel_requested'] = bool(job['cancel_requested'])
+        return job
+
+    # Operações das rotas
+
+    def submit(self, job_type: str, params: Optional[Dict[str, Any]] = None,
+               user_id: Optional[int] = None, upload=None,
+               max_attempts: Optional[int] = None) -> Dict[str, Any]:
+        """Enfileira uma tarefa; `upload` (arquivo binário) fica disponível em context.input_path"""
+        if job_type not in self._handlers:
+            raise UnknownJobType(f'Tipo de tarefa desconhecido: {job_type}')
+
+        job_id = uuid.uuid4().hex
+        if upload is not None:
+            os.makedirs(self.job_dir(job_id), exist_ok=True)
+            with open(os.path.join(self.job_dir(job_id), INPUT_FILE), 'wb') as target:
+                shutil.copyfileobj(upload, target)
+
+        attempts = max_attempts or self._handlers[job_type]['max_attempts'] or self.max_attempts
+        now = time.time()
+        with self._transaction() as connection:
+            connection.execute(
+                'INSERT INTO jobs (id, type, status, params, max_attempts, run_after, user_id, created_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (job_id, job_type, QUEUED, json.dumps(params or {}, default=str), attempts, now, user_id, now)
+            )
+        logger.info(f"Tarefa {job_type} enfileirada: {job_id}")
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connection().execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def recent(self, user_id: Optional[int] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """Tarefas mais recentes (de um usuário, se informado)"""
+        if user_id is None:
+            rows = self._connection().execute(
+                'SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?', (limit,))
+        else:
+            rows = self._connection().execute(
+                'SELECT * FROM jobs WHERE user_id = ? ORDER BY created_at DESC LIMIT ?', (user_id, limit))
+        return [self._to_dict(row) for row in rows]
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Cancela a tarefa: na fila, na hora; em execução, no próximo progresso"""
+        with self._transaction(immediate=True) as connection:
+            connection.execute(
+                'UPDATE jobs SET status = ?, message = ?, finished_at = ? WHERE id = ? AND status = ?',
+                (CANCELLED, 'Cancelada', time.time(), job_id, QUEUED)
+            )
+            connection.execute(
+                'UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = ?', (job_id, RUNNING)
+            )
+        return self.get(job_id)
+
+    # Execução
+
+    def claim(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        """Reserva a próxima tarefa liberada para execução"""
+        now = time.time()
+        with self._transaction(immediate=True) as connection:
+            row = connection.execute(
+                'SELECT id FROM jobs WHERE status = ? AND run_after <= ? '
+                'ORDER BY run_after, created_at LIMIT 1', (QUEUED, now)
+            ).fetchone()
+            if row is None:
+                return None
+            connection.execute(
+                'UPDATE jobs SET status = ?, attempts = attempts + 1, worker = ?, heartbeat_at = ?, '
+                'started_at = ?, progress = 0, message = NULL WHERE id = ?',
+                (RUNNING, worker_id, now, now, row['id'])
+            )
+        return self.get(row['id'])
+
+    def _report_progress(self, job_id: str, percent: float, message: Optional[str]) -> bool:
+        """Grava progresso e heartbeat; retorna se o cancelamento foi pedido"""
+        with self._transaction() as connection:
+            connection.execute(
+                'UPDATE jobs SET progress = ?, message = COALESCE(?, message), heartbeat_at = ? '
+                'WHERE id = ? AND status = ?',
+                (round(max(0.0, min(100.0, percent)), 1), message, time.time(), job_id, RUNNING)
+            )
+            row = connection.execute('SELECT cancel_requested FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return bool(row and row['cancel_requested'])
+
+    def _keep_alive(self, job_id: str, stop: threading.Event) -> None:
+        """Renova o heartbeat enquanto o handler roda (mesmo sem chamar progress)"""
+        while not stop.wait(self.lease_timeout / 4):
+            try:
+                self._connection().execute(
+                    'UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND status = ?',
+                    (time.time(), job_id, RUNNING)
+                )
+            except sqlite3.Error as e:
+                logger.warning(f"Erro ao renovar o heartbeat da tarefa {job_id}: {e}")
+
+    def _finish(self, job: Dict[str, Any], status: str, **fields) -> None:
+        """Registra o desfecho, desde que a reserva ainda seja deste worker"""
+        fields.update(status=status, finished_at=time.time(), worker=None)
+        if 'result' in fields:
+            fields['result'] = json.dumps(fields['result'], default=str)
+        assignments = ', '.join(f'{name} = ?' for name in fields)
+        with self._transaction() as connection:
+            connection.execute(
+                f'UPDATE jobs SET {assignments} WHERE id = ? AND status = ? AND worker = ?',
+                (*fields.values(), job['id'], RUNNING, job['worker'])
+            )
+
+    def _retry(self, job: Dict[str, Any], error: str) -> None:
+        """Devolve à fila com espera exponencial (JOBS_RETRY_BACKOFF, 2x, 4x...)"""
+        delay = self.retry_backoff * 2 ** (job['attempts'] - 1)
+        with self._transaction() as connection:
+            connection.execute(
+                'UPDATE jobs SET status = ?, run_after = ?, error = ?, message = ?, worker = NULL '
+                'WHERE id = ? AND status = ? AND worker = ?',
+                (QUEUED, time.time() + delay, error, f'Nova tentativa em {delay:.0f}s',
+                 job['id'], RUNNING, job['worker'])
+            )
+
+    def execute(self, job: Dict[str, Any], app=None) -> None:
+        """Executa uma tarefa reservada em contexto de aplicação e registra o desfecho"""
+        app = app or self.app
+        handler = self._handlers.get(job['type'])
+        context = JobContext(self, job)
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=self._keep_alive, args=(job['id'], stop),
+                                     name=f"job-heartbeat-{job['id']}", daemon=True)
+        heartbeat.start()
+        start = time.perf_counter()
+        try:
+            if handler is None:
+                raise JobError(f"Tipo de tarefa desconhecido: {job['type']}")
+            with app.app_context():
+                try:
+                    result = handler['func'](context)
+                finally:
+                    db.session.remove()
+        except JobCancelled:
+            self._discard_result(context)
+            self._finish(job, CANCELLED, message='Cancelada')
+            logger.info(f"Tarefa {job['type']} {job['id']} cancelada")
+        except Exception as e:
+            self._discard_result(context)
+            if isinstance(e, JobError) or job['attempts'] >= job['max_attempts']:
+                self._finish(job, FAILED, error=str(e), message='Falhou')
+                logger.error(f"Tarefa {job['type']} {job['id']} falhou: {e}")
+            else:
+                self._retry(job, str(e))
+                logger.warning(f"Tarefa {job['type']} {job['id']} falhou "
+                               f"(tentativa {job['attempts']}/{job['max_attempts']}): {e}")
+        else:
+            self._finish(job, SUCCEEDED, progress=100, message='Concluída', result=result,
+                         result_file=context.result_file, result_name=context.result_name)
+            logger.info(f"Tarefa {job['type']} {job['id']} concluída em "
+                        f"{time.perf_counter() - start:.2f}s")
+        finally:
+            stop.set()
+            heartbeat.join()
+
+    @staticmethod
+    def _discard_result(context: JobContext) -> None:
+        if context.result_file and os.path.exists(context.result_file):
+            os.remove(context.result_file)
+
+    def run_next(self, worker_id: Optional[str] = None, app=None) -> Optional[Dict[str, Any]]:
+        """Reserva e executa uma tarefa; retorna o estado final (None se a fila está vazia)"""
+        job = self.claim(worker_id or f'{socket.gethostname()}:{os.getpid()}')
+        if job is None:
+            return None
+        self.execute(job, app)
+        return self.get(job['id'])
+
+    # Manutenção
+
+    def recover_stale(self) -> int:
+        """Tarefas em execução sem heartbeat (worker encerrado) voltam para a fila ou falham"""
+        now = time.time()
+        expired = now - self.lease_timeout
+        message = 'Worker interrompido durante a execução'
+        with self._transaction(immediate=True) as connection:
+            recovered = connection.execute(
+                'UPDATE jobs SET status = ?, finished_at = ?, worker = NULL WHERE status = ? '
+                'AND heartbeat_at < ? AND cancel_requested = 1', (CANCELLED, now, RUNNING, expired)
+            ).rowcount
+            recovered += connection.execute(
+                'UPDATE jobs SET status = ?, finished_at = ?, error = ?, worker = NULL WHERE status = ? '
+                'AND heartbeat_at < ? AND attempts >= max_attempts', (FAILED, now, message, RUNNING, expired)
+            ).rowcount
+            recovered += connection.execute(
+                'UPDATE jobs SET status = ?, run_after = ?, error = ?, worker = NULL WHERE status = ? '
+                'AND heartbeat_at < ?', (QUEUED, now, message, RUNNING, expired)
+            ).rowcount
+        if recovered:
+            logger.warning(f"{recovered} tarefa(s) órfã(s) recuperada(s)")
+        return recovered
+
+    def purge_expired(self) -> int:
+        """Remove as tarefas terminadas há mais de JOBS_RESULT_RETENTION e seus arquivos"""
+        expired = time.time() - self.retention
+        with self._transaction(immediate=True) as connection:
+            job_ids = [row['id'] for row in connection.execute(
+                'SELECT id FROM jobs WHERE status IN (?, ?, ?) AND finished_at < ?', (*FINISHED, expired)
+            )]
+            connection.executemany('DELETE FROM jobs WHERE id = ?', [(job_id,) for job_id in job_ids])
+        for job_id in job_ids:
+            shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+        if job_ids:
+            logger.info(f"{len(job_ids)} tarefa(s) expirada(s) removida(s)")
+        return len(job_ids)
+
+    def maintenance(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self._last_maintenance < MAINTENANCE_INTERVAL:
+            return
+        self._last_maintenance = now
+        try:
+            self.recover_stale()
+            self.purge_expired()
+        except sqlite3.Error as e:
+            logger.warning(f"Erro na manutenção da fila de tarefas: {e}")
+
+    # Workers
+
+    def work(self, stop: threading.Event, worker_id: Optional[str] = None, app=None) -> None:
+        """Laço de um worker: executa tarefas até `stop` (termina a tarefa em andamento)"""
+        worker_id = worker_id or f'{socket.gethostname()}:{os.getpid()}'
+        logger.info(f"Worker de tarefas {worker_id} iniciado")
+        while not stop.is_set():
+            self.maintenance()
+            try:
+                job = self.run_next(worker_id, app)
+            except sqlite3.Error as e:
+                logger.warning(f"Erro ao reservar tarefa: {e}")
+                job = None
+            if job is None:
+                stop.wait(self.poll_interval)
+        logger.info(f"Worker de tarefas {worker_id} encerrado")
+
+    def _process_main(self, app, index: int) -> None:
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *args: stop.set())
+        signal.signal(signal.SIGINT, lambda *args: stop.set())
+        self.work(stop, f'{socket.gethostname()}:{os.getpid()}', app)
+
+    def run_pool(self, workers: Optional[int] = None, app=None) -> None:
+        """Supervisor do pool: mantém `workers` processos até SIGTERM/SIGINT
+
+        Os processos são criados por fork depois de create_app, sem as
+        conexões do banco do processo pai; um worker que morre é substituído
+        e a tarefa dele volta para a fila quando o heartbeat expira.
+        """
+        app = app or self.app
+        workers = workers or self.workers
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *args: stop.set())
+        signal.signal(signal.SIGINT, lambda *args: stop.set())
+
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+        self.maintenance(force=True)
+
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            # Sem fork (Windows): threads no próprio processo
+            threads = [threading.Thread(target=self.work, args=(stop, f'{socket.gethostname()}:{index}', app),
+                                        name=f'job-worker-{index}') for index in range(workers)]
+            for thread in threads:
+                thread.start()
+            while not stop.wait(1):
+                pass
+            for thread in threads:
+                thread.join()
+            return
+
+        context = multiprocessing.get_context('fork')
+        processes: Dict[int, Any] = {}
+        logger.info(f"Pool de tarefas iniciado com {workers} processo(s): {self.path}")
+        while not stop.is_set():
+            for index in range(workers):
+                process = processes.get(index)
+                if process is not None and process.is_alive():
+                    continue
+                if process is not None:
+                    logger.warning(f"Worker {index} encerrado (código {process.exitcode}), reiniciando")
+                process = context.Process(target=self._process_main, args=(app, index),
+                                          name=f'job-worker-{index}')
+                process.start()
+                processes[index] = process
+            stop.wait(1)
+
+        for process in processes.values():
+            if process.is_alive():
+                process.terminate()
+        for process in processes.values():
+            process.join()
+        logger.info("Pool de tarefas encerrado")
+
+
+def _isoformat(timestamp: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat() if timestamp else None
+
+
+def serialize_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Estado público da tarefa (sem caminhos locais nem o worker)"""
+    finished_at = job['finished_at']
+    return {
+        'id': job['id'],
+        'type': job['type'],
+        'status': job['status'],
+        'progress': job['progress'],
+        'message': job['message'],
+        'params': job['params'],
+        'attempts': job['attempts'],
+        'max_attempts': job['max_attempts'],
+        'cancel_requested': job['cancel_requested'],
+        'error': job['error'],
+        'result': job['result'],
+        'has_file': bool(job['result_file']),
+        'result_name': job['result_name'],
+        'created_at': _isoformat(job['created_at']),
+        'started_at': _isoformat(job['started_at']),
+        'finished_at': _isoformat(finished_at),
+        'expires_at': _isoformat(finished_at + job_queue.retention) if finished_at else None
+    }
+
+
+# Instância global
+job_queue = JobQueue()
@@ -16,6 +16,8 @@ from urllib.parse import urljoin, urlparse
 import os
 import pickle
 from pathlib import Path
+from app.utils.cache import cached
+from app.utils.cache_warmer import warmable
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -679,3 +681,10 @@ class LinkedInService:
             "followers": "2.500+",
             "industry": "Logística e Transporte"
         }
+
+
+@warmable(order=90)  # Depende de rede: aquecido por último
+@cached(timeout=3600, key_prefix="linkedin_posts")  # Mesmo prazo do cache em arquivo
+def get_linkedin_feed(limit: int = 5) -> List[Dict]:
+    """Feed de posts do LinkedIn com cache compartilhado entre workers"""
+    return LinkedInService().get_linkedin_posts(limit=limit)
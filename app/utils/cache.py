@@ -3,26 +3,153 @@ Sistema de Cache para o Projeto Aduaneiro
 Implementa cache Redis com fallback para memória local
 """
 
+import atexit
+import importlib
 import json
+import math
+import os
+import threading
 import pickle
 import hashlib
-from typing import Any, Optional, Union, Callable
+import random
+import time
+from fnmatch import fnmatchcase
+from typing import Any, Dict, Optional, Union, Callable, Iterable, List
 from functools import wraps
-from datetime import datetime, timedelta
 import redis
-from flask import current_app
+from flask import current_app, g, has_request_context
+from sqlalchemy import exc as sa_exc
+from app.utils.local_cache import LocalCache
+from app.utils.shm_cache import SharedMemoryCache
+from app.utils.cache_invalidation import (
+    InvalidationBus, RedisInvalidationBus, make_origin_id
+)
+from app.utils.single_flight import KeyLocks, RedisLease
+from app.utils.cache_serialization import CacheCodec
+from app.utils.cache_snapshot import SnapshotTombstones, read_snapshot, write_snapshot, snapshot_age
+from app.utils.circuit_breaker import CircuitBreaker, CLOSED
+from app.utils.cache_metrics import (
+    CacheMetrics, key_prefix, TIER_ALL, TIER_BATCH, TIER_NEAR, TIER_REDIS,
+    TIER_MEMORY, TIER_COMPUTE
+)
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Tamanho dos lotes usados em SCAN/DEL no Redis
+SCAN_BATCH_SIZE = 500
+
+# Marcador do envelope usado por get_or_set/cached
+ENTRY_MARKER = '__aduaneiro_entry__'
+
+# Intervalo de espera pelo resultado calculado por outro worker
+LOCK_POLL_INTERVAL = 0.05
+
+# Marca, no lote da requisição, chaves ausentes no cache
+_MISSING = object()
+
+# Estados do envelope de get_or_set: valor normal, resultado vazio/None
+# (cache negativo) e falha da computação (backoff)
+STATUS_OK = 'ok'
+STATUS_EMPTY = 'empty'
+STATUS_ERROR = 'error'
+
+
+# Falhas de infraestrutura (banco, rede, Redis) que entram em backoff; as
+# demais (HTTPException de abort(), erros de programação) são relançadas
+# sem passar pelo cache
+BACKOFF_ERRORS = (
+    ConnectionError, TimeoutError,
+    sa_exc.OperationalError, sa_exc.DisconnectionError, sa_exc.TimeoutError,
+    redis.exceptions.ConnectionError, redis.exceptions.TimeoutError,
+)
+
+
+class CacheBackoffError(Exception):
+    """Falha recente cujo tipo original não pôde ser recriado durante o backoff"""
+
+
+def _error_type(error: Exception) -> str:
+    return f"{type(error).__module__}.{type(error).__qualname__}"
+
+
+def _error_message(error: Exception) -> str:
+    # Erros do SQLAlchemy repetem o SQL na mensagem; guardar só a causa
+    if isinstance(error, sa_exc.DBAPIError) and error.orig is not None:
+        return str(error.orig)
+    return str(error)
+
+
+def _backoff_error(entry: dict) -> Exception:
+    """Recria a falha armazenada com o tipo original (CacheBackoffError se não der)"""
+    message = entry['error']
+    module, _, name = entry.get('error_type', '').rpartition('.')
+    try:
+        cls = getattr(importlib.import_module(module), name)
+        if isinstance(cls, type) and issubclass(cls, BACKOFF_ERRORS):
+            if issubclass(cls, sa_exc.DBAPIError):
+                return cls(None, None, Exception(message))   # (statement, params, orig)
+            return cls(message)
+    except Exception:
+        pass
+    return CacheBackoffError(message)
+
+
+def _is_empty(value: Any) -> bool:
+    """Indica se o resultado deve usar o TTL de cache negativo"""
+    if value is None:
+        return True
+    return isinstance(value, (list, tuple, dict, set, str, bytes)) and not value
+
+def _pattern_glob(pattern: str, prefix: str = "aduaneiro") -> str:
+    """Converte um padrão legado em glob compatível com o MATCH do Redis"""
+    return f"{prefix}:{pattern}*"
+
 class CacheManager:
     """Gerenciador de cache com Redis e fallback para memória local"""
     
-    def __init__(self, app=None):
+    def __init__(self, app=None, invalidation_bus: Optional[InvalidationBus] = None):
         self.redis_client = None
-        self.memory_cache = {}
+        self.memory_cache = LocalCache()
+        self.codec = CacheCodec()
+        self.redis_pool = None
+        self.breaker = CircuitBreaker('redis', probe=self._probe_redis, on_close=self._redis_restored)
+        self.metrics = CacheMetrics()
         self.app = app
         
+        # Near-cache: L1 local de TTL curto na frente do Redis
+        self.near_cache_enabled = False
+        self.near_cache_ttl = 5
+        self.invalidation_bus = invalidation_bus
+        self._origin = make_origin_id()
+        self._subscriber_pid = None
+        
+        # TTL dos conjuntos de tags no Redis (maior que qualquer timeout usual)
+        self.tag_ttl = 86400
+        
+        # Proteção contra stampede
+        self.key_locks = KeyLocks()
+        self.lock_lease = 30
+        self.default_stale_ttl = 0
+        self.early_expiration_beta = 1.0
+        
+        # Cache negativo: resultados vazios/None e falhas com TTL próprio
+        self.negative_ttl = 60
+        self.error_ttl = 10
+        
+        # Snapshot do cache local (aquecimento após reciclagem/deploy)
+        self.snapshot_path = None
+        self.snapshot_prefixes = ()
+        self.snapshot_interval = 300
+        self._snapshot_pid = None
+        self._tombstones = SnapshotTombstones()   # remoções ainda não gravadas no snapshot
+        self.stampede_stats = {
+            'recomputations': 0,
+            'coalesced': 0,
+            'stale_served': 0,
+            'early_refreshes': 0
+        }
+        
         if app:
             self.init_app(app)
     
@@ -36,109 +163,429 @@ class CacheManager:
         redis_db = app.config.get('REDIS_DB', 0)
         redis_password = app.config.get('REDIS_PASSWORD')
         
+        # Codificador binário dos valores armazenados
+        self.codec = CacheCodec(
+            compression=app.config.get('CACHE_COMPRESSION', 'zlib'),
+            threshold=app.config.get('CACHE_COMPRESSION_THRESHOLD', 1024)
+        )
+        
+        # Cache local: por processo ou compartilhado entre workers (/dev/shm)
+        self.memory_cache = self._create_memory_cache(app)
+        
+        # Métricas por prefixo e camada, agregadas entre workers no Redis
+        self.metrics = CacheMetrics(
+            enabled=app.config.get('CACHE_METRICS_ENABLED', True),
+            flush_interval=app.config.get('CACHE_METRICS_FLUSH_INTERVAL', 10)
+        )
+        
+        # Circuit breaker: após N falhas o tráfego vai direto ao cache local
+        # e uma sonda em segundo plano restaura o Redis quando ele voltar
+        self.breaker = CircuitBreaker(
+            'redis',
+            failure_threshold=app.config.get('CACHE_BREAKER_FAILURE_THRESHOLD', 3),
+            reset_timeout=app.config.get('CACHE_BREAKER_RESET_TIMEOUT', 10),
+            max_reset_timeout=app.config.get('CACHE_BREAKER_MAX_RESET_TIMEOUT', 300),
+            probe=self._probe_redis,
+            on_close=self._redis_restored
+        )
+        
+        # Pool de conexões explícito, compartilhado pelas threads do worker
+        self.redis_pool = redis.ConnectionPool(
+            host=redis_host,
+            port=redis_port,
+            db=redis_db,
+            password=redis_password,
+            max_connections=app.config.get('REDIS_POOL_MAX_CONNECTIONS', 10),
+            socket_connect_timeout=app.config.get('REDIS_CONNECT_TIMEOUT', 0.5),
+            socket_timeout=app.config.get('REDIS_SOCKET_TIMEOUT', 0.5),
+            health_check_interval=app.config.get('REDIS_HEALTH_CHECK_INTERVAL', 30)
+        )
+        # Valores binários (CacheCodec), sem decode_responses
+        self.redis_client = redis.Redis(connection_pool=self.redis_pool)
+        
         try:
-            # Tentar conectar ao Redis
-            self.redis_client = redis.Redis(
-                host=redis_host,
-                port=redis_port,
-                db=redis_db,
-                password=redis_password,
-                decode_responses=True,
-                socket_connect_timeout=5,
-                socket_timeout=5
-            )
             # Testar conexão
             self.redis_client.ping()
             logger.info("Cache Redis conectado com sucesso")
         except Exception as e:
             logger.warning(f"Redis não disponível, usando cache em memória: {e}")
-            self.redis_client = None
+            self.breaker.trip()
+        
+        # Configurar near-cache e barramento de invalidação
+        self.near_cache_enabled = app.config.get('CACHE_NEAR_ENABLED', False)
+        self.near_cache_ttl = app.config.get('CACHE_NEAR_TTL', 5)
+        self.tag_ttl = app.config.get('CACHE_TAG_TTL', 86400)
+        self.lock_lease = app.config.get('CACHE_LOCK_LEASE', 30)
+        self.default_stale_ttl = app.config.get('CACHE_STALE_TTL', 0)
+        self.early_expiration_beta = app.config.get('CACHE_EARLY_EXPIRATION_BETA', 1.0)
+        self.negative_ttl = app.config.get('CACHE_NEGATIVE_TTL', 60)
+        self.error_ttl = app.config.get('CACHE_ERROR_TTL', 10)
+        if self.near_cache_enabled and self.invalidation_bus is None and self.redis_client:
+            self.invalidation_bus = RedisInvalidationBus(
+                self.redis_client,
+                channel=app.config.get('CACHE_INVALIDATION_CHANNEL', 'aduaneiro:invalidate')
+            )
+        
+        # Snapshot: carregar antes de atender requisições e gravar
+        # periodicamente e no encerramento do processo
+        if app.config.get('CACHE_SNAPSHOT_ENABLED', False):
+            self.snapshot_path = app.config.get('CACHE_SNAPSHOT_PATH', 'instance/cache_snapshot.bin')
+            self.snapshot_prefixes = tuple(app.config.get('CACHE_SNAPSHOT_PREFIXES', ()))
+            self.snapshot_interval = app.config.get('CACHE_SNAPSHOT_INTERVAL', 300)
+            self.load_snapshot()
+            atexit.register(self._save_snapshot_on_exit)
+    
+    def _create_memory_cache(self, app):
+        """Cria o cache local conforme CACHE_MEMORY_BACKEND (local ou shm)"""
+        backend = app.config.get('CACHE_MEMORY_BACKEND', 'local')
+        if backend == 'shm':
+            try:
+                return SharedMemoryCache(
+                    path=app.config.get('CACHE_SHM_PATH'),
+                    slots=app.config.get('CACHE_SHM_SLOTS', 2048),
+                    slot_size=app.config.get('CACHE_SHM_SLOT_SIZE', 32768),
+                    ways=app.config.get('CACHE_SHM_WAYS', 4),
+                    codec=self.codec
+                )
+            except (OSError, RuntimeError, ValueError) as e:
+                logger.warning(f"Cache compartilhado indisponível, usando cache local: {e}")
+        elif backend != 'local':
+            logger.warning(f"CACHE_MEMORY_BACKEND inválido: {backend}, usando cache local")
+        
+        return LocalCache(
+            max_entries=app.config.get('CACHE_MEMORY_MAX_ENTRIES', 10000),
+            max_bytes=app.config.get('CACHE_MEMORY_MAX_BYTES', 64 * 1024 * 1024),
+            policy=app.config.get('CACHE_MEMORY_POLICY', 'lru'),
+            sweep_interval=app.config.get('CACHE_MEMORY_SWEEP_INTERVAL', 60)
+        )
+    
+    def _snapshot_match(self, cache_key: str) -> bool:
+        """Indica se a chave pertence a um dos prefixos do snapshot"""
+        return any(
+            cache_key.startswith(self._generate_key(f"{prefix}:"))
+            for prefix in self.snapshot_prefixes
+        )
+    
+    def _restorable(self, value: Any, expires: Optional[float], now: float) -> bool:
+        """Entradas expiradas, obsoletas ou em backoff de erro não são restauradas"""
+        if expires is not None and expires <= now:
+            return False
+        if isinstance(value, dict) and value.get(ENTRY_MARKER):
+            return value.get('status') != STATUS_ERROR and value['fresh_until'] > now
+        return True
+    
+    def save_snapshot(self) -> int:
+        """Grava no arquivo as entradas do cache local dos prefixos selecionados"""
+        if not self.snapshot_path or not self.snapshot_prefixes:
+            return 0
+        
+        now = time.time()
+        removed = self._tombstones.take()
+        entries = [
+            entry for entry in self.memory_cache.export_entries(self._snapshot_match)
+            if self._restorable(entry[1], entry[2], now)
+        ]
+        try:
+            count = write_snapshot(self.snapshot_path, entries, self.codec, discard=removed.matches)
+        except Exception as e:
+            self._tombstones.restore(removed)
+            logger.warning(f"Erro ao gravar snapshot do cache: {e}")
+            return 0
+        logger.debug(f"Snapshot do cache gravado: {count} entradas em {self.snapshot_path}")
+        return count
+    
+    def load_snapshot(self) -> int:
+        """Carrega o snapshot no cache local preservando o TTL restante
+        
+        Com o Redis disponível o snapshot é ignorado: o Redis já sobrevive
+        à reciclagem dos workers e é a fonte dos valores atuais.
+        """
+        if not self.snapshot_path or self._redis_ready():
+            return 0
+        
+        now = time.time()
+        loaded = 0
+        try:
+            for key, value, expires, tags in read_snapshot(self.snapshot_path, self.codec, now):
+                if not self._snapshot_match(key) or not self._restorable(value, expires, now):
+                    continue
+                timeout = expires - now if expires is not None else None
+                if self.memory_cache.set(key, value, timeout, tags=tags):
+                    loaded += 1
+        except Exception as e:
+            logger.warning(f"Erro ao carregar snapshot do cache: {e}")
+        
+        if loaded:
+            logger.info(f"Cache aquecido com {loaded} entradas do snapshot")
+        return loaded
+    
+    def _ensure_snapshot_thread(self):
+        """Inicia a gravação periódica do snapshot (uma thread por worker)"""
+        if not self.snapshot_path or self._snapshot_pid == os.getpid():
+            return
+        self._snapshot_pid = os.getpid()
+        threading.Thread(target=self._snapshot_loop, name='cache-snapshot', daemon=True).start()
+    
+    def _snapshot_loop(self):
+        pid = os.getpid()
+        while self._snapshot_pid == pid:
+            time.sleep(self.snapshot_interval)
+            self.save_snapshot()
+    
+    def _save_snapshot_on_exit(self):
+        """Grava o snapshot ao encerrar, apenas nos processos que usaram o cache"""
+        if self._snapshot_pid == os.getpid():
+            self.save_snapshot()
+    
+    def _probe_redis(self):
+        """Sonda usada pelo circuit breaker no estado half-open"""
+        self.redis_client.ping()
+    
+    def _redis_restored(self):
+        """Circuito fechado: descarta o L1
+        
+        Com o circuito aberto as escritas ficaram só na memória local, com
+        o TTL completo, e as invalidações dos outros workers não chegaram;
+        o L1 passaria à frente do Redis como near-cache até expirar.
+        """
+        self.memory_cache.clear()
+    
+    def _redis_ready(self) -> bool:
+        """Indica se o Redis está configurado e com o circuito fechado"""
+        return self.redis_client is not None and self.breaker.allow_request()
+    
+    def _redis_failed(self, message: str, error: Exception):
+        """Registra uma falha do Redis no log e no circuit breaker"""
+        logger.warning(f"{message}: {error}")
+        self.breaker.record_failure()
+    
+    def _ensure_subscriber(self):
+        """Inscreve o worker atual no barramento de invalidação
+        
+        A inscrição é feita de forma preguiçosa por PID porque, com
+        preload_app, threads criadas no master não sobrevivem ao fork.
+        """
+        if not self.invalidation_bus or self._subscriber_pid == os.getpid():
+            return
+        
+        if self._subscriber_pid is not None:
+            # Processo filho: descartar L1 herdado do master (o segmento
+            # compartilhado pertence a todos os workers e é mantido)
+            self._origin = make_origin_id()
+            if not self.memory_cache.shared:
+                self.memory_cache.clear()
+        
+        self._subscriber_pid = os.getpid()
+        try:
+            self.invalidation_bus.subscribe(self._handle_invalidation)
+        except Exception as e:
+            # Tentar novamente na próxima operação com o Redis disponível
+            self._subscriber_pid = None
+            self._redis_failed("Erro ao inscrever no canal de invalidação", e)
+    
+    def _handle_invalidation(self, message: dict):
+        """Aplica no L1 uma invalidação recebida de outro worker"""
+        if message.get('origin') == self._origin:
+            return
+        
+        if message.get('all'):
+            self.memory_cache.clear()
+            self._forget(clear_all=True)
+            return
+        
+        for cache_key in message.get('keys', []):
+            self.memory_cache.delete(cache_key)
+        self._forget(keys=message.get('keys', ()), tags=message.get('tags') or ())
+        
+        if message.get('tags'):
+            self.memory_cache.invalidate_tags(message['tags'])
+        
+        pattern = message.get('pattern')
+        if pattern:
+            self._invalidate_local_pattern(pattern)
+    
+    def _forget(self, keys: Iterable[str] = (), tags: Iterable[str] = (),
+                glob: Optional[str] = None, clear_all: bool = False):
+        """Registra remoções para que o snapshot não as traga de volta"""
+        if self.snapshot_path:
+            self._tombstones.add(keys, tags, glob, clear_all)
+    
+    def publish_invalidation(self, keys=None, pattern: str = None, tags=None,
+                             clear_all: bool = False):
+        """Publica uma invalidação para o L1 dos demais workers"""
+        if not self.near_cache_enabled or not self.invalidation_bus or not self._redis_ready():
+            return
+        
+        self._ensure_subscriber()
+        message = {'origin': self._origin}
+        if clear_all:
+            message['all'] = True
+        if keys:
+            message['keys'] = list(keys)
+        if tags:
+            message['tags'] = list(tags)
+        if pattern:
+            message['pattern'] = pattern
+        self.invalidation_bus.publish(message)
     
     def _generate_key(self, key: str, prefix: str = "aduaneiro") -> str:
         """Gera uma chave única para o cache"""
         return f"{prefix}:{key}"
     
-    def _serialize(self, data: Any) -> str:
+    def _tag_key(self, tag: str) -> str:
+        """Gera a chave do conjunto Redis que guarda os membros de uma tag"""
+        return self._generate_key(f"tag:{tag}")
+    
+    def _serialize(self, data: Any, prefix: Optional[str] = None) -> bytes:
         """Serializa dados para armazenamento"""
-        try:
-            return json.dumps(data, default=str)
-        except (TypeError, ValueError):
-            # Fallback para pickle se JSON falhar
-            return pickle.dumps(data).hex()
+        start = time.perf_counter()
+        serialized = self.codec.dumps(data)
+        if prefix is not None:
+            self.metrics.incr(prefix, TIER_ALL, 'serialize_seconds', time.perf_counter() - start)
+        return serialized
     
-    def _deserialize(self, data: str) -> Any:
+    def _deserialize(self, data: bytes, prefix: Optional[str] = None,
+                     tier: str = TIER_REDIS) -> Any:
         """Deserializa dados do cache"""
+        start = time.perf_counter()
+        value = self.codec.loads(data)
+        if prefix is not None:
+            self.metrics.incr(prefix, tier, 'deserialize_seconds', time.perf_counter() - start)
+        return value
+    
+    def _record_write(self, prefix: str, tier: str, size: int):
+        """Registra uma escrita e o volume gravado na camada"""
+        self.metrics.incr(prefix, tier, 'sets')
+        self.metrics.incr(prefix, tier, 'bytes_written', size)
+    
+    def _maybe_flush_metrics(self):
+        """Envia periodicamente as métricas deste worker ao Redis"""
+        if not self.metrics.flush_due() or not self._redis_ready():
+            return
         try:
-            return json.loads(data)
-        except (TypeError, ValueError, json.JSONDecodeError):
-            try:
-                # Tentar deserializar com pickle
-                return pickle.loads(bytes.fromhex(data))
-            except Exception:
-                return data
+            self.metrics.flush(self.redis_client)
+        except Exception as e:
+            self._redis_failed("Erro ao enviar métricas do cache", e)
     
     def get(self, key: str, default: Any = None) -> Any:
         """Recupera dados do cache"""
         cache_key = self._generate_key(key)
+        prefix = key_prefix(key)
+        start = time.perf_counter()
+        value = self._lookup(cache_key, prefix)
+        self.metrics.lookup(prefix, TIER_ALL, value is not None, time.perf_counter() - start)
+        self._maybe_flush_metrics()
+        return default if value is None else value
+    
+    def _lookup(self, cache_key: str, prefix: str) -> Any:
+        """Percorre as camadas do cache registrando métricas de cada uma"""
+        # Valor pré-carregado no lote da requisição (ver prefetch)
+        batched = self._batch_pop(cache_key)
+        if batched is not None:
+            self.metrics.lookup(prefix, TIER_BATCH, batched is not _MISSING)
+            return None if batched is _MISSING else batched
+        
+        # Near-cache: consultar o L1 antes do Redis
+        if self.near_cache_enabled and self._redis_ready():
+            self._ensure_subscriber()
+            start = time.perf_counter()
+            value = self.memory_cache.get(cache_key)
+            self.metrics.lookup(prefix, TIER_NEAR, value is not None, time.perf_counter() - start)
+            if value is not None:
+                return value
         
         # Tentar Redis primeiro
-        if self.redis_client:
+        if self._redis_ready():
             try:
+                start = time.perf_counter()
                 data = self.redis_client.get(cache_key)
+                self.breaker.record_success()
+                self.metrics.lookup(prefix, TIER_REDIS, bool(data), time.perf_counter() - start)
                 if data:
-                    return self._deserialize(data)
+                    value = self._deserialize(data, prefix, TIER_REDIS)
+                    if self.near_cache_enabled:
+                        self.memory_cache.set(cache_key, value, self.near_cache_ttl,
+                                              size=len(cache_key) + len(data))
+                    return value
             except Exception as e:
-                logger.warning(f"Erro ao recuperar do Redis: {e}")
+                self._redis_failed("Erro ao recuperar do Redis", e)
         
         # Fallback para memória local
-        return self.memory_cache.get(cache_key, default)
+        start = time.perf_counter()
+        value = self.memory_cache.get(cache_key)
+        self.metrics.lookup(prefix, TIER_MEMORY, value is not None, time.perf_counter() - start)
+        return value
     
-    def set(self, key: str, value: Any, timeout: int = 3600) -> bool:
-        """Armazena dados no cache"""
+    def set(self, key: str, value: Any, timeout: int = 3600,
+            tags: Optional[Iterable[str]] = None) -> bool:
+        """Armazena dados no cache, opcionalmente associados a tags"""
         cache_key = self._generate_key(key)
-        serialized_data = self._serialize(value)
+        prefix = key_prefix(key)
+        serialized_data = self._serialize(value, prefix)
+        tags = tuple(tags) if tags else ()
+        self._batch_discard([cache_key])
+        self._ensure_snapshot_thread()
         
         # Tentar Redis primeiro
-        if self.redis_client:
+        if self._redis_ready():
             try:
-                self.redis_client.setex(cache_key, timeout, serialized_data)
+                if tags:
+                    pipe = self.redis_client.pipeline(transaction=False)
+                    pipe.setex(cache_key, timeout, serialized_data)
+                    for tag in tags:
+                        tag_key = self._tag_key(tag)
+                        pipe.sadd(tag_key, cache_key)
+                        pipe.expire(tag_key, max(timeout, self.tag_ttl))
+                    pipe.execute()
+                else:
+                    self.redis_client.setex(cache_key, timeout, serialized_data)
+                self.breaker.record_success()
+                self._record_write(prefix, TIER_REDIS, len(serialized_data))
+                if self.near_cache_enabled:
+                    self.memory_cache.set(cache_key, value, min(timeout, self.near_cache_ttl),
+                                          tags=tags, size=len(cache_key) + len(serialized_data))
+                    self.publish_invalidation(keys=[cache_key])
                 return True
             except Exception as e:
-                logger.warning(f"Erro ao armazenar no Redis: {e}")
+                self._redis_failed("Erro ao armazenar no Redis", e)
         
         # Fallback para memória local
-        self.memory_cache[cache_key] = {
-            'value': value,
-            'expires': datetime.now() + timedelta(seconds=timeout)
-        }
-        return True
+        self._record_write(prefix, TIER_MEMORY, len(serialized_data))
+        return self.memory_cache.set(cache_key, value, timeout, tags=tags,
+                                     size=len(cache_key) + len(serialized_data))
     
     def delete(self, key: str) -> bool:
         """Remove dados do cache"""
         cache_key = self._generate_key(key)
+        self._batch_discard([cache_key])
         
         # Tentar Redis primeiro
-        if self.redis_client:
+        if self._redis_ready():
             try:
                 self.redis_client.delete(cache_key)
             except Exception as e:
-                logger.warning(f"Erro ao deletar do Redis: {e}")
+                self._redis_failed("Erro ao deletar do Redis", e)
         
         # Fallback para memória local
-        self.memory_cache.pop(cache_key, None)
+        self.memory_cache.delete(cache_key)
+        self._forget(keys=[cache_key])
+        self.publish_invalidation(keys=[cache_key])
         return True
     
     def clear(self) -> bool:
         """Limpa todo o cache"""
+        self._batch_discard()
         # Tentar Redis primeiro
-        if self.redis_client:
+        if self._redis_ready():
             try:
                 self.redis_client.flushdb()
             except Exception as e:
-                logger.warning(f"Erro ao limpar Redis: {e}")
+                self._redis_failed("Erro ao limpar Redis", e)
         
         # Fallback para memória local
         self.memory_cache.clear()
+        self._forget(clear_all=True)
+        self.publish_invalidation(clear_all=True)
         return True
     
     def exists(self, key: str) -> bool:
@@ -146,32 +593,466 @@ class CacheManager:
         cache_key = self._generate_key(key)
         
         # Tentar Redis primeiro
-        if self.redis_client:
+        if self._redis_ready():
             try:
                 return bool(self.redis_client.exists(cache_key))
             except Exception as e:
-                logger.warning(f"Erro ao verificar existência no Redis: {e}")
+                self._redis_failed("Erro ao verificar existência no Redis", e)
         
         # Fallback para memória local
-        if cache_key in self.memory_cache:
-            item = self.memory_cache[cache_key]
-            if item['expires'] > datetime.now():
+        return cache_key in self.memory_cache
+    
+    def metrics_snapshot(self) -> Dict[str, Any]:
+        """Métricas por prefixo e camada, agregadas entre workers se houver Redis"""
+        if not self._redis_ready():
+            return self.metrics.snapshot()
+        try:
+            self.metrics.flush(self.redis_client)
+        except Exception as e:
+            self._redis_failed("Erro ao enviar métricas do cache", e)
+            return self.metrics.snapshot()
+        return self.metrics.snapshot(self.redis_client)
+    
+    def reset_metrics(self):
+        """Zera as métricas locais e as agregadas no Redis"""
+        redis_client = None
+        if self._redis_ready():
+            redis_client = self.redis_client
+        try:
+            self.metrics.reset(redis_client)
+        except Exception as e:
+            self._redis_failed("Erro ao zerar métricas do cache", e)
+    
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """Recupera várias chaves com uma única ida ao Redis (MGET)
+        
+        Retorna apenas as chaves encontradas, mapeadas pela chave original.
+        """
+        pending = {self._generate_key(key): key for key in dict.fromkeys(keys)}
+        found = {}
+        
+        for cache_key in list(pending):
+            batched = self._batch_pop(cache_key)
+            if batched is None:
+                continue
+            self.metrics.lookup(key_prefix(pending[cache_key]), TIER_BATCH,
+                                batched is not _MISSING)
+            if batched is not _MISSING:
+                found[pending[cache_key]] = batched
+            del pending[cache_key]
+        
+        # Near-cache: consultar o L1 antes do Redis
+        if pending and self.near_cache_enabled and self._redis_ready():
+            self._ensure_subscriber()
+            for cache_key in list(pending):
+                value = self.memory_cache.get(cache_key)
+                self.metrics.lookup(key_prefix(pending[cache_key]), TIER_NEAR, value is not None)
+                if value is not None:
+                    found[pending.pop(cache_key)] = value
+        
+        if pending and self._redis_ready():
+            try:
+                cache_keys = list(pending)
+                values = self.redis_client.mget(cache_keys)
+                self.breaker.record_success()
+                for cache_key, data in zip(cache_keys, values):
+                    prefix = key_prefix(pending[cache_key])
+                    self.metrics.lookup(prefix, TIER_REDIS, bool(data))
+                    if not data:
+                        continue
+                    value = self._deserialize(data, prefix, TIER_REDIS)
+                    if self.near_cache_enabled:
+                        self.memory_cache.set(cache_key, value, self.near_cache_ttl,
+                                              size=len(cache_key) + len(data))
+                    found[pending.pop(cache_key)] = value
+            except Exception as e:
+                self._redis_failed("Erro ao recuperar lote do Redis", e)
+        
+        # Fallback para memória local
+        for cache_key, key in pending.items():
+            value = self.memory_cache.get(cache_key)
+            self.metrics.lookup(key_prefix(key), TIER_MEMORY, value is not None)
+            if value is not None:
+                found[key] = value
+        
+        for key in dict.fromkeys(keys):
+            self.metrics.lookup(key_prefix(key), TIER_ALL, key in found)
+        self._maybe_flush_metrics()
+        return found
+    
+    def set_many(self, mapping: Dict[str, Any], timeout: int = 3600,
+                 tags: Optional[Iterable[str]] = None) -> bool:
+        """Armazena várias chaves com um único pipeline no Redis"""
+        if not mapping:
+            return True
+        
+        entries = []
+        for key, value in mapping.items():
+            prefix = key_prefix(key)
+            entries.append((self._generate_key(key), value, self._serialize(value, prefix), prefix))
+        tags = tuple(tags) if tags else ()
+        cache_keys = [entry[0] for entry in entries]
+        self._batch_discard(cache_keys)
+        
+        # Tentar Redis primeiro
+        if self._redis_ready():
+            try:
+                pipe = self.redis_client.pipeline(transaction=False)
+                for cache_key, _, serialized_data, _ in entries:
+                    pipe.setex(cache_key, timeout, serialized_data)
+                for tag in tags:
+                    tag_key = self._tag_key(tag)
+                    pipe.sadd(tag_key, *cache_keys)
+                    pipe.expire(tag_key, max(timeout, self.tag_ttl))
+                pipe.execute()
+                self.breaker.record_success()
+                for _, _, serialized_data, prefix in entries:
+                    self._record_write(prefix, TIER_REDIS, len(serialized_data))
+                if self.near_cache_enabled:
+                    for cache_key, value, serialized_data, _ in entries:
+                        self.memory_cache.set(cache_key, value, min(timeout, self.near_cache_ttl),
+                                              tags=tags, size=len(cache_key) + len(serialized_data))
+                    self.publish_invalidation(keys=cache_keys)
                 return True
-            else:
-                del self.memory_cache[cache_key]
+            except Exception as e:
+                self._redis_failed("Erro ao armazenar lote no Redis", e)
+        
+        # Fallback para memória local
+        for cache_key, value, serialized_data, prefix in entries:
+            self._record_write(prefix, TIER_MEMORY, len(serialized_data))
+            self.memory_cache.set(cache_key, value, timeout, tags=tags,
+                                  size=len(cache_key) + len(serialized_data))
+        return True
+    
+    def delete_many(self, keys: Iterable[str]) -> int:
+        """Remove várias chaves com um único DEL no Redis"""
+        cache_keys = [self._generate_key(key) for key in dict.fromkeys(keys)]
+        if not cache_keys:
+            return 0
+        self._batch_discard(cache_keys)
+        removed = None
+        
+        # Tentar Redis primeiro
+        if self._redis_ready():
+            try:
+                removed = self.redis_client.delete(*cache_keys)
+            except Exception as e:
+                self._redis_failed("Erro ao deletar lote do Redis", e)
+        
+        # Fallback para memória local
+        local_removed = sum(1 for cache_key in cache_keys if self.memory_cache.delete(cache_key))
+        self._forget(keys=cache_keys)
+        self.publish_invalidation(keys=cache_keys)
+        return local_removed if removed is None else removed
+    
+    def prefetch(self, keys: Iterable[str]) -> int:
+        """Pré-carrega chaves no lote da requisição atual
+        
+        As próximas leituras dessas chaves na mesma requisição (inclusive
+        via @cached) são atendidas pelo lote, sem nova ida ao Redis. Cada
+        valor é consumido uma única vez. Retorna o número de acertos.
+        """
+        if not has_request_context():
+            return 0
+        
+        keys = list(dict.fromkeys(keys))
+        # Descartar valores antigos do lote para buscar a versão atual
+        self._batch_discard([self._generate_key(key) for key in keys])
+        found = self.get_many(keys)
+        
+        batch = g.setdefault('_cache_batch', {})
+        for key in keys:
+            batch[self._generate_key(key)] = found.get(key, _MISSING)
+        return len(found)
+    
+    def _batch_pop(self, cache_key: str) -> Any:
+        """Consome um valor do lote da requisição (None se não houver)"""
+        if not has_request_context():
+            return None
+        batch = g.get('_cache_batch')
+        if not batch:
+            return None
+        return batch.pop(cache_key, None)
+    
+    def _batch_discard(self, cache_keys: Optional[Iterable[str]] = None):
+        """Remove chaves (ou todo o lote) da requisição após escritas"""
+        if not has_request_context():
+            return
+        batch = g.get('_cache_batch')
+        if not batch:
+            return
+        if cache_keys is None:
+            batch.clear()
+            return
+        for cache_key in cache_keys:
+            batch.pop(cache_key, None)
+    
+    def invalidate_tags(self, *tags: str) -> int:
+        """Invalida todas as chaves associadas às tags
+        
+        O custo é proporcional ao número de chaves das tags, tanto no Redis
+        quanto no cache local, sem varrer o keyspace.
+        """
+        if not tags:
+            return 0
+        
+        removed = set()
+        self._batch_discard()
+        
+        if self._redis_ready():
+            try:
+                tag_keys = [self._tag_key(tag) for tag in tags]
+                pipe = self.redis_client.pipeline(transaction=False)
+                for tag_key in tag_keys:
+                    pipe.smembers(tag_key)
+                members = pipe.execute()
+                
+                pipe = self.redis_client.pipeline(transaction=False)
+                for tag_key, tag_members in zip(tag_keys, members):
+                    if tag_members:
+                        pipe.delete(*tag_members)
+                        # SREM em vez de DEL preserva membros adicionados
+                        # entre a leitura e a remoção
+                        pipe.srem(tag_key, *tag_members)
+                        removed.update(
+                            m.decode() if isinstance(m, bytes) else m for m in tag_members
+                        )
+                pipe.execute()
+            except Exception as e:
+                self._redis_failed("Erro ao invalidar tags no Redis", e)
+        
+        removed.update(self.memory_cache.invalidate_tags(tags))
+        self._forget(keys=removed, tags=tags)
+        
+        # O L1 dos demais workers não conhece as tags das chaves lidas do
+        # Redis, por isso as chaves removidas também são propagadas
+        self.publish_invalidation(keys=removed, tags=tags)
+        
+        if removed:
+            logger.info(f"Cache invalidado para tags {', '.join(tags)}: {len(removed)} chaves")
+        return len(removed)
+    
+    def invalidate_pattern(self, pattern: str) -> int:
+        """Invalida chaves por padrão legado usando SCAN com cursor"""
+        glob = _pattern_glob(pattern)
+        removed = 0
+        self._batch_discard()
+        
+        if self._redis_ready():
+            try:
+                batch = []
+                for key in self.redis_client.scan_iter(match=glob, count=SCAN_BATCH_SIZE):
+                    batch.append(key)
+                    if len(batch) >= SCAN_BATCH_SIZE:
+                        removed += self.redis_client.delete(*batch)
+                        batch = []
+                if batch:
+                    removed += self.redis_client.delete(*batch)
+            except Exception as e:
+                self._redis_failed("Erro ao invalidar cache", e)
+        
+        removed += self._invalidate_local_pattern(pattern)
+        
+        # Propagar para o L1 dos demais workers
+        self.publish_invalidation(pattern=pattern)
+        
+        if removed:
+            logger.info(f"Cache invalidado para padrão: {pattern}")
+        return removed
+    
+    def _invalidate_local_pattern(self, pattern: str) -> int:
+        """Remove do cache local as chaves que casam com o padrão"""
+        glob = _pattern_glob(pattern)
+        self._forget(glob=glob)
+        keys_to_remove = [k for k in self.memory_cache.keys() if fnmatchcase(k, glob)]
+        for key in keys_to_remove:
+            self.memory_cache.delete(key)
+        return len(keys_to_remove)
+    
+    def _read_entry(self, key: str) -> Optional[dict]:
+        """Lê um envelope de get_or_set; valores legados são tratados como frescos"""
+        data = self.get(key)
+        if data is None:
+            return None
+        if isinstance(data, dict) and data.get(ENTRY_MARKER):
+            return data
+        return {ENTRY_MARKER: 1, 'value': data, 'fresh_until': float('inf'), 'delta': 0}
+    
+    def _write_entry(self, key: str, value: Any, timeout: int, stale_ttl: int,
+                     delta: float, tags: Optional[Iterable[str]] = None,
+                     status: str = STATUS_OK, error: Optional[Exception] = None) -> bool:
+        """Armazena o envelope mantendo a cópia obsoleta por `stale_ttl` segundos
+        
+        O envelope é o sentinela que distingue "chave ausente" de um
+        resultado None/vazio ou de uma falha armazenados de propósito.
+        """
+        entry = {
+            ENTRY_MARKER: 1,
+            'value': value,
+            'fresh_until': time.time() + timeout,
+            'delta': delta
+        }
+        if status != STATUS_OK:
+            entry['status'] = status
+        if error is not None:
+            entry['error'] = _error_message(error)
+            entry['error_type'] = _error_type(error)
+        return self.set(key, entry, timeout + stale_ttl, tags=tags)
+    
+    def _entry_value(self, entry: dict) -> Any:
+        """Valor do envelope; falhas sem fallback são relançadas durante o backoff"""
+        if entry.get('status') == STATUS_ERROR and 'error' in entry:
+            raise _backoff_error(entry)
+        return entry['value']
+    
+    def _handle_failure(self, key: str, error: Exception, entry: Optional[dict],
+                        fallback: Optional[Callable], tags: Optional[Iterable[str]],
+                        error_ttl: int) -> Any:
+        """Registra a falha da computação com um TTL curto de backoff
+        
+        Durante o backoff os chamadores recebem o último valor válido (se
+        houver), o resultado de `fallback` ou a falha com o mesmo tipo, sem
+        repetir a computação a cada chamada. Só para BACKOFF_ERRORS.
+        """
+        prefix = key_prefix(key)
+        self.metrics.incr(prefix, TIER_COMPUTE, 'errors')
+        logger.error(f"Erro ao computar valor do cache {key}: {error}")
         
-        return False
+        if entry is not None and entry.get('status', STATUS_OK) != STATUS_ERROR:
+            if entry['fresh_until'] > time.time():
+                # Renovação antecipada falhou; a entrada ainda é válida
+                return entry['value']
+            # Reaproveitar o valor obsoleto durante o backoff
+            self.stampede_stats['stale_served'] += 1
+            self._write_entry(key, entry['value'], error_ttl, 0, entry['delta'],
+                              tags=tags, status=entry.get('status', STATUS_OK))
+            return entry['value']
+        
+        if fallback is not None:
+            value = fallback()
+            self._write_entry(key, value, error_ttl, 0, 0, tags=tags, status=STATUS_ERROR)
+            return value
+        
+        self._write_entry(key, None, error_ttl, 0, 0, tags=tags,
+                          status=STATUS_ERROR, error=error)
+        raise error
     
-    def get_or_set(self, key: str, func: Callable, timeout: int = 3600) -> Any:
-        """Recupera do cache ou executa função e armazena resultado"""
-        cached_value = self.get(key)
-        if cached_value is not None:
-            return cached_value
+    def _should_refresh_early(self, entry: dict, now: float, beta: float) -> bool:
+        """Expiração antecipada probabilística (XFetch)
         
-        # Executar função e armazenar resultado
-        result = func()
-        self.set(key, result, timeout)
-        return result
+        Quanto mais próxima a expiração e mais cara a recomputação, maior a
+        chance de um único chamador renovar a entrada antes que ela expire.
+        """
+        if beta <= 0 or not entry['delta']:
+            return False
+        gap = -entry['delta'] * beta * math.log(1.0 - random.random())
+        return now + gap >= entry['fresh_until']
+    
+    def _wait_for_entry(self, key: str, deadline: float) -> Optional[dict]:
+        """Aguarda o resultado calculado por outro worker até o prazo"""
+        while time.time() < deadline:
+            time.sleep(LOCK_POLL_INTERVAL)
+            entry = self._read_entry(key)
+            if entry is not None and entry['fresh_until'] > time.time():
+                return entry
+        return None
+    
+    def get_or_set(self, key: str, func: Callable, timeout: int = 3600,
+                   tags: Optional[Iterable[str]] = None, stale_ttl: Optional[int] = None,
+                   early_expiration: Optional[float] = None,
+                   negative_ttl: Optional[int] = None, error_ttl: Optional[int] = None,
+                   fallback: Optional[Callable] = None,
+                   should_cache: Optional[Callable[[Any], bool]] = None) -> Any:
+        """Recupera do cache ou executa função e armazena resultado
+        
+        Apenas um chamador recomputa cada chave por vez: uma trava por chave
+        no processo coordena as threads e uma trava com lease no Redis
+        coordena os workers. Durante a janela `stale_ttl` os demais
+        chamadores recebem o valor obsoleto enquanto um deles o renova.
+        
+        Resultados None ou vazios são armazenados por `negative_ttl`
+        segundos. Falhas de infraestrutura (BACKOFF_ERRORS) são armazenadas
+        por `error_ttl` segundos (backoff) e atendidas com o valor obsoleto,
+        com `fallback()` ou relançadas; as demais exceções (ex.: abort(404))
+        são relançadas sem cache.
+        `should_cache` permite descartar resultados que não devem ser
+        armazenados (ex.: respostas HTTP de erro).
+        """
+        stale_ttl = self.default_stale_ttl if stale_ttl is None else stale_ttl
+        beta = self.early_expiration_beta if early_expiration is None else early_expiration
+        negative_ttl = self.negative_ttl if negative_ttl is None else negative_ttl
+        error_ttl = self.error_ttl if error_ttl is None else error_ttl
+        
+        now = time.time()
+        entry = self._read_entry(key)
+        if entry is not None and entry['fresh_until'] > now:
+            if not self._should_refresh_early(entry, now, beta):
+                return self._entry_value(entry)
+            self.stampede_stats['early_refreshes'] += 1
+        
+        key_lock = self.key_locks.get(key)
+        held = key_lock.lock.acquire(blocking=False)
+        if not held:
+            if entry is not None:
+                # Há valor para servir enquanto outra thread renova
+                self.stampede_stats['stale_served'] += 1
+                return self._entry_value(entry)
+            
+            held = key_lock.lock.acquire(timeout=self.lock_lease)
+            entry = self._read_entry(key)
+            if entry is not None and entry['fresh_until'] > time.time():
+                self.stampede_stats['coalesced'] += 1
+                if held:
+                    key_lock.lock.release()
+                return self._entry_value(entry)
+        
+        lease = None
+        try:
+            if self._redis_ready():
+                try:
+                    lease = RedisLease(self.redis_client, self._generate_key(f"lock:{key}"),
+                                       self.lock_lease)
+                    if not lease.acquire():
+                        lease = None
+                        if entry is not None:
+                            self.stampede_stats['stale_served'] += 1
+                            return self._entry_value(entry)
+                        
+                        fresh = self._wait_for_entry(key, time.time() + self.lock_lease)
+                        if fresh is not None:
+                            self.stampede_stats['coalesced'] += 1
+                            return self._entry_value(fresh)
+                except Exception as e:
+                    lease = None
+                    self._redis_failed("Erro na trava distribuída do cache", e)
+            
+            # Executar função e armazenar resultado
+            start = time.time()
+            try:
+                result = func()
+            except BACKOFF_ERRORS as e:
+                return self._handle_failure(key, e, entry, fallback, tags, error_ttl)
+            delta = time.time() - start
+            self.stampede_stats['recomputations'] += 1
+            prefix = key_prefix(key)
+            self.metrics.incr(prefix, TIER_COMPUTE, 'recomputations')
+            self.metrics.incr(prefix, TIER_COMPUTE, 'recompute_seconds', delta)
+            self.metrics.observe(prefix, TIER_COMPUTE, delta)
+            
+            if should_cache is not None and not should_cache(result):
+                return result
+            if _is_empty(result):
+                self.metrics.incr(prefix, TIER_COMPUTE, 'negative_writes')
+                self._write_entry(key, result, min(timeout, negative_ttl), 0, delta,
+                                  tags=tags, status=STATUS_EMPTY)
+            else:
+                self._write_entry(key, result, timeout, stale_ttl, delta, tags=tags)
+            return result
+        finally:
+            if lease is not None:
+                lease.release()
+            if held:
+                key_lock.lock.release()
 
 # Instância global do cache
 cache_manager = CacheManager()
@@ -185,57 +1066,105 @@ def cache_key(*args, **kwargs) -> str:
     key_string = json.dumps(key_data, sort_keys=True, default=str)
     return hashlib.md5(key_string.encode()).hexdigest()
 
-def cached(timeout: int = 3600, key_prefix: str = "func"):
-    """Decorator para cache de funções"""
+def cached(timeout: int = 3600, key_prefix: str = "func", tags=None,
+           stale_ttl: Optional[int] = None, early_expiration: Optional[float] = None,
+           negative_ttl: Optional[int] = None, error_ttl: Optional[int] = None,
+           fallback: Optional[Callable] = None):
+    """Decorator para cache de funções
+    
+    `tags` pode ser uma lista de tags (ex.: ["model:Veiculo", "report:monthly"])
+    ou uma função que recebe os mesmos argumentos e retorna a lista.
+    `stale_ttl` e `early_expiration` controlam stale-while-revalidate e a
+    expiração antecipada probabilística (ver CacheManager.get_or_set).
+    `negative_ttl` e `error_ttl` controlam o cache de resultados vazios e
+    de falhas; `fallback` recebe os mesmos argumentos e fornece o valor
+    retornado enquanto a falha estiver em backoff.
+    """
     def decorator(func):
+        def make_key(*args, **kwargs) -> str:
+            # Gerar chave única baseada na função e argumentos
+            return f"{key_prefix}:{func.__name__}:{cache_key(*args, **kwargs)}"
+        
         @wraps(func)
         def wrapper(*args, **kwargs):
-            # Gerar chave única baseada na função e argumentos
-            key = f"{key_prefix}:{func.__name__}:{cache_key(*args, **kwargs)}"
+            key = make_key(*args, **kwargs)
+            entry_tags = tags(*args, **kwargs) if callable(tags) else tags
             
-            # Tentar recuperar do cache
-            cached_result = cache_manager.get(key)
-            if cached_result is not None:
-                logger.debug(f"Cache hit para {func.__name__}")
-                return cached_result
+            def compute():
+                logger.debug(f"Cache miss para {func.__name__}, executando função")
+                return func(*args, **kwargs)
             
-            # Executar função e armazenar resultado
-            logger.debug(f"Cache miss para {func.__name__}, executando função")
-            result = func(*args, **kwargs)
-            cache_manager.set(key, result, timeout)
-            return result
+            return cache_manager.get_or_set(
+                key, compute, timeout,
+                tags=entry_tags,
+                stale_ttl=stale_ttl,
+                early_expiration=early_expiration,
+                negative_ttl=negative_ttl,
+                error_ttl=error_ttl,
+                fallback=(lambda: fallback(*args, **kwargs)) if fallback else None
+            )
         
+        wrapper.make_cache_key = make_key
         return wrapper
     return decorator
 
-def cache_invalidate(pattern: str):
-    """Invalida cache baseado em padrão"""
-    if cache_manager.redis_client:
-        try:
-            keys = cache_manager.redis_client.keys(f"aduaneiro:{pattern}*")
-            if keys:
-                cache_manager.redis_client.delete(*keys)
-                logger.info(f"Cache invalidado para padrão: {pattern}")
-        except Exception as e:
-            logger.warning(f"Erro ao invalidar cache: {e}")
+def cache_prefetch(*calls) -> int:
+    """Pré-carrega, com uma única ida ao Redis, funções @cached de uma view
     
-    # Invalidar cache em memória local
-    keys_to_remove = [k for k in cache_manager.memory_cache.keys() if pattern in k]
-    for key in keys_to_remove:
-        del cache_manager.memory_cache[key]
+    Cada item é uma função decorada com @cached (sem argumentos) ou uma
+    tupla (função, *args). Exemplo:
     
-    if keys_to_remove:
-        logger.info(f"Cache em memória invalidado para padrão: {pattern}")
+        cache_prefetch(get_user_stats, get_vehicle_stats, get_entity_stats)
+    """
+    keys = []
+    for call in calls:
+        func, args = (call[0], call[1:]) if isinstance(call, tuple) else (call, ())
+        keys.append(func.make_cache_key(*args))
+    return cache_manager.prefetch(keys)
+
+def cache_invalidate(pattern: str):
+    """Invalida cache baseado em padrão (SCAN incremental, sem KEYS)"""
+    return cache_manager.invalidate_pattern(pattern)
+
+def cache_invalidate_tags(*tags: str):
+    """Invalida cache baseado em tags"""
+    return cache_manager.invalidate_tags(*tags)
 
 # Funções de conveniência
 def get_cache_stats() -> dict:
     """Retorna estatísticas do cache"""
     stats = {
-        'redis_available': cache_manager.redis_client is not None,
-        'memory_cache_size': len(cache_manager.memory_cache)
+        'redis_available': (
+            cache_manager.redis_client is not None
+            and cache_manager.breaker.state == CLOSED
+        ),
+        'redis_breaker': cache_manager.breaker.stats(),
+        'near_cache_enabled': cache_manager.near_cache_enabled,
+        'memory_cache_size': len(cache_manager.memory_cache),
+        'memory_cache': cache_manager.memory_cache.stats(),
+        'stampede': dict(cache_manager.stampede_stats),
+        'metrics': cache_manager.metrics_snapshot()
     }
     
-    if cache_manager.redis_client:
+    if cache_manager.redis_pool is not None:
+        pool = cache_manager.redis_pool
+        stats['redis_pool'] = {
+            'max_connections': pool.max_connections,
+            'in_use': len(getattr(pool, '_in_use_connections', ())),
+            'available': len(getattr(pool, '_available_connections', ()))
+        }
+    
+    if cache_manager.snapshot_path:
+        stats['snapshot'] = {
+            'path': cache_manager.snapshot_path,
+            'prefixes': list(cache_manager.snapshot_prefixes),
+            'age_seconds': snapshot_age(cache_manager.snapshot_path)
+        }
+    
+    from app.utils.cache_warmer import cache_warmer
+    stats['warmup'] = cache_warmer.status()
+    
+    if cache_manager._redis_ready():
         try:
             info = cache_manager.redis_client.info()
             stats.update({
@@ -248,3 +1177,8 @@ def get_cache_stats() -> dict:
             stats['redis_error'] = str(e)
     
     return stats
+
+def reset_cache_metrics():
+    """Zera as métricas do cache (todos os workers, quando há Redis)"""
+    cache_manager.reset_metrics()
+
@@ -0,0 +1,103 @@
+"""
+Barramento de invalidação de cache entre workers
+Propaga remoções do cache local (L1) via Redis pub/sub ou em processo
+"""
+
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+InvalidationCallback = Callable[[Dict[str, Any]], None]
+
+
+def make_origin_id() -> str:
+    """Gera um identificador único para o processo atual"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class InvalidationBus:
+    """Interface do barramento de invalidação"""
+
+    def publish(self, message: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def subscribe(self, callback: InvalidationCallback) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class LocalInvalidationBus(InvalidationBus):
+    """Barramento em processo, usado em testes e em instâncias sem Redis"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: List[InvalidationCallback] = []
+
+    def publish(self, message: Dict[str, Any]) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            callback(message)
+
+    def subscribe(self, callback: InvalidationCallback) -> None:
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def close(self) -> None:
+        with self._lock:
+            self._subscribers.clear()
+
+
+class RedisInvalidationBus(InvalidationBus):
+    """Barramento via Redis pub/sub compartilhado por todos os workers e instâncias"""
+
+    def __init__(self, redis_client, channel: str = 'aduaneiro:invalidate'):
+        self.redis_client = redis_client
+        self.channel = channel
+        self._thread = None
+        self._callback: Optional[InvalidationCallback] = None
+
+    def publish(self, message: Dict[str, Any]) -> None:
+        try:
+            self.redis_client.publish(self.channel, json.dumps(message))
+        except Exception as e:
+            logger.warning(f"Erro ao publicar invalidação de cache: {e}")
+
+    def subscribe(self, callback: InvalidationCallback) -> None:
+        self._callback = callback
+        pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{self.channel: self._on_message})
+        self._thread = pubsub.run_in_thread(
+            sleep_time=1.0,
+            daemon=True,
+            exception_handler=self._on_error
+        )
+
+    def close(self) -> None:
+        if self._thread is not None:
+            self._thread.stop()
+            self._thread = None
+
+    def _on_message(self, message: Dict[str, Any]) -> None:
+        try:
+            payload = json.loads(message['data'])
+        except (TypeError, ValueError):
+            logger.warning("Mensagem de invalidação inválida ignorada")
+            return
+        self._callback(payload)
+
+    def _on_error(self, error: Exception, pubsub, thread) -> None:
+        # Mensagens podem ter sido perdidas: descartar todo o L1 por segurança
+        logger.warning(f"Erro no canal de invalidação de cache: {error}")
+        if self._callback:
+            self._callback({'all': True})
+        time.sleep(1.0)
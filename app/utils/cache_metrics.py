@@ -0,0 +1,224 @@
+"""
+Métricas do cache do Projeto Aduaneiro
+Contadores e histogramas de latência por prefixo de chave e por camada,
+agregados entre os workers por meio de um hash no Redis
+"""
+
+import bisect
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Limites (em ms) dos buckets dos histogramas de latência
+LATENCY_BUCKETS_MS = (0.1, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 10000)
+
+# Camadas instrumentadas
+TIER_ALL = 'all'          # Resultado final da leitura, qualquer camada
+TIER_BATCH = 'batch'      # Lote pré-carregado da requisição
+TIER_NEAR = 'near'        # L1 local na frente do Redis
+TIER_REDIS = 'redis'
+TIER_MEMORY = 'memory'    # Cache local usado como fallback
+TIER_COMPUTE = 'compute'  # Recomputação em get_or_set/@cached
+
+# Contadores armazenados como float no Redis (HINCRBYFLOAT)
+FLOAT_COUNTERS = ('serialize_seconds', 'deserialize_seconds', 'recompute_seconds')
+
+_SEPARATOR = '|'
+
+
+def key_prefix(key: str) -> str:
+    """Extrai o prefixo de uma chave lógica (ex.: 'reports:get_monthly_stats:...')"""
+    return key.split(':', 1)[0]
+
+
+def _percentile(buckets: list, quantile: float) -> Optional[float]:
+    """Estima um percentil (em ms) a partir dos buckets do histograma"""
+    total = sum(buckets)
+    if not total:
+        return None
+    target = quantile * total
+    running = 0
+    for index, count in enumerate(buckets):
+        running += count
+        if running >= target:
+            if index < len(LATENCY_BUCKETS_MS):
+                return LATENCY_BUCKETS_MS[index]
+            return float('inf')
+    return None
+
+
+class CacheMetrics:
+    """Contadores e histogramas do cache com envio periódico ao Redis
+
+    Cada worker acumula apenas os deltas ainda não enviados; `flush` soma
+    esses deltas no hash compartilhado e `snapshot` combina o hash com os
+    deltas locais, de modo que nenhum valor é contado duas vezes.
+    """
+
+    def __init__(self, enabled: bool = True, flush_interval: float = 10,
+                 redis_key: str = 'aduaneiro:metrics'):
+        self.enabled = enabled
+        self.flush_interval = flush_interval
+        self.redis_key = redis_key
+
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, str, str], float] = {}
+        self._histograms: Dict[Tuple[str, str], list] = {}
+        self._last_flush = time.time()
+        self.started_at = time.time()
+
+    def incr(self, prefix: str, tier: str, name: str, amount: float = 1) -> None:
+        """Incrementa um contador"""
+        if not self.enabled:
+            return
+        key = (prefix, tier, name)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, prefix: str, tier: str, seconds: float) -> None:
+        """Registra uma latência no histograma da camada"""
+        if not self.enabled:
+            return
+        index = bisect.bisect_left(LATENCY_BUCKETS_MS, seconds * 1000)
+        key = (prefix, tier)
+        with self._lock:
+            buckets = self._histograms.get(key)
+            if buckets is None:
+                buckets = self._histograms[key] = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+            buckets[index] += 1
+
+    def lookup(self, prefix: str, tier: str, hit: bool, seconds: Optional[float] = None) -> None:
+        """Registra o resultado de uma leitura em uma camada"""
+        if not self.enabled:
+            return
+        self.incr(prefix, tier, 'hits' if hit else 'misses')
+        if seconds is not None:
+            self.observe(prefix, tier, seconds)
+
+    def flush_due(self) -> bool:
+        """Indica se já passou o intervalo de envio ao Redis"""
+        return self.enabled and time.time() - self._last_flush >= self.flush_interval
+
+    def flush(self, redis_client) -> None:
+        """Soma os deltas locais no hash compartilhado do Redis
+
+        Em caso de erro os deltas voltam para o acumulador local e a
+        exceção é propagada para o chamador.
+        """
+        with self._lock:
+            counters, self._counters = self._counters, {}
+            histograms, self._histograms = self._histograms, {}
+            self._last_flush = time.time()
+
+        if not counters and not histograms:
+            return
+
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            for (prefix, tier, name), value in counters.items():
+                field = _SEPARATOR.join(('c', prefix, tier, name))
+                if name in FLOAT_COUNTERS:
+                    pipe.hincrbyfloat(self.redis_key, field, value)
+                else:
+                    pipe.hincrby(self.redis_key, field, int(value))
+            for (prefix, tier), buckets in histograms.items():
+                for index, count in enumerate(buckets):
+                    if count:
+                        field = _SEPARATOR.join(('h', prefix, tier, str(index)))
+                        pipe.hincrby(self.redis_key, field, count)
+            pipe.execute()
+        except Exception:
+            self._merge(counters, histograms)
+            raise
+
+    def snapshot(self, redis_client=None) -> Dict[str, Any]:
+        """Retorna as métricas agrupadas por prefixo e camada
+
+        Com `redis_client` o resultado inclui os valores enviados por todos
+        os workers; sem ele, apenas os do worker atual.
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: list(buckets) for key, buckets in self._histograms.items()}
+
+        scope = 'worker'
+        if redis_client is not None:
+            try:
+                shared = redis_client.hgetall(self.redis_key)
+                self._merge_fields(shared, counters, histograms)
+                scope = 'cluster'
+            except Exception as e:
+                logger.warning(f"Erro ao ler métricas agregadas do Redis: {e}")
+
+        prefixes: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for (prefix, tier, name), value in counters.items():
+            tier_stats = prefixes.setdefault(prefix, {}).setdefault(tier, {})
+            tier_stats[name] = round(value, 6) if name in FLOAT_COUNTERS else int(value)
+
+        for (prefix, tier), buckets in histograms.items():
+            tier_stats = prefixes.setdefault(prefix, {}).setdefault(tier, {})
+            tier_stats['latency_ms'] = {
+                'count': sum(buckets),
+                'p50': _percentile(buckets, 0.50),
+                'p95': _percentile(buckets, 0.95),
+                'p99': _percentile(buckets, 0.99),
+                'buckets': {
+                    (f"le_{bound}" if index < len(LATENCY_BUCKETS_MS) else 'inf'): count
+                    for index, (bound, count) in enumerate(
+                        zip(LATENCY_BUCKETS_MS + (None,), buckets)
+                    )
+                    if count
+                }
+            }
+
+        for tiers in prefixes.values():
+            total = tiers.get(TIER_ALL)
+            if total:
+                lookups = total.get('hits', 0) + total.get('misses', 0)
+                total['hit_ratio'] = round(total.get('hits', 0) / lookups, 4) if lookups else None
+
+        return {
+            'scope': scope,
+            'since': self.started_at,
+            'prefixes': prefixes
+        }
+
+    def reset(self, redis_client=None) -> None:
+        """Zera as métricas locais e, com `redis_client`, as agregadas"""
+        with self._lock:
+            self._counters = {}
+            self._histograms = {}
+            self.started_at = time.time()
+        if redis_client is not None:
+            redis_client.delete(self.redis_key)
+
+    def _merge(self, counters: dict, histograms: dict) -> None:
+        """Devolve deltas ao acumulador local (após falha no envio)"""
+        with self._lock:
+            for key, value in counters.items():
+                self._counters[key] = self._counters.get(key, 0) + value
+            for key, buckets in histograms.items():
+                current = self._histograms.setdefault(key, [0] * len(buckets))
+                for index, count in enumerate(buckets):
+                    current[index] += count
+
+    def _merge_fields(self, fields: dict, counters: dict, histograms: dict) -> None:
+        """Soma os campos do hash do Redis às estruturas locais"""
+        size = len(LATENCY_BUCKETS_MS) + 1
+        for field, value in fields.items():
+            if isinstance(field, bytes):
+                field = field.decode()
+            if isinstance(value, bytes):
+                value = value.decode()
+            parts = field.split(_SEPARATOR)
+            if parts[0] == 'c' and len(parts) == 4:
+                key = (parts[1], parts[2], parts[3])
+                counters[key] = counters.get(key, 0) + float(value)
+            elif parts[0] == 'h' and len(parts) == 4:
+                buckets = histograms.setdefault((parts[1], parts[2]), [0] * size)
+                index = int(parts[3])
+                if index < size:
+                    buckets[index] += int(value)
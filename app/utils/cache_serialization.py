@@ -0,0 +1,171 @@
+"""
+Serialização binária do cache do Projeto Aduaneiro
+Formato versionado com cabeçalho de tipo e compressão opcional
+"""
+
+import base64
+import json
+import pickle
+import zlib
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any
+import logging
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:  # lz4 é opcional
+    lz4_frame = None
+
+logger = logging.getLogger(__name__)
+
+# Cabeçalho: versão (1 byte) + tipo (1 byte) + flags (1 byte)
+CODEC_VERSION = 1
+HEADER_SIZE = 3
+
+TYPE_JSON = 0x01
+TYPE_PICKLE = 0x02
+TYPE_BYTES = 0x03
+
+FLAG_ZLIB = 0x01
+FLAG_LZ4 = 0x02
+
+COMPRESSIONS = ('none', 'zlib', 'lz4')
+
+# Chave reservada para valores tipados dentro do JSON
+TAG = '__t'
+
+
+class _Unsupported(Exception):
+    """Tipo sem representação no JSON tipado (usa pickle)"""
+
+
+def _is_row(value: Any) -> bool:
+    """Identifica linhas de resultado do SQLAlchemy (Row)"""
+    return hasattr(value, '_mapping') and hasattr(value, '_fields')
+
+
+def _encode(value: Any) -> Any:
+    """Converte o valor em estrutura JSON preservando tipos comuns do projeto"""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, list):
+        return [_encode(v) for v in value]
+    if isinstance(value, dict):
+        if TAG not in value and all(isinstance(k, str) for k in value):
+            return {k: _encode(v) for k, v in value.items()}
+        return {TAG: 'map', 'v': [[_encode(k), _encode(v)] for k, v in value.items()]}
+    if isinstance(value, tuple) or _is_row(value):
+        return {TAG: 'tuple', 'v': [_encode(v) for v in value]}
+    if isinstance(value, datetime):
+        return {TAG: 'dt', 'v': value.isoformat()}
+    if isinstance(value, date):
+        return {TAG: 'date', 'v': value.isoformat()}
+    if isinstance(value, time):
+        return {TAG: 'time', 'v': value.isoformat()}
+    if isinstance(value, Decimal):
+        return {TAG: 'dec', 'v': str(value)}
+    if isinstance(value, (set, frozenset)):
+        return {TAG: 'set', 'v': [_encode(v) for v in value]}
+    if isinstance(value, bytes):
+        return {TAG: 'bytes', 'v': base64.b64encode(value).decode('ascii')}
+    raise _Unsupported(type(value).__name__)
+
+
+_DECODERS = {
+    'map': lambda v: {_freeze(k): val for k, val in v},
+    'tuple': tuple,
+    'dt': datetime.fromisoformat,
+    'date': date.fromisoformat,
+    'time': time.fromisoformat,
+    'dec': Decimal,
+    'set': set,
+    'bytes': lambda v: base64.b64decode(v)
+}
+
+
+def _freeze(key: Any) -> Any:
+    """Chaves de dicionário decodificadas como lista voltam a ser hasheáveis"""
+    return tuple(key) if isinstance(key, list) else key
+
+
+def _object_hook(obj: dict) -> Any:
+    tag = obj.get(TAG)
+    if tag is None:
+        return obj
+    return _DECODERS[tag](obj['v'])
+
+
+class CacheCodec:
+    """Codificador binário versionado para os valores do cache"""
+
+    def __init__(self, compression: str = 'zlib', threshold: int = 1024, level: int = 6):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Compressão inválida: {compression}")
+        if compression == 'lz4' and lz4_frame is None:
+            logger.warning("lz4 não instalado, usando zlib para compressão do cache")
+            compression = 'zlib'
+
+        self.compression = compression
+        self.threshold = threshold
+        self.level = level
+
+    def dumps(self, value: Any) -> bytes:
+        """Serializa um valor para bytes"""
+        if isinstance(value, bytes):
+            type_byte, payload = TYPE_BYTES, value
+        else:
+            try:
+                payload = json.dumps(_encode(value), separators=(',', ':')).encode('utf-8')
+                type_byte = TYPE_JSON
+            except (_Unsupported, ValueError):
+                payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+                type_byte = TYPE_PICKLE
+
+        flags = 0
+        if self.compression != 'none' and len(payload) >= self.threshold:
+            if self.compression == 'lz4':
+                compressed = lz4_frame.compress(payload)
+                flag = FLAG_LZ4
+            else:
+                compressed = zlib.compress(payload, self.level)
+                flag = FLAG_ZLIB
+            if len(compressed) < len(payload):
+                payload, flags = compressed, flag
+
+        return bytes((CODEC_VERSION, type_byte, flags)) + payload
+
+    def loads(self, data: bytes) -> Any:
+        """Deserializa bytes produzidos por `dumps` (ou valores legados)"""
+        if isinstance(data, str):
+            return self._loads_legacy(data)
+        if len(data) < HEADER_SIZE or data[0] != CODEC_VERSION:
+            return self._loads_legacy(data.decode('utf-8', errors='replace'))
+
+        type_byte, flags = data[1], data[2]
+        payload = data[HEADER_SIZE:]
+
+        if flags & FLAG_ZLIB:
+            payload = zlib.decompress(payload)
+        elif flags & FLAG_LZ4:
+            if lz4_frame is None:
+                raise ValueError("Valor comprimido com lz4, mas lz4 não está instalado")
+            payload = lz4_frame.decompress(payload)
+
+        if type_byte == TYPE_JSON:
+            return json.loads(payload, object_hook=_object_hook)
+        if type_byte == TYPE_PICKLE:
+            return pickle.loads(payload)
+        if type_byte == TYPE_BYTES:
+            return payload
+        raise ValueError(f"Tipo de valor desconhecido no cache: {type_byte}")
+
+    def _loads_legacy(self, data: str) -> Any:
+        """Lê valores gravados no formato antigo (JSON ou pickle em hex)"""
+        try:
+            return json.loads(data)
+        except (TypeError, ValueError):
+            try:
+                return pickle.loads(bytes.fromhex(data))
+            except Exception:
+                return data
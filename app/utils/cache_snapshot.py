@@ -0,0 +1,181 @@
+"""
+Snapshot do cache local do Projeto Aduaneiro
+Grava em arquivo as entradas de prefixos selecionados para que workers
+reciclados e novos deploys iniciem com o cache aquecido
+"""
+
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from fnmatch import fnmatchcase
+from typing import Any, Callable, Iterable, Iterator, Optional, Set, Tuple
+import logging
+
+from app.utils.cache_serialization import CacheCodec
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem trava entre processos
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'ADUSNAP1'
+
+# Registro: expiração absoluta (0 = sem expiração), tamanho da chave,
+# tamanho das tags e tamanho do valor codificado
+RECORD = struct.Struct('<dHHI')
+
+TAG_SEPARATOR = '\x1f'
+
+# (chave, valor, expiração absoluta ou None, tags)
+Entry = Tuple[str, Any, Optional[float], Tuple[str, ...]]
+
+
+class SnapshotTombstones:
+    """Chaves, tags e padrões removidos do cache local desde a última gravação
+
+    As entradas do snapshot anterior que casam com elas não são mescladas
+    de volta (senão uma chave invalidada reapareceria no próximo início).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.keys: Set[str] = set()
+        self.tags: Set[str] = set()
+        self.globs: Set[str] = set()
+        self.clear_all = False
+
+    def add(self, keys: Iterable[str] = (), tags: Iterable[str] = (),
+            glob: Optional[str] = None, clear_all: bool = False) -> None:
+        with self._lock:
+            self.keys.update(keys)
+            self.tags.update(tags)
+            if glob:
+                self.globs.add(glob)
+            self.clear_all = self.clear_all or clear_all
+
+    def take(self) -> 'SnapshotTombstones':
+        """Retorna as remoções acumuladas e recomeça do zero"""
+        taken = SnapshotTombstones()
+        with self._lock:
+            taken.keys, self.keys = self.keys, set()
+            taken.tags, self.tags = self.tags, set()
+            taken.globs, self.globs = self.globs, set()
+            taken.clear_all, self.clear_all = self.clear_all, False
+        return taken
+
+    def restore(self, taken: 'SnapshotTombstones') -> None:
+        """Devolve remoções de uma gravação que falhou"""
+        self.add(taken.keys, taken.tags, clear_all=taken.clear_all)
+        with self._lock:
+            self.globs.update(taken.globs)
+
+    def matches(self, key: str, tags: Tuple[str, ...]) -> bool:
+        return (
+            self.clear_all or key in self.keys
+            or any(tag in self.tags for tag in tags)
+            or any(fnmatchcase(key, glob) for glob in self.globs)
+        )
+
+
+@contextmanager
+def _snapshot_lock(path: str) -> Iterator[None]:
+    """Serializa leitura+mescla+escrita do snapshot entre workers"""
+    if fcntl is None:
+        yield
+        return
+    with open(f"{path}.lock", 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def read_snapshot(path: str, codec: CacheCodec, now: Optional[float] = None) -> Iterator[Entry]:
+    """Lê as entradas ainda válidas do snapshot (arquivo mapeado em memória)"""
+    now = time.time() if now is None else now
+    try:
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size < len(MAGIC):
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                if data[:len(MAGIC)] != MAGIC:
+                    logger.warning(f"Snapshot do cache inválido: {path}")
+                    return
+
+                offset = len(MAGIC)
+                while offset + RECORD.size <= len(data):
+                    expires, key_len, tags_len, value_len = RECORD.unpack_from(data, offset)
+                    offset += RECORD.size
+                    end = offset + key_len + tags_len + value_len
+                    if end > len(data):
+                        logger.warning(f"Snapshot do cache truncado: {path}")
+                        return
+
+                    if not expires or expires > now:
+                        key = data[offset:offset + key_len].decode()
+                        tags = data[offset + key_len:offset + key_len + tags_len].decode()
+                        try:
+                            value = codec.loads(data[offset + key_len + tags_len:end])
+                        except Exception as e:
+                            logger.debug(f"Entrada ilegível no snapshot ({key}): {e}")
+                        else:
+                            yield (key, value, expires or None,
+                                   tuple(tags.split(TAG_SEPARATOR)) if tags else ())
+                    offset = end
+    except FileNotFoundError:
+        return
+
+
+def write_snapshot(path: str, entries: Iterable[Entry], codec: CacheCodec,
+                   merge: bool = True,
+                   discard: Optional[Callable[[str, Tuple[str, ...]], bool]] = None) -> int:
+    """Grava o snapshot de forma atômica e retorna o número de entradas
+
+    Com `merge`, entradas válidas do snapshot anterior que não estão em
+    `entries` são mantidas (cada worker contribui com o seu cache local),
+    exceto as que `discard(chave, tags)` indica como removidas.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+
+    with _snapshot_lock(path):
+        records = {key: (key, value, expires, tags) for key, value, expires, tags in entries}
+        if merge:
+            for entry in read_snapshot(path, codec):
+                if discard is None or not discard(entry[0], entry[3]):
+                    records.setdefault(entry[0], entry)
+
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.cache_snapshot')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(MAGIC)
+                for key, value, expires, tags in records.values():
+                    key_bytes = key.encode()
+                    tag_bytes = TAG_SEPARATOR.join(tags).encode()
+                    payload = codec.dumps(value)
+                    f.write(RECORD.pack(expires or 0.0, len(key_bytes), len(tag_bytes), len(payload)))
+                    f.write(key_bytes)
+                    f.write(tag_bytes)
+                    f.write(payload)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    return len(records)
+
+
+def snapshot_age(path: str) -> Optional[float]:
+    """Idade do snapshot em segundos (None se não existir)"""
+    try:
+        return time.time() - os.path.getmtime(path)
+    except OSError:
+        return None
+
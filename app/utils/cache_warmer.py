@@ -0,0 +1,239 @@
+"""
+Aquecimento do cache do Projeto Aduaneiro
+Executa na inicialização as funções cacheadas mais acessadas (estatísticas,
+relatórios, feed do LinkedIn) dentro de um orçamento de tempo, para que a
+primeira requisição não pague pelas consultas de agregação
+"""
+
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Estados do aquecimento
+DISABLED = 'disabled'
+PENDING = 'pending'
+RUNNING = 'running'
+READY = 'ready'
+
+# Resultado de cada função
+RESULT_OK = 'ok'
+RESULT_ERROR = 'error'
+RESULT_TIMEOUT = 'timeout'    # Excedeu o orçamento; continua em segundo plano
+RESULT_SKIPPED = 'skipped'    # Orçamento esgotado antes de começar
+
+MODE_SYNC = 'sync'              # Aquece dentro de create_app
+MODE_BACKGROUND = 'background'  # Aquece em uma thread por worker
+
+
+class CacheWarmer:
+    """Registro de funções aquecíveis com orçamento de tempo
+
+    As funções são executadas em ordem crescente de `order` (empate: ordem
+    de registro), cada uma em uma thread com contexto de aplicação, para
+    que uma função lenta não ultrapasse o orçamento total.
+    """
+
+    def __init__(self):
+        self._warmers: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_pid: Optional[int] = None
+
+        self.app = None
+        self.budget = 10.0
+        self.state = DISABLED
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.results: Dict[str, Dict[str, Any]] = {}
+
+        self._ready.set()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def register(self, func: Optional[Callable] = None, name: Optional[str] = None,
+                 order: int = 100):
+        """Registra uma função aquecível (também pode ser usado como decorator)"""
+        def decorator(f: Callable) -> Callable:
+            warmer_name = name or f.__name__
+            with self._lock:
+                self._warmers = [w for w in self._warmers if w['name'] != warmer_name]
+                self._warmers.append({'name': warmer_name, 'func': f, 'order': order})
+                self._warmers.sort(key=lambda w: w['order'])
+            return f
+
+        if func is not None:
+            return decorator(func)
+        return decorator
+
+    @property
+    def names(self) -> List[str]:
+        return [w['name'] for w in self._warmers]
+
+    def init_app(self, app) -> None:
+        """Configura o aquecimento e o executa conforme CACHE_WARMUP_MODE"""
+        self.app = app
+        self.budget = float(app.config.get('CACHE_WARMUP_BUDGET', 10))
+
+        if not app.config.get('CACHE_WARMUP_ENABLED', True):
+            self.state = DISABLED
+            self._ready.set()
+            return
+
+        self._reset()
+        if app.config.get('CACHE_WARMUP_MODE', MODE_SYNC) == MODE_BACKGROUND:
+            # Workers que não passam pelo post_worker_init do Gunicorn (outro
+            # servidor ou sem config/gunicorn.conf.py) iniciam na 1ª requisição
+            app.before_request(self._start_in_worker)
+            self.ensure_started()
+        else:
+            self.run(app)
+            self._release_connections(app)
+
+    def run(self, app=None, budget: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+        """Executa as funções registradas e retorna o tempo de cada uma"""
+        app = app or self.app
+        budget = self.budget if budget is None else budget
+        deadline = time.monotonic() + budget
+
+        self.state = RUNNING
+        self.started_at = time.time()
+        results: Dict[str, Dict[str, Any]] = {}
+        exhausted = False
+
+        for warmer in list(self._warmers):
+            remaining = deadline - time.monotonic()
+            if exhausted or remaining <= 0:
+                results[warmer['name']] = {'status': RESULT_SKIPPED, 'seconds': 0.0}
+                continue
+
+            results[warmer['name']] = result = self._run_one(app, warmer, remaining)
+            self.results = dict(results)
+            if result['status'] == RESULT_TIMEOUT:
+                exhausted = True
+
+        self.results = results
+        self.finished_at = time.time()
+        self.state = READY
+        self._ready.set()
+
+        elapsed = self.finished_at - self.started_at
+        logger.info(
+            f"Aquecimento do cache concluído em {elapsed:.2f}s: " + ', '.join(
+                f"{name}={r['status']} ({r['seconds']:.3f}s)" for name, r in results.items()
+            )
+        )
+        return results
+
+    def _run_one(self, app, warmer: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        """Executa uma função em thread própria, limitada ao tempo restante"""
+        outcome: Dict[str, Any] = {}
+
+        def target():
+            start = time.perf_counter()
+            try:
+                if app is not None:
+                    with app.app_context():
+                        warmer['func']()
+                else:
+                    warmer['func']()
+                outcome['status'] = RESULT_OK
+            except Exception as e:
+                outcome['status'] = RESULT_ERROR
+                outcome['error'] = str(e)
+                logger.warning(f"Erro ao aquecer {warmer['name']}: {e}")
+            outcome['seconds'] = round(time.perf_counter() - start, 6)
+
+        start = time.perf_counter()
+        thread = threading.Thread(target=target, name=f"cache-warmer-{warmer['name']}",
+                                  daemon=True)
+        thread.start()
+        thread.join(timeout)
+
+        if thread.is_alive():
+            logger.warning(f"Aquecimento de {warmer['name']} excedeu o orçamento de {self.budget}s")
+            return {'status': RESULT_TIMEOUT, 'seconds': round(time.perf_counter() - start, 6)}
+        return outcome
+
+    def ensure_started(self, app=None) -> None:
+        """Inicia o aquecimento em segundo plano se ainda estiver pendente
+
+        Chamado na inicialização de cada worker (post_worker_init), na
+        primeira requisição e pela verificação de prontidão, pois threads do
+        master não sobrevivem ao fork com preload_app.
+        """
+        app = app or self.app
+        with self._lock:
+            if self.state != PENDING or app is None:
+                return
+            self.state = RUNNING
+            self._thread_pid = os.getpid()
+            self._thread = threading.Thread(target=self.run, args=(app,),
+                                            name='cache-warmer', daemon=True)
+            self._thread.start()
+
+    def _start_in_worker(self) -> None:
+        if self.state == PENDING:
+            self.ensure_started()
+
+    def is_ready(self) -> bool:
+        return self._ready.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Aguarda o fim do aquecimento; retorna se está pronto"""
+        return self._ready.wait(timeout)
+
+    def status(self) -> Dict[str, Any]:
+        """Estado do aquecimento e tempo de cada função"""
+        return {
+            'state': self.state,
+            'ready': self.is_ready(),
+            'budget_seconds': self.budget,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'elapsed_seconds': round(
+                (self.finished_at or time.time()) - self.started_at, 6
+            ) if self.started_at else None,
+            'warmers': self.names,
+            'results': dict(self.results)
+        }
+
+    def _reset(self) -> None:
+        self.state = PENDING
+        self.results = {}
+        self.started_at = None
+        self.finished_at = None
+        self._ready.clear()
+
+    def _after_fork(self) -> None:
+        """Processo filho: um aquecimento inacabado do master é reiniciado"""
+        self._lock = threading.Lock()
+        if self.state == RUNNING and self._thread_pid != os.getpid():
+            self._ready = threading.Event()
+            self._reset()
+
+    @staticmethod
+    def _release_connections(app) -> None:
+        """Fecha as conexões abertas no aquecimento (não devem cruzar o fork)"""
+        db = app.extensions.get('sqlalchemy')
+        if db is None:
+            return
+        try:
+            with app.app_context():
+                db.session.remove()
+                db.engine.dispose()
+        except Exception as e:
+            logger.debug(f"Erro ao liberar conexões após o aquecimento: {e}")
+
+
+# Instância global
+cache_warmer = CacheWarmer()
+
+
+def warmable(name: Optional[str] = None, order: int = 100):
+    """Decorator para registrar uma função no aquecimento do cache"""
+    return cache_warmer.register(name=name, order=order)
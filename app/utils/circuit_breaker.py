@@ -0,0 +1,166 @@
+"""
+Circuit breaker para dependências externas do cache (Redis)
+Desvia o tráfego para o cache local após falhas consecutivas e restaura
+a dependência automaticamente com uma sonda em segundo plano, cujo
+intervalo dobra a cada tentativa falha (até max_reset_timeout)
+"""
+
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """Circuit breaker com sonda half-open em segundo plano"""
+
+    def __init__(self, name: str = 'redis', failure_threshold: int = 3,
+                 reset_timeout: float = 10, probe: Optional[Callable[[], Any]] = None,
+                 max_reset_timeout: Optional[float] = 300,
+                 on_close: Optional[Callable[[], Any]] = None):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max(max_reset_timeout or reset_timeout, reset_timeout)
+        self.probe = probe
+        self.on_close = on_close   # chamado quando a dependência é restaurada
+
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probe_thread: Optional[threading.Thread] = None
+        self._probe_pid: Optional[int] = None
+        self._failed_probes = 0
+
+        self.total_failures = 0
+        self.rejected = 0
+        self.transitions: Dict[str, int] = {}
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def allow_request(self) -> bool:
+        """Indica se a dependência pode ser usada agora"""
+        if self._state == CLOSED:
+            return True
+
+        self.rejected += 1
+        self._ensure_probe()
+        return False
+
+    def record_success(self) -> None:
+        """Registra uma chamada bem-sucedida"""
+        if self._state == CLOSED:
+            self._failures = 0
+            return
+        with self._lock:
+            restored = self._state != CLOSED
+            self._transition(CLOSED)
+            self._failures = 0
+        if restored and self.on_close is not None:
+            try:
+                self.on_close()
+            except Exception as e:
+                logger.warning(f"Erro ao restaurar {self.name}: {e}")
+
+    def record_failure(self) -> None:
+        """Registra uma falha e abre o circuito ao atingir o limite"""
+        with self._lock:
+            self.total_failures += 1
+            self._failures += 1
+            if self._state == HALF_OPEN or (
+                self._state == CLOSED and self._failures >= self.failure_threshold
+            ):
+                self._transition(OPEN)
+        if self._state == OPEN:
+            self._ensure_probe()
+
+    def trip(self) -> None:
+        """Abre o circuito imediatamente"""
+        with self._lock:
+            self.total_failures += 1
+            self._transition(OPEN)
+        self._ensure_probe()
+
+    def stats(self) -> Dict[str, Any]:
+        """Retorna estado e contadores do circuito"""
+        return {
+            'name': self.name,
+            'state': self._state,
+            'consecutive_failures': self._failures,
+            'failure_threshold': self.failure_threshold,
+            'reset_timeout': self.reset_timeout,
+            'probe_interval': self.probe_interval(),
+            'failed_probes': self._failed_probes,
+            'opened_at': self._opened_at,
+            'total_failures': self.total_failures,
+            'rejected': self.rejected,
+            'transitions': dict(self.transitions)
+        }
+
+    def probe_interval(self) -> float:
+        """Espera até a próxima sonda: reset_timeout dobrado a cada sonda falha"""
+        return min(self.reset_timeout * 2 ** min(self._failed_probes, 32), self.max_reset_timeout)
+
+    def _transition(self, state: str) -> None:
+        if state == self._state:
+            return
+        transition = f"{self._state}->{state}"
+        self.transitions[transition] = self.transitions.get(transition, 0) + 1
+        if self._state == CLOSED:
+            logger.warning(f"Circuit breaker {self.name}: {transition}")
+        elif state == CLOSED:
+            logger.warning(f"Circuit breaker {self.name}: {transition} "
+                           f"(restaurado após {self._failed_probes + 1} sondas)")
+            self._failed_probes = 0
+        else:
+            # Ciclos open <-> half_open das sondas: sem WARNING por worker
+            logger.debug(f"Circuit breaker {self.name}: {transition}")
+        self._state = state
+        self._opened_at = time.time() if state == OPEN else self._opened_at
+
+    def _ensure_probe(self) -> None:
+        """Inicia a sonda em segundo plano (uma por processo)"""
+        if self.probe is None:
+            return
+        with self._lock:
+            alive = (
+                self._probe_thread is not None
+                and self._probe_pid == os.getpid()
+                and self._probe_thread.is_alive()
+            )
+            if alive or self._state == CLOSED:
+                return
+            self._probe_pid = os.getpid()
+            self._probe_thread = threading.Thread(
+                target=self._probe_loop,
+                name=f"circuit-breaker-{self.name}",
+                daemon=True
+            )
+            self._probe_thread.start()
+
+    def _probe_loop(self) -> None:
+        while self._state != CLOSED:
+            # Jitter para os workers não sondarem ao mesmo tempo
+            time.sleep(self.probe_interval() * random.uniform(0.9, 1.1))
+            with self._lock:
+                self._transition(HALF_OPEN)
+            try:
+                self.probe()
+            except Exception as e:
+                logger.debug(f"Sonda do circuit breaker {self.name} falhou: {e}")
+                with self._lock:
+                    self._failed_probes += 1
+                    self._transition(OPEN)
+                continue
+            self.record_success()
@@ -6,11 +6,21 @@ from app import db
 from app.models.user import User
 from app.models.veiculo import Veiculo
 from app.models.entidade import Entidade
+from app.utils.documents import add_document_columns
 
 def init_database():
     """Inicializa o banco de dados com dados padrão"""
     # Criar todas as tabelas
     db.create_all()
+
+    # Bancos criados antes das colunas de documento normalizado: as colunas
+    # são criadas aqui para o ORM não falhar; o preenchimento e os índices
+    # ficam com scripts/migrate_document_columns.py (pré-deploy)
+    for model in (User, Veiculo, Entidade):
+        added = add_document_columns(model)
+        if added:
+            print(f"Colunas de documento criadas em {model.__tablename__}: {', '.join(added)} "
+                  f"(preencha com scripts/migrate_document_columns.py)")
     
     # Verificar se já existem dados
     user_count = User.query.count()
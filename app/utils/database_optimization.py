@@ -7,8 +7,13 @@ from app import db
 from app.models.user import User
 from app.models.veiculo import Veiculo
 from app.models.entidade import Entidade
-from app.utils.cache import cached, cache_invalidate
-from sqlalchemy import Index, text
+from app.utils.cache import cached, cache_invalidate_tags
+from app.utils.cache_warmer import warmable
+from app.utils.stats_engine import table_totals
+from app.utils.search_index import apply_search
+from app.utils.stats_counters import counter_stats, monthly_series
+from sqlalchemy import Index, event, text
+from sqlalchemy.orm import Session
 import logging
 
 logger = logging.getLogger(__name__)
@@ -97,91 +102,65 @@ def create_database_indexes():
         db.session.rollback()
         return False
 
+def _empty_stats(group_field):
+    """Fallback com estatísticas zeradas, usado enquanto a consulta falha"""
+    return lambda: {
+        'total': 0,
+        'active': 0,
+        'blocked': 0,
+        group_field: []
+    }
+
+def _summary_stats(model, dimension, group_field):
+    """Total, ativos, bloqueados e contagem por grupo (lidos de stats_counters)"""
+    stats = counter_stats(model, statuses=('active', 'blocked'), dimension=dimension)
+    return {
+        'total': stats['total'],
+        'active': stats['by_status']['active'],
+        'blocked': stats['by_status']['blocked'],
+        group_field: stats['by_group']
+    }
+
+# Em caso de erro, os zeros do fallback ficam em cache apenas pelo
+# CACHE_ERROR_TTL (backoff), em vez dos 5 minutos do valor normal
+@warmable(order=10)
+@cached(timeout=300, key_prefix="stats", tags=["model:User"],  # Cache por 5 minutos
+        fallback=_empty_stats('by_group'))
 def get_user_stats():
     """Estatísticas de usuários com cache"""
-    try:
-        return {
-            'total': User.query.count(),
-            'active': User.query.filter_by(status='active').count(),
-            'blocked': User.query.filter_by(status='blocked').count(),
-            'by_group': db.session.query(
-                User.group, 
-                db.func.count(User.id)
-            ).group_by(User.group).all()
-        }
-    except Exception as e:
-        logger.error(f"Erro ao buscar estatísticas de usuários: {e}")
-        return {
-            'total': 0,
-            'active': 0,
-            'blocked': 0,
-            'by_group': []
-        }
+    return _summary_stats(User, 'group', 'by_group')
 
+@warmable(order=10)
+@cached(timeout=300, key_prefix="stats", tags=["model:Veiculo"],  # Cache por 5 minutos
+        fallback=_empty_stats('by_type'))
 def get_vehicle_stats():
     """Estatísticas de veículos com cache"""
-    try:
-        return {
-            'total': Veiculo.query.count(),
-            'active': Veiculo.query.filter_by(status='active').count(),
-            'blocked': Veiculo.query.filter_by(status='blocked').count(),
-            'by_type': db.session.query(
-                Veiculo.tipo, 
-                db.func.count(Veiculo.id)
-            ).group_by(Veiculo.tipo).all()
-        }
-    except Exception as e:
-        logger.error(f"Erro ao buscar estatísticas de veículos: {e}")
-        return {
-            'total': 0,
-            'active': 0,
-            'blocked': 0,
-            'by_type': []
-        }
+    return _summary_stats(Veiculo, 'tipo', 'by_type')
 
+@warmable(order=10)
+@cached(timeout=300, key_prefix="stats", tags=["model:Entidade"],  # Cache por 5 minutos
+        fallback=_empty_stats('by_type'))
 def get_entity_stats():
     """Estatísticas de entidades com cache"""
-    try:
-        return {
-            'total': Entidade.query.count(),
-            'active': Entidade.query.filter_by(status='active').count(),
-            'blocked': Entidade.query.filter_by(status='blocked').count(),
-            'by_type': db.session.query(
-                Entidade.tipo, 
-                db.func.count(Entidade.id)
-            ).group_by(Entidade.tipo).all()
-        }
-    except Exception as e:
-        logger.error(f"Erro ao buscar estatísticas de entidades: {e}")
-        return {
-            'total': 0,
-            'active': 0,
-            'blocked': 0,
-            'by_type': []
-        }
+    return _summary_stats(Entidade, 'tipo_cliente', 'by_type')
 
-@cached(timeout=600, key_prefix="reports")  # Cache por 10 minutos
+@warmable(order=20)
+@cached(timeout=600, key_prefix="reports",  # Cache por 10 minutos
+        tags=["report:monthly", "model:User", "model:Veiculo", "model:Entidade"],
+        stale_ttl=120)  # Servir valor obsoleto por até 2 minutos durante a renovação
 def get_monthly_stats():
     """Estatísticas mensais com cache"""
     from datetime import datetime, timedelta
     
     twelve_months_ago = datetime.now() - timedelta(days=365)
     
+    # Agregados mensais pré-calculados (monthly_rollups): ~36 linhas
+    series = monthly_series(User, Veiculo, Entidade, since=twelve_months_ago)
+    
     return {
-        'users': db.session.query(
-            db.func.strftime('%Y-%m', User.created_at).label('month'),
-            db.func.count(User.id)
-        ).filter(User.created_at >= twelve_months_ago).group_by('month').all(),
-        
-        'vehicles': db.session.query(
-            db.func.strftime('%Y-%m', Veiculo.created_at).label('month'),
-            db.func.count(Veiculo.id)
-        ).filter(Veiculo.created_at >= twelve_months_ago).group_by('month').all(),
-        
-        'entities': db.session.query(
-            db.func.strftime('%Y-%m', Entidade.created_at).label('month'),
-            db.func.count(Entidade.id)
-        ).filter(Entidade.created_at >= twelve_months_ago).group_by('month').all()
+        'users': series[User.__tablename__],
+        'vehicles': series[Veiculo.__tablename__],
+        'entities': series[Entidade.__tablename__]
     }
 
 def optimize_queries():
@@ -198,14 +177,7 @@ def get_optimized_user_query(filters=None, page=1, per_page=25):
     query = User.query
     
     if filters:
-        if filters.get('search'):
-            search_term = f"%{filters['search']}%"
-            query = query.filter(
-                db.or_(
-                    User.name.ilike(search_term),
-                    User.email.ilike(search_term)
-                )
-            )
+        query = apply_search(query, User, filters.get('search'))
         
         if filters.get('group'):
             query = query.filter(User.group == filters['group'])
@@ -228,15 +200,7 @@ def get_optimized_vehicle_query(filters=None, page=1, per_page=25):
     query = Veiculo.query
     
     if filters:
-        if filters.get('search'):
-            search_term = f"%{filters['search']}%"
-            query = query.filter(
-                db.or_(
-                    Veiculo.placa.ilike(search_term),
-                    Veiculo.modelo.ilike(search_term),
-                    Veiculo.motorista.ilike(search_term)
-                )
-            )
+        query = apply_search(query, Veiculo, filters.get('search'))
         
         if filters.get('tipo'):
             query = query.filter(Veiculo.tipo == filters['tipo'])
@@ -262,15 +226,7 @@ def get_optimized_entity_query(filters=None, page=1, per_page=25):
     query = Entidade.query
     
     if filters:
-        if filters.get('search'):
-            search_term = f"%{filters['search']}%"
-            query = query.filter(
-                db.or_(
-                    Entidade.nome.ilike(search_term),
-                    Entidade.cnpj.ilike(search_term),
-                    Entidade.razao_social.ilike(search_term)
-                )
-            )
+        query = apply_search(query, Entidade, filters.get('search'))
         
         if filters.get('tipo'):
             query = query.filter(Entidade.tipo == filters['tipo'])
@@ -295,28 +251,58 @@ def get_optimized_entity_query(filters=None, page=1, per_page=25):
     )
 
 def invalidate_related_cache(model_name, record_id=None):
-    """Invalida cache relacionado a mudanças nos dados"""
-    patterns = [
-        f"stats:{model_name}*",
-        f"reports:*{model_name}*",
-        f"query:{model_name}*"
-    ]
+    """Invalida cache relacionado a mudanças nos dados
+    
+    Usa as tags `model:<Modelo>` e `record:<Modelo>:<id>` atribuídas pelo
+    decorator `cached`, evitando varreduras por padrão no keyspace.
+    """
+    tags = [f"model:{model_name}"]
     
     if record_id:
-        patterns.append(f"record:{model_name}:{record_id}")
+        tags.append(f"record:{model_name}:{record_id}")
     
-    for pattern in patterns:
-        cache_invalidate(pattern)
+    cache_invalidate_tags(*tags)
     
     logger.info(f"Cache invalidado para {model_name} (ID: {record_id})")
 
+# Invalidação pelas escritas do ORM: as respostas e estatísticas em cache
+# usam as tags `model:<Modelo>`, derrubadas no commit que altera o cadastro
+INVALIDATED_MODELS = (User, Veiculo, Entidade)
+PENDING_KEY = 'cache_invalidation_records'   # session.info: (modelo, id) alterados
+
+def _track_changes(session, flush_context):
+    pending = session.info.setdefault(PENDING_KEY, set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, INVALIDATED_MODELS):
+            pending.add((type(obj).__name__, obj.id))
+
+def _invalidate_committed(session):
+    records = session.info.pop(PENDING_KEY, None)
+    if not records:
+        return
+    tags = {f"model:{model_name}" for model_name, _ in records}
+    tags.update(f"record:{model_name}:{record_id}" for model_name, record_id in records if record_id)
+    try:
+        cache_invalidate_tags(*sorted(tags))
+    except Exception as e:
+        # O commit já aconteceu; o cache expira pelo TTL
+        logger.warning(f"Erro ao invalidar cache após commit: {e}")
+
+def _discard_pending(session):
+    session.info.pop(PENDING_KEY, None)
+
+event.listen(Session, 'after_flush', _track_changes)
+event.listen(Session, 'after_commit', _invalidate_committed)
+event.listen(Session, 'after_rollback', _discard_pending)
+
 def get_database_performance_stats():
     """Retorna estatísticas de performance do banco"""
     try:
-        # Estatísticas de tabelas
-        user_count = User.query.count()
-        vehicle_count = Veiculo.query.count()
-        entity_count = Entidade.query.count()
+        # Estatísticas de tabelas (uma única consulta)
+        totals = table_totals(User, Veiculo, Entidade)
+        user_count = totals[User.__tablename__]
+        vehicle_count = totals[Veiculo.__tablename__]
+        entity_count = totals[Entidade.__tablename__]
         
         # Verificar se índices existem
         indexes_query = text("""
@@ -0,0 +1,216 @@
+"""
+Números de documento em forma canônica (CPF, CNPJ, placa e RENAVAM)
+Cada documento tem uma coluna-sombra (<coluna>_norm) só com dígitos ou,
+na placa, letras maiúsculas e dígitos, indexada em B-tree: checagens de
+duplicidade e buscas exatas viram uma busca no índice, qualquer que seja
+a pontuação digitada ("12.345.678/0001-90", "abc-1234")
+"""
+
+import re
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import bindparam, func, inspect, select, text, update
+from app import db
+import logging
+
+logger = logging.getLogger(__name__)
+
+NON_DIGITS = re.compile(r'\D')
+NON_ALNUM = re.compile(r'[^0-9A-Za-z]')
+
+
+def only_digits(value: Any) -> Optional[str]:
+    """Somente os dígitos ("529.982.247-25" -> "52998224725"); None se não houver"""
+    if value is None:
+        return None
+    return NON_DIGITS.sub('', str(value)) or None
+
+
+def normalize_placa(value: Any) -> Optional[str]:
+    """Letras e dígitos em maiúsculas ("abc-1234" -> "ABC1234"); None se não houver"""
+    if value is None:
+        return None
+    return NON_ALNUM.sub('', str(value)).upper() or None
+
+
+class DocumentKind:
+    """Normalização de um tipo de documento e o formato do número completo"""
+
+    def __init__(self, normalize: Callable[[Any], Optional[str]], pattern: str):
+        self.normalize = normalize
+        self.pattern = re.compile(pattern)
+
+    def complete(self, value: Any) -> Optional[str]:
+        """Forma canônica se `value` é um número completo (senão None)"""
+        canonical = self.normalize(value)
+        if canonical and self.pattern.fullmatch(canonical):
+            return canonical
+        return None
+
+
+CPF = DocumentKind(only_digits, r'\d{11}')
+CPF_CNPJ = DocumentKind(only_digits, r'\d{11}|\d{14}')
+PLACA = DocumentKind(normalize_placa, r'[A-Z]{3}\d[A-Z\d]\d{2}')   # ABC1234 e Mercosul ABC1D23
+RENAVAM = DocumentKind(only_digits, r'\d{9,11}')
+
+MIGRATION_BATCH_SIZE = 1000
+
+
+def _canonical_default(source: str, kind: DocumentKind):
+    def default(context):
+        # Também vale para insert() em lote, que não passa pelos eventos do ORM
+        return kind.normalize(context.get_current_parameters().get(source))
+    return default
+
+
+def document_column(source: str, kind: DocumentKind, length: int, unique: bool = False):
+    """Coluna-sombra com a forma canônica de `source`
+
+    Preenchida no INSERT a partir de `source`; nas alterações pelo ORM o
+    modelo atualiza a sombra com @validates (ver `sync_document`).
+    """
+    return db.Column(
+        db.String(length), unique=unique, index=True,
+        default=_canonical_default(source, kind),
+        info={'document_source': source, 'document_kind': kind}
+    )
+
+
+def document_columns(model) -> Dict[str, Tuple[str, DocumentKind]]:
+    """Colunas-sombra do modelo: {sombra: (coluna de origem, tipo)}"""
+    return {
+        column.name: (column.info['document_source'], column.info['document_kind'])
+        for column in model.__table__.columns if 'document_source' in column.info
+    }
+
+
+def sync_document(target, source: str, value: Any) -> Any:
+    """Atualiza as sombras de `source` em `target` (uso em @validates)"""
+    for name, (column_source, kind) in document_columns(type(target)).items():
+        if column_source == source:
+            setattr(target, name, kind.normalize(value))
+    return value
+
+
+def _shadow(model, source: str):
+    for name, (column_source, kind) in document_columns(model).items():
+        if column_source == source:
+            return getattr(model, name), kind
+    raise ValueError(f'{model.__tablename__}.{source} não tem coluna normalizada')
+
+
+def document_filter(model, source: str, value: Any):
+    """Condição `<source>_norm = forma canônica de value` (None se não há dígitos)"""
+    shadow, kind = _shadow(model, source)
+    canonical = kind.normalize(value)
+    return None if canonical is None else shadow == canonical
+
+
+def find_by_document(model, source: str, value: Any):
+    """Registro com o mesmo documento em `source`, ignorando a pontuação"""
+    condition = document_filter(model, source, value)
+    return None if condition is None else model.query.filter(condition).first()
+
+
+def document_condition(model, term: Optional[str]):
+    """Busca exata se `term` é um documento completo do modelo (senão None)
+
+    Um número pode casar com mais de uma coluna (CPF do motorista e RENAVAM
+    têm 11 dígitos): as condições são unidas por OR, uma busca por índice cada.
+    """
+    conditions = []
+    for name, (_, kind) in document_columns(model).items():
+        canonical = kind.complete(term) if term else None
+        if canonical:
+            conditions.append(getattr(model, name) == canonical)
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else db.or_(*conditions)
+
+
+# Migração de bancos existentes
+
+def add_document_columns(model) -> List[str]:
+    """Cria as colunas-sombra ausentes (só ALTER TABLE, sem preenchimento)"""
+    table = model.__table__
+    existing = {column['name'] for column in inspect(db.engine).get_columns(table.name)}
+    added = []
+    with db.engine.begin() as connection:
+        preparer = connection.dialect.identifier_preparer
+        for name in document_columns(model):
+            if name in existing:
+                continue
+            column_type = table.c[name].type.compile(dialect=connection.dialect)
+            connection.execute(text(
+                f'ALTER TABLE {preparer.format_table(table)} '
+                f'ADD COLUMN {preparer.quote(name)} {column_type}'
+            ))
+            added.append(name)
+    return added
+
+
+def _backfill(model, batch_size: int) -> int:
+    """Preenche as sombras em lotes por id, uma transação por lote"""
+    table = model.__table__
+    shadows = document_columns(model)
+    sources = {source for source, _ in shadows.values()}
+    statement = (
+        update(table).where(table.c.id == bindparam('_id'))
+        .values({name: bindparam(f'_{name}') for name in shadows})
+    )
+    last_id, updated = 0, 0
+    while True:
+        with db.engine.begin() as connection:
+            rows = connection.execute(
+                select(table.c.id, *(table.c[name] for name in sorted(sources | set(shadows))))
+                .where(table.c.id > last_id).order_by(table.c.id).limit(batch_size)
+            ).mappings().all()
+            if not rows:
+                break
+            changes = []
+            for row in rows:
+                values = {name: kind.normalize(row[source]) for name, (source, kind) in shadows.items()}
+                if any(row[name] != value for name, value in values.items()):
+                    changes.append(dict({f'_{name}': value for name, value in values.items()}, _id=row['id']))
+            if changes:
+                connection.execute(statement, changes)
+            last_id = rows[-1]['id']
+        updated += len(changes)
+    return updated
+
+
+def _duplicates(model, name: str) -> List[str]:
+    """Valores canônicos repetidos (impedem o índice único)"""
+    column = getattr(model, name)
+    return list(db.session.execute(
+        select(column).where(column.isnot(None)).group_by(column).having(func.count() > 1).limit(20)
+    ).scalars())
+
+
+def migrate_document_columns(models: Iterable, batch_size: int = MIGRATION_BATCH_SIZE) -> Dict[str, Dict[str, Any]]:
+    """Adiciona as colunas-sombra que faltam, preenche em lotes e cria os índices
+
+    Pode ser executada de novo a qualquer momento (só altera linhas
+    divergentes). Um índice único não é criado enquanto houver documentos
+    repetidos na forma canônica: eles são listados em `conflicts` para
+    correção manual e o índice é criado na próxima execução.
+    """
+    report = {}
+    for model in models:
+        table = model.__table__
+        added = add_document_columns(model)
+        updated = _backfill(model, batch_size)
+        conflicts = {}
+        for index in table.indexes:
+            names = [column.name for column in index.columns]
+            if not all(name in document_columns(model) for name in names):
+                continue
+            repeated = _duplicates(model, names[0]) if index.unique else []
+            if repeated:
+                conflicts[names[0]] = repeated
+                logger.warning(f"{table.name}.{names[0]}: documentos repetidos, índice único não criado: {repeated}")
+                continue
+            index.create(db.engine, checkfirst=True)
+        report[table.name] = {'added': added, 'updated': updated, 'conflicts': conflicts}
+        logger.info(f"Documentos normalizados em {table.name}: {updated} linhas atualizadas")
+    return report
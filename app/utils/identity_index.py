@@ -0,0 +1,271 @@
+"""
+Índice de identidade por documento (CPF/CNPJ)
+A tabela document_identities liga cada documento normalizado aos cadastros
+que o contêm (usuário pelo cpf, veículos pelo cpf_motorista e entidade pelo
+cpf_cnpj) e é mantida pelos eventos do ORM na transação da própria escrita.
+`lookup_document` resolve os três cadastros em uma consulta indexada; as
+respostas ficam em um LRU do processo, invalidado no commit das escritas do
+processo e com TTL curto para as feitas em outros processos (workers)
+"""
+
+import threading
+import weakref
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set
+
+from sqlalchemy import and_, delete, event, func, insert, inspect, literal, select
+from sqlalchemy.orm import Session, object_session
+from app import db
+from app.models.user import User
+from app.models.veiculo import Veiculo
+from app.models.entidade import Entidade
+from app.models.document_identity import DocumentIdentity
+from app.utils.documents import CPF_CNPJ
+from app.utils.local_cache import LocalCache
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Coluna normalizada indexada de cada cadastro
+IDENTITY_FIELDS = {
+    User: 'cpf_norm',
+    Veiculo: 'cpf_motorista_norm',
+    Entidade: 'cpf_cnpj_norm',
+}
+
+# Grupos da resposta (os mesmos nomes de /api/search) e campos de cada registro
+LOOKUP_FIELDS = {
+    'users': (User, ('name', 'lastname', 'cpf', 'email', 'group', 'status')),
+    'vehicles': (Veiculo, ('placa', 'motorista_responsavel', 'cpf_motorista', 'renavam', 'tipo', 'status')),
+    'entities': (Entidade, ('razao_social', 'nome_fantasia', 'cpf_cnpj', 'tipo_cliente', 'status')),
+}
+_GROUPS = {model.__tablename__: name for name, (model, _) in LOOKUP_FIELDS.items()}
+
+DEFAULT_CACHE_SIZE = 1024
+DEFAULT_CACHE_TTL = 30
+PENDING_KEY = 'identity_index_documents'   # session.info: documentos a invalidar no commit
+
+_state = {'cache': LocalCache(max_entries=DEFAULT_CACHE_SIZE, policy='lru'), 'ttl': DEFAULT_CACHE_TTL}
+_lock = threading.Lock()
+_tables: 'weakref.WeakKeyDictionary' = weakref.WeakKeyDictionary()   # engine -> tabela existe
+_ready: 'weakref.WeakKeyDictionary' = weakref.WeakKeyDictionary()    # engine -> índice conferido
+
+
+def init_identity_index(app) -> None:
+    """Configura o LRU das consultas (IDENTITY_LOOKUP_CACHE_SIZE e _TTL)"""
+    _state['cache'] = LocalCache(
+        max_entries=app.config.get('IDENTITY_LOOKUP_CACHE_SIZE', DEFAULT_CACHE_SIZE), policy='lru'
+    )
+    _state['ttl'] = app.config.get('IDENTITY_LOOKUP_CACHE_TTL', DEFAULT_CACHE_TTL)
+    _tables.clear()
+    _ready.clear()
+
+
+def invalidate(documents: Iterable[str]) -> None:
+    """Remove do LRU as consultas dos documentos"""
+    cache = _state['cache']
+    for document in documents:
+        cache.delete(document)
+
+
+def identity_cache_stats() -> Dict[str, Any]:
+    """Acertos, faltas e ocupação do LRU"""
+    return _state['cache'].stats()
+
+
+# Manutenção pelos eventos do ORM
+
+def _table_ready(connection) -> bool:
+    engine = connection.engine
+    if engine not in _tables:
+        _tables[engine] = inspect(connection).has_table(DocumentIdentity.__tablename__)
+    return _tables[engine]
+
+
+def _index(connection, model, records: Sequence[Sequence[Any]]) -> None:
+    """Insere os pares (id, documento) do modelo"""
+    rows = [
+        {'document': document, 'entity': model.__tablename__, 'record_id': record_id}
+        for record_id, document in records if document
+    ]
+    if rows:
+        connection.execute(insert(DocumentIdentity), rows)
+
+
+def _unindex(connection, model, record_id: int) -> Set[str]:
+    """Remove as linhas do registro e retorna os documentos que ele tinha"""
+    condition = and_(DocumentIdentity.entity == model.__tablename__, DocumentIdentity.record_id == record_id)
+    documents = set(connection.execute(select(DocumentIdentity.document).where(condition)).scalars())
+    if documents:
+        connection.execute(delete(DocumentIdentity).where(condition))
+    return documents
+
+
+def _pending(target) -> Set[str]:
+    session = object_session(target)
+    return session.info.setdefault(PENDING_KEY, set()) if session is not None else set()
+
+
+def _after_insert(mapper, connection, target):
+    document = getattr(target, IDENTITY_FIELDS[mapper.class_])
+    if document and _table_ready(connection):
+        _index(connection, mapper.class_, [(target.id, document)])
+        _pending(target).add(document)
+
+
+def _after_update(mapper, connection, target):
+    if not _table_ready(connection):
+        return
+    field = IDENTITY_FIELDS[mapper.class_]
+    pending = _pending(target)
+    if inspect(target).attrs[field].history.has_changes():
+        pending.update(_unindex(connection, mapper.class_, target.id))
+        _index(connection, mapper.class_, [(target.id, getattr(target, field))])
+        pending.add(getattr(target, field))
+    else:
+        # Documento igual, mas os campos da resposta em cache podem ter mudado
+        pending.update(connection.execute(
+            select(DocumentIdentity.document).where(
+                DocumentIdentity.entity == mapper.class_.__tablename__,
+                DocumentIdentity.record_id == target.id
+            )
+        ).scalars())
+    pending.discard(None)
+
+
+def _after_delete(mapper, connection, target):
+    if _table_ready(connection):
+        _pending(target).update(_unindex(connection, mapper.class_, target.id))
+
+
+def _session_ended(session):
+    # No rollback também: uma consulta entre o flush e o rollback pode ter
+    # guardado dados que não foram gravados
+    documents = session.info.pop(PENDING_KEY, None)
+    if documents:
+        invalidate(documents)
+
+
+def _table_changed(target, connection, **kw):
+    """Tabela criada ou removida: índice conferido de novo e LRU descartado"""
+    _tables.pop(connection.engine, None)
+    _ready.pop(connection.engine, None)
+    _state['cache'].clear()
+
+
+for _model in IDENTITY_FIELDS:
+    event.listen(_model, 'after_insert', _after_insert)
+    event.listen(_model, 'after_update', _after_update)
+    event.listen(_model, 'after_delete', _after_delete)
+    event.listen(_model.__table__, 'after_create', _table_changed)
+    event.listen(_model.__table__, 'after_drop', _table_changed)
+event.listen(DocumentIdentity.__table__, 'after_create', _table_changed)
+event.listen(DocumentIdentity.__table__, 'after_drop', _table_changed)
+event.listen(Session, 'after_commit', _session_ended)
+event.listen(Session, 'after_rollback', _session_ended)
+
+
+def identity_bulk_insert(connection, model, rows: Sequence[Dict[str, Any]], key: str) -> None:
+    """Indexa linhas inseridas com insert() em lote, localizadas pela coluna única `key`
+
+    Chamado na mesma transação do insert.
+    """
+    if not rows or not _table_ready(connection):
+        return
+    column = getattr(model, IDENTITY_FIELDS[model])
+    inserted = connection.execute(
+        select(model.id, column).where(getattr(model, key).in_([row[key] for row in rows]), column.isnot(None))
+    ).all()
+    _index(connection, model, inserted)
+    invalidate(document for _, document in inserted)
+
+
+# Inicialização e reconstrução
+
+def _rebuild(connection, model) -> int:
+    table = model.__tablename__
+    column = getattr(model, IDENTITY_FIELDS[model])
+    connection.execute(delete(DocumentIdentity).where(DocumentIdentity.entity == table))
+    result = connection.execute(insert(DocumentIdentity).from_select(
+        ['document', 'entity', 'record_id'],
+        select(column, literal(table), model.id).where(column.isnot(None))
+    ))
+    return result.rowcount
+
+
+def _ensure_index() -> None:
+    """Cria a tabela e reconstrói o índice dos cadastros defasados (na primeira consulta, por engine)"""
+    engine = db.engine
+    if _ready.get(engine):
+        return
+    with _lock, engine.begin() as connection:
+        if not _table_ready(connection):
+            DocumentIdentity.__table__.create(connection, checkfirst=True)
+        # Registros anteriores ao índice (ou gravados fora dos eventos)
+        for model, field in IDENTITY_FIELDS.items():
+            column = getattr(model, field)
+            expected = connection.execute(select(func.count()).where(column.isnot(None))).scalar()
+            indexed = connection.execute(
+                select(func.count()).select_from(DocumentIdentity)
+                .where(DocumentIdentity.entity == model.__tablename__)
+            ).scalar()
+            if indexed != expected:
+                indexed = _rebuild(connection, model)
+                logger.info(f"Índice de identidade de {model.__tablename__} reconstruído ({indexed} registros)")
+    _ready[engine] = True
+    _state['cache'].clear()
+
+
+def rebuild_identity_index() -> Dict[str, int]:
+    """Reconstrói o índice de todos os cadastros"""
+    with _lock, db.engine.begin() as connection:
+        DocumentIdentity.__table__.create(connection, checkfirst=True)
+        indexed = {model.__tablename__: _rebuild(connection, model) for model in IDENTITY_FIELDS}
+    _ready[db.engine] = True
+    _state['cache'].clear()
+    return indexed
+
+
+# Consulta
+
+def _query(document: str) -> Dict[str, List[Dict[str, Any]]]:
+    """Registros do documento: uma consulta pela chave primária do índice,
+    com LEFT JOIN pelo id em cada cadastro"""
+    identity = DocumentIdentity
+    joined = identity.__table__
+    columns = [identity.entity, identity.record_id]
+    for model, fields in LOOKUP_FIELDS.values():
+        joined = joined.outerjoin(model.__table__, and_(
+            identity.entity == model.__tablename__, model.id == identity.record_id
+        ))
+        columns += [getattr(model, field).label(f'{model.__tablename__}_{field}') for field in fields]
+
+    result = {name: [] for name in LOOKUP_FIELDS}
+    rows = db.session.execute(
+        select(*columns).select_from(joined)
+        .where(identity.document == document)
+        .order_by(identity.entity, identity.record_id)
+    ).mappings()
+    for row in rows:
+        name = _GROUPS[row['entity']]
+        table = row['entity']
+        record = {'id': row['record_id']}
+        record.update({field: row[f'{table}_{field}'] for field in LOOKUP_FIELDS[name][1]})
+        result[name].append(record)
+    return result
+
+
+def lookup_document(documento: Any) -> Optional[Dict[str, List[Dict[str, Any]]]]:
+    """Usuário, veículos e entidade de um CPF/CNPJ (com ou sem pontuação)
+
+    None se `documento` não é um CPF (11 dígitos) ou CNPJ (14 dígitos).
+    """
+    document = CPF_CNPJ.complete(documento)
+    if document is None:
+        return None
+    cache = _state['cache']
+    result = cache.get(document)
+    if result is None:
+        _ensure_index()
+        result = _query(document)
+        cache.set(document, result, timeout=_state['ttl'])
+    return result
@@ -0,0 +1,279 @@
+"""
+Cache em memória local do Projeto Aduaneiro
+Implementa um armazenamento limitado por número de entradas e bytes,
+com expiração por TTL e política de remoção LRU ou LFU
+"""
+
+import pickle
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+import logging
+
+logger = logging.getLogger(__name__)
+
+EVICTION_POLICIES = ('lru', 'lfu')
+
+
+class _Entry:
+    """Entrada armazenada no cache local"""
+    __slots__ = ('value', 'expires', 'size', 'freq', 'tags')
+
+    def __init__(self, value: Any, expires: Optional[float], size: int,
+                 tags: Optional[tuple] = None):
+        self.value = value
+        self.expires = expires
+        self.size = size
+        self.freq = 1
+        self.tags = tags or ()
+
+    def is_expired(self, now: float) -> bool:
+        return self.expires is not None and self.expires <= now
+
+
+def estimate_size(key: str, value: Any) -> int:
+    """Estima o tamanho em bytes de uma entrada do cache"""
+    try:
+        value_size = len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        value_size = sys.getsizeof(value)
+    return len(key) + value_size
+
+
+class LocalCache:
+    """Cache em memória limitado, thread-safe, com expiração e remoção LRU/LFU"""
+
+    # Armazenamento exclusivo do processo (ver SharedMemoryCache)
+    shared = False
+
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 64 * 1024 * 1024,
+                 policy: str = 'lru', sweep_interval: int = 60):
+        if policy not in EVICTION_POLICIES:
+            raise ValueError(f"Política de remoção inválida: {policy}")
+
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.sweep_interval = sweep_interval
+
+        self._lock = threading.RLock()
+        self._entries: 'OrderedDict[str, _Entry]' = OrderedDict()
+        # Buckets de frequência usados apenas pela política LFU
+        self._buckets: Dict[int, 'OrderedDict[str, None]'] = {}
+        self._min_freq = 0
+        # Índice reverso tag -> chaves, para invalidação em O(chaves da tag)
+        self._tags: Dict[str, Set[str]] = {}
+        self._bytes = 0
+        self._last_sweep = time.time()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.rejections = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False
+            if entry.is_expired(time.time()):
+                self._remove(key)
+                self.expirations += 1
+                return False
+            return True
+
+    def keys(self) -> List[str]:
+        """Retorna uma cópia das chaves armazenadas"""
+        with self._lock:
+            return list(self._entries.keys())
+
+    def export_entries(self, match: Callable[[str], bool]) -> List[tuple]:
+        """Retorna (chave, valor, expiração, tags) das entradas válidas que casam com `match`"""
+        now = time.time()
+        with self._lock:
+            return [
+                (key, entry.value, entry.expires, entry.tags)
+                for key, entry in self._entries.items()
+                if match(key) and not entry.is_expired(now)
+            ]
+    
+    def get(self, key: str, default: Any = None) -> Any:
+        """Recupera um valor, removendo-o se estiver expirado"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+
+            if entry.is_expired(time.time()):
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+
+            self._touch(key, entry)
+            self.hits += 1
+            return entry.value
+
+    def set(self, key: str, value: Any, timeout: Optional[int] = 3600,
+            size: Optional[int] = None, tags: Optional[Iterable[str]] = None) -> bool:
+        """Armazena um valor respeitando os limites de entradas e bytes"""
+        if size is None:
+            size = estimate_size(key, value)
+
+        if size > self.max_bytes:
+            self.rejections += 1
+            logger.debug(f"Valor muito grande para o cache local: {key} ({size} bytes)")
+            return False
+
+        now = time.time()
+        expires = now + timeout if timeout else None
+
+        with self._lock:
+            self._maybe_sweep(now)
+
+            if key in self._entries:
+                self._remove(key)
+
+            while self._entries and (
+                len(self._entries) >= self.max_entries
+                or self._bytes + size > self.max_bytes
+            ):
+                self._evict_one()
+
+            entry = _Entry(value, expires, size, tuple(tags) if tags else None)
+            self._entries[key] = entry
+            self._bytes += size
+            for tag in entry.tags:
+                self._tags.setdefault(tag, set()).add(key)
+
+            if self.policy == 'lfu':
+                self._buckets.setdefault(1, OrderedDict())[key] = None
+                self._min_freq = 1
+
+        return True
+
+    def delete(self, key: str) -> bool:
+        """Remove uma chave do cache"""
+        with self._lock:
+            if key not in self._entries:
+                return False
+            self._remove(key)
+            return True
+
+    def pop(self, key: str, default: Any = None) -> Any:
+        """Remove uma chave e retorna seu valor"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            self._remove(key)
+            return entry.value
+
+    def invalidate_tags(self, tags: Iterable[str]) -> List[str]:
+        """Remove todas as chaves associadas às tags e retorna as chaves removidas"""
+        removed = []
+        with self._lock:
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    if key in self._entries:
+                        self._remove(key)
+                        removed.append(key)
+                self._tags.pop(tag, None)
+        return removed
+
+    def clear(self) -> None:
+        """Remove todas as entradas"""
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+            self._buckets.clear()
+            self._min_freq = 0
+            self._bytes = 0
+
+    def sweep(self) -> int:
+        """Remove todas as entradas expiradas e retorna a quantidade removida"""
+        now = time.time()
+        with self._lock:
+            expired = [k for k, e in self._entries.items() if e.is_expired(now)]
+            for key in expired:
+                self._remove(key)
+            self.expirations += len(expired)
+            self._last_sweep = now
+        return len(expired)
+
+    def stats(self) -> Dict[str, Any]:
+        """Retorna contadores do cache local"""
+        with self._lock:
+            return {
+                'policy': self.policy,
+                'entries': len(self._entries),
+                'tags': len(self._tags),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'rejections': self.rejections
+            }
+
+    def _maybe_sweep(self, now: float) -> None:
+        """Executa a varredura periódica de expirados quando o intervalo vence"""
+        if self.sweep_interval and now - self._last_sweep >= self.sweep_interval:
+            self.sweep()
+
+    def _touch(self, key: str, entry: _Entry) -> None:
+        """Atualiza a posição da chave conforme a política de remoção"""
+        if self.policy == 'lru':
+            self._entries.move_to_end(key)
+            return
+
+        bucket = self._buckets[entry.freq]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[entry.freq]
+            if self._min_freq == entry.freq:
+                self._min_freq = entry.freq + 1
+        entry.freq += 1
+        self._buckets.setdefault(entry.freq, OrderedDict())[key] = None
+
+    def _evict_one(self) -> None:
+        """Remove uma entrada conforme a política, priorizando expiradas"""
+        if self.policy == 'lru':
+            key = next(iter(self._entries))
+        else:
+            if self._min_freq not in self._buckets:
+                self._min_freq = min(self._buckets)
+            key = next(iter(self._buckets[self._min_freq]))
+
+        if self._entries[key].is_expired(time.time()):
+            self.expirations += 1
+        else:
+            self.evictions += 1
+        self._remove(key)
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+        for tag in entry.tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+        if self.policy == 'lfu':
+            bucket = self._buckets.get(entry.freq)
+            if bucket is not None:
+                bucket.pop(key, None)
+                if not bucket:
+                    del self._buckets[entry.freq]
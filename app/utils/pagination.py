@@ -0,0 +1,232 @@
+"""
+Paginação das listagens da API do Projeto Aduaneiro
+Paginação por cursor (keyset): o cursor opaco guarda (valor da ordenação,
+id) do último item e a próxima página é buscada com WHERE (col, id) > (...),
+sem OFFSET. A paginação por página (OFFSET) continua disponível, e o
+COUNT(*) pode ser dispensado com include_total=false. As páginas HTML usam
+paginate_page: LIMIT/OFFSET no banco, colunas restritas às exibidas e
+total em cache
+"""
+
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import load_only
+import logging
+
+from app.utils.cache import cache_key, cache_manager
+
+logger = logging.getLogger(__name__)
+
+MAX_PER_PAGE = 100
+
+# Páginas HTML
+PAGE_SIZES = (10, 25, 50, 100)
+DEFAULT_PAGE_SIZE = 25
+COUNT_CACHE_TIMEOUT = 60  # Total de listagens filtradas (segundos)
+
+
+class InvalidCursor(ValueError):
+    """Cursor malformado ou gerado para outra ordenação"""
+
+
+class InvalidSort(ValueError):
+    """Campo de ordenação fora da lista permitida do recurso"""
+
+
+def sort_column(model, sort: Optional[str]):
+    """Coluna de ordenação; nomes que não são colunas da tabela viram `id`"""
+    if sort and sort in model.__table__.columns:
+        return sort, getattr(model, sort)
+    return 'id', model.id
+
+
+def _dump_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    if isinstance(value, date):
+        return {'d': value.isoformat()}
+    if isinstance(value, Decimal):
+        return {'n': str(value)}
+    return value
+
+
+def _load_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        if 'dt' in value:
+            return datetime.fromisoformat(value['dt'])
+        if 'd' in value:
+            return date.fromisoformat(value['d'])
+        if 'n' in value:
+            return Decimal(value['n'])
+    return value
+
+
+def encode_cursor(sort: str, order: str, value: Any, last_id: int) -> str:
+    """Cursor opaco (base64 url-safe) com a ordenação e a posição do último item"""
+    payload = json.dumps({'s': sort, 'o': order, 'v': _dump_value(value), 'k': last_id},
+                         separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token: str, sort: str, order: str) -> Tuple[Any, int]:
+    """(valor da ordenação, id) de um cursor; InvalidCursor se não confere"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        value, last_id = _load_value(payload['v']), int(payload['k'])
+    except (ValueError, TypeError, KeyError) as e:
+        raise InvalidCursor('Cursor inválido') from e
+    if payload.get('s') != sort or payload.get('o') != order:
+        raise InvalidCursor('Cursor gerado para outra ordenação')
+    return value, last_id
+
+
+# Bancos em que NULL já é o menor valor e que não aceitam NULLS FIRST/LAST
+NULLS_LOWEST_DIALECTS = ('mysql', 'mariadb', 'mssql')
+
+
+def _sort_key(column, descending: bool, dialect: str):
+    """ORDER BY da coluna com NULL como o menor valor, como em `_seek`
+
+    NULLS FIRST no ASC e NULLS LAST no DESC (o PostgreSQL põe NULL por
+    último no ASC); MySQL e SQL Server já ordenam assim e não aceitam a
+    sintaxe.
+    """
+    if descending:
+        key = column.desc()
+        return key if dialect in NULLS_LOWEST_DIALECTS else key.nulls_last()
+    key = column.asc()
+    return key if dialect in NULLS_LOWEST_DIALECTS else key.nulls_first()
+
+
+def _seek(column, id_column, value: Any, last_id: int, descending: bool):
+    """Condição para os itens após (value, last_id) na ordenação
+
+    Equivale a (col, id) > (value, last_id), escrito com OR/AND porque nem
+    todos os bancos comparam tuplas. NULL é tratado como o menor valor,
+    a mesma ordem que `_sort_key` impõe em todos os bancos.
+    """
+    if column is id_column:
+        return id_column < last_id if descending else id_column > last_id
+
+    if value is None:
+        tie = and_(column.is_(None), id_column < last_id if descending else id_column > last_id)
+        return tie if descending else or_(column.isnot(None), tie)
+
+    after = column < value if descending else column > value
+    if descending:
+        after = or_(after, column.is_(None))
+    tie = and_(column == value, id_column < last_id if descending else id_column > last_id)
+    return or_(after, tie)
+
+
+def paginate(query, model, sort: Optional[str] = 'id', order: str = 'asc',
+             page: int = 1, per_page: int = 10, cursor: Optional[str] = None,
+             include_total: bool = True,
+             sortable: Sequence[str] = ('id',)) -> Tuple[List[Any], Dict[str, Any]]:
+    """Pagina `query` (já filtrada, sem ORDER BY) por cursor ou por página
+
+    Com `cursor`, usa keyset; sem ele, OFFSET da página `page`. Em ambos os
+    modos a resposta traz `next_cursor` para seguir por keyset. Busca
+    per_page + 1 linhas para saber se há próxima página, e só executa o
+    COUNT(*) quando `include_total` é verdadeiro.
+
+    `sort` deve estar em `sortable` (InvalidSort se não estiver): o valor
+    da coluna de ordenação vai no cursor, então colunas sensíveis (senha,
+    CPF, permissões) não podem ser escolhidas pelo cliente.
+    """
+    if sort and sort != 'id' and sort not in sortable:
+        raise InvalidSort(f"Ordenação inválida: use {', '.join(sortable)}")
+    per_page = max(1, min(per_page or 10, MAX_PER_PAGE))
+    descending = order == 'desc'
+    order = 'desc' if descending else 'asc'
+    sort_name, column = sort_column(model, sort)
+    id_column = model.id
+
+    base = query.order_by(None)
+    if column is id_column:
+        ordering = [id_column.desc() if descending else id_column.asc()]
+    else:
+        dialect = query.session.get_bind().dialect.name
+        ordering = [_sort_key(column, descending, dialect),
+                    id_column.desc() if descending else id_column.asc()]
+
+    if cursor:
+        value, last_id = decode_cursor(cursor, sort_name, order)
+        rows = base.filter(_seek(column, id_column, value, last_id, descending)) \
+                   .order_by(*ordering).limit(per_page + 1).all()
+        page = None
+    else:
+        page = max(page or 1, 1)
+        rows = base.order_by(*ordering).offset((page - 1) * per_page).limit(per_page + 1).all()
+
+    has_next = len(rows) > per_page
+    items = rows[:per_page]
+    last = items[-1] if items else None
+
+    total = base.count() if include_total else None
+    pagination = {
+        'mode': 'cursor' if cursor else 'page',
+        'page': page,
+        'per_page': per_page,
+        'total': total,
+        'pages': -(-total // per_page) if total is not None else None,
+        'has_prev': bool(cursor) or (page or 1) > 1,
+        'has_next': has_next,
+        'next_cursor': encode_cursor(sort_name, order, getattr(last, sort_name), last.id)
+        if has_next and last is not None else None
+    }
+    return items, pagination
+
+
+def page_size(value: Optional[int]) -> int:
+    """Tamanho de página permitido mais próximo de `value`"""
+    if not value:
+        return DEFAULT_PAGE_SIZE
+    return min(PAGE_SIZES, key=lambda size: (abs(size - value), size))
+
+
+def cached_count(query, model, timeout: int = COUNT_CACHE_TIMEOUT) -> int:
+    """Total de registros de `query`, sem varrer a tabela a cada página
+
+    Sem filtros, vem de stats_counters (mantido pelos eventos do ORM). Com
+    filtros, o COUNT(*) fica em cache por `timeout` segundos, com chave
+    derivada do SQL e dos parâmetros e a tag `model:<Modelo>`.
+    """
+    query = query.order_by(None)
+    if query.whereclause is None:
+        from app.utils.stats_counters import counter_totals
+        return counter_totals(model)[model.__tablename__]
+
+    compiled = query.statement.compile()
+    key = f"count:{model.__tablename__}:{cache_key(str(compiled), compiled.params)}"
+    return cache_manager.get_or_set(key, query.count, timeout,
+                                    tags=[f"model:{model.__name__}"], negative_ttl=timeout)
+
+
+def paginate_page(query, model, page: int = 1, per_page: int = DEFAULT_PAGE_SIZE,
+                  sort: Optional[str] = 'id', order: str = 'asc', columns=None):
+    """Página de `query` como objeto Pagination do Flask-SQLAlchemy
+
+    Busca só as linhas da página (LIMIT/OFFSET) e, com `columns`, só as
+    colunas exibidas (load_only). A ordenação inclui o id para que as
+    páginas sejam estáveis, e o total vem de cached_count.
+    """
+    _, column = sort_column(model, sort)
+    ordering = [column.desc() if order == 'desc' else column.asc()]
+    if column is not model.id:
+        ordering.append(model.id.desc() if order == 'desc' else model.id.asc())
+
+    page_query = query.order_by(None).order_by(*ordering)
+    if columns:
+        page_query = page_query.options(load_only(*(
+            getattr(model, column) if isinstance(column, str) else column for column in columns
+        )))
+
+    pagination = page_query.paginate(page=max(page or 1, 1), per_page=page_size(per_page),
+                                     max_per_page=MAX_PER_PAGE, error_out=False, count=False)
+    pagination.total = cached_count(query, model)
+    return pagination
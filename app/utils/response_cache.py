@@ -0,0 +1,172 @@
+"""
+Cache de respostas HTTP do Projeto Aduaneiro
+Armazena corpo e cabeçalhos das views, gera ETags fortes e responde
+If-None-Match com 304 sem executar a view
+"""
+
+import hashlib
+from functools import wraps
+from typing import Any, Callable, Dict, Iterable, Optional
+from flask import current_app, request, Response
+from flask_login import current_user
+from app.utils import cache as cache_module
+from app.utils.cache import cache_key
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Cabeçalhos que não devem ser reaproveitados entre requisições
+EXCLUDED_HEADERS = frozenset((
+    'content-length', 'set-cookie', 'date', 'connection', 'keep-alive',
+    'transfer-encoding', 'x-cache'
+))
+
+# Dimensões de Vary calculadas a partir do usuário logado
+USER_VARY = {
+    'user': lambda: str(current_user.get_id()) if current_user.is_authenticated else 'anonymous',
+    'user_group': lambda: (
+        getattr(current_user, 'group', None) or 'user'
+    ) if current_user.is_authenticated else 'anonymous'
+}
+
+CACHEABLE_METHODS = ('GET', 'HEAD')
+
+
+def make_etag(body: bytes) -> str:
+    """ETag forte calculado a partir do corpo da resposta"""
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def _normalized_query() -> list:
+    """Parâmetros da query string ordenados (independe da ordem na URL)"""
+    return sorted((k, sorted(request.args.getlist(k))) for k in request.args)
+
+
+def _vary_values(vary: Iterable[str]) -> list:
+    """Valores das dimensões de Vary para a requisição atual"""
+    values = []
+    for name in vary:
+        resolver = USER_VARY.get(name)
+        values.append(resolver() if resolver else request.headers.get(name, ''))
+    return values
+
+
+def _etag_matches(etag: str) -> bool:
+    """Compara o If-None-Match com o ETag armazenado
+
+    O Flask-Compress acrescenta o algoritmo ao ETag ("abc:gzip"), por isso
+    o sufixo é ignorado na comparação.
+    """
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    for candidate in header.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if ':' in candidate:
+            candidate = candidate.split(':', 1)[0] + '"'
+        if candidate == etag:
+            return True
+    return False
+
+
+def _to_record(response: Response) -> Dict[str, Any]:
+    """Converte a resposta da view no registro armazenado no cache"""
+    body = response.get_data()
+    etag = response.headers.get('ETag') or make_etag(body)
+    headers = [
+        (name, value) for name, value in response.headers.items()
+        if name.lower() not in EXCLUDED_HEADERS and name.lower() != 'etag'
+    ]
+    return {
+        'status': response.status_code,
+        'headers': headers,
+        'body': body,
+        'etag': etag
+    }
+
+
+def _build_response(record: Dict[str, Any], cache_control: str, vary_headers: list,
+                    cache_status: str) -> Response:
+    """Monta a resposta (200 ou 304) a partir do registro armazenado"""
+    if _etag_matches(record['etag']):
+        response = Response(status=304)
+    else:
+        response = Response(record['body'], status=record['status'],
+                            headers=record['headers'])
+    response.headers['ETag'] = record['etag']
+    if cache_control:
+        response.headers['Cache-Control'] = cache_control
+    for header in vary_headers:
+        response.vary.add(header)
+    response.headers['X-Cache'] = cache_status
+    return response
+
+
+def cache_response(timeout: int = 60, key_prefix: str = "http",
+                   vary: Optional[Iterable[str]] = None, tags=None,
+                   stale_ttl: Optional[int] = None,
+                   cache_control: str = 'private, no-cache'):
+    """Decorator de cache de respostas para views Flask e Resources do flask-restx
+
+    A chave combina método, caminho, query string normalizada e as
+    dimensões de `vary` (padrão: CACHE_RESPONSE_VARY). Cada dimensão é um
+    cabeçalho da requisição (ex.: "Accept-Encoding") ou "user"/"user_group".
+    Apenas respostas 200 são armazenadas; exceções da view (inclusive
+    abort) são repassadas sem cache. Deve ficar abaixo de
+    @login_required para que a autenticação continue sendo verificada.
+    """
+    def decorator(view: Callable):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if (request.method not in CACHEABLE_METHODS
+                    or not current_app.config.get('CACHE_RESPONSE_ENABLED', True)):
+                return view(*args, **kwargs)
+
+            dimensions = list(vary if vary is not None else
+                              current_app.config.get('CACHE_RESPONSE_VARY',
+                                                     ['user_group', 'Accept-Encoding']))
+            # GET e HEAD compartilham a mesma entrada
+            key = f"{key_prefix}:{request.endpoint}:" + cache_key(
+                request.path, _normalized_query(), _vary_values(dimensions)
+            )
+            entry_tags = tags(*args, **kwargs) if callable(tags) else tags
+            vary_headers = [name for name in dimensions if name not in USER_VARY]
+            if len(vary_headers) < len(dimensions):
+                # Respostas por usuário/grupo dependem do cookie de sessão
+                vary_headers.append('Cookie')
+
+            state = {'status': 'HIT'}
+
+            def render():
+                state['status'] = 'MISS'
+                try:
+                    response = current_app.make_response(view(*args, **kwargs))
+                except Exception as e:
+                    # abort(4xx) e falhas da view nunca vão para o cache
+                    state['error'] = e
+                    return None
+                state['response'] = response
+                if response.is_streamed or response.direct_passthrough:
+                    return None
+                return _to_record(response)
+
+            record = cache_module.cache_manager.get_or_set(
+                key, render, timeout,
+                tags=entry_tags,
+                stale_ttl=stale_ttl,
+                should_cache=lambda r: r is not None and r['status'] == 200
+            )
+
+            if 'error' in state:
+                raise state['error']
+            if record is None or record['status'] != 200:
+                # Erros e respostas em streaming são devolvidos sem cache
+                return state['response']
+            return _build_response(record, cache_control, vary_headers, state['status'])
+
+        return wrapper
+    return decorator
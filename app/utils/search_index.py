@@ -0,0 +1,431 @@
+"""
+Índice de busca dos cadastros (usuários, veículos e entidades)
+No SQLite, tabelas virtuais FTS5 (search_<tabela>) mantidas por triggers,
+que também cobrem insert() em lote e query.update(); nos demais bancos (ou
+SQLite sem FTS5), a tabela search_trigrams mantida pelos eventos do ORM.
+Nos dois casos a busca casa prefixos de palavras sem acento nem caixa
+("joao" encontra "João Silva") e os resultados têm ordem de relevância
+"""
+
+import re
+import threading
+import unicodedata
+import weakref
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import Integer, column, delete, event, func, insert, inspect, select, text, union
+from app import db
+from app.models.user import User
+from app.models.veiculo import Veiculo
+from app.models.entidade import Entidade
+from app.models.search_trigram import SearchTrigram
+from app.utils.documents import document_condition
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Colunas pesquisáveis por modelo (as mesmas das caixas de busca)
+SEARCH_FIELDS = {
+    User: ('name', 'lastname', 'email', 'cpf'),
+    Veiculo: ('motorista_responsavel', 'cpf_motorista', 'placa', 'renavam'),
+    Entidade: ('razao_social', 'nome_fantasia', 'cpf_cnpj', 'email_faturamento'),
+}
+
+# Documentos também indexados sem pontuação ("529.982.247-25" -> "52998224725")
+COMPACT_FIELDS = {
+    User: ('cpf',),
+    Veiculo: ('cpf_motorista', 'placa', 'renavam'),
+    Entidade: ('cpf_cnpj',),
+}
+
+BACKEND_FTS5 = 'fts5'
+BACKEND_TRIGRAM = 'trigram'
+BACKEND_LIKE = 'like'        # Sem índice (tabela search_trigrams ausente): ilike
+
+MAX_QUERY_TERMS = 8
+REBUILD_BATCH_SIZE = 1000
+
+_state = {'backend': 'auto'}
+_lock = threading.Lock()
+_backends: 'weakref.WeakKeyDictionary' = weakref.WeakKeyDictionary()   # engine -> backend
+_ready: 'weakref.WeakKeyDictionary' = weakref.WeakKeyDictionary()      # engine -> {tabela: backend}
+_tables_ready: 'weakref.WeakKeyDictionary' = weakref.WeakKeyDictionary()
+
+
+def normalize_text(value: Any) -> str:
+    """Texto sem acentos e em minúsculas ("João" -> "joao")"""
+    value = unicodedata.normalize('NFKD', str(value or ''))
+    return ''.join(char for char in value if not unicodedata.combining(char)).lower()
+
+
+def _words(value: Any) -> List[str]:
+    return re.findall(r'[a-z0-9]+', normalize_text(value))
+
+
+def document_words(model, values: Dict[str, Any]) -> Set[str]:
+    """Palavras indexadas de um registro (campos pesquisáveis e documentos compactos)"""
+    words = set()
+    for field in SEARCH_FIELDS[model]:
+        words.update(_words(values.get(field)))
+    for field in COMPACT_FIELDS[model]:
+        compact = ''.join(_words(values.get(field)))
+        if compact:
+            words.add(compact)
+    return words
+
+
+def query_terms(term: str) -> Tuple[List[str], Optional[str]]:
+    """Palavras da busca e, se houver pontuação entre elas, a forma compacta
+
+    "ABC-1234" busca as palavras "abc" e "1234" ou o prefixo "abc1234".
+    """
+    words = _words(term)[:MAX_QUERY_TERMS]
+    compact = ''.join(words) if len(words) > 1 else None
+    return words, compact
+
+
+def _trigrams(word: str, prefix: bool = False) -> Set[str]:
+    """Trigramas com o preenchimento do pg_trgm ("  w", " wo", ...)
+
+    Na busca (`prefix`), sem o espaço final: todos os trigramas de um
+    prefixo aparecem entre os da palavra completa.
+    """
+    padded = f'  {word}' if prefix else f'  {word} '
+    return {padded[index:index + 3] for index in range(len(padded) - 2)}
+
+
+def init_search_index(app) -> None:
+    """Escolhe o índice conforme SEARCH_INDEX_BACKEND (auto, trigram ou like)"""
+    _state['backend'] = app.config.get('SEARCH_INDEX_BACKEND', 'auto')
+    _backends.clear()
+    _ready.clear()
+
+
+def _backend(connection) -> str:
+    engine = connection.engine
+    if engine not in _backends:
+        backend = _state['backend']
+        if backend == 'auto':
+            backend = BACKEND_TRIGRAM
+            if connection.dialect.name == 'sqlite':
+                available = connection.exec_driver_sql(
+                    "SELECT sqlite_compileoption_used('ENABLE_FTS5')"
+                ).scalar()
+                backend = BACKEND_FTS5 if available else BACKEND_TRIGRAM
+        _backends[engine] = backend
+    return _backends[engine]
+
+
+def _has_table(connection, name: str) -> bool:
+    tables = _tables_ready.setdefault(connection.engine, {})
+    if name not in tables:
+        tables[name] = inspect(connection).has_table(name)
+    return tables[name]
+
+
+# FTS5 (SQLite)
+
+def _fts_table(model) -> str:
+    return f'search_{model.__tablename__}'
+
+
+def _fts_body(model, prefix: str) -> str:
+    """Expressão SQL do texto indexado (remove_diacritics trata os acentos)"""
+    parts = [f'coalesce({prefix}"{field}", \'\')' for field in SEARCH_FIELDS[model]]
+    for field in COMPACT_FIELDS[model]:
+        compact = f'coalesce({prefix}"{field}", \'\')'
+        for separator in ('.', '-', '/', ' '):
+            compact = f"replace({compact}, '{separator}', '')"
+        parts.append(compact)
+    return " || ' ' || ".join(parts)
+
+
+def _create_fts(connection, model) -> None:
+    table, fts = model.__tablename__, _fts_table(model)
+    body = _fts_body(model, 'new.')
+    columns = ', '.join(f'"{field}"' for field in SEARCH_FIELDS[model])
+    for statement in (
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(body, tokenize = 'unicode61 remove_diacritics 2')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, body) VALUES (new.id, {body}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {columns} ON {table} BEGIN "
+        f"DELETE FROM {fts} WHERE rowid = old.id; "
+        f"INSERT INTO {fts}(rowid, body) VALUES (new.id, {body}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+        f"DELETE FROM {fts} WHERE rowid = old.id; END",
+    ):
+        connection.exec_driver_sql(statement)
+
+
+def _rebuild_fts(connection, model) -> int:
+    fts = _fts_table(model)
+    connection.exec_driver_sql(f'DELETE FROM {fts}')
+    return connection.exec_driver_sql(
+        f'INSERT INTO {fts}(rowid, body) SELECT id, {_fts_body(model, "")} FROM {model.__tablename__}'
+    ).rowcount
+
+
+def _fts_match(terms: Sequence[str], compact: Optional[str]) -> str:
+    """Consulta FTS5: todas as palavras como prefixo (ou o documento compacto)"""
+    expression = ' AND '.join(f'"{word}"*' for word in terms)
+    if compact:
+        expression = f'({expression}) OR "{compact}"*'
+    return expression
+
+
+# Trigramas (demais bancos)
+
+def _trigram_rows(model, records: Iterable[Tuple[int, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    entity = model.__tablename__
+    rows = []
+    for record_id, values in records:
+        trigrams = set()
+        for word in document_words(model, values):
+            trigrams |= _trigrams(word)
+        rows.extend({'entity': entity, 'trigram': trigram, 'record_id': record_id}
+                    for trigram in trigrams)
+    return rows
+
+
+def _index_trigrams(connection, model, records: Iterable[Tuple[int, Dict[str, Any]]]) -> None:
+    rows = _trigram_rows(model, records)
+    if rows:
+        connection.execute(insert(SearchTrigram.__table__), rows)
+
+
+def _unindex_trigrams(connection, model, record_ids: Iterable[int]) -> None:
+    connection.execute(delete(SearchTrigram.__table__).where(
+        SearchTrigram.entity == model.__tablename__,
+        SearchTrigram.record_id.in_(list(record_ids))
+    ))
+
+
+def _rebuild_trigrams(connection, model) -> int:
+    connection.execute(delete(SearchTrigram.__table__).where(SearchTrigram.entity == model.__tablename__))
+    fields = SEARCH_FIELDS[model]
+    statement = select(model.id, *(getattr(model, field) for field in fields))
+    result = connection.execution_options(yield_per=REBUILD_BATCH_SIZE).execute(statement)
+    indexed = 0
+    for rows in result.partitions():
+        _index_trigrams(connection, model, ((row[0], dict(zip(fields, row[1:]))) for row in rows))
+        indexed += len(rows)
+    return indexed
+
+
+def _trigram_candidates(model, terms: Sequence[str], compact: Optional[str]):
+    """SELECT dos ids que têm todos os trigramas dos prefixos buscados"""
+    def matching(trigrams: Set[str]):
+        return select(SearchTrigram.record_id).where(
+            SearchTrigram.entity == model.__tablename__,
+            SearchTrigram.trigram.in_(sorted(trigrams))
+        ).group_by(SearchTrigram.record_id).having(func.count() == len(trigrams))
+
+    trigrams = set()
+    for word in terms:
+        trigrams |= _trigrams(word, prefix=True)
+    statement = matching(trigrams)
+    if compact:
+        statement = union(statement, matching(_trigrams(compact, prefix=True)))
+    return statement
+
+
+def _trigram_ready(connection) -> bool:
+    return _backend(connection) == BACKEND_TRIGRAM and _has_table(connection, SearchTrigram.__tablename__)
+
+
+def _values(target) -> Dict[str, Any]:
+    return {field: getattr(target, field) for field in SEARCH_FIELDS[type(target)]}
+
+
+def _after_insert(mapper, connection, target):
+    if _trigram_ready(connection):
+        _index_trigrams(connection, mapper.class_, [(target.id, _values(target))])
+
+
+def _after_update(mapper, connection, target):
+    state = inspect(target)
+    changed = any(state.attrs[field].history.has_changes() for field in SEARCH_FIELDS[mapper.class_])
+    if changed and _trigram_ready(connection):
+        _unindex_trigrams(connection, mapper.class_, [target.id])
+        _index_trigrams(connection, mapper.class_, [(target.id, _values(target))])
+
+
+def _after_delete(mapper, connection, target):
+    if _trigram_ready(connection):
+        _unindex_trigrams(connection, mapper.class_, [target.id])
+
+
+def _model_table_changed(target, connection, **kw):
+    """Tabela do cadastro criada ou removida: o índice é refeito na próxima busca"""
+    _ready.get(connection.engine, {}).pop(target.name, None)
+
+
+def _model_table_dropped(target, connection, **kw):
+    _model_table_changed(target, connection)
+    if connection.dialect.name == 'sqlite':
+        connection.exec_driver_sql(f'DROP TABLE IF EXISTS search_{target.name}')
+
+
+def _trigram_table_changed(target, connection, **kw):
+    _tables_ready.pop(connection.engine, None)
+    _ready.pop(connection.engine, None)
+
+
+for _model in SEARCH_FIELDS:
+    event.listen(_model, 'after_insert', _after_insert)
+    event.listen(_model, 'after_update', _after_update)
+    event.listen(_model, 'after_delete', _after_delete)
+    event.listen(_model.__table__, 'after_create', _model_table_changed)
+    event.listen(_model.__table__, 'after_drop', _model_table_dropped)
+event.listen(SearchTrigram.__table__, 'after_create', _trigram_table_changed)
+event.listen(SearchTrigram.__table__, 'after_drop', _trigram_table_changed)
+
+
+def index_bulk_insert(connection, model, rows: Sequence[Dict[str, Any]], key: str) -> None:
+    """Indexa linhas inseridas com insert() em lote, localizadas pela coluna única `key`
+
+    Só o índice de trigramas precisa disso (no FTS5 os triggers já
+    indexaram); chamado na mesma transação do insert.
+    """
+    if not rows or not _trigram_ready(connection):
+        return
+    fields = SEARCH_FIELDS[model]
+    key_column = getattr(model, key)
+    inserted = connection.execute(
+        select(model.id, *(getattr(model, field) for field in fields))
+        .where(key_column.in_([row[key] for row in rows]))
+    ).all()
+    _index_trigrams(connection, model, ((row[0], dict(zip(fields, row[1:]))) for row in inserted))
+
+
+# Inicialização e reconstrução
+
+def _ensure_index(model) -> str:
+    """Cria e popula o índice do modelo na primeira busca (por engine)"""
+    engine = db.engine
+    table = model.__tablename__
+    backend = _ready.get(engine, {}).get(table)
+    if backend:
+        return backend
+
+    with _lock, engine.begin() as connection:
+        backend = _backend(connection)
+        if backend == BACKEND_FTS5:
+            created = connection.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = ?",
+                (f'{_fts_table(model)}_ai',)
+            ).first()
+            if not created:
+                _create_fts(connection, model)
+                indexed = _rebuild_fts(connection, model)
+                logger.info(f"Índice de busca FTS5 de {table} criado ({indexed} registros)")
+        elif backend == BACKEND_TRIGRAM:
+            if not _has_table(connection, SearchTrigram.__tablename__):
+                logger.warning("Tabela search_trigrams ausente: busca sem índice (ilike)")
+                backend = BACKEND_LIKE
+            else:
+                # Registros anteriores ao índice (ou fora dos eventos): reconstruir
+                records = connection.execute(select(func.count()).select_from(model)).scalar()
+                indexed = connection.execute(
+                    select(func.count(SearchTrigram.record_id.distinct()))
+                    .where(SearchTrigram.entity == table)
+                ).scalar()
+                if indexed != records:
+                    indexed = _rebuild_trigrams(connection, model)
+                    logger.info(f"Índice de busca por trigramas de {table} reconstruído ({indexed} registros)")
+    _ready.setdefault(engine, {})[table] = backend
+    return backend
+
+
+def rebuild_search_index(models: Optional[Iterable] = None) -> Dict[str, int]:
+    """Recria o índice de busca a partir das tabelas; retorna os registros indexados"""
+    indexed = {}
+    with _lock, db.engine.begin() as connection:
+        backend = _backend(connection)
+        for model in models or SEARCH_FIELDS:
+            if backend == BACKEND_FTS5:
+                _create_fts(connection, model)
+                indexed[model.__tablename__] = _rebuild_fts(connection, model)
+            elif backend == BACKEND_TRIGRAM and _has_table(connection, SearchTrigram.__tablename__):
+                indexed[model.__tablename__] = _rebuild_trigrams(connection, model)
+    for model in models or SEARCH_FIELDS:
+        _ready.get(db.engine, {}).pop(model.__tablename__, None)
+    logger.info(f"Índice de busca reconstruído: {indexed}")
+    return indexed
+
+
+# Busca
+
+def _like_condition(model, term: str):
+    pattern = f'%{term}%'
+    return db.or_(*(getattr(model, field).ilike(pattern) for field in SEARCH_FIELDS[model]))
+
+
+def search_condition(model, term: Optional[str]):
+    """Condição `id IN (...)` dos registros que casam com `term` (None se a busca é vazia)
+
+    Um documento completo ("529.982.247-25", "ABC-1234") com cadastro vira
+    igualdade na coluna normalizada (busca no índice); sem cadastro, segue
+    para o índice de texto, que também casa prefixos.
+    """
+    terms, compact = query_terms(term or '')
+    if not terms:
+        return None
+    exact = document_condition(model, term.strip())
+    if exact is not None and db.session.execute(select(model.id).where(exact).limit(1)).first():
+        return exact
+    backend = _ensure_index(model)
+    if backend == BACKEND_FTS5:
+        fts = _fts_table(model)
+        matches = text(f'SELECT rowid FROM {fts} WHERE {fts} MATCH :query').bindparams(
+            query=_fts_match(terms, compact)
+        ).columns(column('rowid', Integer))
+        return model.id.in_(matches)
+    if backend == BACKEND_TRIGRAM:
+        return model.id.in_(_trigram_candidates(model, terms, compact))
+    return _like_condition(model, term.strip())
+
+
+def apply_search(query, model, term: Optional[str]):
+    """Filtra `query` pelos registros que casam com `term` (sem busca: inalterada)"""
+    condition = search_condition(model, term)
+    return query if condition is None else query.filter(condition)
+
+
+def search_ids(model, term: Optional[str], limit: int = 20) -> List[int]:
+    """Ids dos registros mais relevantes para `term`
+
+    Documento completo cadastrado: igualdade na coluna normalizada.
+    FTS5: ordem do bm25. Trigramas: registros com menos trigramas além
+    dos buscados primeiro (mais próximos do termo); ilike: id.
+    """
+    terms, compact = query_terms(term or '')
+    if not terms:
+        return []
+    exact = document_condition(model, term.strip())
+    if exact is not None:
+        ids = list(db.session.execute(
+            select(model.id).where(exact).order_by(model.id).limit(limit)
+        ).scalars())
+        if ids:
+            return ids
+    backend = _ensure_index(model)
+    if backend == BACKEND_FTS5:
+        fts = _fts_table(model)
+        return list(db.session.execute(
+            text(f'SELECT rowid FROM {fts} WHERE {fts} MATCH :query ORDER BY rank LIMIT :limit'),
+            {'query': _fts_match(terms, compact), 'limit': limit}
+        ).scalars())
+    if backend == BACKEND_TRIGRAM:
+        candidates = _trigram_candidates(model, terms, compact).subquery()
+        return list(db.session.execute(
+            select(SearchTrigram.record_id)
+            .where(SearchTrigram.entity == model.__tablename__,
+                   SearchTrigram.record_id.in_(select(candidates.c.record_id)))
+            .group_by(SearchTrigram.record_id)
+            .order_by(func.count(), SearchTrigram.record_id)
+            .limit(limit)
+        ).scalars())
+    return list(db.session.execute(
+        select(model.id).where(_like_condition(model, term.strip())).order_by(model.id).limit(limit)
+    ).scalars())
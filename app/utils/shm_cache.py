@@ -0,0 +1,430 @@
+"""
+Cache em memória compartilhada do Projeto Aduaneiro
+Tabela hash de tamanho fixo em um arquivo mapeado (mmap) em /dev/shm,
+compartilhada pelos workers do Gunicorn de um mesmo nó sem depender do Redis
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+import logging
+
+from app.utils.cache_serialization import CacheCodec
+
+try:
+    import fcntl
+except ImportError:  # Windows: backend indisponível
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'ADUSHM01'
+LAYOUT_VERSION = 1
+
+# Cabeçalho do segmento: magic, versão, slots, tamanho do slot, vias, PID do dono
+HEADER = struct.Struct('<8sIIIIq')
+HEADER_SIZE = 64
+
+# Cabeçalho do slot: seq (seqlock), hash da chave, expiração, tamanho do
+# valor, tamanho da chave, tamanho das tags, flags
+SLOT = struct.Struct('<QQdIHHI')
+SEQ = struct.Struct('<Q')
+SLOT_HEADER_SIZE = 40
+
+FLAG_USED = 0x01
+
+# Travas de thread por faixa de buckets (as travas fcntl são por processo)
+LOCK_STRIPES = 64
+
+# Tentativas de leitura consistente antes de tratar a chave como ausente
+READ_RETRIES = 8
+
+TAG_SEPARATOR = '\x1f'
+
+_MISSING = object()
+
+
+def default_path() -> str:
+    """Caminho padrão do segmento (/dev/shm quando disponível)"""
+    base = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(base, 'aduaneiro-cache')
+
+
+def _hash_key(key: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'little')
+
+
+def _pid_alive(pid: int) -> bool:
+    if pid <= 0:
+        return False
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class SharedMemoryCache:
+    """Cache associativo por conjunto (bucket com `ways` slots) em memória compartilhada
+
+    Leituras não usam trava: cada slot tem um contador seqlock que o
+    escritor torna ímpar durante a escrita, e o leitor repete a leitura se
+    o contador mudar. Escritas no mesmo bucket são serializadas por uma
+    trava fcntl na faixa do arquivo (entre processos) e por uma trava de
+    thread (dentro do processo). Valores maiores que o slot são recusados.
+
+    Implementa a mesma interface do LocalCache para ser usado pelo
+    CacheManager como cache local (fallback e near-cache).
+    """
+
+    shared = True
+
+    def __init__(self, path: Optional[str] = None, slots: int = 2048,
+                 slot_size: int = 32768, ways: int = 4, codec: Optional[CacheCodec] = None):
+        if fcntl is None:
+            raise RuntimeError("Cache em memória compartilhada requer fcntl (Linux/Unix)")
+        if slots <= 0 or ways <= 0 or slots % ways:
+            raise ValueError("O número de slots deve ser múltiplo de ways")
+        if slot_size <= SLOT_HEADER_SIZE:
+            raise ValueError(f"Tamanho de slot inválido: {slot_size}")
+
+        self.path = path or default_path()
+        self.slots = slots
+        self.slot_size = slot_size
+        self.ways = ways
+        self.buckets = slots // ways
+        self.capacity = slot_size - SLOT_HEADER_SIZE
+        self.codec = codec or CacheCodec()
+
+        self._size = HEADER_SIZE + slots * slot_size
+        self._thread_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        self._open_segment()
+        self._mm = mmap.mmap(self._fd, self._size)
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.rejections = 0
+        self.read_retries = 0
+
+    def _open_segment(self) -> None:
+        """Anexa ao segmento existente ou o (re)cria
+
+        O segmento é recriado quando o layout mudou ou quando o processo que
+        o criou (master do Gunicorn) não existe mais, para não servir dados
+        de uma execução anterior.
+        """
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, HEADER_SIZE, 0)
+        try:
+            if os.fstat(self._fd).st_size == self._size:
+                magic, version, slots, slot_size, ways, owner = HEADER.unpack(
+                    os.pread(self._fd, HEADER.size, 0)
+                )
+                if (magic == MAGIC and version == LAYOUT_VERSION and slots == self.slots
+                        and slot_size == self.slot_size and ways == self.ways
+                        and _pid_alive(owner)):
+                    return
+
+            os.ftruncate(self._fd, 0)
+            os.ftruncate(self._fd, self._size)
+            os.pwrite(self._fd, HEADER.pack(MAGIC, LAYOUT_VERSION, self.slots,
+                                            self.slot_size, self.ways, os.getpid()), 0)
+            logger.info(f"Segmento de cache compartilhado criado em {self.path} "
+                        f"({self._size // (1024 * 1024)}MB)")
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, HEADER_SIZE, 0)
+
+    def close(self) -> None:
+        """Desfaz o mapeamento (o arquivo permanece para os demais workers)"""
+        self._mm.close()
+        os.close(self._fd)
+
+    # Layout
+
+    def _offset(self, index: int) -> int:
+        return HEADER_SIZE + index * self.slot_size
+
+    def _bucket_of(self, key_hash: int) -> int:
+        return key_hash % self.buckets
+
+    def _bucket_slots(self, bucket: int) -> range:
+        start = bucket * self.ways
+        return range(start, start + self.ways)
+
+    @contextmanager
+    def _bucket_lock(self, bucket: int) -> Iterator[None]:
+        """Trava de escrita do bucket (threads e processos)"""
+        start = self._offset(bucket * self.ways)
+        length = self.ways * self.slot_size
+        with self._thread_locks[bucket % LOCK_STRIPES]:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, length, start)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, length, start)
+
+    # Leitura e escrita de slots
+
+    def _read_slot(self, index: int, with_value: bool = True) -> Optional[Tuple]:
+        """Leitura consistente (seqlock) de um slot ocupado
+
+        Retorna (hash, expira, chave, tags, valor) ou None se o slot estiver
+        vazio ou não puder ser lido de forma consistente.
+        """
+        offset = self._offset(index)
+        data_start = offset + SLOT_HEADER_SIZE
+        for _ in range(READ_RETRIES):
+            seq, key_hash, expires, value_len, key_len, tags_len, flags = \
+                SLOT.unpack_from(self._mm, offset)
+            if seq & 1:
+                # Escrita em andamento
+                self.read_retries += 1
+                time.sleep(0)
+                continue
+            if not flags & FLAG_USED:
+                return None
+
+            length = key_len + tags_len + (value_len if with_value else 0)
+            data = self._mm[data_start:data_start + length]
+            if SEQ.unpack_from(self._mm, offset)[0] != seq:
+                self.read_retries += 1
+                continue
+
+            return (key_hash, expires, data[:key_len],
+                    data[key_len:key_len + tags_len], data[key_len + tags_len:])
+        return None
+
+    def _write_slot(self, index: int, key_hash: int, expires: float,
+                    key: bytes, tags: bytes, payload: bytes) -> None:
+        """Grava um slot (chamar com a trava do bucket)"""
+        offset = self._offset(index)
+        seq = SEQ.unpack_from(self._mm, offset)[0]
+        SEQ.pack_into(self._mm, offset, seq + 1)
+        data = key + tags + payload
+        data_start = offset + SLOT_HEADER_SIZE
+        self._mm[data_start:data_start + len(data)] = data
+        SLOT.pack_into(self._mm, offset, seq + 1, key_hash, expires,
+                       len(payload), len(key), len(tags), FLAG_USED)
+        SEQ.pack_into(self._mm, offset, seq + 2)
+
+    def _clear_slot(self, index: int) -> None:
+        """Libera um slot (chamar com a trava do bucket)"""
+        offset = self._offset(index)
+        seq = SEQ.unpack_from(self._mm, offset)[0]
+        SEQ.pack_into(self._mm, offset, seq + 1)
+        SLOT.pack_into(self._mm, offset, seq + 1, 0, 0.0, 0, 0, 0, 0)
+        SEQ.pack_into(self._mm, offset, seq + 2)
+
+    def _find(self, key: bytes, key_hash: int) -> Optional[Tuple[int, Tuple]]:
+        """Localiza a chave no seu bucket"""
+        for index in self._bucket_slots(self._bucket_of(key_hash)):
+            slot = self._read_slot(index)
+            if slot is not None and slot[0] == key_hash and slot[2] == key:
+                return index, slot
+        return None
+
+    def _choose_slot(self, bucket: int, key_hash: int, key: bytes, now: float) -> int:
+        """Escolhe o slot para gravar: mesma chave, vazio, expirado ou o que expira antes"""
+        empty = expired = victim = None
+        victim_expires = float('inf')
+        for index in self._bucket_slots(bucket):
+            _, slot_hash, expires, _, key_len, _, flags = SLOT.unpack_from(
+                self._mm, self._offset(index)
+            )
+            if not flags & FLAG_USED:
+                if empty is None:
+                    empty = index
+                continue
+            if slot_hash == key_hash:
+                data_start = self._offset(index) + SLOT_HEADER_SIZE
+                if self._mm[data_start:data_start + key_len] == key:
+                    return index
+            if expires and expires <= now:
+                if expired is None:
+                    expired = index
+                continue
+            effective = expires or float('inf')
+            if victim is None or effective < victim_expires:
+                victim, victim_expires = index, effective
+
+        if empty is not None:
+            return empty
+        if expired is not None:
+            self.expirations += 1
+            return expired
+        self.evictions += 1
+        return victim
+
+    def _scan(self, with_value: bool = False) -> Iterator[Tuple[int, Tuple]]:
+        """Percorre todos os slots ocupados"""
+        for index in range(self.slots):
+            slot = self._read_slot(index, with_value=with_value)
+            if slot is not None:
+                yield index, slot
+
+    def _delete_index(self, index: int, key: bytes, key_hash: int) -> bool:
+        """Remove o slot se ele ainda contiver a chave"""
+        with self._bucket_lock(self._bucket_of(key_hash)):
+            slot = self._read_slot(index, with_value=False)
+            if slot is None or slot[2] != key:
+                return False
+            self._clear_slot(index)
+            return True
+
+    # Interface compatível com LocalCache
+
+    def __len__(self) -> int:
+        now = time.time()
+        return sum(1 for _, slot in self._scan() if not slot[1] or slot[1] > now)
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def keys(self) -> List[str]:
+        """Retorna as chaves armazenadas e não expiradas"""
+        now = time.time()
+        return [slot[2].decode() for _, slot in self._scan() if not slot[1] or slot[1] > now]
+
+    def export_entries(self, match: Callable[[str], bool]) -> List[tuple]:
+        """Retorna (chave, valor, expiração, tags) das entradas válidas que casam com `match`"""
+        now = time.time()
+        entries = []
+        for _, (_, expires, key, tags, payload) in self._scan(with_value=True):
+            key = key.decode()
+            if (expires and expires <= now) or not match(key):
+                continue
+            try:
+                value = self.codec.loads(payload)
+            except Exception:
+                continue
+            entries.append((key, value, expires or None,
+                            tuple(tags.decode().split(TAG_SEPARATOR)) if tags else ()))
+        return entries
+    
+    def get(self, key: str, default: Any = None) -> Any:
+        """Recupera um valor (sem trava; leitura via seqlock)"""
+        key_bytes = key.encode()
+        found = self._find(key_bytes, _hash_key(key_bytes))
+        if found is None:
+            self.misses += 1
+            return default
+
+        _, (_, expires, _, _, payload) = found
+        if expires and expires <= time.time():
+            self.expirations += 1
+            self.misses += 1
+            return default
+
+        try:
+            value = self.codec.loads(payload)
+        except Exception as e:
+            logger.warning(f"Valor inválido no cache compartilhado ({key}): {e}")
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any, timeout: Optional[int] = 3600,
+            size: Optional[int] = None, tags: Optional[Iterable[str]] = None) -> bool:
+        """Armazena um valor; recusa valores maiores que o slot"""
+        key_bytes = key.encode()
+        tag_bytes = TAG_SEPARATOR.join(tags).encode() if tags else b''
+        payload = self.codec.dumps(value)
+        if (len(key_bytes) > 0xFFFF or len(tag_bytes) > 0xFFFF
+                or len(key_bytes) + len(tag_bytes) + len(payload) > self.capacity):
+            self.rejections += 1
+            logger.debug(f"Valor muito grande para o cache compartilhado: {key}")
+            return False
+
+        now = time.time()
+        expires = now + timeout if timeout else 0.0
+        key_hash = _hash_key(key_bytes)
+        bucket = self._bucket_of(key_hash)
+        with self._bucket_lock(bucket):
+            index = self._choose_slot(bucket, key_hash, key_bytes, now)
+            self._write_slot(index, key_hash, expires, key_bytes, tag_bytes, payload)
+        return True
+
+    def delete(self, key: str) -> bool:
+        """Remove uma chave do cache"""
+        key_bytes = key.encode()
+        key_hash = _hash_key(key_bytes)
+        found = self._find(key_bytes, key_hash)
+        if found is None:
+            return False
+        return self._delete_index(found[0], key_bytes, key_hash)
+
+    def pop(self, key: str, default: Any = None) -> Any:
+        """Remove uma chave e retorna seu valor"""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            return default
+        self.delete(key)
+        return value
+
+    def invalidate_tags(self, tags: Iterable[str]) -> List[str]:
+        """Remove as chaves associadas às tags (varre a tabela)"""
+        wanted = set(tags)
+        removed = []
+        for index, (key_hash, _, key, slot_tags, _) in list(self._scan()):
+            if slot_tags and wanted.intersection(slot_tags.decode().split(TAG_SEPARATOR)):
+                if self._delete_index(index, key, key_hash):
+                    removed.append(key.decode())
+        return removed
+
+    def clear(self) -> None:
+        """Remove todas as entradas (de todos os workers)"""
+        for bucket in range(self.buckets):
+            with self._bucket_lock(bucket):
+                for index in self._bucket_slots(bucket):
+                    flags = SLOT.unpack_from(self._mm, self._offset(index))[6]
+                    if flags & FLAG_USED:
+                        self._clear_slot(index)
+
+    def sweep(self) -> int:
+        """Remove todas as entradas expiradas e retorna a quantidade removida"""
+        now = time.time()
+        removed = 0
+        for index, (key_hash, expires, key, _, _) in list(self._scan()):
+            if expires and expires <= now and self._delete_index(index, key, key_hash):
+                removed += 1
+        self.expirations += removed
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        """Retorna ocupação do segmento e contadores deste worker"""
+        now = time.time()
+        entries = 0
+        used_bytes = 0
+        for _, (_, expires, key, tags, payload) in self._scan(with_value=True):
+            if not expires or expires > now:
+                entries += 1
+                used_bytes += len(key) + len(tags) + len(payload)
+        return {
+            'policy': 'shm',
+            'path': self.path,
+            'entries': entries,
+            'bytes': used_bytes,
+            'max_entries': self.slots,
+            'max_bytes': self.slots * self.capacity,
+            'slot_size': self.slot_size,
+            'ways': self.ways,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'rejections': self.rejections,
+            'read_retries': self.read_retries
+        }
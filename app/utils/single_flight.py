@@ -0,0 +1,81 @@
+"""
+Travas para recomputação única (single-flight) de entradas do cache
+Combina uma trava por chave no processo com uma trava com lease no Redis
+"""
+
+import threading
+import uuid
+import weakref
+from typing import Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class _KeyLock:
+    """Trava associada a uma chave (permite referência fraca)"""
+    __slots__ = ('lock', '__weakref__')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+
+
+class KeyLocks:
+    """Registro de travas por chave dentro do processo
+
+    As travas são mantidas por referência fraca e desaparecem quando
+    nenhuma thread as utiliza mais.
+    """
+
+    def __init__(self):
+        self._guard = threading.Lock()
+        self._locks: 'weakref.WeakValueDictionary[str, _KeyLock]' = weakref.WeakValueDictionary()
+
+    def get(self, key: str) -> _KeyLock:
+        with self._guard:
+            key_lock = self._locks.get(key)
+            if key_lock is None:
+                key_lock = _KeyLock()
+                self._locks[key] = key_lock
+            return key_lock
+
+
+class RedisLease:
+    """Trava distribuída no Redis com lease (SET NX PX)"""
+
+    def __init__(self, redis_client, lock_key: str, lease: float):
+        self.redis_client = redis_client
+        self.lock_key = lock_key
+        self.lease = lease
+        self.token: Optional[str] = None
+
+    def acquire(self) -> bool:
+        """Tenta obter a trava sem bloquear"""
+        token = uuid.uuid4().hex
+        if self.redis_client.set(self.lock_key, token, nx=True, px=int(self.lease * 1000)):
+            self.token = token
+            return True
+        return False
+
+    def release(self) -> None:
+        """Libera a trava apenas se ela ainda pertencer a este processo"""
+        if self.token is None:
+            return
+
+        try:
+            with self.redis_client.pipeline() as pipe:
+                pipe.watch(self.lock_key)
+                current = pipe.get(self.lock_key)
+                if isinstance(current, bytes):
+                    current = current.decode()
+                if current == self.token:
+                    pipe.multi()
+                    pipe.delete(self.lock_key)
+                    pipe.execute()
+                else:
+                    pipe.unwatch()
+        except Exception as e:
+            # O lease expira sozinho; apenas registrar
+            logger.debug(f"Erro ao liberar trava {self.lock_key}: {e}")
+        finally:
+            self.token = None
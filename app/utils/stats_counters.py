@@ -0,0 +1,459 @@
+"""
+Contadores de estatísticas mantidos incrementalmente
+Eventos after_insert/after_update/before_delete de User, Veiculo e Entidade
+atualizam as tabelas stats_counters (total, status, grupo/tipo) e
+monthly_rollups (registros por mês de criação) na mesma transação da
+escrita, e uma reconciliação periódica corrige a divergência (operações em
+massa, como query.update() e insert() em lote, não disparam os eventos)
+"""
+
+import os
+import random
+import threading
+import time
+import weakref
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from flask import current_app
+from sqlalchemy import delete, event, exists, func, inspect, select, update
+from app import db
+from app.models.user import User
+from app.models.veiculo import Veiculo
+from app.models.entidade import Entidade
+from app.models.stats_counter import StatsCounter
+from app.models.monthly_rollup import MonthlyRollup
+from app.utils.stats_engine import month_key, monthly_counts, table_stats, table_totals
+import logging
+
+logger = logging.getLogger(__name__)
+
+TOTAL = '_total'
+
+# Dimensões contadas por modelo
+COUNTED_DIMENSIONS = {
+    User: ('status', 'group'),
+    Veiculo: ('status', 'tipo'),
+    Entidade: ('status', 'tipo_cliente'),
+}
+
+# Coluna usada nos agregados mensais
+DATE_COLUMN = 'created_at'
+
+Key = Tuple[str, str, str]    # (tabela, dimensão, valor)
+MonthKey = Tuple[str, str]    # (tabela, AAAA-MM)
+
+# Tabelas auxiliares existentes em cada engine (verificado uma vez)
+_tables_ready = weakref.WeakKeyDictionary()
+_state = {'enabled': False, 'reconcile_pid': None}
+
+
+def _value(value: Any) -> str:
+    return '' if value is None else str(value)
+
+
+def _committed_value(target, attribute: str) -> Any:
+    """Valor do atributo antes das alterações pendentes"""
+    history = inspect(target).attrs[attribute].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return getattr(target, attribute)
+
+
+def _row_deltas(target, sign: int, committed: bool = False) -> Tuple[Dict[Key, int], Dict[MonthKey, int]]:
+    """Deltas dos contadores e do mês de criação de um registro inserido/removido"""
+    table = target.__tablename__
+
+    def read(attribute):
+        return _committed_value(target, attribute) if committed else getattr(target, attribute)
+
+    deltas = {(table, TOTAL, ''): sign}
+    for dimension in COUNTED_DIMENSIONS[type(target)]:
+        deltas[(table, dimension, _value(read(dimension)))] = sign
+
+    month = month_key(read(DATE_COLUMN))
+    return deltas, ({(table, month): sign} if month else {})
+
+
+def _update_deltas(target) -> Tuple[Dict[Key, int], Dict[MonthKey, int]]:
+    """Deltas das dimensões (e do mês) alterados em um UPDATE"""
+    table = target.__tablename__
+    state = inspect(target)
+    deltas: Dict[Key, int] = defaultdict(int)
+    months: Dict[MonthKey, int] = defaultdict(int)
+
+    for attribute in COUNTED_DIMENSIONS[type(target)] + (DATE_COLUMN,):
+        history = state.attrs[attribute].history
+        if not history.has_changes():
+            continue
+        old = history.deleted[0] if history.deleted else None
+        new = history.added[0] if history.added else None
+        if attribute == DATE_COLUMN:
+            if month_key(old) != month_key(new):
+                if old:
+                    months[(table, month_key(old))] -= 1
+                if new:
+                    months[(table, month_key(new))] += 1
+        elif _value(old) != _value(new):
+            deltas[(table, attribute, _value(old))] -= 1
+            deltas[(table, attribute, _value(new))] += 1
+    return deltas, months
+
+
+def _upsert(connection, table, keys: Dict[str, str], delta: int, absolute: bool = False) -> None:
+    """Soma `delta` à contagem da linha `keys` (ou define o valor, com `absolute`)"""
+    now = datetime.utcnow()
+    new_count = delta if absolute else table.c.count + delta
+    row = dict(keys, count=delta, updated_at=now)
+    dialect = connection.dialect.name
+
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        statement = insert(table).values(**row).on_conflict_do_update(
+            index_elements=[table.c[name] for name in keys],
+            set_={'count': new_count, 'updated_at': now}
+        )
+    elif dialect in ('mysql', 'mariadb'):
+        from sqlalchemy.dialects.mysql import insert
+        statement = insert(table).values(**row).on_duplicate_key_update(
+            count=new_count, updated_at=now
+        )
+    else:
+        result = connection.execute(
+            update(table)
+            .where(*(table.c[name] == value for name, value in keys.items()))
+            .values(count=new_count, updated_at=now)
+        )
+        if result.rowcount:
+            return
+        statement = table.insert().values(**row)
+
+    connection.execute(statement)
+
+
+def _upsert_counter(connection, key: Key, delta: int, absolute: bool = False) -> None:
+    table_name, dimension, value = key
+    _upsert(connection, StatsCounter.__table__,
+            {'table_name': table_name, 'dimension': dimension, 'value': value}, delta, absolute)
+
+
+def _upsert_month(connection, key: MonthKey, delta: int, absolute: bool = False) -> None:
+    entity, month = key
+    _upsert(connection, MonthlyRollup.__table__, {'entity': entity, 'month': month}, delta, absolute)
+
+
+def _table_ready(connection, model) -> bool:
+    """Indica se os contadores estão ativos e a tabela auxiliar existe nesta engine"""
+    if not _state['enabled']:
+        return False
+    tables = _tables_ready.setdefault(connection.engine, {})
+    name = model.__tablename__
+    if name not in tables:
+        tables[name] = inspect(connection).has_table(name)
+    return tables[name]
+
+
+def _apply(connection, deltas: Tuple[Dict[Key, int], Dict[MonthKey, int]]) -> None:
+    counters, months = deltas
+    if _table_ready(connection, StatsCounter):
+        for key, delta in counters.items():
+            if delta:
+                _upsert_counter(connection, key, delta)
+    if _table_ready(connection, MonthlyRollup):
+        for key, delta in months.items():
+            if delta:
+                _upsert_month(connection, key, delta)
+
+
+def _after_insert(mapper, connection, target):
+    _apply(connection, _row_deltas(target, 1))
+
+
+def _after_update(mapper, connection, target):
+    _apply(connection, _update_deltas(target))
+
+
+def _before_delete(mapper, connection, target):
+    # Antes do DELETE: atributos expirados ainda podem ser carregados
+    _apply(connection, _row_deltas(target, -1, committed=True))
+
+
+def _table_created(target, connection, **kw):
+    _tables_ready.setdefault(connection.engine, {})[target.name] = True
+
+
+def _table_dropped(target, connection, **kw):
+    _tables_ready.setdefault(connection.engine, {})[target.name] = False
+
+
+def _track_previous(target, value, oldvalue, initiator):
+    return value
+
+
+for _model, _dimensions in COUNTED_DIMENSIONS.items():
+    # active_history: ao alterar um atributo expirado, o valor anterior é
+    # carregado, para que o UPDATE saiba de qual contador decrementar
+    for _attribute in _dimensions + (DATE_COLUMN,):
+        event.listen(getattr(_model, _attribute), 'set', _track_previous,
+                     active_history=True, retval=True)
+    event.listen(_model, 'after_insert', _after_insert)
+    event.listen(_model, 'after_update', _after_update)
+    event.listen(_model, 'before_delete', _before_delete)
+for _table in (StatsCounter.__table__, MonthlyRollup.__table__):
+    event.listen(_table, 'after_create', _table_created)
+    event.listen(_table, 'after_drop', _table_dropped)
+
+
+def count_bulk_insert(connection, model, rows: Iterable[Dict[str, Any]]) -> None:
+    """Soma aos contadores linhas inseridas com insert() em lote
+
+    insert() em lote não dispara os eventos do ORM; chamado na mesma
+    transação, aplica um upsert por valor distinto em vez de um por linha.
+    As linhas devem trazer os valores finais das dimensões e de created_at.
+    """
+    table = model.__tablename__
+    counters: Dict[Key, int] = defaultdict(int)
+    months: Dict[MonthKey, int] = defaultdict(int)
+    for row in rows:
+        counters[(table, TOTAL, '')] += 1
+        for dimension in COUNTED_DIMENSIONS[model]:
+            counters[(table, dimension, _value(row.get(dimension)))] += 1
+        month = month_key(row.get(DATE_COLUMN))
+        if month:
+            months[(table, month)] += 1
+    _apply(connection, (counters, months))
+
+
+def init_stats_counters(app) -> None:
+    """Ativa a manutenção dos contadores conforme STATS_COUNTERS_ENABLED"""
+    _state['enabled'] = app.config.get('STATS_COUNTERS_ENABLED', True)
+
+
+def _actual_counts(connection, model) -> Dict[Key, int]:
+    """Contagens reais da tabela (uma única varredura agrupada)"""
+    table = model.__tablename__
+    columns = [getattr(model, dimension) for dimension in COUNTED_DIMENSIONS[model]]
+    counts: Dict[Key, int] = defaultdict(int)
+    rows = connection.execute(
+        select(*columns, func.count()).select_from(model).group_by(*columns)
+    ).all()
+    for row in rows:
+        count = row[-1]
+        counts[(table, TOTAL, '')] += count
+        for dimension, value in zip(COUNTED_DIMENSIONS[model], row[:-1]):
+            counts[(table, dimension, _value(value))] += count
+    counts.setdefault((table, TOTAL, ''), 0)
+    return counts
+
+
+def _reconcile_counters(connection, model) -> int:
+    table = model.__tablename__
+    counters = StatsCounter.__table__
+    actual = _actual_counts(connection, model)
+    stored = {
+        (table, row.dimension, row.value): row.count
+        for row in connection.execute(
+            select(counters.c.dimension, counters.c.value, counters.c.count)
+            .where(counters.c.table_name == table)
+        )
+    }
+    drift = [key for key in set(actual) | set(stored) if actual.get(key, 0) != stored.get(key)]
+    for key in drift:
+        if actual.get(key, 0) or key[1] == TOTAL:
+            _upsert_counter(connection, key, actual.get(key, 0), absolute=True)
+        else:
+            connection.execute(delete(counters).where(
+                counters.c.table_name == key[0], counters.c.dimension == key[1], counters.c.value == key[2]
+            ))
+    return len(drift)
+
+
+def _reconcile_months(connection, model) -> int:
+    table = model.__tablename__
+    rollups = MonthlyRollup.__table__
+    actual = {
+        (table, month): count
+        for month, count in monthly_counts(model, date_column=DATE_COLUMN, connection=connection)
+    }
+    stored = {
+        (table, row.month): row.count
+        for row in connection.execute(
+            select(rollups.c.month, rollups.c.count).where(rollups.c.entity == table)
+        )
+    }
+    drift = [key for key in set(actual) | set(stored) if actual.get(key, 0) != stored.get(key)]
+    for key in drift:
+        if actual.get(key, 0):
+            _upsert_month(connection, key, actual[key], absolute=True)
+        else:
+            connection.execute(delete(rollups).where(rollups.c.entity == key[0], rollups.c.month == key[1]))
+    return len(drift)
+
+
+def reconcile_counters(models: Optional[Iterable] = None) -> Dict[str, int]:
+    """Recalcula contadores e agregados mensais a partir das tabelas
+
+    Retorna o número de linhas corrigidas por tabela. Roda em uma conexão
+    e transação próprias (nunca faz commit da sessão da requisição).
+    Escritas concorrentes durante a reconciliação podem deixar divergências
+    residuais, corrigidas na execução seguinte.
+    """
+    fixed = {}
+    with db.engine.begin() as connection:
+        for model in (models or COUNTED_DIMENSIONS):
+            table = model.__tablename__
+            fixed[table] = 0
+            if _table_ready(connection, StatsCounter):
+                fixed[table] += _reconcile_counters(connection, model)
+            if _table_ready(connection, MonthlyRollup):
+                fixed[table] += _reconcile_months(connection, model)
+            if fixed[table]:
+                logger.info(f"Contadores de {table} reconciliados ({fixed[table]} corrigidos)")
+    return fixed
+
+
+def _reconcile_loop(app, interval: float) -> None:
+    pid = os.getpid()
+    while _state['reconcile_pid'] == pid:
+        time.sleep(interval * random.uniform(0.9, 1.1))
+        try:
+            with app.app_context():
+                if _acquire_reconcile_lease(interval):
+                    reconcile_counters()
+        except Exception as e:
+            logger.warning(f"Erro ao reconciliar contadores de estatísticas: {e}")
+
+
+def _acquire_reconcile_lease(interval: float) -> bool:
+    """Com Redis, apenas um worker reconcilia a cada intervalo"""
+    from app.utils.cache import cache_manager
+    from app.utils.single_flight import RedisLease
+    if not cache_manager._redis_ready():
+        return True
+    try:
+        return RedisLease(cache_manager.redis_client, 'aduaneiro:lock:stats_counters',
+                          interval * 0.9).acquire()
+    except Exception as e:
+        logger.debug(f"Lease de reconciliação indisponível: {e}")
+        return True
+
+
+def _ensure_reconcile_thread() -> None:
+    """Inicia a reconciliação periódica (uma thread por worker)"""
+    interval = current_app.config.get('STATS_COUNTERS_RECONCILE_INTERVAL', 3600)
+    if not interval or _state['reconcile_pid'] == os.getpid():
+        return
+    _state['reconcile_pid'] = os.getpid()
+    threading.Thread(target=_reconcile_loop, args=(current_app._get_current_object(), interval),
+                     name='stats-counters-reconcile', daemon=True).start()
+
+
+def _stored_counters(models: List) -> Optional[Dict[str, Dict[str, Dict[str, int]]]]:
+    """Contadores gravados ({tabela: {dimensão: {valor: contagem}}}) ou None
+
+    Tabelas ainda sem contadores (primeiro uso) são reconciliadas antes da
+    leitura; sem a tabela stats_counters, retorna None.
+    """
+    if not _table_ready(db.session.connection(), StatsCounter):
+        return None
+    _ensure_reconcile_thread()
+
+    tables = [model.__tablename__ for model in models]
+    rows = db.session.execute(
+        select(StatsCounter.table_name, StatsCounter.dimension, StatsCounter.value,
+               StatsCounter.count).where(StatsCounter.table_name.in_(tables))
+    ).all()
+    counters: Dict[str, Dict[str, Dict[str, int]]] = {table: {} for table in tables}
+    for table, dimension, value, count in rows:
+        counters[table].setdefault(dimension, {})[value] = count
+
+    missing = [model for model in models if TOTAL not in counters[model.__tablename__]]
+    if missing:
+        reconcile_counters(missing)
+        return _stored_counters(models)
+    return counters
+
+
+def counter_totals(*models) -> Dict[str, int]:
+    """Total de registros por tabela lido dos contadores (mesmo formato de table_totals)"""
+    counters = _stored_counters(list(models))
+    if counters is None:
+        return table_totals(*models)
+    return {table: dims[TOTAL].get('', 0) for table, dims in counters.items()}
+
+
+def counter_stats(model, statuses: Iterable[str] = ('active', 'blocked'),
+                  dimension: Optional[str] = None) -> Dict[str, Any]:
+    """Estatísticas de uma tabela lidas dos contadores (mesmo formato de table_stats)
+
+    `dimension` é a coluna de agrupamento ("group", "tipo", "tipo_cliente").
+    """
+    statuses = list(statuses)
+    counters = _stored_counters([model])
+    if counters is None:
+        return table_stats(model, statuses=statuses,
+                           group_by=getattr(model, dimension) if dimension else None)
+
+    dims = counters[model.__tablename__]
+    by_status = dims.get('status', {})
+    by_group = [
+        (value or None, count)
+        for value, count in dims.get(dimension, {}).items() if count
+    ] if dimension else []
+    by_group.sort(key=lambda item: item[1], reverse=True)
+    return {
+        'total': dims[TOTAL].get('', 0),
+        'by_status': {status: by_status.get(status, 0) for status in statuses},
+        'by_group': by_group,
+        'conditions': {}
+    }
+
+
+def _missing_rollups(models: List) -> List:
+    """Tabelas com registros mas sem nenhum agregado mensal (primeiro uso)"""
+    with_rollups = set(db.session.execute(
+        select(MonthlyRollup.entity).where(
+            MonthlyRollup.entity.in_([model.__tablename__ for model in models])
+        ).distinct()
+    ).scalars())
+    return [
+        model for model in models
+        if model.__tablename__ not in with_rollups
+        and db.session.execute(select(exists().select_from(model))).scalar()
+    ]
+
+
+def monthly_series(*models, since: Optional[datetime] = None) -> Dict[str, List[Tuple[str, int]]]:
+    """Registros criados por mês ({tabela: [(AAAA-MM, contagem)]}) a partir do mês de `since`
+
+    Lê monthly_rollups (cerca de 12 linhas por tabela para um ano); sem a
+    tabela, agrupa created_at com month_bucket.
+    """
+    if not _table_ready(db.session.connection(), MonthlyRollup):
+        return {model.__tablename__: monthly_counts(model, since, DATE_COLUMN) for model in models}
+    _ensure_reconcile_thread()
+
+    tables = [model.__tablename__ for model in models]
+    query = select(MonthlyRollup.entity, MonthlyRollup.month, MonthlyRollup.count).where(
+        MonthlyRollup.entity.in_(tables), MonthlyRollup.count > 0
+    )
+    if since is not None:
+        query = query.where(MonthlyRollup.month >= month_key(since))
+    series: Dict[str, List[Tuple[str, int]]] = {table: [] for table in tables}
+    for entity, month, count in db.session.execute(query.order_by(MonthlyRollup.month)):
+        series[entity].append((month, count))
+
+    # Sem linhas na janela: conferir se a tabela ainda não foi agregada
+    empty = [model for model in models if not series[model.__tablename__]]
+    if empty:
+        missing = _missing_rollups(empty)
+        if missing:
+            reconcile_counters(missing)
+            return monthly_series(*models, since=since)
+    return series
@@ -0,0 +1,135 @@
+"""
+Motor de estatísticas agregadas do Projeto Aduaneiro
+Calcula total, contagens por status, por grupo/tipo e por condições
+arbitrárias de uma tabela em uma única varredura (SUM(CASE ...)), e
+agrupa datas por mês com a função correta de cada banco
+"""
+
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import String, case, func, literal_column, select
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+from app import db
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _conditional_count(condition):
+    """COUNT condicional: SUM(CASE WHEN condição THEN 1 ELSE 0 END)"""
+    return func.sum(case((condition, 1), else_=0))
+
+
+def table_stats(model, statuses: Iterable[str] = ('active', 'blocked'),
+                group_by=None, conditions: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Estatísticas de uma tabela em uma única consulta
+
+    Retorna `total`, `by_status` (contagem de cada status pedido),
+    `by_group` (lista de (valor, contagem) da coluna `group_by`, em ordem
+    decrescente de contagem) e `conditions` (contagem de cada expressão
+    booleana nomeada, ex.: {'new_this_month': User.created_at >= inicio}).
+    """
+    statuses = list(statuses)
+    conditions = dict(conditions or {})
+
+    columns = [func.count()]
+    columns += [_conditional_count(model.status == status) for status in statuses]
+    columns += [_conditional_count(condition) for condition in conditions.values()]
+
+    if group_by is not None:
+        rows = db.session.execute(
+            select(group_by, *columns).select_from(model).group_by(group_by)
+        ).all()
+    else:
+        rows = [(None,) + tuple(db.session.execute(select(*columns).select_from(model)).one())]
+
+    result = {
+        'total': 0,
+        'by_status': dict.fromkeys(statuses, 0),
+        'by_group': [],
+        'conditions': dict.fromkeys(conditions, 0)
+    }
+    for row in rows:
+        group, count, values = row[0], row[1] or 0, row[2:]
+        result['total'] += count
+        for status, value in zip(statuses, values):
+            result['by_status'][status] += value or 0
+        for name, value in zip(conditions, values[len(statuses):]):
+            result['conditions'][name] += value or 0
+        if group_by is not None:
+            result['by_group'].append((group, count))
+
+    result['by_group'].sort(key=lambda item: item[1], reverse=True)
+    return result
+
+
+def table_totals(*models) -> Dict[str, int]:
+    """Total de registros de várias tabelas em uma única consulta
+
+    Cada COUNT(*) vira uma subconsulta escalar do mesmo SELECT, em vez de
+    uma ida ao banco por tabela. As chaves são os nomes das tabelas.
+    """
+    columns = [
+        select(func.count()).select_from(model).scalar_subquery().label(model.__tablename__)
+        for model in models
+    ]
+    row = db.session.execute(select(*columns)).one()
+    return {model.__tablename__: row[index] or 0 for index, model in enumerate(models)}
+
+
+class month_bucket(FunctionElement):
+    """Mês ("AAAA-MM") de uma coluna de data, compilado conforme o dialeto
+
+    O formato é um literal (e não um parâmetro) para que a expressão do
+    SELECT e a do GROUP BY sejam idênticas em todos os bancos.
+    """
+    type = String()
+    name = 'month_bucket'
+    inherit_cache = True
+
+
+def _bucket_column(element):
+    return list(element.clauses)[0]
+
+
+@compiles(month_bucket)
+def _month_bucket_sqlite(element, compiler, **kw):
+    # SQLite (padrão)
+    return compiler.process(func.strftime(literal_column("'%Y-%m'"), _bucket_column(element)), **kw)
+
+
+@compiles(month_bucket, 'mysql')
+@compiles(month_bucket, 'mariadb')
+def _month_bucket_mysql(element, compiler, **kw):
+    return compiler.process(func.date_format(_bucket_column(element), literal_column("'%Y-%m'")), **kw)
+
+
+@compiles(month_bucket, 'postgresql')
+def _month_bucket_postgresql(element, compiler, **kw):
+    return compiler.process(func.to_char(_bucket_column(element), literal_column("'YYYY-MM'")), **kw)
+
+
+@compiles(month_bucket, 'mssql')
+def _month_bucket_mssql(element, compiler, **kw):
+    return compiler.process(func.format(_bucket_column(element), literal_column("'yyyy-MM'")), **kw)
+
+
+def month_key(value: Optional[datetime]) -> Optional[str]:
+    """Mês ("AAAA-MM") de uma data no Python, no mesmo formato de month_bucket"""
+    return value.strftime('%Y-%m') if value else None
+
+
+def monthly_counts(model, since: Optional[datetime] = None,
+                   date_column: str = 'created_at', connection=None) -> List[Tuple[str, int]]:
+    """Registros por mês (GROUP BY month_bucket), a partir do mês de `since`
+
+    Executa em `connection`, se informada (senão na sessão).
+    """
+    column = getattr(model, date_column)
+    bucket = month_bucket(column)
+    query = select(bucket.label('month'), func.count()).select_from(model)
+    if since is not None:
+        query = query.where(column >= since.replace(day=1, hour=0, minute=0, second=0, microsecond=0))
+    rows = (connection or db.session).execute(query.group_by(bucket).order_by(bucket)).all()
+    return [(month, count) for month, count in rows if month]
@@ -0,0 +1,234 @@
+"""
+Respostas em streaming do Projeto Aduaneiro
+Percorre consultas em lotes (yield_per, cursor no servidor quando o banco
+suporta) e escreve NDJSON, CSV ou XLSX em blocos por um gerador, para que
+a memória não cresça com o número de linhas e o primeiro byte saia logo
+"""
+
+import csv
+import io
+import json
+import re
+import zipfile
+from xml.sax.saxutils import escape
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+from flask import Response, stream_with_context
+from app import db
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 1000
+
+FORMAT_NDJSON = 'ndjson'
+FORMAT_CSV = 'csv'
+FORMAT_XLSX = 'xlsx'
+STREAM_FORMATS = (FORMAT_NDJSON, FORMAT_CSV, FORMAT_XLSX)
+
+MIMETYPES = {
+    FORMAT_NDJSON: 'application/x-ndjson',
+    FORMAT_CSV: 'text/csv; charset=utf-8',
+    FORMAT_XLSX: 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+}
+
+
+def iter_batches(statement, batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[List[Any]]:
+    """Linhas de um SELECT em lotes de `batch_size` (yield_per)
+
+    Com yield_per o SQLAlchemy usa stream_results (cursor no servidor no
+    PostgreSQL e no MySQL) e só mantém um lote de linhas em memória.
+    """
+    result = db.session.execute(statement.execution_options(yield_per=batch_size))
+    try:
+        for partition in result.partitions():
+            yield partition
+    finally:
+        result.close()
+
+
+def iter_records(statement, serialize: Callable[[Any], Dict[str, Any]],
+                 batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[List[Dict[str, Any]]]:
+    """Lotes de registros (dicionários) de um SELECT, convertidos por `serialize`"""
+    for rows in iter_batches(statement, batch_size):
+        yield [serialize(row) for row in rows]
+
+
+def ndjson_chunks(batches: Iterable[List[Dict[str, Any]]]) -> Iterator[str]:
+    """Um bloco de texto por lote, uma linha JSON por registro"""
+    try:
+        for records in batches:
+            if records:
+                yield ''.join(json.dumps(record, ensure_ascii=False, default=str) + '\n'
+                              for record in records)
+    except Exception as e:
+        # Status e cabeçalhos já foram enviados: a falha vai na última linha
+        logger.error(f"Erro durante o streaming NDJSON: {e}")
+        yield json.dumps({'error': 'Falha ao gerar o relatório'}, ensure_ascii=False) + '\n'
+
+
+def csv_chunks(batches: Iterable[List[Dict[str, Any]]], fieldnames: Sequence[str],
+               header: Optional[Sequence[str]] = None, bom: bool = True) -> Iterator[str]:
+    """Um bloco de CSV por lote, precedido do cabeçalho
+
+    `header` substitui os nomes das colunas na primeira linha (ex.: rótulos
+    em português); o BOM faz o Excel reconhecer o UTF-8.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush() -> str:
+        chunk = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return chunk
+
+    if bom:
+        buffer.write('\ufeff')
+    writer.writerow(header or fieldnames)
+    yield flush()
+
+    try:
+        for records in batches:
+            writer.writerows([record.get(field) for field in fieldnames] for record in records)
+            chunk = flush()
+            if chunk:
+                yield chunk
+    except Exception as e:
+        # Sem marcador no CSV: a exceção interrompe a resposta (chunked sem o
+        # terminador) e o cliente não recebe um arquivo truncado como válido
+        logger.error(f"Erro durante o streaming CSV: {e}")
+        raise
+
+
+# Partes fixas do pacote XLSX (SpreadsheetML com uma planilha)
+_XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+        '<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/styles.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+        '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+        '<fills count="1"><fill><patternFill patternType="none"/></fill></fills>'
+        '<borders count="1"><border/></borders>'
+        '<cellStyleXfs count="1"><xf/></cellStyleXfs>'
+        '<cellXfs count="2"><xf/><xf fontId="1" applyFont="1"/></cellXfs>'
+        '</styleSheet>'
+    )
+}
+
+_XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets></workbook>'
+)
+
+# Caracteres de controle não permitidos em XML 1.0
+_XML_INVALID = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+class _ChunkBuffer:
+    """Destino do zipfile sem seek: acumula bytes até o gerador drená-los"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _xlsx_cell(value: Any, style: int = 0) -> str:
+    style_attr = f' s="{style}"' if style else ''
+    if isinstance(value, bool) or value is None:
+        value = '' if value is None else ('Sim' if value else 'Não')
+    if isinstance(value, (int, float)):
+        return f'<c{style_attr}><v>{value}</v></c>'
+    text = escape(_XML_INVALID.sub('', str(value)))
+    return f'<c{style_attr} t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _xlsx_row(values: Iterable[Any], style: int = 0) -> str:
+    return '<row>' + ''.join(_xlsx_cell(value, style) for value in values) + '</row>'
+
+
+def xlsx_chunks(batches: Iterable[List[Dict[str, Any]]], fieldnames: Sequence[str],
+                header: Optional[Sequence[str]] = None, sheet_name: str = 'Dados') -> Iterator[bytes]:
+    """Planilha XLSX escrita lote a lote
+
+    O XLSX é um zip de XML: as partes fixas são gravadas primeiro e a
+    planilha é comprimida em streaming (zipfile com data descriptors, sem
+    seek). Os textos vão como inline strings, sem a tabela sharedStrings,
+    que exigiria manter todos os valores em memória.
+    """
+    buffer = _ChunkBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as package:
+        for name, content in _XLSX_PARTS.items():
+            package.writestr(name, content)
+        package.writestr('xl/workbook.xml', _XLSX_WORKBOOK.format(name=escape(sheet_name[:31])))
+
+        with package.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write((
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                '<sheetData>' + _xlsx_row(header or fieldnames, style=1)
+            ).encode())
+            yield buffer.drain()
+
+            try:
+                for records in batches:
+                    sheet.write(''.join(
+                        _xlsx_row(record.get(field) for field in fieldnames) for record in records
+                    ).encode())
+                    chunk = buffer.drain()
+                    if chunk:
+                        yield chunk
+            except Exception as e:
+                # Propaga sem fechar a planilha: o diretório central do zip fica
+                # só no buffer (não é mais enviado) e o download termina inválido
+                logger.error(f"Erro durante o streaming XLSX: {e}")
+                raise
+            sheet.write(b'</sheetData></worksheet>')
+    yield buffer.drain()
+
+
+def stream_response(chunks: Iterator[str], format_type: str,
+                    filename: Optional[str] = None) -> Response:
+    """Resposta HTTP em streaming (mantém o contexto da requisição no gerador)"""
+    response = Response(stream_with_context(chunks), content_type=MIMETYPES[format_type])
+    if filename:
+        response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    # Evita que proxies (nginx) acumulem a resposta antes de enviá-la
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
@@ -31,11 +31,122 @@ class Config:
     REDIS_DB = int(os.environ.get('REDIS_DB', 0))
     REDIS_PASSWORD = os.environ.get('REDIS_PASSWORD')
     
+    # Pool de conexões Redis (por worker) e timeouts curtos para falhar rápido
+    REDIS_POOL_MAX_CONNECTIONS = int(os.environ.get('REDIS_POOL_MAX_CONNECTIONS', 10))
+    REDIS_SOCKET_TIMEOUT = float(os.environ.get('REDIS_SOCKET_TIMEOUT', 0.5))
+    REDIS_CONNECT_TIMEOUT = float(os.environ.get('REDIS_CONNECT_TIMEOUT', 0.5))
+    REDIS_HEALTH_CHECK_INTERVAL = int(os.environ.get('REDIS_HEALTH_CHECK_INTERVAL', 30))
+    
+    # Circuit breaker do Redis: abre após N falhas e testa após reset_timeout segundos,
+    # dobrando a espera a cada sonda falha até o máximo
+    CACHE_BREAKER_FAILURE_THRESHOLD = int(os.environ.get('CACHE_BREAKER_FAILURE_THRESHOLD', 3))
+    CACHE_BREAKER_RESET_TIMEOUT = float(os.environ.get('CACHE_BREAKER_RESET_TIMEOUT', 10))
+    CACHE_BREAKER_MAX_RESET_TIMEOUT = float(os.environ.get('CACHE_BREAKER_MAX_RESET_TIMEOUT', 300))
+    
     # Configurações de cache
     CACHE_TYPE = os.environ.get('CACHE_TYPE', 'redis')
     CACHE_DEFAULT_TIMEOUT = int(os.environ.get('CACHE_DEFAULT_TIMEOUT', 3600))
     CACHE_KEY_PREFIX = 'aduaneiro'
     
+    # Cache em memória local (fallback quando o Redis não está disponível)
+    CACHE_MEMORY_MAX_ENTRIES = int(os.environ.get('CACHE_MEMORY_MAX_ENTRIES', 10000))
+    CACHE_MEMORY_MAX_BYTES = int(os.environ.get('CACHE_MEMORY_MAX_BYTES', 64 * 1024 * 1024))
+    CACHE_MEMORY_POLICY = os.environ.get('CACHE_MEMORY_POLICY', 'lru')  # lru ou lfu
+    CACHE_MEMORY_SWEEP_INTERVAL = int(os.environ.get('CACHE_MEMORY_SWEEP_INTERVAL', 60))
+    
+    # Backend do cache local: 'local' (por worker) ou 'shm' (tabela hash em
+    # /dev/shm compartilhada pelos workers do Gunicorn, sem Redis)
+    CACHE_MEMORY_BACKEND = os.environ.get('CACHE_MEMORY_BACKEND', 'local')
+    CACHE_SHM_PATH = os.environ.get('CACHE_SHM_PATH')  # Padrão: /dev/shm/aduaneiro-cache
+    CACHE_SHM_SLOTS = int(os.environ.get('CACHE_SHM_SLOTS', 2048))
+    CACHE_SHM_SLOT_SIZE = int(os.environ.get('CACHE_SHM_SLOT_SIZE', 32768))
+    CACHE_SHM_WAYS = int(os.environ.get('CACHE_SHM_WAYS', 4))
+    
+    # Near-cache: L1 por worker na frente do Redis, invalidado via pub/sub
+    CACHE_NEAR_ENABLED = os.environ.get('CACHE_NEAR_ENABLED', 'False').lower() == 'true'
+    CACHE_NEAR_TTL = int(os.environ.get('CACHE_NEAR_TTL', 5))
+    CACHE_INVALIDATION_CHANNEL = os.environ.get('CACHE_INVALIDATION_CHANNEL', 'aduaneiro:invalidate')
+    CACHE_TAG_TTL = int(os.environ.get('CACHE_TAG_TTL', 86400))
+    
+    # Proteção contra stampede (recomputação única e stale-while-revalidate)
+    CACHE_LOCK_LEASE = int(os.environ.get('CACHE_LOCK_LEASE', 30))  # Igual ao timeout do Gunicorn
+    CACHE_STALE_TTL = int(os.environ.get('CACHE_STALE_TTL', 0))
+    CACHE_EARLY_EXPIRATION_BETA = float(os.environ.get('CACHE_EARLY_EXPIRATION_BETA', 1.0))
+    
+    # Cache negativo: resultados None/vazios e falhas (backoff) com TTL curto
+    CACHE_NEGATIVE_TTL = int(os.environ.get('CACHE_NEGATIVE_TTL', 60))
+    CACHE_ERROR_TTL = int(os.environ.get('CACHE_ERROR_TTL', 10))
+    
+    # Serialização binária: compressão (none, zlib ou lz4) acima do limite em bytes
+    CACHE_COMPRESSION = os.environ.get('CACHE_COMPRESSION', 'zlib')
+    CACHE_COMPRESSION_THRESHOLD = int(os.environ.get('CACHE_COMPRESSION_THRESHOLD', 1024))
+    
+    # Cache de respostas HTTP (ETag/304): dimensões de Vary da chave
+    # (cabeçalhos da requisição ou user/user_group)
+    CACHE_RESPONSE_ENABLED = os.environ.get('CACHE_RESPONSE_ENABLED', 'True').lower() == 'true'
+    CACHE_RESPONSE_VARY = [
+        v.strip() for v in os.environ.get('CACHE_RESPONSE_VARY', 'user_group,Accept-Encoding').split(',')
+        if v.strip()
+    ]
+    
+    # Snapshot do cache local: gravado periodicamente e no encerramento dos
+    # workers e carregado na inicialização (apenas sem Redis disponível)
+    CACHE_SNAPSHOT_ENABLED = os.environ.get('CACHE_SNAPSHOT_ENABLED', 'False').lower() == 'true'
+    CACHE_SNAPSHOT_PATH = os.environ.get('CACHE_SNAPSHOT_PATH', 'instance/cache_snapshot.bin')
+    CACHE_SNAPSHOT_INTERVAL = int(os.environ.get('CACHE_SNAPSHOT_INTERVAL', 300))
+    CACHE_SNAPSHOT_PREFIXES = [
+        p.strip() for p in os.environ.get(
+            'CACHE_SNAPSHOT_PREFIXES',
+            'stats,reports,reports_stats,system_stats,system_stats_detailed,api_stats,linkedin_posts'
+        ).split(',')
+        if p.strip()
+    ]
+    
+    # Aquecimento do cache na inicialização: "sync" aquece dentro de
+    # create_app (antes do fork com preload_app) e "background" em uma
+    # thread por worker; /api/health/ready responde 503 até terminar
+    CACHE_WARMUP_ENABLED = os.environ.get('CACHE_WARMUP_ENABLED', 'True').lower() == 'true'
+    CACHE_WARMUP_MODE = os.environ.get('CACHE_WARMUP_MODE', 'sync')
+    CACHE_WARMUP_BUDGET = float(os.environ.get('CACHE_WARMUP_BUDGET', 10))
+    
+    # Contadores de estatísticas (tabela stats_counters) e intervalo da
+    # reconciliação que corrige divergências (0 desativa)
+    STATS_COUNTERS_ENABLED = os.environ.get('STATS_COUNTERS_ENABLED', 'True').lower() == 'true'
+    STATS_COUNTERS_RECONCILE_INTERVAL = int(os.environ.get('STATS_COUNTERS_RECONCILE_INTERVAL', 3600))
+    
+    # Importação em massa de CSV: linhas por lote (validação, checagem de
+    # duplicidade e transação) e máximo de erros listados na resposta
+    IMPORT_CHUNK_SIZE = int(os.environ.get('IMPORT_CHUNK_SIZE', 500))
+    IMPORT_MAX_ERRORS = int(os.environ.get('IMPORT_MAX_ERRORS', 1000))
+    
+    # Índice de busca dos cadastros: "auto" (FTS5 no SQLite, trigramas nos
+    # demais bancos), "trigram" ou "like" (sem índice)
+    SEARCH_INDEX_BACKEND = os.environ.get('SEARCH_INDEX_BACKEND', 'auto')
+    
+    # Consulta por CPF/CNPJ (/api/lookup): LRU do processo; o TTL limita a
+    # defasagem das escritas feitas em outros processos
+    IDENTITY_LOOKUP_CACHE_SIZE = int(os.environ.get('IDENTITY_LOOKUP_CACHE_SIZE', 1024))
+    IDENTITY_LOOKUP_CACHE_TTL = int(os.environ.get('IDENTITY_LOOKUP_CACHE_TTL', 30))
+    
+    # Fila de tarefas em segundo plano: arquivo SQLite da fila e pasta dos
+    # resultados (padrão: instance/), processos do pool, tentativas, espera
+    # antes da nova tentativa (dobra a cada uma), prazo sem heartbeat para a
+    # tarefa voltar à fila e retenção dos resultados (segundos).
+    # JOBS_EMBEDDED_WORKER (padrão True, lido em config/gunicorn.conf.py) faz o
+    # Gunicorn iniciar scripts/job_worker.py
+    JOBS_DATABASE = os.environ.get('JOBS_DATABASE')
+    JOBS_RESULT_DIR = os.environ.get('JOBS_RESULT_DIR')
+    JOBS_WORKERS = int(os.environ.get('JOBS_WORKERS', 2))
+    JOBS_POLL_INTERVAL = float(os.environ.get('JOBS_POLL_INTERVAL', 1))
+    JOBS_MAX_ATTEMPTS = int(os.environ.get('JOBS_MAX_ATTEMPTS', 3))
+    JOBS_RETRY_BACKOFF = float(os.environ.get('JOBS_RETRY_BACKOFF', 30))
+    JOBS_LEASE_TIMEOUT = float(os.environ.get('JOBS_LEASE_TIMEOUT', 120))
+    JOBS_RESULT_RETENTION = int(os.environ.get('JOBS_RESULT_RETENTION', 86400))
+    
+    # Métricas por prefixo/camada, enviadas ao Redis a cada N segundos por worker
+    CACHE_METRICS_ENABLED = os.environ.get('CACHE_METRICS_ENABLED', 'True').lower() == 'true'
+    CACHE_METRICS_FLUSH_INTERVAL = float(os.environ.get('CACHE_METRICS_FLUSH_INTERVAL', 10))
+    
     # Configurações de compressão
     COMPRESS_MIMETYPES = [
         'text/html',
@@ -72,6 +183,7 @@ class DevelopmentConfig(Config):
 class ProductionConfig(Config):
     """Configuração para produção"""
     DEBUG = False
+    CACHE_SNAPSHOT_ENABLED = os.environ.get('CACHE_SNAPSHOT_ENABLED', 'True').lower() == 'true'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///projeto_aduaneiro_prod.db'
 
 class TestingConfig(Config):
@@ -79,6 +191,7 @@ class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     WTF_CSRF_ENABLED = False
+    CACHE_WARMUP_ENABLED = False
 
 # Mapeamento de configurações
 config = {
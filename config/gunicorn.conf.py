@@ -1,6 +1,9 @@
 # Configuração do Gunicorn para Produção
 import os
 
+import subprocess
+import sys
+
 # Configurações básicas
 bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
 workers = int(os.environ.get('WEB_CONCURRENCY', 4))
@@ -27,3 +30,36 @@ secure_scheme_headers = {
 # Configurações de performance
 preload_app = True
 worker_tmp_dir = "/dev/shm"
+
+# Snapshot do cache local: workers novos (inclusive os reciclados por
+# max_requests) carregam o snapshot mais recente antes de atender
+# requisições, e cada worker grava o seu ao encerrar
+def post_worker_init(worker):
+    from app.utils.cache import cache_manager
+    from app.utils.cache_warmer import cache_warmer
+    cache_manager.load_snapshot()
+    # Com CACHE_WARMUP_MODE=background o aquecimento roda em cada worker
+    cache_warmer.ensure_started()
+
+def worker_exit(server, worker):
+    from app.utils.cache import cache_manager
+    cache_manager.save_snapshot()
+
+# Pool da fila de tarefas como processo filho do master: o deploy (Railway
+# e Procfile) tem um único serviço e a fila SQLite fica no disco dele. Com
+# JOBS_EMBEDDED_WORKER=False, rode scripts/job_worker.py com o mesmo
+# JOBS_DATABASE/JOBS_RESULT_DIR
+_job_worker = None
+
+def when_ready(server):
+    global _job_worker
+    if os.environ.get('JOBS_EMBEDDED_WORKER', 'True').lower() == 'true':
+        script = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                              'scripts', 'job_worker.py')
+        _job_worker = subprocess.Popen([sys.executable, script])
+        server.log.info(f"Pool de tarefas iniciado (pid {_job_worker.pid})")
+
+def on_exit(server):
+    if _job_worker is not None and _job_worker.poll() is None:
+        _job_worker.terminate()
+        _job_worker.wait()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Benchmark do motor de estatísticas
+Compara as consultas COUNT por status (padrão anterior) com a agregação
+condicional em uma única varredura: número de consultas e latência
+
+Uso: python scripts/benchmark_stats.py [--rows 20000] [--repeat 20]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event, insert
+
+from app import create_app, db
+from app.models.user import User
+from app.models.veiculo import Veiculo
+from app.models.entidade import Entidade
+from app.utils.stats_engine import table_stats, table_totals
+
+
+def seed(rows):
+    """Popula as três tabelas com dados sintéticos"""
+    now = datetime.utcnow()
+    statuses = ['active'] * 8 + ['blocked', 'ativo', 'inativo']
+
+    def created():
+        return now - timedelta(days=random.randint(0, 720))
+
+    db.session.execute(insert(User), [{
+        'name': f'Usuario {i}', 'lastname': 'Teste', 'cpf': f'{i:011d}',
+        'email': f'usuario{i}@exemplo.com', 'status': random.choice(statuses),
+        'group': random.choice(['Paclog ADM', 'Paclog Faturamento', 'Paclog Operacional']),
+        'created_at': created()
+    } for i in range(rows)])
+    db.session.execute(insert(Veiculo), [{
+        'motorista_responsavel': f'Motorista {i}', 'cpf_motorista': f'{i:011d}',
+        'placa': f'V{i:07d}', 'status': random.choice(statuses),
+        'tipo': random.choice(['Reboque', 'Carreta', 'Cavalo', 'Truck', 'Outros']),
+        'created_at': created()
+    } for i in range(rows)])
+    db.session.execute(insert(Entidade), [{
+        'razao_social': f'Empresa {i}', 'nome_fantasia': f'Empresa {i}',
+        'cpf_cnpj': f'{i:014d}', 'pagamento': '001', 'status': random.choice(statuses),
+        'tipo_cliente': random.choice(['Pessoa Fisica', 'Juridica', 'Estrangeira']),
+        'email_faturamento': 'f@exemplo.com', 'email_operacional': 'o@exemplo.com',
+        'email_despachante': 'd@exemplo.com', 'created_at': created()
+    } for i in range(rows)])
+    db.session.commit()
+
+
+def legacy_stats():
+    """Padrão anterior: total + um COUNT por status + GROUP BY, por tabela"""
+    result = {}
+    for model, group_column in ((User, User.group), (Veiculo, Veiculo.tipo),
+                                (Entidade, Entidade.tipo_cliente)):
+        result[model.__tablename__] = {
+            'total': model.query.count(),
+            'active': model.query.filter_by(status='active').count(),
+            'blocked': model.query.filter_by(status='blocked').count(),
+            'by_group': sorted(
+                db.session.query(group_column, db.func.count(model.id)).group_by(group_column).all(),
+                key=lambda item: item[1], reverse=True
+            )
+        }
+    return result
+
+
+def engine_stats():
+    """Motor novo: uma consulta por tabela"""
+    result = {}
+    for model, group_column in ((User, User.group), (Veiculo, Veiculo.tipo),
+                                (Entidade, Entidade.tipo_cliente)):
+        stats = table_stats(model, statuses=('active', 'blocked'), group_by=group_column)
+        result[model.__tablename__] = {
+            'total': stats['total'],
+            'active': stats['by_status']['active'],
+            'blocked': stats['by_status']['blocked'],
+            'by_group': stats['by_group']
+        }
+    return result
+
+
+def legacy_totals():
+    return {model.__tablename__: model.query.count() for model in (User, Veiculo, Entidade)}
+
+
+def engine_totals():
+    return table_totals(User, Veiculo, Entidade)
+
+
+def measure(func, repeat, counter):
+    """Executa `func` e retorna (resultado, consultas por chamada, latências em ms)"""
+    result = func()
+    counter['queries'] = 0
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+        db.session.rollback()
+    return result, counter['queries'] / repeat, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=20000, help='Registros por tabela')
+    parser.add_argument('--repeat', type=int, default=20, help='Repetições por cenário')
+    args = parser.parse_args()
+
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        seed(args.rows)
+
+        counter = {'queries': 0}
+
+        @event.listens_for(db.engine, 'before_cursor_execute')
+        def count_queries(*_):
+            counter['queries'] += 1
+
+        print(f"{'cenário':<36}{'consultas':>10}{'p50 (ms)':>12}{'média (ms)':>12}")
+        for label, legacy, engine in (
+            ('estatísticas detalhadas', legacy_stats, engine_stats),
+            ('totais (/api/stats)', legacy_totals, engine_totals),
+        ):
+            before, before_queries, before_ms = measure(legacy, args.repeat, counter)
+            after, after_queries, after_ms = measure(engine, args.repeat, counter)
+            assert before == after, f"Resultados divergentes em {label}"
+
+            for name, queries, timings in (('anterior', before_queries, before_ms),
+                                           ('motor', after_queries, after_ms)):
+                print(f"{label + ' / ' + name:<36}{queries:>10.0f}"
+                      f"{statistics.median(timings):>12.2f}{statistics.mean(timings):>12.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+Worker da fila de tarefas em segundo plano
+Executa as tarefas enfileiradas pela aplicação (exportações, importações,
+reconstrução do cache) em um pool de processos até receber SIGTERM/SIGINT
+
+Uso: python scripts/job_worker.py [--workers 2]
+"""
+
+import argparse
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.services.jobs import job_queue
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Worker da fila de tarefas')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Processos do pool (padrão: JOBS_WORKERS)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO'),
+                        format='%(asctime)s %(processName)s %(levelname)s %(name)s: %(message)s')
+    app = create_app()
+    job_queue.run_pool(workers=args.workers, app=app)
+
+
+if __name__ == '__main__':
+    main()
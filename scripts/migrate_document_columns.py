@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Migração das colunas de documento normalizado
+Adiciona cpf_norm, cpf_motorista_norm, placa_norm, renavam_norm e
+cpf_cnpj_norm aos bancos existentes, preenche em lotes (uma transação por
+lote) e cria os índices. Documentos repetidos após a normalização são
+listados e impedem o índice único até serem corrigidos
+
+Executado no pré-deploy (Procfile release, preDeployCommand do Railway);
+os conflitos não bloqueiam o deploy, a não ser com --strict
+
+Uso: python scripts/migrate_document_columns.py [--batch-size 1000] [--strict]
+"""
+
+import argparse
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from app.models.user import User
+from app.models.veiculo import Veiculo
+from app.models.entidade import Entidade
+from app.utils.documents import MIGRATION_BATCH_SIZE, migrate_document_columns
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Migração das colunas de documento normalizado')
+    parser.add_argument('--batch-size', type=int, default=MIGRATION_BATCH_SIZE,
+                        help='Linhas por transação no preenchimento')
+    parser.add_argument('--strict', action='store_true',
+                        help='Sai com erro se houver documentos repetidos')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO'),
+                        format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    app = create_app()
+    with app.app_context():
+        # Banco novo: cria as tabelas (já com as colunas) antes da migração
+        db.create_all()
+        report = migrate_document_columns([User, Veiculo, Entidade], batch_size=args.batch_size)
+
+    conflicts = False
+    for table, result in report.items():
+        added = ', '.join(result['added']) or 'nenhuma'
+        print(f"{table}: colunas adicionadas: {added}; linhas atualizadas: {result['updated']}")
+        for column, values in result['conflicts'].items():
+            conflicts = True
+            print(f"  {column}: valores repetidos (índice único não criado): {', '.join(values)}")
+    return 1 if conflicts and args.strict else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,7 +3,6 @@ Configuração global dos testes
 """
 import pytest
 import os
-import tempfile
 from app import create_app, db
 from app.models.user import User
 from app.models.veiculo import Veiculo
@@ -52,19 +51,13 @@ class EntidadeFactory(Factory):
 @pytest.fixture(scope='session')
 def app():
     """Criar aplicação Flask para testes"""
-    # Configuração de teste
+    # Configuração de teste (TestingConfig: SQLite em memória, sem CSRF)
     os.environ['FLASK_ENV'] = 'testing'
     os.environ['TESTING'] = 'True'
     
-    # Criar arquivo temporário para banco de dados
-    db_fd, db_path = tempfile.mkstemp()
-    
-    app = create_app({
-        'TESTING': True,
-        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}',
-        'WTF_CSRF_ENABLED': False,  # Desabilitar CSRF para testes
+    app = create_app('testing')
+    app.config.update({
         'SECRET_KEY': 'test-secret-key',
-        'CACHE_TYPE': 'simple',  # Cache simples para testes
         'RATELIMIT_ENABLED': False,  # Desabilitar rate limiting para testes
     })
     
@@ -72,9 +65,6 @@ def app():
         db.create_all()
         yield app
         db.drop_all()
-    
-    os.close(db_fd)
-    os.unlink(db_path)
 
 
 @pytest.fixture
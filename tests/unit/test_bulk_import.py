@@ -0,0 +1,138 @@
+"""
+Testes unitários para a importação em massa de cadastros
+"""
+import io
+import pytest
+from flask import Flask
+from sqlalchemy import event
+from app import db
+from app.models.user import User
+from app.models.veiculo import Veiculo
+from app.security.input_validation import validate_cpf
+from app.services.bulk_import import IMPORT_SPECS, BulkImporter, ImportFormatError
+
+
+def make_cpf(number):
+    """CPF válido a partir de um número de 9 dígitos"""
+    digits = [int(digit) for digit in f'{number:09d}']
+    for weight in (10, 11):
+        remainder = sum(d * w for d, w in zip(digits, range(weight, 1, -1))) % 11
+        digits.append(0 if remainder < 2 else 11 - remainder)
+    return ''.join(map(str, digits))
+
+
+@pytest.mark.unit
+class TestBulkImport:
+    """Testes para validação em lotes, duplicidade e inserção em massa"""
+
+    @pytest.fixture
+    def app(self):
+        from app.utils.stats_counters import init_stats_counters
+
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        app.config['STATS_COUNTERS_RECONCILE_INTERVAL'] = 0
+        db.init_app(app)
+        init_stats_counters(app)
+        with app.app_context():
+            db.create_all()
+            yield app
+
+    def csv_file(self, *lines):
+        return io.BytesIO('\n'.join(lines).encode('utf-8-sig'))
+
+    def test_validate_cpf(self):
+        """Testar os dígitos verificadores do CPF"""
+        assert validate_cpf('529.982.247-25')
+        assert not validate_cpf('529.982.247-24')
+        assert not validate_cpf('111.111.111-11')
+
+    def test_import_reports_row_errors(self, app):
+        """Testar inserção dos válidos e erros por linha (formato, banco e arquivo)"""
+        from app.utils.stats_counters import counter_stats
+
+        db.session.add(User(name='Existente', lastname='Teste', cpf=make_cpf(1),
+                            email='existente@exemplo.com', group='ADM'))
+        db.session.commit()
+
+        result = BulkImporter(IMPORT_SPECS['users'], aliases=[('email', 'E-mail')], chunk_size=3).run(
+            self.csv_file(
+                'Name;Lastname;CPF;E-mail;Group;Status',
+                f'Ana;Silva;{make_cpf(2)};ana@exemplo.com;ADM;Ativo',
+                f'Bruno;Souza;{make_cpf(1)};bruno@exemplo.com;ADM;active',
+                'Carla;Lima;123;carla;ADM;active',
+                f'Davi;Rocha;{make_cpf(3)};ANA@exemplo.com;Operacional;blocked',
+                f'Eva;Melo;{make_cpf(3)};eva@exemplo.com;Operacional;blocked',
+                f'Fábio;Reis;{make_cpf(5)};Eva@exemplo.com;Operacional;blocked',
+            )
+        )
+
+        assert (result['total'], result['imported'], result['failed']) == (6, 2, 4)
+        assert result['errors'] == [
+            {'line': 3, 'errors': ['cpf: já cadastrado']},
+            {'line': 4, 'errors': ['cpf: CPF inválido', 'email: e-mail inválido']},
+            {'line': 5, 'errors': ['email: já cadastrado']},
+            {'line': 7, 'errors': ['email: repetido no arquivo (linha 6)']},
+        ]
+        assert result['rows_per_second'] > 0
+        assert User.query.count() == 3
+        stats = counter_stats(User, dimension='group')
+        assert stats['total'] == 3 and stats['by_status'] == {'active': 2, 'blocked': 1}
+
+    def test_import_hashes_passwords(self, app):
+        """Testar senha opcional gravada como hash e login recusado sem senha"""
+        result = BulkImporter(IMPORT_SPECS['users']).run(self.csv_file(
+            'name,lastname,cpf,email,group,password',
+            f'Ana,Silva,{make_cpf(2)},ana@exemplo.com,ADM,segredo1',
+            f'Bia,Lima,{make_cpf(3)},bia@exemplo.com,ADM,',
+            f'Caio,Reis,{make_cpf(4)},caio@exemplo.com,ADM,123',
+        ))
+
+        assert result['errors'] == [{'line': 4, 'errors': ['password: mínimo de 6 caracteres']}]
+        ana = User.query.filter_by(email='ana@exemplo.com').one()
+        assert ana.password_hash != 'segredo1'
+        assert ana.check_password('segredo1') and not ana.check_password('outra')
+        bia = User.query.filter_by(email='bia@exemplo.com').one()
+        assert bia.password_hash is None
+        assert bia.check_password('') is False and bia.check_password('qualquer') is False
+
+    def test_one_lookup_and_one_insert_per_chunk(self, app):
+        """Testar uma consulta de duplicidade e um INSERT em lote por bloco"""
+        lines = ['placa,motorista_responsavel,cpf_motorista,tipo']
+        lines += [f'ABC{index:04d},Motorista {index},{make_cpf(index)},Truck' for index in range(1, 11)]
+
+        statements = []
+        event.listen(db.engine, 'before_cursor_execute',
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+        result = BulkImporter(IMPORT_SPECS['veiculos'], chunk_size=5).run(self.csv_file(*lines))
+
+        assert result['imported'] == 10
+        assert Veiculo.query.filter_by(placa='ABC0001').one().status == 'active'
+        assert sum(s.startswith('SELECT veiculos.placa') for s in statements) == 2
+        assert sum(s.startswith('INSERT INTO veiculos') for s in statements) == 2
+
+    def test_missing_required_columns(self, app):
+        """Testar rejeição do arquivo sem colunas obrigatórias"""
+        with pytest.raises(ImportFormatError):
+            BulkImporter(IMPORT_SPECS['entidades']).run(self.csv_file('razao_social', 'Empresa'))
+
+    def test_documents_compared_without_punctuation(self, app):
+        """Testar duplicidade de CPF e placa com pontuação diferente"""
+        cpf = make_cpf(7)
+        db.session.add(Veiculo(motorista_responsavel='Existente', cpf_motorista=cpf,
+                               placa='ABC1234', tipo='Truck'))
+        db.session.commit()
+
+        result = BulkImporter(IMPORT_SPECS['veiculos'], chunk_size=5).run(self.csv_file(
+            'placa,motorista_responsavel,cpf_motorista,tipo',
+            f'abc-1234,Motorista A,{cpf},Truck',
+            f'XYZ1D23,Motorista B,{cpf[:3]}.{cpf[3:6]}.{cpf[6:9]}-{cpf[9:]},Truck',
+            f'xyz-1d23,Motorista C,{cpf},Truck',
+        ))
+
+        assert result['imported'] == 1
+        assert result['errors'] == [
+            {'line': 2, 'errors': ['placa: já cadastrado']},
+            {'line': 4, 'errors': ['placa: repetido no arquivo (linha 3)']},
+        ]
+        assert Veiculo.query.filter_by(placa='XYZ1D23').one().cpf_motorista_norm == cpf
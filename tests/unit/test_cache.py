@@ -0,0 +1,1027 @@
+"""
+Testes unitários para o sistema de cache
+"""
+import os
+import pickle
+import threading
+import time
+from datetime import datetime
+from decimal import Decimal
+import pytest
+from app.utils.cache import CacheManager, cached
+from app.utils.cache_invalidation import LocalInvalidationBus
+from app.utils.cache_serialization import CacheCodec
+from app.utils.circuit_breaker import CircuitBreaker
+from app.utils.local_cache import LocalCache
+from app.utils.shm_cache import SharedMemoryCache
+from app.utils.single_flight import RedisLease
+
+
+def make_near_cache_pair():
+    """Cria dois gerenciadores (workers) compartilhando um Redis falso"""
+    fakeredis = pytest.importorskip('fakeredis')
+    server = fakeredis.FakeServer()
+    bus = LocalInvalidationBus()
+    managers = []
+    for _ in range(2):
+        manager = CacheManager(invalidation_bus=bus)
+        manager.redis_client = fakeredis.FakeRedis(server=server)
+        manager.near_cache_enabled = True
+        managers.append(manager)
+    return managers
+
+
+@pytest.mark.unit
+class TestLocalCache:
+    """Testes para o cache em memória local"""
+
+    def test_set_and_get(self):
+        """Testar armazenamento e recuperação"""
+        cache = LocalCache()
+        assert cache.set('a', {'total': 1}, 60) is True
+        assert cache.get('a') == {'total': 1}
+        assert cache.get('inexistente', 'padrao') == 'padrao'
+
+    def test_expired_entry_is_not_returned(self):
+        """Testar expiração preguiçosa na leitura"""
+        cache = LocalCache()
+        cache.set('a', 1, 60)
+        cache._entries['a'].expires = time.time() - 1
+
+        assert cache.get('a') is None
+        assert 'a' not in cache
+        assert cache.stats()['expirations'] == 1
+
+    def test_sweep_removes_expired_entries(self):
+        """Testar varredura de entradas expiradas"""
+        cache = LocalCache()
+        cache.set('a', 1, 60)
+        cache.set('b', 2, 60)
+        cache._entries['a'].expires = time.time() - 1
+
+        assert cache.sweep() == 1
+        assert len(cache) == 1
+
+    def test_lru_eviction_by_entries(self):
+        """Testar remoção LRU ao atingir o limite de entradas"""
+        cache = LocalCache(max_entries=2)
+        cache.set('a', 1, 60)
+        cache.set('b', 2, 60)
+        cache.get('a')
+        cache.set('c', 3, 60)
+
+        assert 'a' in cache
+        assert 'b' not in cache
+        assert 'c' in cache
+        assert cache.stats()['evictions'] == 1
+
+    def test_lfu_eviction_by_entries(self):
+        """Testar remoção LFU ao atingir o limite de entradas"""
+        cache = LocalCache(max_entries=2, policy='lfu')
+        cache.set('a', 1, 60)
+        cache.set('b', 2, 60)
+        cache.get('a')
+        cache.get('a')
+        cache.get('b')
+        cache.set('c', 3, 60)
+
+        assert 'a' in cache
+        assert 'b' not in cache
+        assert 'c' in cache
+
+    def test_eviction_by_bytes(self):
+        """Testar remoção ao atingir o limite de bytes"""
+        cache = LocalCache(max_bytes=100)
+        cache.set('a', 'x', 60, size=60)
+        cache.set('b', 'y', 60, size=60)
+
+        assert 'a' not in cache
+        assert cache.stats()['bytes'] == 60
+
+    def test_value_larger_than_limit_is_rejected(self):
+        """Testar rejeição de valores maiores que o limite"""
+        cache = LocalCache(max_bytes=10)
+        assert cache.set('a', 'x' * 100, 60) is False
+        assert cache.stats()['rejections'] == 1
+
+    def test_invalid_policy(self):
+        """Testar política de remoção inválida"""
+        with pytest.raises(ValueError):
+            LocalCache(policy='fifo')
+
+
+@pytest.mark.unit
+class TestNearCache:
+    """Testes para o near-cache L1 com invalidação entre workers"""
+
+    def test_get_populates_l1(self):
+        """Testar que leituras do Redis populam o L1"""
+        worker_a, worker_b = make_near_cache_pair()
+        worker_a.set('stats', {'total': 1}, 300)
+
+        assert worker_b.get('stats') == {'total': 1}
+        assert 'aduaneiro:stats' in worker_b.memory_cache
+
+    def test_l1_hit_skips_redis(self):
+        """Testar que o L1 atende sem consultar o Redis"""
+        worker_a, _ = make_near_cache_pair()
+        worker_a.set('stats', {'total': 1}, 300)
+        worker_a.redis_client.delete('aduaneiro:stats')
+
+        assert worker_a.get('stats') == {'total': 1}
+
+    def test_set_invalidates_other_workers(self):
+        """Testar que escritas invalidam o L1 dos demais workers"""
+        worker_a, worker_b = make_near_cache_pair()
+        worker_a.set('stats', {'total': 1}, 300)
+        assert worker_b.get('stats') == {'total': 1}
+
+        worker_a.set('stats', {'total': 2}, 300)
+        assert worker_b.get('stats') == {'total': 2}
+
+    def test_delete_and_clear_invalidate_other_workers(self):
+        """Testar propagação de remoções e limpeza"""
+        worker_a, worker_b = make_near_cache_pair()
+        worker_a.set('a', 1, 300)
+        worker_a.set('b', 2, 300)
+        worker_b.get('a')
+        worker_b.get('b')
+
+        worker_a.delete('a')
+        assert 'aduaneiro:a' not in worker_b.memory_cache
+
+        worker_a.clear()
+        assert len(worker_b.memory_cache) == 0
+
+
+@pytest.mark.unit
+class TestCacheTags:
+    """Testes para invalidação por tags e por padrão"""
+
+    def test_local_cache_invalidate_tags(self):
+        """Testar índice reverso de tags no cache local"""
+        cache = LocalCache()
+        cache.set('a', 1, 60, tags=['model:Veiculo'])
+        cache.set('b', 2, 60, tags=['model:Veiculo', 'report:monthly'])
+        cache.set('c', 3, 60, tags=['model:User'])
+
+        assert sorted(cache.invalidate_tags(['model:Veiculo'])) == ['a', 'b']
+        assert 'c' in cache
+        assert cache.stats()['tags'] == 1
+
+    def test_evicted_keys_leave_tag_index(self):
+        """Testar limpeza do índice de tags na remoção"""
+        cache = LocalCache(max_entries=1)
+        cache.set('a', 1, 60, tags=['model:Veiculo'])
+        cache.set('b', 2, 60)
+
+        assert cache.stats()['tags'] == 0
+
+    def test_manager_invalidate_tags_without_redis(self):
+        """Testar invalidação por tags no fallback em memória"""
+        manager = CacheManager()
+        manager.set('stats:1', 1, 60, tags=['model:Veiculo'])
+        manager.set('stats:2', 2, 60, tags=['model:User'])
+
+        assert manager.invalidate_tags('model:Veiculo') == 1
+        assert manager.get('stats:1') is None
+        assert manager.get('stats:2') == 2
+
+    def test_manager_invalidate_tags_with_redis(self):
+        """Testar invalidação por tags no Redis e no L1 dos demais workers"""
+        worker_a, worker_b = make_near_cache_pair()
+        worker_a.set('reports:monthly', {'users': []}, 600, tags=['report:monthly'])
+        worker_b.get('reports:monthly')
+
+        assert worker_a.invalidate_tags('report:monthly') == 1
+        assert not worker_a.redis_client.exists('aduaneiro:reports:monthly')
+        assert 'aduaneiro:reports:monthly' not in worker_b.memory_cache
+
+    def test_invalidate_pattern_with_scan(self):
+        """Testar invalidação por padrão legado via SCAN"""
+        worker_a, _ = make_near_cache_pair()
+        worker_a.set('linkedin_posts:1', 1, 60)
+        worker_a.set('linkedin_posts:2', 2, 60)
+        worker_a.set('reports:1', 3, 60)
+
+        assert worker_a.invalidate_pattern('linkedin_posts') >= 2
+        assert worker_a.get('linkedin_posts:1') is None
+        assert worker_a.get('reports:1') == 3
+
+
+@pytest.mark.unit
+class TestStampedeProtection:
+    """Testes para recomputação única e stale-while-revalidate"""
+
+    def test_concurrent_misses_compute_once(self):
+        """Testar que misses simultâneos executam a função uma única vez"""
+        manager = CacheManager()
+        calls = []
+
+        def slow_stats():
+            calls.append(1)
+            time.sleep(0.2)
+            return {'total': 42}
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(
+                manager.get_or_set('reports:monthly', slow_stats, 600)
+            ))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(calls) == 1
+        assert results == [{'total': 42}] * 8
+        assert manager.stampede_stats['coalesced'] == 7
+
+    def test_stale_value_served_while_refreshing(self):
+        """Testar que o valor obsoleto é servido enquanto outro renova"""
+        manager = CacheManager()
+        manager.get_or_set('stats', lambda: 'antigo', 600, stale_ttl=60)
+        entry = manager._read_entry('stats')
+        entry['fresh_until'] = time.time() - 1
+        manager.set('stats', entry, 60)
+
+        key_lock = manager.key_locks.get('stats')
+        key_lock.lock.acquire()
+        try:
+            assert manager.get_or_set('stats', lambda: 'novo', 600, stale_ttl=60) == 'antigo'
+        finally:
+            key_lock.lock.release()
+
+        assert manager.get_or_set('stats', lambda: 'novo', 600, stale_ttl=60) == 'novo'
+        assert manager.stampede_stats['stale_served'] == 1
+
+    def test_early_expiration(self):
+        """Testar expiração antecipada probabilística"""
+        manager = CacheManager()
+        manager._write_entry('stats', 'antigo', 600, 0, delta=10)
+
+        assert manager.get_or_set('stats', lambda: 'novo', 600, early_expiration=0) == 'antigo'
+        assert manager.get_or_set('stats', lambda: 'novo', 600, early_expiration=1e6) == 'novo'
+        assert manager.stampede_stats['early_refreshes'] == 1
+
+    def test_redis_lease_coalesces_workers(self):
+        """Testar que outro worker aguarda o resultado em vez de recomputar"""
+        worker_a, worker_b = make_near_cache_pair()
+        lease = RedisLease(worker_a.redis_client, 'aduaneiro:lock:stats', 5)
+        assert lease.acquire()
+
+        def publish_result():
+            time.sleep(0.1)
+            worker_a._write_entry('stats', 'calculado', 600, 0, delta=0.1)
+
+        thread = threading.Thread(target=publish_result)
+        thread.start()
+        assert worker_b.get_or_set('stats', lambda: 'duplicado', 600) == 'calculado'
+        thread.join()
+        lease.release()
+
+        assert worker_b.stampede_stats['coalesced'] == 1
+
+    def test_cached_decorator_uses_single_flight(self):
+        """Testar o decorator cached com o gerenciador global"""
+        calls = []
+
+        @cached(timeout=60, key_prefix='test_single_flight')
+        def compute(value):
+            calls.append(value)
+            return value * 2
+
+        assert compute(21) == 42
+        assert compute(21) == 42
+        assert calls == [21]
+
+
+@pytest.mark.unit
+class TestCacheCodec:
+    """Testes para a serialização binária do cache"""
+
+    def test_roundtrip_preserves_types(self):
+        """Testar preservação de datetime, Decimal e tuplas"""
+        codec = CacheCodec()
+        value = {
+            'created_at': datetime(2024, 1, 15, 10, 30),
+            'valor_retencao': Decimal('1000.50'),
+            'by_group': [('Paclog ADM', 2), ('Paclog Operacional', 1)],
+            'ids': {1, 2},
+            1: 'chave inteira'
+        }
+
+        assert codec.loads(codec.dumps(value)) == value
+
+    def test_large_payload_is_compressed(self):
+        """Testar compressão acima do limite"""
+        codec = CacheCodec(threshold=100)
+        value = [{'month': '2024-01', 'count': 10}] * 500
+        data = codec.dumps(value)
+
+        assert data[2] != 0
+        assert len(data) < len(pickle.dumps(value))
+        assert codec.loads(data) == value
+
+    def test_small_payload_is_not_compressed(self):
+        """Testar que valores pequenos não são comprimidos"""
+        data = CacheCodec(threshold=1024).dumps({'total': 1})
+        assert data[2] == 0
+
+    def test_unsupported_type_falls_back_to_pickle(self):
+        """Testar fallback para pickle"""
+        codec = CacheCodec()
+        value = complex(1, 2)
+        assert codec.loads(codec.dumps(value)) == value
+
+    def test_legacy_values(self):
+        """Testar leitura de valores no formato antigo"""
+        codec = CacheCodec()
+        assert codec.loads(b'{"total": 1}') == {'total': 1}
+        assert codec.loads(pickle.dumps(complex(1, 2)).hex().encode()) == complex(1, 2)
+
+    def test_manager_stores_bytes_in_redis(self):
+        """Testar que o Redis recebe o formato binário"""
+        worker_a, worker_b = make_near_cache_pair()
+        worker_a.set('stats', {'created_at': datetime(2024, 1, 1)}, 60)
+
+        raw = worker_a.redis_client.get('aduaneiro:stats')
+        assert raw[0] == 1
+        assert worker_b.get('stats') == {'created_at': datetime(2024, 1, 1)}
+
+
+class FailingRedis:
+    """Cliente Redis que sempre falha, simulando indisponibilidade"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __getattr__(self, name):
+        def fail(*args, **kwargs):
+            self.calls += 1
+            raise ConnectionError('Redis indisponível')
+        return fail
+
+
+@pytest.mark.unit
+class TestCircuitBreaker:
+    """Testes para o circuit breaker do Redis"""
+
+    def test_opens_after_threshold(self):
+        """Testar abertura do circuito após falhas consecutivas"""
+        breaker = CircuitBreaker(failure_threshold=2)
+        breaker.record_failure()
+        assert breaker.allow_request() is True
+
+        breaker.record_failure()
+        assert breaker.state == 'open'
+        assert breaker.allow_request() is False
+        assert breaker.stats()['transitions'] == {'closed->open': 1}
+
+    def test_success_resets_failures(self):
+        """Testar que sucesso zera as falhas consecutivas"""
+        breaker = CircuitBreaker(failure_threshold=2)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        assert breaker.state == 'closed'
+
+    def test_background_probe_closes_circuit(self):
+        """Testar restauração automática pela sonda half-open"""
+        probes = []
+        breaker = CircuitBreaker(reset_timeout=0.05, probe=lambda: probes.append(1))
+        breaker.trip()
+
+        deadline = time.time() + 2
+        while breaker.state != 'closed' and time.time() < deadline:
+            time.sleep(0.01)
+
+        assert breaker.state == 'closed'
+        assert breaker.stats()['transitions']['half_open->closed'] == 1
+
+    def test_failed_probes_back_off_quietly(self, caplog):
+        """Testar espera crescente entre sondas e WARNING só na abertura e na restauração"""
+        import logging
+        attempts = []
+
+        def probe():
+            attempts.append(time.time())
+            if len(attempts) < 3:
+                raise ConnectionError('recusada')
+
+        breaker = CircuitBreaker(reset_timeout=0.05, max_reset_timeout=0.15, probe=probe)
+        with caplog.at_level(logging.DEBUG, logger='app.utils.circuit_breaker'):
+            breaker.trip()
+            deadline = time.time() + 3
+            while breaker.state != 'closed' and time.time() < deadline:
+                time.sleep(0.01)
+
+        assert breaker.state == 'closed'
+        assert len(attempts) == 3
+        assert attempts[2] - attempts[1] > attempts[1] - attempts[0]
+        warnings = [r.getMessage() for r in caplog.records if r.levelno == logging.WARNING]
+        assert len(warnings) == 2
+        assert 'closed->open' in warnings[0] and 'half_open->closed' in warnings[1]
+        assert breaker.stats()['transitions']['half_open->open'] == 2
+        assert breaker.probe_interval() == 0.05
+
+    def test_manager_skips_redis_when_open(self):
+        """Testar que o gerenciador usa o cache local com o circuito aberto"""
+        manager = CacheManager()
+        manager.redis_client = FailingRedis()
+        manager.breaker = CircuitBreaker(failure_threshold=2)
+
+        manager.set('a', 1, 60)
+        manager.set('b', 2, 60)
+        calls = manager.redis_client.calls
+
+        assert manager.breaker.state == 'open'
+        assert manager.get('a') == 1
+        assert manager.get('b') == 2
+        assert manager.redis_client.calls == calls
+
+
+    def test_fallback_writes_dropped_when_circuit_closes(self):
+        """Testar que as escritas locais do circuito aberto não sobrevivem à restauração"""
+        fakeredis = pytest.importorskip('fakeredis')
+        manager = CacheManager()
+        manager.near_cache_enabled = True
+        manager.redis_client = FailingRedis()
+        manager.breaker = CircuitBreaker(failure_threshold=1, on_close=manager._redis_restored)
+
+        manager.set('a', 1, 3600)
+        assert manager.breaker.state == 'open'
+        assert manager.get('a') == 1
+
+        manager.redis_client = fakeredis.FakeRedis()
+        manager.redis_client.setex(manager._generate_key('a'), 60, manager._serialize(2, 'a'))
+        manager.breaker.record_success()
+
+        assert manager.breaker.state == 'closed'
+        assert manager.get('a') == 2
+
+@pytest.mark.unit
+class TestBatchOperations:
+    """Testes para get_many/set_many/delete_many e o lote da requisição"""
+
+    def test_batch_roundtrip_without_redis(self):
+        """Testar operações em lote no cache local"""
+        manager = CacheManager()
+        manager.set_many({'a': 1, 'b': {'total': 2}}, 60, tags=['model:User'])
+
+        assert manager.get_many(['a', 'b', 'c']) == {'a': 1, 'b': {'total': 2}}
+        assert manager.delete_many(['a', 'c']) == 1
+        assert manager.get_many(['a', 'b']) == {'b': {'total': 2}}
+
+    def test_get_many_uses_single_mget(self):
+        """Testar leitura de várias chaves com um único MGET"""
+        fakeredis = pytest.importorskip('fakeredis')
+        manager = CacheManager()
+        manager.redis_client = fakeredis.FakeRedis()
+        manager.set_many({'a': 1, 'b': 2}, 60, tags=['model:User'])
+
+        calls = []
+        original_get = manager.redis_client.get
+        manager.redis_client.get = lambda *a: calls.append(a) or original_get(*a)
+
+        assert manager.get_many(['a', 'b', 'c']) == {'a': 1, 'b': 2}
+        assert calls == []
+        assert manager.invalidate_tags('model:User') == 2
+
+    def test_prefetch_serves_cached_functions(self):
+        """Testar lote da requisição compartilhado por funções @cached"""
+        fakeredis = pytest.importorskip('fakeredis')
+        from flask import Flask
+        import app.utils.cache as cache_module
+
+        manager = CacheManager()
+        manager.redis_client = fakeredis.FakeRedis()
+        original_manager = cache_module.cache_manager
+        cache_module.cache_manager = manager
+        try:
+            @cached(timeout=60, key_prefix='teste')
+            def users():
+                return {'total': 3}
+
+            @cached(timeout=60, key_prefix='teste')
+            def vehicles():
+                return {'total': 5}
+
+            users()
+            vehicles()
+
+            reads = []
+            original_get = manager.redis_client.get
+            manager.redis_client.get = lambda *a: reads.append(a) or original_get(*a)
+
+            with Flask(__name__).test_request_context():
+                assert cache_module.cache_prefetch(users, vehicles) == 2
+                assert users() == {'total': 3}
+                assert vehicles() == {'total': 5}
+            assert reads == []
+        finally:
+            cache_module.cache_manager = original_manager
+
+
+@pytest.mark.unit
+class TestCacheMetrics:
+    """Testes para as métricas por prefixo e camada"""
+
+    def test_hits_misses_and_writes_per_prefix(self):
+        """Testar contadores por prefixo no cache local"""
+        manager = CacheManager()
+        manager.set('reports:mensal', {'total': 1}, 60)
+        manager.get('reports:mensal')
+        manager.get('reports:inexistente')
+
+        prefixes = manager.metrics_snapshot()['prefixes']
+        assert prefixes['reports']['all']['hits'] == 1
+        assert prefixes['reports']['all']['misses'] == 1
+        assert prefixes['reports']['all']['hit_ratio'] == 0.5
+        assert prefixes['reports']['memory']['sets'] == 1
+        assert prefixes['reports']['memory']['bytes_written'] > 0
+        assert prefixes['reports']['all']['latency_ms']['count'] == 2
+
+    def test_recompute_time_recorded(self):
+        """Testar tempo de recomputação em get_or_set"""
+        manager = CacheManager()
+        manager.get_or_set('stats:usuarios', lambda: 42, 60)
+
+        compute = manager.metrics_snapshot()['prefixes']['stats']['compute']
+        assert compute['recomputations'] == 1
+        assert compute['latency_ms']['count'] == 1
+
+    def test_aggregated_across_workers(self):
+        """Testar agregação das métricas de dois workers no Redis"""
+        fakeredis = pytest.importorskip('fakeredis')
+        server = fakeredis.FakeServer()
+        workers = []
+        for _ in range(2):
+            manager = CacheManager()
+            manager.redis_client = fakeredis.FakeRedis(server=server)
+            workers.append(manager)
+
+        workers[0].set('stats:a', 1, 60)
+        workers[0].get('stats:a')
+        workers[1].get('stats:a')
+        workers[1].get('stats:b')
+
+        snapshot = workers[0].metrics_snapshot()
+        # O worker 1 ainda não enviou suas métricas
+        assert snapshot['prefixes']['stats']['redis']['hits'] == 1
+        workers[1].metrics_snapshot()
+
+        snapshot = workers[0].metrics_snapshot()
+        assert snapshot['scope'] == 'cluster'
+        assert snapshot['prefixes']['stats']['redis']['hits'] == 2
+        assert snapshot['prefixes']['stats']['redis']['misses'] == 1
+
+        workers[0].reset_metrics()
+        assert workers[1].metrics_snapshot()['prefixes'] == {}
+
+
+@pytest.mark.unit
+class TestNegativeCaching:
+    """Testes para o cache de resultados vazios e de falhas"""
+
+    def test_none_result_is_cached(self):
+        """Testar que None não é recomputado a cada chamada"""
+        manager = CacheManager()
+        calls = []
+
+        def lookup():
+            calls.append(1)
+            return None
+
+        assert manager.get_or_set('busca:cpf', lookup, 300) is None
+        assert manager.get_or_set('busca:cpf', lookup, 300) is None
+        assert len(calls) == 1
+
+    def test_empty_result_uses_negative_ttl(self):
+        """Testar TTL negativo separado para resultados vazios"""
+        manager = CacheManager()
+        manager.negative_ttl = 5
+        manager.get_or_set('busca:vazia', lambda: [], 300)
+
+        entry = manager._read_entry('busca:vazia')
+        assert entry['status'] == 'empty'
+        assert entry['fresh_until'] - time.time() <= 5
+
+    def test_failure_is_cached_with_backoff(self):
+        """Testar que a falha de infraestrutura é relançada, com o mesmo tipo, sem recomputar"""
+        from sqlalchemy.exc import OperationalError
+
+        manager = CacheManager()
+        manager.error_ttl = 5
+        calls = []
+
+        def failing():
+            calls.append(1)
+            raise OperationalError('SELECT 1', {}, Exception('banco indisponível'))
+
+        with pytest.raises(OperationalError):
+            manager.get_or_set('stats:falha', failing, 300)
+        with pytest.raises(OperationalError, match='banco indisponível'):
+            manager.get_or_set('stats:falha', failing, 300)
+        assert len(calls) == 1
+
+    def test_other_errors_are_not_cached(self):
+        """Testar que abort() e erros de programação não entram em backoff"""
+        from werkzeug.exceptions import NotFound, abort
+
+        manager = CacheManager()
+        calls = []
+
+        def missing():
+            calls.append(1)
+            abort(404)
+
+        for _ in range(2):
+            with pytest.raises(NotFound):
+                manager.get_or_set('registro:404', missing, 300)
+        with pytest.raises(KeyError):
+            manager.get_or_set('registro:bug', lambda: {}['x'], 300)
+        assert len(calls) == 2
+        assert manager._read_entry('registro:404') is None
+        assert manager._read_entry('registro:bug') is None
+
+    def test_failure_uses_fallback_and_stale_value(self):
+        """Testar fallback e reaproveitamento do valor obsoleto na falha"""
+        manager = CacheManager()
+
+        def failing():
+            raise ConnectionError('banco indisponível')
+
+        assert manager.get_or_set('stats:a', failing, 300,
+                                  fallback=lambda: {'total': 0}) == {'total': 0}
+
+        manager.get_or_set('stats:b', lambda: {'total': 7}, 300, stale_ttl=60)
+        entry = manager._read_entry('stats:b')
+        manager._write_entry('stats:b', entry['value'], -1, 60, 0)
+        assert manager.get_or_set('stats:b', failing, 300) == {'total': 7}
+        assert manager.get_or_set('stats:b', failing, 300) == {'total': 7}
+
+
+@pytest.mark.unit
+class TestResponseCache:
+    """Testes para o cache de respostas HTTP com ETag"""
+
+    def make_app(self, calls):
+        from flask import Flask, jsonify
+        from flask_login import LoginManager
+        from app.utils.response_cache import cache_response
+
+        app = Flask(__name__)
+        app.secret_key = 'teste'
+        LoginManager(app).user_loader(lambda user_id: None)
+
+        @app.route('/stats')
+        @cache_response(timeout=60, key_prefix='teste_http')
+        def stats():
+            calls.append(1)
+            return jsonify({'total': len(calls)})
+
+        @app.route('/erro')
+        @cache_response(timeout=60, key_prefix='teste_http')
+        def erro():
+            calls.append(1)
+            return jsonify({'error': 'falha'}), 500
+
+        @app.route('/abort')
+        @cache_response(timeout=60, key_prefix='teste_http')
+        def abortar():
+            from flask import abort
+            calls.append(1)
+            abort(404)
+
+        @app.route('/banco')
+        @cache_response(timeout=60, key_prefix='teste_http')
+        def banco():
+            from sqlalchemy.exc import OperationalError
+            calls.append(1)
+            raise OperationalError('SELECT 1', {}, Exception('database is locked'))
+
+        return app
+
+    @pytest.fixture(autouse=True)
+    def isolated_manager(self):
+        import app.utils.cache as cache_module
+        original = cache_module.cache_manager
+        cache_module.cache_manager = CacheManager()
+        yield
+        cache_module.cache_manager = original
+
+    def test_hit_and_etag_revalidation(self):
+        """Testar HIT, ETag forte e 304 sem executar a view"""
+        calls = []
+        client = self.make_app(calls).test_client()
+
+        first = client.get('/stats?b=2&a=1')
+        assert first.status_code == 200
+        assert first.headers['X-Cache'] == 'MISS'
+        etag = first.headers['ETag']
+        assert etag.startswith('"')
+
+        second = client.get('/stats?a=1&b=2')
+        assert second.headers['X-Cache'] == 'HIT'
+        assert second.get_json() == {'total': 1}
+
+        not_modified = client.get('/stats?a=1&b=2', headers={'If-None-Match': etag})
+        assert not_modified.status_code == 304
+        compressed = client.get('/stats?a=1&b=2',
+                                headers={'If-None-Match': etag[:-1] + ':gzip"'})
+        assert compressed.status_code == 304
+        assert calls == [1]
+
+    def test_vary_and_errors_are_not_shared(self):
+        """Testar chave por Accept-Encoding e respostas de erro sem cache"""
+        calls = []
+        client = self.make_app(calls).test_client()
+
+        client.get('/stats', headers={'Accept-Encoding': 'gzip'})
+        client.get('/stats', headers={'Accept-Encoding': 'br'})
+        assert len(calls) == 2
+
+        assert client.get('/erro').status_code == 500
+        assert client.get('/erro').status_code == 500
+        assert len(calls) == 4
+
+    def test_exceptions_are_not_cached(self):
+        """Testar que abort e falhas da view são repassados sem cache"""
+        calls = []
+        client = self.make_app(calls).test_client()
+
+        assert client.get('/abort').status_code == 404
+        assert client.get('/abort').status_code == 404
+        assert client.get('/banco').status_code == 500
+        assert client.get('/banco').status_code == 500
+        assert len(calls) == 4
+
+    def test_orm_commit_invalidates_model_tags(self, app):
+        """Testar invalidação das tags model:<Modelo> no commit do ORM"""
+        import app.utils.cache as cache_module
+        from app import db
+        from app.models.user import User
+        import app.utils.database_optimization  # noqa: F401 (registra os eventos)
+        manager = cache_module.cache_manager
+        manager.set('stats:usuarios', 1, 60, tags=['model:User'])
+        manager.set('stats:veiculos', 2, 60, tags=['model:Veiculo'])
+
+        db.session.add(User(name='Ana', lastname='Lima', email='ana@example.com', cpf='52998224725', group='Paclog ADM'))
+        db.session.flush()
+        db.session.rollback()
+        assert manager.get('stats:usuarios') == 1
+
+        db.session.add(User(name='Ana', lastname='Lima', email='ana@example.com', cpf='52998224725', group='Paclog ADM'))
+        db.session.commit()
+        assert manager.get('stats:usuarios') is None
+        assert manager.get('stats:veiculos') == 2
+
+
+@pytest.mark.unit
+class TestSharedMemoryCache:
+    """Testes para o cache em memória compartilhada (/dev/shm)"""
+
+    @pytest.fixture
+    def path(self, tmp_path):
+        return str(tmp_path / 'aduaneiro-cache')
+
+    def test_set_get_delete(self, path):
+        """Testar armazenamento, recuperação e remoção"""
+        cache = SharedMemoryCache(path=path, slots=16, slot_size=1024)
+        assert cache.set('a', {'total': 1}, 60) is True
+        assert cache.get('a') == {'total': 1}
+        assert 'a' in cache
+        assert cache.delete('a') is True
+        assert cache.get('a', 'padrao') == 'padrao'
+
+    def test_shared_between_processes(self, path):
+        """Testar que um processo filho enxerga e grava no mesmo segmento"""
+        import multiprocessing
+        cache = SharedMemoryCache(path=path, slots=16, slot_size=1024)
+        cache.set('stats:a', 1, 60)
+
+        def child():
+            other = SharedMemoryCache(path=path, slots=16, slot_size=1024)
+            other.set('stats:b', other.get('stats:a') + 1, 60)
+
+        process = multiprocessing.get_context('fork').Process(target=child)
+        process.start()
+        process.join(10)
+
+        assert process.exitcode == 0
+        assert cache.get('stats:b') == 2
+
+    def test_bucket_eviction_and_rejection(self, path):
+        """Testar remoção dentro do bucket cheio e recusa de valores grandes"""
+        cache = SharedMemoryCache(path=path, slots=4, slot_size=256, ways=4)
+        for i in range(6):
+            cache.set(f'k{i}', i, 60 + i)
+
+        assert len(cache) == 4
+        assert cache.stats()['evictions'] == 2
+        assert cache.get('k5') == 5
+        assert cache.set('grande', os.urandom(1024), 60) is False
+        assert cache.stats()['rejections'] == 1
+
+    def test_expiration_and_tags(self, path):
+        """Testar expiração e invalidação por tags"""
+        cache = SharedMemoryCache(path=path, slots=16, slot_size=1024)
+        cache.set('a', 1, 60, tags=['model:User'])
+        cache.set('b', 2, 60, tags=['model:Veiculo'])
+        cache.set('c', 3, -1)
+
+        assert cache.get('c') is None
+        assert cache.invalidate_tags(['model:User']) == ['a']
+        assert cache.keys() == ['b']
+
+    def test_manager_selects_shared_backend(self, path):
+        """Testar seleção do backend pelo CACHE_MEMORY_BACKEND"""
+        from flask import Flask
+        app = Flask(__name__)
+        app.config.update(CACHE_MEMORY_BACKEND='shm', CACHE_SHM_PATH=path,
+                          CACHE_SHM_SLOTS=16, CACHE_SHM_SLOT_SIZE=1024,
+                          REDIS_CONNECT_TIMEOUT=0.05, REDIS_SOCKET_TIMEOUT=0.05,
+                          REDIS_PORT=1)
+        manager = CacheManager(app)
+
+        assert isinstance(manager.memory_cache, SharedMemoryCache)
+        manager.set('stats:total', 10, 60)
+        assert SharedMemoryCache(path=path, slots=16, slot_size=1024).get('aduaneiro:stats:total') == 10
+
+
+@pytest.mark.unit
+class TestCacheSnapshot:
+    """Testes para o snapshot do cache local"""
+
+    def make_manager(self, path):
+        manager = CacheManager()
+        manager.snapshot_path = str(path)
+        manager.snapshot_prefixes = ('stats', 'reports')
+        return manager
+
+    def test_roundtrip_preserves_ttl(self, tmp_path):
+        """Testar gravação e carga com TTL restante preservado"""
+        path = tmp_path / 'cache_snapshot.bin'
+        manager = self.make_manager(path)
+        manager.get_or_set('stats:usuarios', lambda: {'total': 3}, 300)
+        manager.set('reports:mensal', [1, 2], 120, tags=['report:monthly'])
+        manager.set('outro:valor', 1, 300)
+
+        assert manager.save_snapshot() == 2
+
+        worker = self.make_manager(path)
+        assert worker.load_snapshot() == 2
+        assert worker.get_or_set('stats:usuarios', lambda: None, 300) == {'total': 3}
+        assert worker.get('outro:valor') is None
+        remaining = worker.memory_cache._entries['aduaneiro:reports:mensal'].expires - time.time()
+        assert 100 < remaining <= 120
+        assert worker.invalidate_tags('report:monthly') == 1
+
+    def test_stale_entries_are_not_restored(self, tmp_path):
+        """Testar que entradas vencidas ou em backoff não são restauradas"""
+        path = tmp_path / 'cache_snapshot.bin'
+        manager = self.make_manager(path)
+        manager._write_entry('stats:obsoleto', 1, -1, 60, 0)
+        manager._write_entry('stats:erro', None, 10, 0, 0, status='error', error='falha')
+        manager.set('stats:valido', 1, 60)
+        manager.save_snapshot()
+
+        worker = self.make_manager(path)
+        assert worker.load_snapshot() == 1
+        assert worker.memory_cache.keys() == ['aduaneiro:stats:valido']
+
+    def test_workers_merge_snapshots(self, tmp_path):
+        """Testar que cada worker acrescenta suas entradas ao snapshot"""
+        path = tmp_path / 'cache_snapshot.bin'
+        first, second = self.make_manager(path), self.make_manager(path)
+        first.set('stats:a', 1, 60)
+        second.set('stats:b', 2, 60)
+        first.save_snapshot()
+        second.save_snapshot()
+
+        assert self.make_manager(path).load_snapshot() == 2
+
+    def test_invalidated_keys_are_not_merged_back(self, tmp_path):
+        """Testar que chaves removidas ou invalidadas não voltam pela mescla"""
+        path = tmp_path / 'cache_snapshot.bin'
+        first = self.make_manager(path)
+        first.set('stats:a', 1, 60)
+        first.set('stats:b', 2, 60, tags=['model:User'])
+        first.set('reports:c', 3, 60)
+        first.set('stats:d', 4, 60)
+        first.save_snapshot()
+
+        worker = self.make_manager(path)
+        assert worker.load_snapshot() == 4
+        worker.delete('stats:a')
+        worker.memory_cache.delete(worker._generate_key('stats:b'))   # despejo (LRU)
+        worker.memory_cache.delete(worker._generate_key('stats:d'))
+        worker.invalidate_tags('model:User')
+        worker.invalidate_pattern('reports:')
+        worker.save_snapshot()
+
+        restarted = self.make_manager(path)
+        assert restarted.load_snapshot() == 1
+        assert restarted.memory_cache.keys() == ['aduaneiro:stats:d']
+
+
+@pytest.mark.unit
+class TestCacheWarmer:
+    """Testes para o aquecimento do cache na inicialização"""
+
+    def make_app(self, **config):
+        from flask import Flask
+        app = Flask(__name__)
+        app.config.update({'CACHE_WARMUP_BUDGET': 5, **config})
+        return app
+
+    def test_runs_in_order_with_timing(self):
+        """Testar ordem de execução, contexto de aplicação e tempos"""
+        from flask import current_app
+        from app.utils.cache_warmer import CacheWarmer
+        warmer = CacheWarmer()
+        calls = []
+        warmer.register(lambda: calls.append(current_app.name), name='feed', order=90)
+        warmer.register(lambda: calls.append('stats'), name='stats', order=10)
+
+        def falha():
+            raise RuntimeError('banco indisponível')
+        warmer.register(falha, name='falha', order=20)
+
+        warmer.init_app(self.make_app())
+
+        assert calls == ['stats', __name__]
+        assert warmer.is_ready()
+        assert warmer.results['stats']['status'] == 'ok'
+        assert warmer.results['stats']['seconds'] >= 0
+        assert warmer.results['falha'] == {
+            'status': 'error', 'error': 'banco indisponível',
+            'seconds': warmer.results['falha']['seconds']
+        }
+
+    def test_budget_skips_remaining(self):
+        """Testar que uma função lenta não ultrapassa o orçamento"""
+        from app.utils.cache_warmer import CacheWarmer
+        warmer = CacheWarmer()
+        release = threading.Event()
+        calls = []
+        warmer.register(lambda: release.wait(5), name='lenta', order=10)
+        warmer.register(lambda: calls.append(1), name='seguinte', order=20)
+
+        start = time.monotonic()
+        warmer.init_app(self.make_app(CACHE_WARMUP_BUDGET=0.2))
+        release.set()
+
+        assert time.monotonic() - start < 2
+        assert warmer.results['lenta']['status'] == 'timeout'
+        assert warmer.results['seguinte'] == {'status': 'skipped', 'seconds': 0.0}
+        assert calls == []
+        assert warmer.is_ready()
+
+    def test_background_readiness(self):
+        """Testar que a prontidão aguarda o aquecimento em segundo plano"""
+        from app.utils.cache_warmer import CacheWarmer
+        warmer = CacheWarmer()
+        release = threading.Event()
+        warmer.register(lambda: release.wait(5), name='stats')
+
+        warmer.init_app(self.make_app(CACHE_WARMUP_MODE='background'))
+        assert not warmer.is_ready()
+        assert warmer.status()['state'] == 'running'
+        assert warmer.wait(0.05) is False
+
+        release.set()
+        assert warmer.wait(2) is True
+        assert warmer.status()['results']['stats']['status'] == 'ok'
+
+    def test_background_restarts_in_forked_worker(self):
+        """Testar que o worker inicia o aquecimento pendente na primeira requisição"""
+        from app.utils.cache_warmer import CacheWarmer
+        warmer = CacheWarmer()
+        calls = []
+        warmer.register(lambda: calls.append(1), name='stats')
+        app = self.make_app(CACHE_WARMUP_MODE='background')
+        app.add_url_rule('/ping', 'ping', lambda: 'ok')
+
+        warmer.init_app(app)
+        assert warmer.wait(2) is True
+        # Estado do processo filho após o fork (ver _after_fork)
+        warmer._reset()
+
+        assert app.test_client().get('/ping').status_code == 200
+        assert warmer.wait(2) is True
+        assert calls == [1, 1]
+
+    def test_disabled_is_ready(self):
+        """Testar que o aquecimento desativado não bloqueia a prontidão"""
+        from app.utils.cache_warmer import CacheWarmer
+        warmer = CacheWarmer()
+        calls = []
+        warmer.register(lambda: calls.append(1), name='stats')
+        warmer.init_app(self.make_app(CACHE_WARMUP_ENABLED=False))
+        assert calls == []
+        assert warmer.is_ready()
+        assert warmer.status()['state'] == 'disabled'
@@ -0,0 +1,149 @@
+"""
+Testes unitários para as colunas de documento normalizado
+"""
+import pytest
+from flask import Flask
+from sqlalchemy import event, insert, inspect, text
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models.user import User
+from app.models.veiculo import Veiculo
+from app.models.entidade import Entidade
+from app.utils.documents import (
+    CPF_CNPJ, PLACA, add_document_columns, document_condition, find_by_document,
+    migrate_document_columns,
+    normalize_placa, only_digits
+)
+from app.utils.search_index import apply_search, init_search_index
+
+
+@pytest.mark.unit
+class TestDocuments:
+    """Testes para a normalização, a sincronização na escrita e a migração"""
+
+    @pytest.fixture
+    def app(self):
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        db.init_app(app)
+        init_search_index(app)
+        with app.app_context():
+            db.create_all()
+            yield app
+
+    def entity(self, cpf_cnpj, **values):
+        return dict({
+            'razao_social': 'Empresa', 'cpf_cnpj': cpf_cnpj, 'nome_fantasia': 'Empresa',
+            'tipo_cliente': 'Juridica', 'pagamento': '001', 'email_faturamento': 'f@exemplo.com',
+            'email_operacional': 'o@exemplo.com', 'email_despachante': 'd@exemplo.com'
+        }, **values)
+
+    def test_normalization(self):
+        """Testar a forma canônica e o formato dos números completos"""
+        assert only_digits('12.345.678/0001-90') == '12345678000190'
+        assert only_digits(' - ') is None and only_digits(None) is None
+        assert normalize_placa('abc-1234') == 'ABC1234'
+        assert CPF_CNPJ.complete('529.982.247-25') == '52998224725'
+        assert CPF_CNPJ.complete('5299822') is None
+        assert PLACA.complete('abc 1d23') == 'ABC1D23'
+        assert PLACA.complete('joao') is None
+
+    def test_shadow_columns_follow_writes(self, app):
+        """Testar o preenchimento no ORM, na alteração e no insert() em lote"""
+        user = User(name='Ana', lastname='Silva', cpf='529.982.247-25',
+                    email='ana@exemplo.com', group='ADM')
+        db.session.add(user)
+        db.session.commit()
+        assert user.cpf_norm == '52998224725'
+
+        user.cpf = '111.444.777-35'
+        db.session.commit()
+        assert db.session.execute(text('SELECT cpf_norm FROM users')).scalar() == '11144477735'
+
+        db.session.execute(insert(Entidade), [self.entity('12.345.678/0001-90')])
+        db.session.commit()
+        assert find_by_document(Entidade, 'cpf_cnpj', '12345678000190').cpf_cnpj == '12.345.678/0001-90'
+        assert find_by_document(Entidade, 'cpf_cnpj', '') is None
+
+    def test_canonical_uniqueness(self, app):
+        """Testar o índice único sobre a forma canônica"""
+        db.session.add(Entidade(**self.entity('12.345.678/0001-90')))
+        db.session.commit()
+        db.session.add(Entidade(**self.entity('12345678000190')))
+        with pytest.raises(IntegrityError):
+            db.session.commit()
+
+    def test_document_search_is_index_seek(self, app):
+        """Testar a busca exata pela coluna normalizada"""
+        db.session.add_all([
+            Veiculo(motorista_responsavel='Ana', cpf_motorista='529.982.247-25',
+                    placa='ABC-1234', renavam='00123456789', tipo='Truck'),
+            Veiculo(motorista_responsavel='Bia', cpf_motorista='111.444.777-35',
+                    placa='XYZ1D23', renavam='52998224725', tipo='Truck'),
+        ])
+        db.session.commit()
+
+        assert document_condition(Veiculo, 'Ana') is None
+        assert [v.placa for v in apply_search(Veiculo.query, Veiculo, 'abc1234')] == ['ABC-1234']
+        # CPF de um e RENAVAM do outro: 11 dígitos casam as duas colunas
+        found = apply_search(Veiculo.query.order_by(Veiculo.id), Veiculo, '529.982.247-25')
+        assert [v.placa for v in found] == ['ABC-1234', 'XYZ1D23']
+
+        statement = apply_search(Veiculo.query, Veiculo, 'ABC-1234').statement
+        plan = ' '.join(str(row[-1]) for row in db.session.execute(
+            text('EXPLAIN QUERY PLAN ' + str(statement.compile(compile_kwargs={'literal_binds': True})))
+        ))
+        assert 'USING INDEX ix_veiculos_placa_norm' in plan
+
+    def test_migration_backfills_in_batches(self, app):
+        """Testar a migração de um banco sem as colunas normalizadas"""
+        # Só entidades volta ao esquema antigo (as demais tabelas seguem para o clean_db)
+        Entidade.__table__.drop(db.engine)
+        db.session.execute(text(
+            'CREATE TABLE entidades (id INTEGER PRIMARY KEY, razao_social VARCHAR(200), '
+            'cpf_cnpj VARCHAR(18) UNIQUE, nome_fantasia VARCHAR(200), tipo_cliente VARCHAR(20), '
+            'pagamento VARCHAR(10), email_faturamento VARCHAR(120), email_operacional VARCHAR(120), '
+            'email_despachante VARCHAR(120))'
+        ))
+        db.session.execute(text('INSERT INTO entidades (id, cpf_cnpj) VALUES '
+                                "(1, '12.345.678/0001-90'), (2, '529.982.247-25'), "
+                                "(3, '12345678000190'), (4, '111.444.777-35'), (5, '-')"))
+        db.session.commit()
+
+        updates = []
+        event.listen(db.engine, 'before_cursor_execute',
+                     lambda conn, cursor, statement, *args: updates.append(statement)
+                     if statement.startswith('UPDATE') else None)
+        report = migrate_document_columns([Entidade], batch_size=2)
+
+        assert report['entidades'] == {
+            'added': ['cpf_cnpj_norm'], 'updated': 4, 'conflicts': {'cpf_cnpj_norm': ['12345678000190']}
+        }
+        assert len(updates) == 2
+        indexes = {index['name'] for index in inspect(db.engine).get_indexes('entidades')}
+        assert 'ix_entidades_cpf_cnpj_norm' not in indexes
+
+        # Corrigido o conflito, a nova execução só cria o índice
+        db.session.execute(text('DELETE FROM entidades WHERE id = 3'))
+        db.session.commit()
+        report = migrate_document_columns([Entidade], batch_size=2)
+        assert report['entidades'] == {'added': [], 'updated': 0, 'conflicts': {}}
+        indexes = {index['name']: index['unique'] for index in inspect(db.engine).get_indexes('entidades')}
+        assert indexes['ix_entidades_cpf_cnpj_norm']
+
+    def test_add_document_columns_only_alters(self, app):
+        """Testar a criação das colunas na inicialização, sem preenchimento"""
+        Entidade.__table__.drop(db.engine)
+        db.session.execute(text(
+            'CREATE TABLE entidades (id INTEGER PRIMARY KEY, razao_social VARCHAR(200), '
+            'cpf_cnpj VARCHAR(18) UNIQUE, nome_fantasia VARCHAR(200), tipo_cliente VARCHAR(20), '
+            'pagamento VARCHAR(10), email_faturamento VARCHAR(120), email_operacional VARCHAR(120), '
+            'email_despachante VARCHAR(120))'
+        ))
+        db.session.execute(text("INSERT INTO entidades (id, cpf_cnpj) VALUES (1, '529.982.247-25')"))
+        db.session.commit()
+
+        assert add_document_columns(Entidade) == ['cpf_cnpj_norm']
+        assert add_document_columns(Entidade) == []
+        # A coluna existe, mas o preenchimento fica com a migração
+        assert db.session.execute(text('SELECT cpf_cnpj_norm FROM entidades')).scalar() is None
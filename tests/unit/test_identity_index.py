@@ -0,0 +1,119 @@
+"""
+Testes unitários para o índice de identidade por CPF/CNPJ
+"""
+import pytest
+from flask import Flask
+from sqlalchemy import event, insert, text
+from app import db
+from app.models.user import User
+from app.models.veiculo import Veiculo
+from app.models.entidade import Entidade
+from app.models.document_identity import DocumentIdentity
+from app.utils.identity_index import (
+    identity_bulk_insert, identity_cache_stats, init_identity_index, lookup_document
+)
+
+CPF = '529.982.247-25'
+
+
+@pytest.mark.unit
+class TestIdentityIndex:
+    """Testes para a manutenção pelos eventos, a consulta única e o LRU"""
+
+    @pytest.fixture
+    def app(self):
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        app.config['IDENTITY_LOOKUP_CACHE_TTL'] = 60
+        db.init_app(app)
+        init_identity_index(app)
+        with app.app_context():
+            db.create_all()
+            yield app
+
+    @pytest.fixture(autouse=True)
+    def records(self, app, clean_db):
+        """Cadastros gravados depois da limpeza do banco (clean_db)"""
+        db.session.add_all([
+            User(name='Ana', lastname='Silva', cpf=CPF, email='ana@exemplo.com', group='ADM'),
+            Veiculo(motorista_responsavel='Ana', cpf_motorista='52998224725',
+                    placa='ABC1234', tipo='Truck'),
+            Veiculo(motorista_responsavel='Ana', cpf_motorista=CPF, placa='XYZ1D23', tipo='Truck'),
+            Veiculo(motorista_responsavel='Bia', cpf_motorista='111.444.777-35',
+                    placa='BBB2222', tipo='Truck'),
+        ])
+        db.session.commit()
+
+    def ids(self, documento):
+        return {name: [record['id'] for record in records]
+                for name, records in lookup_document(documento).items()}
+
+    def test_lookup_groups_records(self, app):
+        """Testar usuário e veículos do mesmo CPF, com ou sem pontuação"""
+        result = lookup_document('52998224725')
+        assert [user['email'] for user in result['users']] == ['ana@exemplo.com']
+        assert [vehicle['placa'] for vehicle in result['vehicles']] == ['ABC1234', 'XYZ1D23']
+        assert result['entities'] == []
+        assert lookup_document('123') is None
+        assert self.ids('000.000.000-00') == {'users': [], 'vehicles': [], 'entities': []}
+
+    def test_single_query_and_cache(self, app):
+        """Testar uma consulta ao banco na primeira chamada e nenhuma nas repetidas"""
+        lookup_document(CPF)   # constrói o índice
+        lookup_document('11144477735')
+        statements = []
+        event.listen(db.engine, 'before_cursor_execute',
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+
+        lookup_document('11144477725')
+        assert len(statements) == 1 and 'document_identities' in statements[0]
+        lookup_document('111.444.777-25')
+        lookup_document(CPF)
+        assert len(statements) == 1
+        assert identity_cache_stats()['hits'] >= 2
+
+    def test_index_follows_writes(self, app):
+        """Testar inclusão, alteração e exclusão refletidas após o commit"""
+        assert len(lookup_document(CPF)['vehicles']) == 2
+
+        entity = Entidade(razao_social='Ana ME', cpf_cnpj=CPF, nome_fantasia='Ana',
+                          tipo_cliente='Pessoa Fisica', pagamento='001', email_faturamento='f@exemplo.com',
+                          email_operacional='o@exemplo.com', email_despachante='d@exemplo.com')
+        db.session.add(entity)
+        vehicle = Veiculo.query.filter_by(placa='XYZ1D23').one()
+        vehicle.cpf_motorista = '111.444.777-35'
+        user = User.query.one()
+        user.name = 'Ana Maria'
+        db.session.commit()
+
+        result = lookup_document(CPF)
+        assert [record['razao_social'] for record in result['entities']] == ['Ana ME']
+        assert [record['placa'] for record in result['vehicles']] == ['ABC1234']
+        assert result['users'][0]['name'] == 'Ana Maria'
+        assert [record['placa'] for record in lookup_document('11144477735')['vehicles']] == ['XYZ1D23', 'BBB2222']
+
+        db.session.delete(user)
+        db.session.commit()
+        assert lookup_document(CPF)['users'] == []
+
+    def test_rebuilt_when_out_of_sync(self, app):
+        """Testar a reconstrução de registros gravados fora dos eventos"""
+        lookup_document(CPF)
+        db.session.execute(insert(User), [{'name': 'Caio', 'lastname': 'Souza', 'cpf': '111.444.777-35',
+                                           'email': 'caio@exemplo.com', 'group': 'ADM'}])
+        db.session.execute(text('DELETE FROM document_identities'))
+        db.session.commit()
+        init_identity_index(app)
+
+        assert [user['name'] for user in lookup_document('11144477735')['users']] == ['Caio']
+        assert DocumentIdentity.query.count() == 5
+
+    def test_bulk_insert(self, app):
+        """Testar a indexação das linhas de insert() em lote"""
+        lookup_document('11144477735')
+        rows = [{'name': 'Caio', 'lastname': 'Souza', 'cpf': '111.444.777-35',
+                 'email': 'caio@exemplo.com', 'group': 'ADM'}]
+        db.session.execute(insert(User), rows)
+        identity_bulk_insert(db.session.connection(), User, rows, 'cpf')
+        db.session.commit()
+        assert [user['name'] for user in lookup_document('11144477735')['users']] == ['Caio']
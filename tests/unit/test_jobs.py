@@ -0,0 +1,153 @@
+"""
+Testes unitários para a fila de tarefas em segundo plano
+"""
+import csv
+import io
+import os
+import time
+import pytest
+from flask import Flask
+from sqlalchemy import insert
+from app import db
+from app.models.user import User
+from app.services.jobs import (
+    CANCELLED, FAILED, QUEUED, RUNNING, SUCCEEDED, JobError, JobQueue, UnknownJobType
+)
+
+
+@pytest.mark.unit
+class TestJobQueue:
+    """Testes para enfileirar, executar, repetir, cancelar e expirar tarefas"""
+
+    @pytest.fixture
+    def app(self, tmp_path):
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        app.config['JOBS_DATABASE'] = str(tmp_path / 'jobs.sqlite3')
+        app.config['JOBS_RESULT_DIR'] = str(tmp_path / 'jobs')
+        app.config['JOBS_RETRY_BACKOFF'] = 60
+        db.init_app(app)
+        with app.app_context():
+            db.create_all()
+            yield app
+
+    @pytest.fixture
+    def queue(self, app):
+        queue = JobQueue()
+        queue.init_app(app)
+        return queue
+
+    def test_submit_and_run_with_result_file(self, queue):
+        """Testar execução com progresso, resultado em JSON e arquivo"""
+        @queue.handler('echo')
+        def echo(context):
+            context.progress(50, 'metade', force=True)
+            with open(context.result_path('saída.txt'), 'w') as target:
+                target.write(context.params['text'])
+            return {'length': len(context.params['text'])}
+
+        job = queue.submit('echo', {'text': 'olá'}, user_id=7)
+        assert job['status'] == QUEUED and job['user_id'] == 7
+
+        job = queue.run_next('teste')
+        assert job['status'] == SUCCEEDED and job['progress'] == 100
+        assert job['result'] == {'length': 3} and job['result_name'] == 'saída.txt'
+        with open(job['result_file']) as result:
+            assert result.read() == 'olá'
+        assert queue.run_next('teste') is None
+
+        with pytest.raises(UnknownJobType):
+            queue.submit('inexistente')
+
+    def test_retry_with_backoff_then_fail(self, queue):
+        """Testar nova tentativa com espera e falha definitiva (JobError ou tentativas esgotadas)"""
+        calls = []
+
+        @queue.handler('instavel', max_attempts=2)
+        def flaky(context):
+            calls.append(context.attempt)
+            raise RuntimeError('banco indisponível')
+
+        @queue.handler('invalida')
+        def invalid(context):
+            raise JobError('parâmetros inválidos')
+
+        job_id = queue.submit('instavel')['id']
+        job = queue.run_next('teste')
+        assert job['status'] == QUEUED and job['error'] == 'banco indisponível'
+        assert job['run_after'] >= time.time() + 55
+        assert queue.run_next('teste') is None
+
+        queue._connection().execute('UPDATE jobs SET run_after = 0 WHERE id = ?', (job_id,))
+        job = queue.run_next('teste')
+        assert job['status'] == FAILED and job['attempts'] == 2 and calls == [1, 2]
+
+        queue.submit('invalida')
+        job = queue.run_next('teste')
+        assert job['status'] == FAILED and job['attempts'] == 1
+
+    def test_cancel_queued_and_running(self, queue):
+        """Testar cancelamento na fila e durante a execução (no progresso)"""
+        @queue.handler('longa')
+        def long_job(context):
+            with open(context.result_path('parcial.csv'), 'w') as target:
+                target.write('x')
+            queue.cancel(context.job_id)
+            context.progress(10, force=True)
+            return {'never': True}
+
+        queued = queue.submit('longa')
+        assert queue.cancel(queued['id'])['status'] == CANCELLED
+        assert queue.run_next('teste') is None
+
+        queue.submit('longa')
+        job = queue.run_next('teste')
+        assert job['status'] == CANCELLED and job['cancel_requested']
+        assert job['result_file'] is None
+        assert not os.listdir(queue.job_dir(job['id']))
+
+    def test_recover_stale_and_purge_expired(self, queue):
+        """Testar a volta à fila sem heartbeat e a remoção dos resultados expirados"""
+        @queue.handler('arquivo')
+        def with_file(context):
+            with open(context.result_path('r.txt'), 'w') as target:
+                target.write('ok')
+
+        stale = queue.submit('arquivo')
+        assert queue.claim('morto')['status'] == RUNNING
+        queue._connection().execute('UPDATE jobs SET heartbeat_at = 0 WHERE id = ?', (stale['id'],))
+        assert queue.recover_stale() == 1
+        assert queue.get(stale['id'])['status'] == QUEUED
+
+        job = queue.run_next('teste')
+        assert job['status'] == SUCCEEDED and job['attempts'] == 2
+        assert queue.purge_expired() == 0
+
+        queue._connection().execute('UPDATE jobs SET finished_at = 1 WHERE id = ?', (job['id'],))
+        assert queue.purge_expired() == 1
+        assert queue.get(job['id']) is None and not os.path.exists(queue.job_dir(job['id']))
+
+    def test_report_export_job(self, app):
+        """Testar a exportação de relatório na fila: arquivo CSV e total de linhas"""
+        from app.routes.reports import build_report_export  # registra o handler
+        from app.services.jobs import job_queue
+
+        job_queue.init_app(app)
+        db.session.execute(insert(User), [{
+            'name': f'Usuário {i}', 'lastname': 'Teste', 'cpf': f'{i:011d}',
+            'email': f'u{i}@exemplo.com', 'group': 'ADM', 'status': ('active', 'blocked')[i % 2]
+        } for i in range(30)])
+        db.session.commit()
+
+        job_queue.submit('report_export', {'report_type': 'users', 'format': 'csv',
+                                           'filters': {'status': 'active'}})
+        job = job_queue.run_next('teste')
+        assert job['status'] == SUCCEEDED and job['result'] == {
+            'report_type': 'users', 'format': 'csv', 'rows': 15
+        }
+        with open(job['result_file'], encoding='utf-8-sig') as result:
+            rows = list(csv.reader(result))
+        assert rows[0][0] == 'ID' and len(rows) == 16
+
+        job_queue.submit('report_export', {'report_type': 'users', 'format': 'pdf'})
+        assert job_queue.run_next('teste')['status'] == FAILED
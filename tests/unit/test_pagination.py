@@ -0,0 +1,121 @@
+"""
+Testes unitários para a paginação por cursor (keyset)
+"""
+import pytest
+from datetime import datetime
+from flask import Flask
+from sqlalchemy import event
+from app import db
+from app.models.user import User
+from app.utils.pagination import InvalidCursor, InvalidSort, encode_cursor, paginate
+
+SORTABLE = ('id', 'name', 'group', 'job_title', 'created_at')
+
+
+@pytest.mark.unit
+class TestKeysetPagination:
+    """Testes para a paginação por cursor e por página"""
+
+    @pytest.fixture
+    def app(self):
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        db.init_app(app)
+        with app.app_context():
+            db.create_all()
+            yield app
+
+    @pytest.fixture(autouse=True)
+    def users(self, app, clean_db):
+        """Usuários gravados depois da limpeza do banco (clean_db)"""
+        for index in range(11):
+            db.session.add(User(
+                name=f'Usuario {index}', lastname='Teste', cpf=f'{index:011d}',
+                email=f'u{index}@exemplo.com', group=('ADM', 'Faturamento')[index % 2],
+                job_title=None if index % 3 == 0 else f'Cargo {index % 4}',
+                created_at=datetime(2024, 1, 1 + index % 5)
+            ))
+        db.session.commit()
+
+    def walk(self, **kwargs):
+        """Percorre todas as páginas seguindo next_cursor"""
+        ids, cursor = [], None
+        while True:
+            items, pagination = paginate(User.query, User, per_page=4, cursor=cursor,
+                                         include_total=False, sortable=SORTABLE, **kwargs)
+            ids += [user.id for user in items]
+            cursor = pagination['next_cursor']
+            if not cursor:
+                return ids
+
+    def test_cursor_matches_offset_order(self, app):
+        """Testar que o cursor percorre os itens na mesma ordem da paginação por página"""
+        for sort in ('id', 'created_at', 'job_title', 'group'):
+            for order in ('asc', 'desc'):
+                expected = [user.id for user in paginate(
+                    User.query, User, sort=sort, order=order, per_page=100, sortable=SORTABLE)[0]]
+                assert self.walk(sort=sort, order=order) == expected, (sort, order)
+                assert len(expected) == 11
+
+    def test_cursor_pages_skip_count(self, app):
+        """Testar que include_total=false dispensa o COUNT(*)"""
+        queries = []
+        event.listen(db.engine, 'before_cursor_execute', lambda *args: queries.append(1))
+
+        items, pagination = paginate(User.query, User, per_page=4, include_total=False)
+        assert len(queries) == 1
+        assert pagination['total'] is None and pagination['has_next']
+
+        items, pagination = paginate(User.query, User, per_page=4)
+        assert pagination['total'] == 11 and pagination['pages'] == 3
+
+    def test_invalid_cursor(self, app):
+        """Testar cursores malformados ou de outra ordenação"""
+        with pytest.raises(InvalidCursor):
+            paginate(User.query, User, cursor='nao-e-um-cursor')
+        with pytest.raises(InvalidCursor):
+            paginate(User.query, User, sort='name', cursor=encode_cursor('id', 'asc', 3, 3),
+                     sortable=SORTABLE)
+
+    def test_sort_outside_whitelist(self, app):
+        """Testar que colunas fora da lista (valor iria no cursor) são rejeitadas"""
+        for sort in ('password_hash', 'cpf', 'permissions', 'nao_existe'):
+            with pytest.raises(InvalidSort):
+                paginate(User.query, User, sort=sort, sortable=SORTABLE)
+        assert paginate(User.query, User, per_page=4)[1]['next_cursor']
+
+    def test_sort_key_nulls_lowest_per_dialect(self):
+        """Testar NULLS FIRST/LAST explícito onde o banco aceita (ordem usada pelo cursor)"""
+        from sqlalchemy import select
+        from sqlalchemy.dialects import mysql, postgresql
+        from app.utils.pagination import _sort_key
+
+        def compiled(descending, dialect):
+            statement = select(User.id).order_by(_sort_key(User.job_title, descending, dialect.name))
+            return str(statement.compile(dialect=dialect)).split('ORDER BY ')[1]
+
+        assert compiled(False, postgresql.dialect()) == 'users.job_title ASC NULLS FIRST'
+        assert compiled(True, postgresql.dialect()) == 'users.job_title DESC NULLS LAST'
+        assert compiled(False, mysql.dialect()) == 'users.job_title ASC'
+
+    def test_paginate_page_projection_and_cached_count(self, app):
+        """Testar a página HTML: só as colunas exibidas e total filtrado em cache"""
+        from sqlalchemy import inspect
+        from app.utils.cache import cache_manager
+        from app.utils.pagination import paginate_page
+
+        cache_manager.clear()
+        query = User.query.filter(User.group == 'ADM')
+        pagination = paginate_page(query, User, page=2, per_page=10, sort='name',
+                                   order='desc', columns=('id', 'name'))
+        assert pagination.total == 6 and pagination.pages == 1
+        assert pagination.items == []
+
+        pagination = paginate_page(query, User, page=1, per_page=10, sort='name', columns=('id', 'name'))
+        assert [user.name for user in pagination.items] == sorted(user.name for user in pagination.items)
+        assert 'email' in inspect(pagination.items[0]).unloaded
+
+        queries = []
+        event.listen(db.engine, 'before_cursor_execute', lambda *args: queries.append(args[2]))
+        paginate_page(query, User, page=1, per_page=10, sort='name', columns=('id', 'name'))
+        assert len(queries) == 1 and 'count(' not in queries[0].lower()
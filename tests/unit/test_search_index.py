@@ -0,0 +1,106 @@
+"""
+Testes unitários para o índice de busca dos cadastros
+"""
+import io
+import pytest
+from flask import Flask
+from sqlalchemy import insert
+from app import db
+from app.models.user import User
+from app.models.veiculo import Veiculo
+from app.models.search_trigram import SearchTrigram
+from app.utils.search_index import apply_search, init_search_index, query_terms, search_ids
+
+
+@pytest.mark.unit
+class TestSearchIndex:
+    """Testes para a busca por prefixo sem acentos, a sincronização e a relevância"""
+
+    @pytest.fixture(params=['fts5', 'trigram'])
+    def app(self, request):
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        app.config['SEARCH_INDEX_BACKEND'] = request.param
+        db.init_app(app)
+        init_search_index(app)
+        with app.app_context():
+            db.create_all()
+            yield app
+
+    @pytest.fixture(autouse=True)
+    def users(self, app, clean_db):
+        """Usuários gravados depois da limpeza do banco (clean_db)"""
+        db.session.add_all([
+            User(name='João', lastname='Silva', cpf='529.982.247-25',
+                 email='joao.silva@exemplo.com', group='ADM'),
+            User(name='Maria', lastname='Conceição', cpf='111.444.777-35',
+                 email='maria@exemplo.com', group='ADM'),
+            User(name='Joana', lastname='Albuquerque Fontes', cpf='123.456.789-09',
+                 email='joana.fontes@exemplo.com', group='Faturamento'),
+        ])
+        db.session.commit()
+
+    def names(self, term):
+        return sorted(user.name for user in apply_search(User.query, User, term))
+
+    def test_query_terms(self):
+        """Testar a normalização dos termos e a forma compacta dos documentos"""
+        assert query_terms('  JOÃO  da Silva ') == (['joao', 'da', 'silva'], 'joaodasilva')
+        assert query_terms('ABC-1234') == (['abc', '1234'], 'abc1234')
+        assert query_terms('%_') == ([], None)
+
+    def test_prefix_and_accent_insensitive(self, app):
+        """Testar prefixos de palavras, acentos e caixa"""
+        assert self.names('joao') == ['João']
+        assert self.names('JO') == ['Joana', 'João']
+        assert self.names('conceicao') == ['Maria']
+        assert self.names('jo silv') == ['João']
+        assert self.names('exemplo') == ['Joana', 'João', 'Maria']
+        assert self.names('oao') == []
+        assert self.names('') == ['Joana', 'João', 'Maria']
+
+    def test_documents_with_and_without_punctuation(self, app):
+        """Testar CPF formatado, só dígitos e prefixo"""
+        assert self.names('529.982.247-25') == ['João']
+        assert self.names('52998224725') == ['João']
+        assert self.names('1114') == ['Maria']
+
+    def test_index_follows_writes(self, app):
+        """Testar atualização, exclusão e inserção em lote"""
+        from app.services.bulk_import import IMPORT_SPECS, BulkImporter
+
+        maria = User.query.filter_by(name='Maria').one()
+        maria.lastname = 'Sebastião'
+        db.session.commit()
+        assert self.names('conceicao') == [] and self.names('sebastiao') == ['Maria']
+
+        db.session.delete(maria)
+        db.session.commit()
+        assert self.names('maria') == []
+
+        BulkImporter(IMPORT_SPECS['veiculos']).run(io.BytesIO(
+            'placa,motorista_responsavel,cpf_motorista,tipo\n'
+            'ABC1D23,José Araújo,529.982.247-25,Truck\n'.encode()
+        ))
+        assert [v.placa for v in apply_search(Veiculo.query, Veiculo, 'jose araujo')] == ['ABC1D23']
+        assert [v.placa for v in apply_search(Veiculo.query, Veiculo, 'abc1')] == ['ABC1D23']
+
+    def test_relevance_order(self, app):
+        """Testar a ordem de relevância (registro mais próximo do termo primeiro)"""
+        db.session.execute(insert(User), [
+            {'name': 'Silva', 'lastname': 'Silva', 'cpf': '1', 'email': 's@x.com', 'group': 'ADM'},
+        ])
+        db.session.commit()
+        ids = search_ids(User, 'silva')
+        assert [db.session.get(User, user_id).name for user_id in ids] == ['Silva', 'João']
+
+    def test_index_rebuilt_when_out_of_sync(self, app):
+        """Testar a reconstrução na primeira busca quando há registros fora do índice"""
+        if app.config['SEARCH_INDEX_BACKEND'] != 'trigram':
+            pytest.skip('os triggers do FTS5 cobrem qualquer escrita')
+        from app.utils import search_index
+
+        db.session.query(SearchTrigram).delete()
+        db.session.commit()
+        search_index._ready.clear()
+        assert self.names('joao') == ['João']
@@ -0,0 +1,247 @@
+"""
+Testes unitários para o motor de estatísticas
+"""
+import pytest
+from datetime import datetime
+from flask import Flask
+from sqlalchemy import event
+from app import db
+from app.models.user import User
+from app.models.veiculo import Veiculo
+from app.models.entidade import Entidade
+from app.utils.stats_engine import table_stats, table_totals
+
+
+@pytest.mark.unit
+class TestStatsEngine:
+    """Testes para o motor de estatísticas em uma única varredura"""
+
+    @pytest.fixture
+    def app(self):
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        db.init_app(app)
+        with app.app_context():
+            db.create_all()
+            yield app
+
+    def add_users(self, *rows):
+        for index, (status, group) in enumerate(rows):
+            db.session.add(User(name=f'Usuario {index}', lastname='Teste', cpf=f'{index:011d}',
+                                email=f'u{index}@exemplo.com', status=status, group=group,
+                                created_at=datetime(2024, 1 + index, 1)))
+        db.session.commit()
+
+    def count_queries(self):
+        counter = []
+        event.listen(db.engine, 'before_cursor_execute', lambda *args: counter.append(1))
+        return counter
+
+    def test_table_stats_single_query(self, app):
+        """Testar total, status, grupos e condições em uma única consulta"""
+
+        self.add_users(('active', 'ADM'), ('active', 'ADM'), ('blocked', 'Operacional'),
+                       ('inativo', 'Faturamento'))
+        queries = self.count_queries()
+
+        stats = table_stats(User, group_by=User.group,
+                            conditions={'recentes': User.created_at >= datetime(2024, 3, 1)})
+
+        assert len(queries) == 1
+        assert stats['total'] == 4
+        assert stats['by_status'] == {'active': 2, 'blocked': 1}
+        assert stats['by_group'][0] == ('ADM', 2)
+        assert sorted(stats['by_group']) == [('ADM', 2), ('Faturamento', 1), ('Operacional', 1)]
+        assert stats['conditions'] == {'recentes': 2}
+
+    def test_table_stats_empty_table(self, app):
+        """Testar tabela vazia sem agrupamento"""
+
+        assert table_stats(User, statuses=('ativo',)) == {
+            'total': 0, 'by_status': {'ativo': 0}, 'by_group': [], 'conditions': {}
+        }
+
+    def test_table_totals_single_query(self, app):
+        """Testar totais de várias tabelas em uma única consulta"""
+
+        self.add_users(('active', 'ADM'), ('blocked', 'ADM'))
+        queries = self.count_queries()
+
+        assert table_totals(User, Veiculo, Entidade) == {'users': 2, 'veiculos': 0, 'entidades': 0}
+        assert len(queries) == 1
+
+
+@pytest.mark.unit
+class TestStatsCounters:
+    """Testes para os contadores mantidos pelos eventos do SQLAlchemy"""
+
+    @pytest.fixture
+    def app(self):
+        from app.utils.stats_counters import init_stats_counters
+
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        app.config['STATS_COUNTERS_RECONCILE_INTERVAL'] = 0
+        db.init_app(app)
+        init_stats_counters(app)
+        with app.app_context():
+            db.create_all()
+            yield app
+
+    def make_user(self, index, status='active', group='ADM'):
+        return User(name=f'Usuario {index}', lastname='Teste', cpf=f'{index:011d}',
+                    email=f'u{index}@exemplo.com', status=status, group=group)
+
+    def stored(self):
+        from app.models.stats_counter import StatsCounter
+        return {
+            (row.dimension, row.value): row.count
+            for row in StatsCounter.query.filter_by(table_name='users') if row.count
+        }
+
+    def test_events_keep_counters_in_sync(self, app):
+        """Testar inserção, alteração e remoção refletidas nos contadores"""
+        from app.utils.stats_counters import counter_stats, counter_totals
+
+        users = [self.make_user(i) for i in range(3)]
+        db.session.add_all(users)
+        db.session.commit()
+
+        users[0].status = 'blocked'
+        users[1].group = 'Faturamento'
+        db.session.commit()
+        db.session.delete(users[2])
+        db.session.commit()
+
+        assert self.stored() == {
+            ('_total', ''): 2, ('status', 'active'): 1, ('status', 'blocked'): 1,
+            ('group', 'ADM'): 1, ('group', 'Faturamento'): 1
+        }
+
+        # Primeira leitura de veiculos: contadores criados pela reconciliação
+        assert counter_totals(User, Veiculo) == {'users': 2, 'veiculos': 0}
+        queries = []
+        event.listen(db.engine, 'before_cursor_execute', lambda *args: queries.append(1))
+        assert counter_totals(User, Veiculo) == {'users': 2, 'veiculos': 0}
+        assert len(queries) == 1
+        stats = counter_stats(User, dimension='group')
+        assert stats['by_status'] == {'active': 1, 'blocked': 1}
+        assert sorted(stats['by_group']) == [('ADM', 1), ('Faturamento', 1)]
+        assert stats == table_stats(User, group_by=User.group) | {'by_group': stats['by_group']}
+
+    def test_rollback_discards_deltas(self, app):
+        """Testar que os contadores seguem a transação da escrita"""
+        from app.utils.stats_counters import counter_totals
+
+        db.session.add(self.make_user(1))
+        db.session.flush()
+        db.session.rollback()
+
+        assert counter_totals(User) == {'users': 0}
+
+    def test_first_use_does_not_commit_request_session(self, app):
+        """Testar que a reconciliação do primeiro uso não faz commit da sessão"""
+        from sqlalchemy import delete
+        from sqlalchemy.orm import Session
+        from app.models.stats_counter import StatsCounter
+        from app.utils.stats_counters import counter_totals
+
+        db.session.add(self.make_user(1))
+        db.session.commit()
+        db.session.execute(delete(StatsCounter))
+        db.session.commit()
+
+        commits = []
+        listener = lambda session: commits.append(session)
+        event.listen(Session, 'after_commit', listener)
+        try:
+            assert counter_totals(User) == {'users': 1}
+        finally:
+            event.remove(Session, 'after_commit', listener)
+        assert commits == []
+
+    def test_reconcile_fixes_bulk_writes(self, app):
+        """Testar que a reconciliação corrige escritas que não disparam eventos"""
+        from sqlalchemy import insert
+        from app.utils.stats_counters import counter_totals, reconcile_counters
+
+        db.session.add(self.make_user(1))
+        db.session.commit()
+        db.session.execute(insert(User), [{
+            'name': 'Lote', 'lastname': 'Teste', 'cpf': '99999999999',
+            'email': 'lote@exemplo.com', 'status': 'blocked', 'group': 'Operacional'
+        }])
+        db.session.commit()
+        assert counter_totals(User) == {'users': 1}
+
+        # TOTAL, status e grupo do registro em lote, mais o seu mês
+        assert reconcile_counters([User]) == {'users': 4}
+        assert counter_totals(User) == {'users': 2}
+        assert self.stored()[('group', 'Operacional')] == 1
+        assert reconcile_counters([User]) == {'users': 0}
+
+
+@pytest.mark.unit
+class TestMonthlyRollups:
+    """Testes para o agrupamento mensal portável e os agregados mensais"""
+
+    @pytest.fixture
+    def app(self):
+        from app.utils.stats_counters import init_stats_counters
+
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        app.config['STATS_COUNTERS_RECONCILE_INTERVAL'] = 0
+        db.init_app(app)
+        init_stats_counters(app)
+        with app.app_context():
+            db.create_all()
+            yield app
+
+    def make_user(self, index, created_at):
+        return User(name=f'Usuario {index}', lastname='Teste', cpf=f'{index:011d}',
+                    email=f'u{index}@exemplo.com', group='ADM', created_at=created_at)
+
+    def test_month_bucket_compiles_per_dialect(self):
+        """Testar a função de agrupamento mensal gerada para cada banco"""
+        from sqlalchemy import select
+        from sqlalchemy.dialects import mysql, postgresql, sqlite
+        from app.utils.stats_engine import month_bucket
+
+        query = select(month_bucket(User.created_at))
+        assert "strftime('%Y-%m', users.created_at)" in str(query.compile(dialect=sqlite.dialect()))
+        assert "date_format(users.created_at, '%%Y-%%m')" in str(query.compile(dialect=mysql.dialect()))
+        assert "to_char(users.created_at, 'YYYY-MM')" in str(query.compile(dialect=postgresql.dialect()))
+
+    def test_events_roll_months_forward(self, app):
+        """Testar inserção, mudança de mês e remoção refletidas nos agregados"""
+        from app.utils.stats_counters import monthly_series
+        from app.utils.stats_engine import monthly_counts
+
+        users = [self.make_user(1, datetime(2024, 1, 10)), self.make_user(2, datetime(2024, 1, 20)),
+                 self.make_user(3, datetime(2024, 3, 5)), self.make_user(4, datetime(2023, 6, 1))]
+        db.session.add_all(users)
+        db.session.commit()
+        users[1].created_at = datetime(2024, 2, 1)
+        db.session.delete(users[2])
+        db.session.commit()
+
+        queries = []
+        event.listen(db.engine, 'before_cursor_execute', lambda *args: queries.append(1))
+        series = monthly_series(User, since=datetime(2023, 12, 15))
+        assert series == {'users': [('2024-01', 1), ('2024-02', 1)]}
+        assert len(queries) == 1
+        assert monthly_counts(User, since=datetime(2023, 12, 15)) == series['users']
+
+    def test_reconcile_builds_missing_rollups(self, app):
+        """Testar que tabelas ainda sem agregados são reconciliadas na leitura"""
+        from sqlalchemy import insert
+        from app.utils.stats_counters import monthly_series
+
+        db.session.execute(insert(User), [{
+            'name': 'Lote', 'lastname': 'Teste', 'cpf': f'{i:011d}', 'email': f'l{i}@exemplo.com',
+            'group': 'ADM', 'created_at': datetime(2024, 5, 1 + i)
+        } for i in range(3)])
+        db.session.commit()
+
+        assert monthly_series(User, Veiculo) == {'users': [('2024-05', 3)], 'veiculos': []}
@@ -0,0 +1,108 @@
+"""
+Testes unitários para as respostas em streaming
+"""
+import io
+import json
+import zipfile
+import pytest
+from xml.etree import ElementTree
+from flask import Flask
+from sqlalchemy import insert, select
+from app import db
+from app.models.user import User
+from app.utils.streaming import (
+    csv_chunks, iter_batches, iter_records, ndjson_chunks, stream_response, xlsx_chunks
+)
+
+
+@pytest.mark.unit
+class TestStreaming:
+    """Testes para a leitura em lotes e a escrita de NDJSON/CSV"""
+
+    @pytest.fixture
+    def app(self):
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        db.init_app(app)
+        with app.app_context():
+            db.create_all()
+            yield app
+
+    @pytest.fixture(autouse=True)
+    def users(self, app, clean_db):
+        """Usuários gravados depois da limpeza do banco (clean_db)"""
+        db.session.execute(insert(User), [{
+            'name': f'Usuário {i}', 'lastname': 'Teste', 'cpf': f'{i:011d}',
+            'email': f'u{i}@exemplo.com', 'group': 'ADM'
+        } for i in range(25)])
+        db.session.commit()
+
+    def test_iter_batches_yields_fixed_size_partitions(self, app):
+        """Testar que as linhas chegam em lotes de yield_per"""
+        sizes = [len(rows) for rows in iter_batches(select(User.id).order_by(User.id), batch_size=10)]
+        assert sizes == [10, 10, 5]
+
+    def test_ndjson_one_chunk_per_batch(self, app):
+        """Testar NDJSON: um bloco por lote e uma linha por registro"""
+        batches = iter_records(select(User.id, User.name).order_by(User.id),
+                               lambda row: {'id': row.id, 'name': row.name}, batch_size=10)
+        chunks = list(ndjson_chunks(batches))
+        assert len(chunks) == 3
+        records = [json.loads(line) for chunk in chunks for line in chunk.splitlines()]
+        assert records[0] == {'id': 1, 'name': 'Usuário 0'} and len(records) == 25
+
+    def test_csv_header_and_rows(self, app):
+        """Testar CSV: BOM, cabeçalho com rótulos e colunas na ordem pedida"""
+        batches = iter_records(select(User.id, User.email).order_by(User.id).limit(2),
+                               lambda row: {'id': row.id, 'email': row.email})
+        chunks = list(csv_chunks(batches, ['email', 'id'], header=['E-mail', 'ID']))
+        assert chunks[0] == '\ufeffE-mail,ID\r\n'
+        assert chunks[1] == 'u0@exemplo.com,1\r\nu1@exemplo.com,2\r\n'
+
+    def test_csv_error_mid_stream_propagates(self, app):
+        """Testar que um erro no meio do CSV interrompe o stream em vez de truncá-lo"""
+        def batches():
+            yield [{'id': 1}]
+            raise RuntimeError('conexão perdida')
+
+        chunks = csv_chunks(batches(), ['id'])
+        assert next(chunks) == '\ufeffid\r\n'
+        assert next(chunks) == '1\r\n'
+        with pytest.raises(RuntimeError):
+            next(chunks)
+
+    def test_response_headers(self, app):
+        """Testar Content-Type (charset uma única vez) e nome do arquivo"""
+        with app.test_request_context():
+            response = stream_response(iter(['a\r\n']), 'csv', 'usuarios.csv')
+        assert response.headers['Content-Type'] == 'text/csv; charset=utf-8'
+        assert response.headers['Content-Disposition'] == 'attachment; filename="usuarios.csv"'
+
+    def test_xlsx_package_streams_rows(self, app):
+        """Testar XLSX: pacote zip válido com uma linha por registro e textos escapados"""
+        batches = iter_records(select(User.id, User.name).order_by(User.id),
+                               lambda row: {'id': row.id, 'name': f'{row.name} <&>\x01'},
+                               batch_size=10)
+        data = b''.join(xlsx_chunks(batches, ['id', 'name'], header=['ID', 'Nome']))
+
+        package = zipfile.ZipFile(io.BytesIO(data))
+        assert package.testzip() is None
+        assert '[Content_Types].xml' in package.namelist()
+        namespace = {'s': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+        sheet = ElementTree.fromstring(package.read('xl/worksheets/sheet1.xml'))
+        rows = sheet.findall('s:sheetData/s:row', namespace)
+        assert len(rows) == 26
+        assert [''.join(cell.itertext()) for cell in rows[1]] == ['1', 'Usuário 0 <&>']
+
+    def test_xlsx_error_mid_stream_does_not_finish_package(self, app):
+        """Testar que um erro no meio do XLSX não grava o fim do zip"""
+        def batches():
+            yield [{'id': 1}]
+            raise RuntimeError('conexão perdida')
+
+        sent = []
+        with pytest.raises(RuntimeError):
+            for chunk in xlsx_chunks(batches(), ['id']):
+                sent.append(chunk)
+        with pytest.raises(zipfile.BadZipFile):
+            zipfile.ZipFile(io.BytesIO(b''.join(sent)))